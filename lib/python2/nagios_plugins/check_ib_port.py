@@ -11,6 +11,8 @@
 import os
 import sys
 import re
+import time
+import socket
 import logging
 import textwrap
 
@@ -27,6 +29,8 @@ from nagios.common import pp, caller_search_path
 
 from nagios.plugin import NagiosPluginError
 
+from nagios.plugin.functions import STATUS_TEXT
+
 from nagios.plugin.range import NagiosRange
 
 from nagios.plugin.threshold import NagiosThreshold
@@ -36,17 +40,42 @@ from nagios.plugins import ExecutionTimeoutError
 from nagios.plugins import CommandNotFoundError
 from nagios.plugins import ExtNagiosPlugin
 
+from nagios_plugins.ib_counters import THROUGHPUT_COUNTERS, ERROR_COUNTERS
+from nagios_plugins.ib_counters import XMIT_WAIT_COUNTER
+from nagios_plugins.ib_counters import counter_deltas, counter_window
+from nagios_plugins.ib_counters import CounterWindowSampler
+from nagios_plugins.ib_counters import DATA_COUNTERS, DATA_COUNTER_SCALE
+from nagios_plugins.ib_counters import IbCounterState
+from nagios_plugins.ib_counters import read_port_counters
+
+from nagios_plugins.sysfs import SysfsError, SysfsReader
+
+from nagios_plugins.clock import monotonic
+
+from nagios_plugins.state_files import STATE_DIR
+
+from nagios_plugins.link_flaps import DEFAULT_SAMPLE_INTERVAL
+from nagios_plugins.link_flaps import DEFAULT_FLAP_WARNING
+from nagios_plugins.link_flaps import LinkFlapSampler, evaluate_flaps
+
 #---------------------------------------------
 # Some module variables
 
-__version__ = '0.3.0'
+__version__ = '0.6.1'
 
 log = logging.getLogger(__name__)
 
 DEFAULT_RATE = 40
 DEFAULT_TIMEOUT = 2
+
+# The shortest window in seconds for sampling 32 bit counters, a shorter one
+# gives no meaningful rates
+MIN_COUNTER_WINDOW = 0.1
 IB_BASE_DIR = os.sep + os.path.join('sys', 'class', 'infiniband')
 
+# Warning threshold of the increase per hour of each error counter
+DEFAULT_ERRORS_WARNING = '0'
+
 # Some conststants from /usr/include/infiniband/iba/ib_types.h:
 IB_LINK_NO_CHANGE = 0
 IB_LINK_DOWN      = 1
@@ -67,6 +96,30 @@ IB_PORT_PHYS_STATE_PHYTEST        = 7
 re_state = re.compile(r'^(\d+):\s+(\S.*)')
 re_rate = re.compile(r'^(\d+)')
 
+#==============================================================================
+def discover_ib_ports(sysfs, hca_name = None):
+    """
+    Lists all HCAs and their ports.
+
+    @param sysfs: the reader of IB_BASE_DIR
+    @type sysfs: SysfsReader
+    @param hca_name: list only the ports of this HCA
+    @type hca_name: str or None
+
+    @return: the HCA names and port numbers, sorted
+    @rtype: list of tuple
+    """
+
+    result = []
+    for hca in sysfs.listdir():
+        if hca_name is not None and hca != hca_name:
+            continue
+        ports = sysfs.listdir(os.path.join(hca, 'ports'))
+        for port in sorted(int(x) for x in ports if x.isdigit()):
+            result.append((hca, port))
+
+    return result
+
 #==============================================================================
 class CheckIbStatusPlugin(ExtNagiosPlugin):
     """
@@ -82,13 +135,24 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
 
         usage = """\
                 %(prog)s [-v] [-t <timeout>] -H <HCA_name> -P <HCA_port> [--rate <RATE>]
+                %(prog)s [-v] [-t <timeout>] --all [-H <HCA_name>] [--rate <RATE>]
+                                [--passive [--passive-host <HOST>] [--service <NAME>]
+                                [--command-file <FILE>]]
+                %(prog)s ... [--state-file <FILE>] [--util-warning <range>]
+                                [--util-critical <range>]
+                                [--errors-warning <range>] [--errors-critical <range>]
+                                [--xmit-wait-warning <range>]
+                                [--xmit-wait-critical <range>]
+                                [--sample-duration <sec> [--sample-interval <ms>]
+                                [--flap-warning <range>] [--flap-critical <range>]]
                 """
         usage = textwrap.dedent(usage).strip()
         usage += '\n       %(prog)s --usage'
         usage += '\n       %(prog)s --help'
 
         blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
-        blurb += "Checks the state of the given Infiniband HCA port."
+        blurb += ("Checks the state of the given Infiniband HCA port " +
+                "or of all HCA ports.")
 
         super(CheckIbStatusPlugin, self).__init__(
                 shortname = 'IB_PORT',
@@ -114,6 +178,112 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
         @type: int
         """
 
+        self._all_ports = False
+        """
+        @ivar: check all ports of all HCAs (or of the given HCA)
+        @type: bool
+        """
+
+        self._passive = False
+        """
+        @ivar: output the results of the ports in discovery mode as
+               passive check results
+        @type: bool
+        """
+
+        self._passive_host = None
+        """
+        @ivar: the host name used in passive check results
+        @type: str
+        """
+
+        self._service = 'IB_PORT'
+        """
+        @ivar: the service description used in passive check results,
+               completed by the HCA name and the port number
+        @type: str
+        """
+
+        self._command_file = None
+        """
+        @ivar: the external command file of Icinga/Nagios to write the
+               passive check results to
+        @type: str or None
+        """
+
+        self._state_file = None
+        """
+        @ivar: the file to keep the snapshot of the port counters between
+               two checks
+        @type: str
+        """
+
+        self._sysfs = None
+        """
+        @ivar: the reader of the sysfs attributes below IB_BASE_DIR
+        @type: SysfsReader
+        """
+
+        self._counter_state = None
+        """
+        @ivar: the snapshots of the port counters of the previous check
+        @type: IbCounterState
+        """
+
+        self._util_threshold = None
+        """
+        @ivar: the threshold of the utilisation of the port in percent
+               of the current rate
+        @type: NagiosThreshold or None
+        """
+
+        self._error_threshold = None
+        """
+        @ivar: the threshold of the increase per hour of each error counter
+        @type: NagiosThreshold
+        """
+
+        self._xmit_wait_threshold = None
+        """
+        @ivar: the threshold of the ratio of the transmit wait ticks to the
+               transmitted data words
+        @type: NagiosThreshold or None
+        """
+
+        self._sample_duration = 0
+        """
+        @ivar: the duration of sampling the link states in seconds,
+               no sampling, if zero
+        @type: float
+        """
+
+        self._sample_interval = DEFAULT_SAMPLE_INTERVAL / 1000.0
+        """
+        @ivar: the interval between two samples of the link states in seconds
+        @type: float
+        """
+
+        self._flap_threshold = None
+        """
+        @ivar: the threshold of the link state transitions while sampling
+        @type: NagiosThreshold
+        """
+
+        self._flap_stats = None
+        """
+        @ivar: the results of sampling the link states with tuples of HCA
+               name and port number as keys
+        @type: dict of LinkFlapStats or None
+        """
+
+        self._counter_windows = {}
+        """
+        @ivar: the two snapshots of the 32 bit counters within a short window
+               (see CounterWindowSampler) with tuples of HCA name and port
+               number as keys
+        @type: dict of tuple
+        """
+
         self._add_args()
 
     #------------------------------------------------------------
@@ -134,6 +304,90 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
         """The expected transfer rate of the HCA port in Gb/sec."""
         return self._rate
 
+    #------------------------------------------------------------
+    @property
+    def all_ports(self):
+        """Check all ports of all HCAs (or of the given HCA)."""
+        return self._all_ports
+
+    #------------------------------------------------------------
+    @property
+    def passive(self):
+        """Output the results of the ports as passive check results."""
+        return self._passive
+
+    #------------------------------------------------------------
+    @property
+    def passive_host(self):
+        """The host name used in passive check results."""
+        return self._passive_host
+
+    #------------------------------------------------------------
+    @property
+    def service(self):
+        """The service description used in passive check results."""
+        return self._service
+
+    #------------------------------------------------------------
+    @property
+    def command_file(self):
+        """The external command file to write passive check results to."""
+        return self._command_file
+
+    #------------------------------------------------------------
+    @property
+    def state_file(self):
+        """The file to keep the snapshot of the port counters."""
+        return self._state_file
+
+    #------------------------------------------------------------
+    @property
+    def sysfs(self):
+        """The reader of the sysfs attributes below IB_BASE_DIR."""
+        return self._sysfs
+
+    #------------------------------------------------------------
+    @property
+    def counter_state(self):
+        """The snapshots of the port counters of the previous check."""
+        return self._counter_state
+
+    #------------------------------------------------------------
+    @property
+    def util_threshold(self):
+        """The threshold of the utilisation of the port in percent."""
+        return self._util_threshold
+
+    #------------------------------------------------------------
+    @property
+    def error_threshold(self):
+        """The threshold of the increase per hour of each error counter."""
+        return self._error_threshold
+
+    #------------------------------------------------------------
+    @property
+    def xmit_wait_threshold(self):
+        """The threshold of the ratio of transmit wait ticks to data words."""
+        return self._xmit_wait_threshold
+
+    #------------------------------------------------------------
+    @property
+    def sample_duration(self):
+        """The duration of sampling the link states in seconds."""
+        return self._sample_duration
+
+    #------------------------------------------------------------
+    @property
+    def sample_interval(self):
+        """The interval between two samples of the link states in seconds."""
+        return self._sample_interval
+
+    #------------------------------------------------------------
+    @property
+    def flap_threshold(self):
+        """The threshold of the link state transitions while sampling."""
+        return self._flap_threshold
+
     #--------------------------------------------------------------------------
     def as_dict(self):
         """
@@ -149,6 +403,32 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
         d['hca_name'] = self.hca_name
         d['hca_port'] = self.hca_port
         d['rate'] = self.rate
+        d['all_ports'] = self.all_ports
+        d['passive'] = self.passive
+        d['passive_host'] = self.passive_host
+        d['service'] = self.service
+        d['command_file'] = self.command_file
+        d['state_file'] = self.state_file
+        d['sysfs'] = None
+        if self.sysfs:
+            d['sysfs'] = self.sysfs.as_dict()
+        d['counter_state'] = None
+        if self.counter_state:
+            d['counter_state'] = self.counter_state.as_dict()
+        d['util_threshold'] = None
+        if self.util_threshold:
+            d['util_threshold'] = self.util_threshold.as_dict()
+        d['error_threshold'] = None
+        if self.error_threshold:
+            d['error_threshold'] = self.error_threshold.as_dict()
+        d['xmit_wait_threshold'] = None
+        if self.xmit_wait_threshold:
+            d['xmit_wait_threshold'] = self.xmit_wait_threshold.as_dict()
+        d['sample_duration'] = self.sample_duration
+        d['sample_interval'] = self.sample_interval
+        d['flap_threshold'] = None
+        if self.flap_threshold:
+            d['flap_threshold'] = self.flap_threshold.as_dict()
 
         return d
 
@@ -162,8 +442,8 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
                 '-H', '--hca-name',
                 metavar = 'HCA',
                 dest = 'hca_name',
-                required = True,
-                help = "The name of the HCA to check (e.g. 'mlx4_0').",
+                help = ("The name of the HCA to check (e.g. 'mlx4_0'), " +
+                        "with --all only the ports of this HCA are checked."),
         )
 
         self.add_arg(
@@ -171,7 +451,6 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
                 metavar = 'PORT',
                 dest = 'hca_port',
                 type = int,
-                required = True,
                 help = "The port number of the HCA to check (e.g. 1).",
         )
 
@@ -185,6 +464,168 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
                         "in Gb/sec (Default: %(default)d)."),
         )
 
+        self.add_arg(
+                '-a', '--all',
+                action = 'store_true',
+                dest = 'all_ports',
+                help = ("Discovery mode: checks all ports of all HCAs " +
+                        "under %r in one pass.") % (IB_BASE_DIR),
+        )
+
+        self.add_arg(
+                '--passive',
+                action = 'store_true',
+                dest = 'passive',
+                help = ("Discovery mode: output the result of every port as " +
+                        "a passive check result (PROCESS_SERVICE_CHECK_RESULT) " +
+                        "for Icinga/Nagios."),
+        )
+
+        self.add_arg(
+                '--passive-host',
+                metavar = 'HOST',
+                dest = 'passive_host',
+                help = ("The host name used in passive check results " +
+                        "(Default: the name of the local host)."),
+        )
+
+        self.add_arg(
+                '--service',
+                metavar = 'NAME',
+                dest = 'service',
+                default = self.shortname,
+                help = ("The service description used in passive check " +
+                        "results, followed by ' <HCA>:<port>' " +
+                        "(Default: %(default)r)."),
+        )
+
+        self.add_arg(
+                '--command-file',
+                metavar = 'FILE',
+                dest = 'command_file',
+                help = ("The external command file of Icinga/Nagios to write " +
+                        "the passive check results to. If not given, they are " +
+                        "written to stdout."),
+        )
+
+        self.add_arg(
+                '--state-file',
+                metavar = 'FILE',
+                dest = 'state_file',
+                help = ("The file to keep the snapshot of the port counters " +
+                        "between two checks for computing the throughput " +
+                        "(Default: %s with -H and -P, %s with --all).") % (
+                        os.path.join(STATE_DIR, 'ib-port-<HCA>-<port>.json'),
+                        os.path.join(STATE_DIR, 'ib-ports.json')),
+        )
+
+        self.add_arg(
+                '--util-warning',
+                metavar = 'RANGE',
+                dest = 'util_warning',
+                type = NagiosRange,
+                help = ("Generate a warning state, if the transmit or receive " +
+                        "throughput of a port in percent of its current rate " +
+                        "is outside this range."),
+        )
+
+        self.add_arg(
+                '--util-critical',
+                metavar = 'RANGE',
+                dest = 'util_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the transmit or " +
+                        "receive throughput of a port in percent of its " +
+                        "current rate is outside this range."),
+        )
+
+        self.add_arg(
+                '--errors-warning',
+                metavar = 'RANGE',
+                dest = 'errors_warning',
+                type = NagiosRange,
+                default = NagiosRange(DEFAULT_ERRORS_WARNING),
+                help = ("Generate a warning state, if the increase per hour " +
+                        "of an error counter of a port (%s) is outside this " +
+                        "range (Default: %s).") % (
+                        ', '.join(x[0] for x in ERROR_COUNTERS),
+                        DEFAULT_ERRORS_WARNING),
+        )
+
+        self.add_arg(
+                '--errors-critical',
+                metavar = 'RANGE',
+                dest = 'errors_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the increase per hour " +
+                        "of an error counter of a port is outside this range."),
+        )
+
+        self.add_arg(
+                '--xmit-wait-warning',
+                metavar = 'RANGE',
+                dest = 'xmit_wait_warning',
+                type = NagiosRange,
+                help = ("Generate a warning state, if the ratio of the " +
+                        "transmit wait ticks (port_xmit_wait) to the " +
+                        "transmitted data words (port_xmit_data) of a port " +
+                        "since the previous check is outside this range."),
+        )
+
+        self.add_arg(
+                '--xmit-wait-critical',
+                metavar = 'RANGE',
+                dest = 'xmit_wait_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the ratio of the " +
+                        "transmit wait ticks to the transmitted data words " +
+                        "of a port is outside this range."),
+        )
+
+        self.add_arg(
+                '--sample-duration',
+                metavar = 'SEC',
+                dest = 'sample_duration',
+                type = float,
+                default = 0,
+                help = ("Sampling mode: polls state and phys_state of the " +
+                        "ports for this many seconds before checking them, " +
+                        "to detect short link flaps. Must be lower than the " +
+                        "timeout (Default: no sampling)."),
+        )
+
+        self.add_arg(
+                '--sample-interval',
+                metavar = 'MS',
+                dest = 'sample_interval',
+                type = int,
+                default = DEFAULT_SAMPLE_INTERVAL,
+                help = ("The interval in milliseconds between two samples " +
+                        "of the link states (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+                '--flap-warning',
+                metavar = 'RANGE',
+                dest = 'flap_warning',
+                type = NagiosRange,
+                default = NagiosRange(DEFAULT_FLAP_WARNING),
+                help = ("Generate a warning state, if the number of link " +
+                        "state transitions of a port while sampling is " +
+                        "outside this range (Default: %s).") % (
+                        DEFAULT_FLAP_WARNING),
+        )
+
+        self.add_arg(
+                '--flap-critical',
+                metavar = 'RANGE',
+                dest = 'flap_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the number of link " +
+                        "state transitions of a port while sampling is " +
+                        "outside this range."),
+        )
+
     #--------------------------------------------------------------------------
     def parse_args(self, args = None):
         """
@@ -201,92 +642,142 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
         self._hca_name = self.argparser.args.hca_name
         self._hca_port = self.argparser.args.hca_port
         self._rate = self.argparser.args.rate
+        self._all_ports = bool(self.argparser.args.all_ports)
+        self._passive = bool(self.argparser.args.passive)
+        self._passive_host = self.argparser.args.passive_host
+        if not self._passive_host:
+            self._passive_host = socket.gethostname()
+        self._service = self.argparser.args.service
+        self._command_file = self.argparser.args.command_file
+
+        if self.all_ports:
+            if self.hca_port is not None:
+                self.die("The option -P is not possible with --all.")
+        else:
+            if self.hca_name is None or self.hca_port is None:
+                self.die("The options -H and -P are required without --all.")
+            if self.passive:
+                self.die("The option --passive is only possible with --all.")
+
+        self._state_file = self.argparser.args.state_file
+        if not self._state_file:
+            if self.all_ports:
+                self._state_file = os.path.join(STATE_DIR,
+                        'ib-ports.json')
+            else:
+                self._state_file = os.path.join(STATE_DIR,
+                        'ib-port-%s-%d.json' % (self.hca_name,
+                        self.hca_port))
+
+        warn = self.argparser.args.util_warning
+        crit = self.argparser.args.util_critical
+        if warn is not None or crit is not None:
+            self._util_threshold = NagiosThreshold(warning = warn,
+                    critical = crit)
+
+        self._error_threshold = NagiosThreshold(
+                warning = self.argparser.args.errors_warning,
+                critical = self.argparser.args.errors_critical)
+
+        self._sample_duration = self.argparser.args.sample_duration
+        if self.sample_duration < 0:
+            self.die("The sample duration must not be negative.")
+        if self.sample_duration >= self.argparser.args.timeout:
+            self.die("The sample duration must be lower than the timeout.")
+        if self.argparser.args.sample_interval <= 0:
+            self.die("The sample interval must be greater than zero.")
+        self._sample_interval = self.argparser.args.sample_interval / 1000.0
+
+        self._flap_threshold = NagiosThreshold(
+                warning = self.argparser.args.flap_warning,
+                critical = self.argparser.args.flap_critical)
+
+        warn = self.argparser.args.xmit_wait_warning
+        crit = self.argparser.args.xmit_wait_critical
+        if warn is not None or crit is not None:
+            self._xmit_wait_threshold = NagiosThreshold(warning = warn,
+                    critical = crit)
 
     #--------------------------------------------------------------------------
-    def __call__(self):
-        """
-        Method to call the plugin directly.
+    def check_port(self, hca_name, hca_port):
         """
+        Reads state, physical state and rate of the given HCA port from
+        sysfs and evaluates them.
 
-        self.parse_args()
-        self.init_root_logger()
+        @param hca_name: the name of the HCA (e.g. 'mlx4_0')
+        @type hca_name: str
+        @param hca_port: the port number of the HCA (e.g. 1)
+        @type hca_port: int
 
-        state = nagios.state.ok
-        out = "Infiniband port %s:%d seems to be okay." % (
-                self.hca_name, self.hca_port)
+        @return: the state, the output and the performance data as a list
+                 of dicts with the keys 'label', 'value', 'uom' and
+                 'threshold'
+        @rtype: tuple
 
-        if self.verbose > 2:
-            log.debug("Current object:\n%s", pp(self.as_dict()))
+        """
 
-        # Checking directories in sysfs ...
-        hca_dir = os.path.join(IB_BASE_DIR, self.hca_name)
+        hca_dir = hca_name
         ports_dir = os.path.join(hca_dir, 'ports')
-        port_dir = os.path.join(ports_dir, str(self.hca_port))
-
-        for sysfsdir in (IB_BASE_DIR, hca_dir, ports_dir, port_dir):
-            if self.verbose > 1:
-                log.debug("Checking directory %r ...", sysfsdir)
-            if not os.path.exists(sysfsdir):
-                msg = "Directory %r doesn't exists." % (sysfsdir)
-                self.exit(nagios.state.critical, msg)
-            if not os.path.isdir(sysfsdir):
-                msg = "%r is not a directory." % (sysfsdir)
-                self.exit(nagios.state.critical, msg)
-
-        # Checking state files
-        state_file = os.path.join(port_dir, 'state')
-        phys_state_file = os.path.join(port_dir, 'phys_state')
-        rate_file = os.path.join(port_dir, 'rate')
-
-        for sfile in (state_file, phys_state_file, rate_file):
-            if self.verbose > 1:
-                log.debug("Checking file %r ...", sfile)
-            if not os.path.exists(sfile):
-                msg = "File %r doesn't exists." % (sfile)
-                self.exit(nagios.state.critical, msg)
-            if not os.path.isfile(sfile):
-                msg = "%r is not a regular file." % (sfile)
-                self.exit(nagios.state.critical, msg)
+        port_dir = os.path.join(ports_dir, str(hca_port))
+        perfdata = []
+
+        if self.verbose > 1:
+            log.debug("Reading state files in %r ...",
+                    self.sysfs.path(port_dir))
+        try:
+            values = self.sysfs.read_many(port_dir,
+                    ('state', 'phys_state', 'rate'))
+        except SysfsError, e:
+            return (nagios.state.unknown, str(e), perfdata)
+
+        for name in ('state', 'phys_state', 'rate'):
+            if values[name] is not None:
+                continue
+            # find out, what is missing, only in this case
+            for sysfsdir in ('', hca_dir, ports_dir, port_dir):
+                if not self.sysfs.has_dir(sysfsdir):
+                    msg = "Directory %r doesn't exists." % (
+                            self.sysfs.path(sysfsdir))
+                    return (nagios.state.critical, msg, perfdata)
+            msg = "File %r doesn't exists." % (self.sysfs.path(port_dir, name))
+            return (nagios.state.critical, msg, perfdata)
 
         # getting state (e.g.: '4: ACTIVE', '1: DOWN')
-        cur_state = self.read_file(state_file).strip()
-        state_num = None
-        state_str = None
+        cur_state = values['state']
         match = re_state.search(cur_state)
         if not match:
             msg = "Could not evaluate IB port state %r from %r." % (
-                    cur_state, state_file)
-            self.die(msg)
+                    cur_state, self.sysfs.path(port_dir, 'state'))
+            return (nagios.state.unknown, msg, perfdata)
         state_num = int(match.group(1))
         state_str = match.group(2)
         log.debug("Got a state %r (%d) for infiniband port %s:%d.", state_str,
-                state_num, self.hca_name, self.hca_port)
+                state_num, hca_name, hca_port)
 
         # getting physical state (e.g.: '5: LinkUp', '2: Polling')
-        cur_phys_state = self.read_file(phys_state_file).strip()
-        phys_state_num = None
-        phys_state_str = None
+        cur_phys_state = values['phys_state']
         match = re_state.search(cur_phys_state)
         if not match:
             msg = "Could not evaluate IB port physical state %r from %r." % (
-                    cur_phys_state, phys_state_file)
-            self.die(msg)
+                    cur_phys_state, self.sysfs.path(port_dir, 'phys_state'))
+            return (nagios.state.unknown, msg, perfdata)
         phys_state_num = int(match.group(1))
         phys_state_str = match.group(2)
         log.debug("Got a physical state %r (%d) for infiniband port %s:%d.",
-                phys_state_str, phys_state_num, self.hca_name, self.hca_port)
+                phys_state_str, phys_state_num, hca_name, hca_port)
 
         # getting the current port rate (e.g. '40 Gb/sec (4X QDR)')
-        cur_rate = self.read_file(rate_file).strip()
-        rate_val = None
+        cur_rate = values['rate']
         match = re_rate.search(cur_rate)
         if not match:
             msg = "Could not evaluate IB port rate %r from %r." % (
-                    cur_rate, rate_file)
-            self.die(msg)
+                    cur_rate, self.sysfs.path(port_dir, 'rate'))
+            return (nagios.state.unknown, msg, perfdata)
         rate_val = int(match.group(1))
         log.debug("Got a data rate of %d GiB/sec [%s] for infiniband port %s:%d.",
-                rate_val, cur_rate, self.hca_name, self.hca_port)
+                rate_val, cur_rate, hca_name, hca_port)
+
+        state = nagios.state.ok
 
         if rate_val != self.rate:
             state = nagios.state.warning
@@ -297,10 +788,521 @@ class CheckIbStatusPlugin(ExtNagiosPlugin):
         if phys_state_num != IB_PORT_PHYS_STATE_LINKUP:
             state = nagios.state.critical
 
-        out = "Infiniband port %s:%d is %s (%s) - current rate %s." % (
-                self.hca_name, self.hca_port, state_str, phys_state_str,
+        prefix = ''
+        if self.all_ports:
+            prefix = '%s_%d_' % (hca_name, hca_port)
+        perfdata.append({'label': prefix + 'state', 'value': state_num,
+                'uom': None, 'threshold': None})
+        perfdata.append({'label': prefix + 'phys_state',
+                'value': phys_state_num, 'uom': None, 'threshold': None})
+        perfdata.append({'label': prefix + 'rate', 'value': rate_val,
+                'uom': None, 'threshold': None})
+
+        out = "%s (%s) - current rate %s" % (state_str, phys_state_str,
                 cur_rate)
 
+        (t_state, t_out, t_perfdata) = self.check_counters(
+                hca_name, hca_port, port_dir, rate_val, prefix)
+        state = self.max_state(state, t_state)
+        if t_out:
+            out += ", " + t_out
+        perfdata += t_perfdata
+
+        if self._flap_stats is not None:
+            (f_state, f_out, f_perfdata) = evaluate_flaps(
+                    self._flap_stats.get((hca_name, hca_port)),
+                    self.flap_threshold, prefix)
+            state = self.max_state(state, f_state)
+            if f_out:
+                out += ", " + f_out
+            perfdata += f_perfdata
+
+        return (state, out, perfdata)
+
+    #--------------------------------------------------------------------------
+    def sample_links(self, ports):
+        """
+        Sampling mode: polls state and phys_state of the given ports for
+        sample_duration seconds and saves the results in self._flap_stats.
+
+        @param ports: the HCA names and port numbers
+        @type ports: list of tuple
+
+        """
+
+        def is_up(values):
+            for (name, wanted) in (('state', IB_LINK_ACTIVE),
+                    ('phys_state', IB_PORT_PHYS_STATE_LINKUP)):
+                if values[name] is None:
+                    return False
+                match = re_state.search(values[name])
+                if not match or int(match.group(1)) != wanted:
+                    return False
+            return True
+
+        sampler = LinkFlapSampler(interval = self.sample_interval,
+                duration = self.sample_duration, verbose = self.verbose)
+        for (hca_name, hca_port) in ports:
+            port_dir = os.path.join(hca_name, 'ports', str(hca_port))
+            sampler.add_target((hca_name, hca_port), self.sysfs, port_dir,
+                    ('state', 'phys_state'), is_up)
+
+        self._flap_stats = sampler.run()
+
+    #--------------------------------------------------------------------------
+    def sample_counters(self, ports):
+        """
+        Takes two snapshots of the counters of the given ports with only
+        32 bit data and packet counters within a short window and saves
+        them in self._counter_windows. The window is shortened to the time
+        left by the timeout and the sampling of the link states.
+
+        @param ports: the HCA names and port numbers
+        @type ports: list of tuple
+
+        """
+
+        if self.counter_state is None:
+            return
+
+        sampler = CounterWindowSampler(self.sysfs, verbose = self.verbose)
+        window = None
+        for (hca_name, hca_port) in ports:
+            port_dir = os.path.join(hca_name, 'ports', str(hca_port))
+            rate = self.sysfs.read(port_dir, 'rate')
+            if rate is None:
+                continue
+            match = re_rate.search(rate)
+            if not match:
+                continue
+            if not sampler.add_port((hca_name, hca_port), port_dir):
+                continue
+            p_window = counter_window(int(match.group(1)))
+            if window is None or p_window < window:
+                window = p_window
+
+        if window is None:
+            return
+        budget = (self.argparser.args.timeout - self.sample_duration) / 2.0
+        if budget < window:
+            window = budget
+        if window < MIN_COUNTER_WINDOW:
+            log.debug("No time left to sample the 32 bit counters.")
+            return
+
+        self._counter_windows = sampler.run(window)
+
+    #--------------------------------------------------------------------------
+    def check_counters(self, hca_name, hca_port, port_dir, rate_val,
+            prefix = ''):
+        """
+        Reads the data, packet and error counters of the given HCA port,
+        evaluates them against the snapshot of the previous check and
+        stores the current snapshot.
+
+        @param rate_val: the current rate of the port in Gb/sec
+        @type rate_val: int
+        @param prefix: the prefix of the labels of the performance data
+        @type prefix: str
+
+        @return: the state, the output and the performance data
+        @rtype: tuple
+
+        """
+
+        state = nagios.state.ok
+        perfdata = []
+
+        if self.counter_state is None:
+            return (state, None, perfdata)
+
+        names = list(THROUGHPUT_COUNTERS)
+        names.append(XMIT_WAIT_COUNTER)
+        for (name, width) in ERROR_COUNTERS:
+            names.append(name)
+
+        try:
+            counters = read_port_counters(self.sysfs, port_dir, names)
+        except SysfsError, e:
+            return (nagios.state.unknown, "could not read counters: %s" % (
+                    e.strerror), perfdata)
+        if not counters:
+            return (state, None, perfdata)
+        now = monotonic()
+
+        previous = self.counter_state.get(hca_name, hca_port)
+        self.counter_state.set(hca_name, hca_port, now, counters)
+
+        msgs = []
+        deltas = None
+        if previous is None:
+            msgs.append("no previous counter snapshot")
+        else:
+            (last_time, last_counters) = previous
+            elapsed = now - last_time
+            if elapsed > 0:
+                (deltas, saturated, unknown) = counter_deltas(last_counters,
+                        counters, rate_val, elapsed)
+
+        # 32 bit data and packet counters are taken from the snapshots
+        # within a short window, they may wrap unnoticed between two checks
+        window = self._counter_windows.get((hca_name, hca_port))
+        if window is not None:
+            (t_elapsed, first, second) = window
+            (t_deltas, t_saturated, t_unknown) = counter_deltas(first, second,
+                    rate_val, t_elapsed)
+        elif deltas is not None:
+            (t_elapsed, t_deltas, t_saturated, t_unknown) = (elapsed, deltas,
+                    saturated, unknown)
+        else:
+            return (state, ', '.join(msgs), perfdata)
+
+        if t_unknown:
+            msgs.append("32 bit counters may have wrapped: %s" % (
+                    ', '.join(sorted(t_unknown))))
+
+        evaluations = [
+            (self.evaluate_throughput, t_deltas, t_saturated, t_elapsed),
+            (self.evaluate_congestion, t_deltas, t_saturated, t_elapsed),
+        ]
+        if deltas is not None:
+            evaluations.append((self.evaluate_errors, deltas, saturated,
+                    elapsed))
+        for (method, m_deltas, m_saturated, m_elapsed) in evaluations:
+            (e_state, e_out, e_perfdata) = method(m_deltas, m_saturated,
+                    m_elapsed, rate_val, prefix)
+            state = self.max_state(state, e_state)
+            if e_out:
+                msgs.append(e_out)
+            perfdata += e_perfdata
+
+        return (state, ', '.join(msgs), perfdata)
+
+    #--------------------------------------------------------------------------
+    def evaluate_throughput(self, deltas, saturated, elapsed, rate_val,
+            prefix = ''):
+        """
+        Computes the throughput and the packet rates of a HCA port from the
+        increases of the data and packet counters.
+
+        @param deltas: the increases of the counters with their names as keys
+        @type deltas: dict
+        @param saturated: the names of the saturated counters
+        @type saturated: list of str
+        @param elapsed: the seconds since the previous snapshot
+        @type elapsed: float
+        @param rate_val: the current rate of the port in Gb/sec
+        @type rate_val: int
+        @param prefix: the prefix of the labels of the performance data
+        @type prefix: str
+
+        @return: the state, the output and the performance data
+        @rtype: tuple
+
+        """
+
+        state = nagios.state.ok
+        perfdata = []
+
+        rates = {}
+        for name in THROUGHPUT_COUNTERS:
+            if name not in deltas or name in saturated:
+                continue
+            delta = deltas[name]
+            if name in DATA_COUNTERS:
+                delta *= DATA_COUNTER_SCALE
+            rates[name] = delta / elapsed
+
+        # the current rate in bytes per second
+        max_bytes = rate_val * 1000.0 ** 3 / 8
+        msgs = []
+        for (direction, data_name, pkts_name) in (
+                ('tx', 'port_xmit_data', 'port_xmit_packets'),
+                ('rx', 'port_rcv_data', 'port_rcv_packets')):
+
+            if data_name in saturated:
+                msgs.append("%s counter saturated" % (direction))
+
+            if data_name in rates:
+                value = rates[data_name]
+                perfdata.append({'label': prefix + direction,
+                        'value': int(round(value)), 'uom': 'B',
+                        'threshold': None})
+                msg = "%s %s/s" % (direction, self.human_bytes(value))
+                if max_bytes:
+                    util = 100.0 * value / max_bytes
+                    perfdata.append({'label': prefix + direction + '_util',
+                            'value': round(util, 2), 'uom': '%',
+                            'threshold': self.util_threshold})
+                    msg += " (%0.1f%%)" % (util)
+                    if self.util_threshold:
+                        u_state = self.util_threshold.get_status(util)
+                        if u_state != nagios.state.ok:
+                            state = self.max_state(state, u_state)
+                            msg += " " + STATUS_TEXT[u_state]
+                msgs.append(msg)
+
+            if pkts_name in rates:
+                perfdata.append({'label': prefix + direction + '_pkts',
+                        'value': round(rates[pkts_name], 1), 'uom': None,
+                        'threshold': None})
+
+        return (state, ', '.join(msgs), perfdata)
+
+    #--------------------------------------------------------------------------
+    def evaluate_congestion(self, deltas, saturated, elapsed, rate_val,
+            prefix = ''):
+        """
+        Computes the transmit wait ticks per second of a HCA port and their
+        ratio to the transmitted data words (both counted in the same
+        interval) as a measure of the congestion of the fabric. If nothing
+        was transmitted, the ratio is related to one data word. Without a
+        known increase of the transmitted data words (e.g. a saturated or
+        wrapped counter), only the ticks per second are given.
+
+        @return: the state, the output and the performance data
+        @rtype: tuple
+
+        """
+
+        state = nagios.state.ok
+        perfdata = []
+
+        name = XMIT_WAIT_COUNTER
+        if name not in deltas:
+            return (state, None, perfdata)
+        if name in saturated:
+            return (state, "xmit_wait counter saturated", perfdata)
+
+        wait = deltas[name]
+        perfdata.append({'label': prefix + 'xmit_wait',
+                'value': round(wait / elapsed, 1), 'uom': None,
+                'threshold': None})
+
+        if 'port_xmit_data' not in deltas or 'port_xmit_data' in saturated:
+            return (state, None, perfdata)
+
+        ratio = float(wait) / max(deltas['port_xmit_data'], 1)
+        perfdata.append({'label': prefix + 'xmit_wait_ratio',
+                'value': round(ratio, 4), 'uom': None,
+                'threshold': self.xmit_wait_threshold})
+
+        msg = None
+        if wait:
+            msg = "xmit_wait ratio %0.4f" % (ratio)
+        if self.xmit_wait_threshold:
+            w_state = self.xmit_wait_threshold.get_status(ratio)
+            if w_state != nagios.state.ok:
+                state = self.max_state(state, w_state)
+                msg = "xmit_wait ratio %0.4f %s" % (ratio, STATUS_TEXT[w_state])
+
+        return (state, msg, perfdata)
+
+    #--------------------------------------------------------------------------
+    def evaluate_errors(self, deltas, saturated, elapsed, rate_val,
+            prefix = ''):
+        """
+        Computes the increase per hour of the error counters of a HCA port
+        and evaluates them against the error thresholds. A saturated error
+        counter doesn't count anymore, so it gives a warning.
+
+        @return: the state, the output and the performance data
+        @rtype: tuple
+
+        """
+
+        state = nagios.state.ok
+        perfdata = []
+        msgs = []
+
+        for (name, width) in ERROR_COUNTERS:
+            if name in saturated:
+                state = self.max_state(state, nagios.state.warning)
+                msgs.append("%s saturated at %d, reset the counters" % (
+                        name, (1 << width) - 1))
+            if name not in deltas:
+                continue
+
+            per_hour = deltas[name] * 3600.0 / elapsed
+            perfdata.append({'label': prefix + name,
+                    'value': round(per_hour, 2), 'uom': None,
+                    'threshold': self.error_threshold})
+            if not deltas[name]:
+                continue
+
+            msg = "%s +%d (%0.1f/h)" % (name, deltas[name], per_hour)
+            e_state = self.error_threshold.get_status(per_hour)
+            if e_state != nagios.state.ok:
+                state = self.max_state(state, e_state)
+                msg += " " + STATUS_TEXT[e_state]
+            msgs.append(msg)
+
+        return (state, ', '.join(msgs), perfdata)
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def human_bytes(value):
+        """Formats a number of bytes with a binary prefix."""
+
+        for unit in ('B', 'KiB', 'MiB', 'GiB'):
+            if abs(value) < 1024:
+                break
+            value /= 1024.0
+        else:
+            unit = 'TiB'
+        return "%0.1f %s" % (value, unit)
+
+    #--------------------------------------------------------------------------
+    def format_passive_result(self, hca_name, hca_port, state, out, perfdata):
+        """
+        Formats the check result of a HCA port as an external command for
+        Icinga/Nagios (PROCESS_SERVICE_CHECK_RESULT) with a trailing line feed.
+        """
+
+        result = []
+        for pd in perfdata:
+            label = pd['label'][len('%s_%d_' % (hca_name, hca_port)):]
+            warn = ''
+            crit = ''
+            threshold = pd['threshold']
+            if threshold:
+                if threshold.warning:
+                    warn = str(threshold.warning)
+                if threshold.critical:
+                    crit = str(threshold.critical)
+            value = pd['value']
+            if isinstance(value, float):
+                value = ('%f' % (value)).rstrip('0').rstrip('.')
+            result.append("%s=%s%s;%s;%s" % (label, value, pd['uom'] or '',
+                    warn, crit))
+        if result:
+            out += ' | ' + ' '.join(result)
+
+        return "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s %s:%d;%d;%s %s - %s\n" % (
+                int(time.time()), self.passive_host, self.service, hca_name,
+                hca_port, state, self.shortname, STATUS_TEXT[state], out)
+
+    #--------------------------------------------------------------------------
+    def check_all_ports(self):
+        """
+        Discovery mode: checks all ports of all HCAs in one pass and
+        generates one output with the state of all ports, or one passive
+        check result per port.
+        """
+
+        try:
+            ports = discover_ib_ports(self.sysfs, self.hca_name)
+        except SysfsError, e:
+            self.die(str(e))
+        if not ports:
+            if self.hca_name:
+                msg = "No ports of HCA %r found in %r." % (self.hca_name,
+                        IB_BASE_DIR)
+            else:
+                msg = "No Infiniband HCA ports found in %r." % (IB_BASE_DIR)
+            self.exit(nagios.state.critical, msg)
+
+        try:
+            if self.sample_duration:
+                self.sample_links(ports)
+            self.sample_counters(ports)
+        except SysfsError, e:
+            self.die(str(e))
+
+        lines = []
+        cmd_fh = None
+        if self.passive and self.command_file:
+            try:
+                cmd_fh = open(self.command_file, 'a')
+            except IOError, e:
+                self.die("Could not open command file %r: %s" % (
+                        self.command_file, e.strerror))
+
+        state = nagios.state.ok
+        counts = {}
+        for st in (nagios.state.ok, nagios.state.warning,
+                nagios.state.critical, nagios.state.unknown):
+            counts[st] = 0
+
+        try:
+            for (hca_name, hca_port) in ports:
+                (p_state, p_out, perfdata) = self.check_port(hca_name, hca_port)
+                counts[p_state] += 1
+
+                if self.passive:
+                    line = self.format_passive_result(hca_name, hca_port,
+                            p_state, p_out, perfdata)
+                    if cmd_fh:
+                        cmd_fh.write(line)
+                    else:
+                        sys.stdout.write(line)
+                    continue
+
+                state = self.max_state(state, p_state)
+                lines.append("%s:%d %s - %s" % (hca_name, hca_port,
+                        STATUS_TEXT[p_state], p_out))
+                for pd in perfdata:
+                    self.add_perfdata(**pd)
+        finally:
+            if cmd_fh:
+                cmd_fh.close()
+            elif self.passive:
+                sys.stdout.flush()
+
+        out = "%d Infiniband ports checked: %d OK, %d WARNING, %d CRITICAL, " \
+                "%d UNKNOWN." % (len(ports), counts[nagios.state.ok],
+                counts[nagios.state.warning], counts[nagios.state.critical],
+                counts[nagios.state.unknown])
+        if lines:
+            out += "\n" + "\n".join(lines)
+
+        self.counter_state.save()
+        self.sysfs.close()
+
+        self.add_perfdata(label = 'ports', value = len(ports))
+        self.exit(state, out)
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        self._sysfs = SysfsReader(IB_BASE_DIR)
+        self._counter_state = IbCounterState(self.state_file)
+        self.counter_state.load()
+
+        if self.all_ports:
+            self.check_all_ports()
+            return
+
+        try:
+            if self.sample_duration:
+                self.sample_links([(self.hca_name, self.hca_port)])
+            self.sample_counters([(self.hca_name, self.hca_port)])
+        except SysfsError, e:
+            self.die(str(e))
+
+        (state, out, perfdata) = self.check_port(self.hca_name, self.hca_port)
+        self.counter_state.save()
+        self.sysfs.close()
+        if state == nagios.state.unknown:
+            self.die(out)
+        if not perfdata:
+            # the port could not be read at all
+            self.exit(state, out)
+        for pd in perfdata:
+            self.add_perfdata(**pd)
+
+        out = "Infiniband port %s:%d is %s." % (self.hca_name, self.hca_port,
+                out)
+
         self.exit(state, out)
 
 #==============================================================================
@@ -0,0 +1,468 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for CheckIpoibPlugin class for checking partition key,
+          mode, MTU and parent HCA port of all IPoIB interfaces
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import logging
+import textwrap
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.functions import STATUS_TEXT
+
+from nagios.plugins import ExtNagiosPlugin
+
+from nagios_plugins.check_ib_port import IB_BASE_DIR, IB_LINK_ACTIVE
+from nagios_plugins.check_ib_port import re_state
+
+from nagios_plugins.sysfs import SysfsError, SysfsReader
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_MODE = 'connected'
+NET_BASE_DIR = os.sep + os.path.join('sys', 'class', 'net')
+
+# from linux/if_arp.h
+ARPHRD_INFINIBAND = 32
+
+# The maximum MTUs of the IPoIB modes
+DEFAULT_MIN_MTU = {
+    'connected': 65520,
+    'datagram': 2044,
+}
+
+re_hca_port = re.compile(r'^([^:]+):(\d+)$')
+
+#==============================================================================
+class CheckIpoibPlugin(ExtNagiosPlugin):
+    """
+    A special NagiosPlugin class for checking the partition key, the mode
+    (datagram or connected), the MTU and the state of the parent HCA port
+    of all IPoIB interfaces in one run.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the CheckIpoibPlugin class.
+        """
+
+        usage = """\
+                %(prog)s [-v] [-i <interface> ...] [--pkey <interface>=<pkey> ...]
+                                [--hca-port <interface>=<HCA>:<port> ...]
+                                [--mode connected|datagram] [--min-mtu <MTU>]
+                """
+        usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s --usage'
+        usage += '\n       %(prog)s --help'
+
+        blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
+        blurb += ("Checks partition key, mode, MTU and parent HCA port " +
+                "of all IPoIB interfaces.")
+
+        super(CheckIpoibPlugin, self).__init__(
+                shortname = 'IPOIB',
+                usage = usage, blurb = blurb,
+                version = __version__, timeout = DEFAULT_TIMEOUT,
+        )
+
+        self._interfaces = []
+        """
+        @ivar: the IPoIB interfaces to check, all found ones, if empty
+        @type: list of str
+        """
+
+        self._pkeys = {}
+        """
+        @ivar: the expected partition keys with the interfaces as keys
+        @type: dict of int
+        """
+
+        self._hca_ports = {}
+        """
+        @ivar: the expected parent HCA ports as tuples of HCA name and
+               port number with the interfaces as keys
+        @type: dict of tuple
+        """
+
+        self._mode = DEFAULT_MODE
+        """
+        @ivar: the expected IPoIB mode ('connected' or 'datagram')
+        @type: str
+        """
+
+        self._min_mtu = DEFAULT_MIN_MTU[DEFAULT_MODE]
+        """
+        @ivar: the minimum MTU of the interfaces
+        @type: int
+        """
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def interfaces(self):
+        """The IPoIB interfaces to check, all found ones, if empty."""
+        return self._interfaces
+
+    #------------------------------------------------------------
+    @property
+    def pkeys(self):
+        """The expected partition keys with the interfaces as keys."""
+        return self._pkeys
+
+    #------------------------------------------------------------
+    @property
+    def hca_ports(self):
+        """The expected parent HCA ports with the interfaces as keys."""
+        return self._hca_ports
+
+    #------------------------------------------------------------
+    @property
+    def mode(self):
+        """The expected IPoIB mode ('connected' or 'datagram')."""
+        return self._mode
+
+    #------------------------------------------------------------
+    @property
+    def min_mtu(self):
+        """The minimum MTU of the interfaces."""
+        return self._min_mtu
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckIpoibPlugin, self).as_dict()
+
+        d['interfaces'] = self.interfaces
+        d['pkeys'] = self.pkeys
+        d['hca_ports'] = self.hca_ports
+        d['mode'] = self.mode
+        d['min_mtu'] = self.min_mtu
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.add_arg(
+                '-i', '--interface',
+                metavar = 'INTERFACE',
+                dest = 'interfaces',
+                action = 'append',
+                help = ("An IPoIB interface to check, may be given multiple " +
+                        "times (Default: all IPoIB interfaces)."),
+        )
+
+        self.add_arg(
+                '--pkey',
+                metavar = 'INTERFACE=PKEY',
+                dest = 'pkeys',
+                action = 'append',
+                help = ("The expected partition key of an interface " +
+                        "(e.g. 'ib0=0x8001'), may be given multiple times."),
+        )
+
+        self.add_arg(
+                '--hca-port',
+                metavar = 'INTERFACE=HCA:PORT',
+                dest = 'hca_ports',
+                action = 'append',
+                help = ("The expected parent HCA port of an interface " +
+                        "(e.g. 'ib0=mlx4_0:1'), may be given multiple times."),
+        )
+
+        self.add_arg(
+                '--mode',
+                metavar = 'MODE',
+                dest = 'mode',
+                choices = ('connected', 'datagram'),
+                default = DEFAULT_MODE,
+                help = ("The expected IPoIB mode of the interfaces, " +
+                        "'connected' or 'datagram' (Default: %(default)r)."),
+        )
+
+        self.add_arg(
+                '--min-mtu',
+                metavar = 'MTU',
+                dest = 'min_mtu',
+                type = int,
+                help = ("Generate a warning state, if the MTU of an " +
+                        "interface is lower (Default: %d in connected, " +
+                        "%d in datagram mode).") % (
+                        DEFAULT_MIN_MTU['connected'],
+                        DEFAULT_MIN_MTU['datagram']),
+        )
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckIpoibPlugin, self).parse_args(args)
+
+        if self.argparser.args.interfaces:
+            for iface in self.argparser.args.interfaces:
+                if iface not in self._interfaces:
+                    self._interfaces.append(iface)
+
+        for pkey_def in self.argparser.args.pkeys or []:
+            (iface, sep, pkey) = pkey_def.partition('=')
+            if not iface or not sep:
+                self.die("Invalid partition key definition %r given." % (
+                        pkey_def))
+            try:
+                self._pkeys[iface] = int(pkey, 16)
+            except ValueError:
+                self.die("Invalid partition key %r given for %r." % (
+                        pkey, iface))
+
+        for port_def in self.argparser.args.hca_ports or []:
+            (iface, sep, hca_port) = port_def.partition('=')
+            match = re_hca_port.search(hca_port)
+            if not iface or not sep or not match:
+                self.die("Invalid HCA port definition %r given." % (port_def))
+            self._hca_ports[iface] = (match.group(1), int(match.group(2)))
+
+        self._mode = self.argparser.args.mode
+        self._min_mtu = self.argparser.args.min_mtu
+        if self._min_mtu is None:
+            self._min_mtu = DEFAULT_MIN_MTU[self.mode]
+
+    #--------------------------------------------------------------------------
+    def find_interfaces(self, net):
+        """
+        Finds all IPoIB interfaces (of the type ARPHRD_INFINIBAND).
+
+        @param net: the reader of NET_BASE_DIR
+        @type net: SysfsReader
+
+        @return: the names of the interfaces, sorted
+        @rtype: list of str
+
+        """
+
+        result = []
+        for iface in net.listdir():
+            if net.read_int(iface, 'type') == ARPHRD_INFINIBAND:
+                result.append(iface)
+        return result
+
+    #--------------------------------------------------------------------------
+    def get_hca_port(self, net, iface):
+        """
+        Gets the parent HCA port of the given IPoIB interface from the
+        Infiniband device of its parent device and its dev_port (or dev_id
+        on older kernels), which is the port number minus one.
+
+        @return: the HCA name and the port number, or None
+        @rtype: tuple or None
+
+        """
+
+        hcas = net.listdir(os.path.join(iface, 'device', 'infiniband'))
+        if len(hcas) != 1:
+            return None
+
+        values = net.read_many(iface, ('dev_port', 'dev_id'))
+        for name in ('dev_port', 'dev_id'):
+            if values[name] is None:
+                continue
+            try:
+                port_idx = int(values[name], 0)
+            except ValueError:
+                continue
+            if name == 'dev_port' and not port_idx and values['dev_id']:
+                # older kernels have only dev_id set
+                continue
+            return (hcas[0], port_idx + 1)
+
+        return None
+
+    #--------------------------------------------------------------------------
+    def check_interface(self, net, ib, iface):
+        """
+        Checks partition key, mode, MTU and the parent HCA port of the
+        given IPoIB interface.
+
+        @param net: the reader of NET_BASE_DIR
+        @type net: SysfsReader
+        @param ib: the reader of IB_BASE_DIR
+        @type ib: SysfsReader
+        @param iface: the name of the interface
+        @type iface: str
+
+        @return: the state and the output
+        @rtype: tuple
+
+        """
+
+        values = net.read_many(iface, ('type', 'pkey', 'mode', 'mtu',
+                'operstate'))
+        if values['type'] is None:
+            return (nagios.state.critical, "interface doesn't exists")
+        if values['pkey'] is None:
+            return (nagios.state.unknown, "not an IPoIB interface")
+
+        state = nagios.state.ok
+        msgs = []
+
+        # partition key
+        pkey = values['pkey']
+        msg = "pkey %s" % (pkey)
+        try:
+            pkey_val = int(pkey, 16)
+        except ValueError:
+            return (nagios.state.unknown, "invalid pkey %r" % (pkey))
+        if iface in self.pkeys:
+            if pkey_val != self.pkeys[iface]:
+                state = self.max_state(state, nagios.state.critical)
+                msg += " (expected 0x%04x) CRITICAL" % (self.pkeys[iface])
+        msgs.append(msg)
+
+        # mode
+        mode = values['mode']
+        msg = "mode %s" % (mode)
+        if mode != self.mode:
+            state = self.max_state(state, nagios.state.critical)
+            msg += " (expected %s) CRITICAL" % (self.mode)
+        msgs.append(msg)
+
+        # MTU
+        mtu = None
+        if values['mtu'] is not None:
+            mtu = int(values['mtu'])
+            self.add_perfdata(label = '%s_mtu' % (iface), value = mtu)
+        msg = "MTU %s" % (mtu)
+        if mtu is not None and mtu < self.min_mtu:
+            state = self.max_state(state, nagios.state.warning)
+            msg += " (< %d) WARNING" % (self.min_mtu)
+        msgs.append(msg)
+
+        if values['operstate'] != 'up':
+            state = self.max_state(state, nagios.state.critical)
+            msgs.append("operstate %s CRITICAL" % (values['operstate']))
+
+        # parent HCA port
+        hca_port = self.get_hca_port(net, iface)
+        if hca_port is None:
+            state = self.max_state(state, nagios.state.warning)
+            msgs.append("parent HCA port not found WARNING")
+            return (state, ', '.join(msgs))
+
+        (hca_name, port) = hca_port
+        msg = "on %s:%d" % (hca_name, port)
+        if iface in self.hca_ports and self.hca_ports[iface] != hca_port:
+            state = self.max_state(state, nagios.state.critical)
+            msg += " (expected %s:%d) CRITICAL" % self.hca_ports[iface]
+
+        port_state = ib.read(os.path.join(hca_name, 'ports', str(port)),
+                'state')
+        match = None
+        if port_state is not None:
+            match = re_state.search(port_state)
+        if not match:
+            state = self.max_state(state, nagios.state.unknown)
+            msg += " (port state unknown)"
+        else:
+            msg += " (%s)" % (match.group(2))
+            if int(match.group(1)) != IB_LINK_ACTIVE:
+                state = self.max_state(state, nagios.state.critical)
+                msg += " CRITICAL"
+        msgs.append(msg)
+
+        return (state, ', '.join(msgs))
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        net = SysfsReader(NET_BASE_DIR)
+        ib = SysfsReader(IB_BASE_DIR)
+
+        state = nagios.state.ok
+        lines = []
+
+        try:
+            interfaces = self.interfaces
+            if not interfaces:
+                interfaces = self.find_interfaces(net)
+            if not interfaces:
+                self.exit(nagios.state.critical,
+                        "No IPoIB interfaces found.")
+
+            for iface in interfaces:
+                (i_state, i_out) = self.check_interface(net, ib, iface)
+                state = self.max_state(state, i_state)
+                lines.append("%s: %s" % (iface, i_out))
+        except SysfsError, e:
+            self.die(str(e))
+        finally:
+            net.close()
+            ib.close()
+
+        out = "%d IPoIB interfaces checked." % (len(interfaces))
+        if len(lines) == 1:
+            out = lines[0] + '.'
+        else:
+            out += "\n" + "\n".join(lines)
+
+        self.exit(state, out)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
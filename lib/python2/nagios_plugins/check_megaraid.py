@@ -39,6 +39,9 @@ from nagios.plugins import ExecutionTimeoutError
 from nagios.plugins import CommandNotFoundError
 from nagios.plugins import ExtNagiosPlugin
 
+from nagios_plugins.megaraid_parsers import re_exit_code, re_no_adapter
+from nagios_plugins.megaraid_parsers import parse_adapter_properties
+
 #---------------------------------------------
 # Some module variables
 
@@ -46,10 +49,6 @@ __version__ = '0.4.0'
 
 log = logging.getLogger(__name__)
 
-re_exit_code = re.compile(r'^\s*Exit\s*Code\s*:\s+0x([0-9a-f]+)', re.IGNORECASE)
-re_no_adapter = re.compile(r'^\s*User\s+specified\s+controller\s+is\s+not\s+present',
-        re.IGNORECASE)
-
 #==============================================================================
 class CheckMegaRaidPlugin(ExtNagiosPlugin):
     """
@@ -350,6 +349,27 @@ class CheckMegaRaidPlugin(ExtNagiosPlugin):
 
         return (stdoutdata, stderrdata, ret, exit_code)
 
+    #--------------------------------------------------------------------------
+    def get_adapter_properties(self):
+        """
+        Calls 'MegaCli -AdpAllInfo' once and collects all 'Key : Value' lines
+        of its output (see megaraid_parsers.parse_adapter_properties()).
+
+        @return: a tuple with the exit value extracted from output and
+                 a dict with all found adapter properties
+        @rtype: tuple
+
+        """
+
+        args = ('-AdpAllInfo',)
+        (stdoutdata, stderrdata, ret, exit_code) = self.megacli(args)
+        if self.verbose > 3:
+            log.debug("Output on StdOut:\n%s", stdoutdata)
+
+        properties = parse_adapter_properties(stdoutdata)
+
+        return (exit_code, properties)
+
 
 #==============================================================================
 
@@ -42,6 +42,8 @@ from nagios.plugins import ExtNagiosPlugin
 import nagios_plugins.check_megaraid
 from nagios_plugins.check_megaraid import CheckMegaRaidPlugin
 
+from nagios_plugins.megaraid_parsers import parse_bbu_status
+
 #---------------------------------------------
 # Some module variables
 
@@ -144,135 +146,29 @@ class CheckMegaRaidBBUPlugin(CheckMegaRaidPlugin):
         state = nagios.state.ok
         out = "BBU of MegaRaid adapter %d seems to be okay." % (self.adapter_nr)
 
-        re_batt_type = re.compile(r'^\s*BatteryType\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_batt_state = re.compile(r'^\s*Battery\s*State\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_voltage = re.compile(r'^\s*Voltage\s*:\s+(\S+)', re.IGNORECASE)
-        re_temp = re.compile(r'^\s*Temperature\s*:\s+(\S+)', re.IGNORECASE)
-        re_lc_req = re.compile(r'^\s*Learn\s+Cycle\s+Requested\s*:\s+(\S+)', re.IGNORECASE)
-        re_lc_act = re.compile(r'^\s*Learn\s+Cycle\s+Active\s*:\s+(\S+)', re.IGNORECASE)
-        re_lc_state = re.compile(r'^\s*Learn\s+Cycle\s+Status\s*:\s+(\S+)', re.IGNORECASE)
-        re_lc_tout = re.compile(r'^\s*Learn\s+Cycle\s+Timeout\s*:\s+(\S+)', re.IGNORECASE)
-        re_i2c_err = re.compile(r'^\s*I2c\s+Errors\s+Detected\s*:\s+(\S+)', re.IGNORECASE)
-        re_bbu_miss = re.compile(r'^\s*Battery\s+Pack\s+Missing\s*:\s+(\S+)', re.IGNORECASE)
-        re_bbu_replace = re.compile(r'^\s*Battery\s+Replacement\s+required\s*:\s+(\S+)', re.IGNORECASE)
-        re_capac_low = re.compile(r'^\s*Remaining\s+Capacity\s+Low\s*:\s+(\S+)', re.IGNORECASE)
-        re_per_learn = re.compile(r'^\s*Periodic\s+Learn\s+Required\s*:\s+(\S+)', re.IGNORECASE)
-        re_trans_learn = re.compile(r'^\s*Transparent\s+Learn\s*:\s+(\S+)', re.IGNORECASE)
-        re_no_space = re.compile(r'^\s*No\s+space\s+to\s+cache\s+offload\s*:\s+(\S+)', re.IGNORECASE)
-        re_pack_fail = re.compile(r'^\s*Pack\s+is\s+about\s+to\s+fail\s+.*:\s+(\S+)', re.IGNORECASE)
-        re_micro_upd = re.compile(r'^\s*Module\s+microcode\s+update\s+required\s*:\s+(\S+)', re.IGNORECASE)
-
         args = ('-AdpBbuCmd', '-GetBbuStatus')
         (stdoutdata, stderrdata, ret, exit_code) = self.megacli(args)
         if self.verbose > 2:
             log.debug("Output on StdOut:\n%s", stdoutdata)
 
-        batt_type = 'unknown'
-        batt_state = None       # optimal
-        voltage = None          # ok
-        temperature = None      # ok
-        lc_req = None           # no
-        lc_act = None           # no
-        lc_state = None         # ok
-        lc_timeout = None       # no
-        i2c_err = None          # no
-        bbu_miss = None         # no
-        bbu_replace = None      # no
-        capac_low = None        # no
-        per_learn = None        # no
-        trans_learn = None      # no
-        no_space = None         # no
-        pack_fail = None        # no
-        micro_upd = None        # no
-
-        for line in stdoutdata.splitlines():
-
-            line = line.strip()
-            
-            match = re_batt_type.search(line)
-            if match:
-                batt_type = match.group(1)
-                continue
-
-            match = re_batt_state.search(line)
-            if match:
-                batt_state = match.group(1)
-                continue
-
-            match = re_voltage.search(line)
-            if match:
-                voltage = match.group(1).lower()
-                continue
-
-            match = re_temp.search(line)
-            if match:
-                temperature = match.group(1).lower()
-                continue
-
-            match = re_lc_req.search(line)
-            if match:
-                lc_req = match.group(1).lower()
-                continue
-
-            match = re_lc_act.search(line)
-            if match:
-                lc_act = match.group(1).lower()
-                continue
-
-            match = re_lc_state.search(line)
-            if match:
-                lc_state = match.group(1).lower()
-                continue
-
-            match = re_lc_tout.search(line)
-            if match:
-                lc_timeout = match.group(1).lower()
-                continue
-
-            match = re_i2c_err.search(line)
-            if match:
-                i2c_err = match.group(1).lower()
-                continue
-
-            match = re_bbu_miss.search(line)
-            if match:
-                bbu_miss = match.group(1).lower()
-                continue
-
-            match = re_bbu_replace.search(line)
-            if match:
-                bbu_replace = match.group(1).lower()
-                continue
-
-            match = re_capac_low.search(line)
-            if match:
-                capac_low = match.group(1).lower()
-                continue
-
-            match = re_per_learn.search(line)
-            if match:
-                per_learn = match.group(1).lower()
-                continue
-
-            match = re_trans_learn.search(line)
-            if match:
-                trans_learn = match.group(1).lower()
-                continue
-
-            match = re_no_space.search(line)
-            if match:
-                no_space = match.group(1).lower()
-                continue
-
-            match = re_pack_fail.search(line)
-            if match:
-                pack_fail = match.group(1).lower()
-                continue
-
-            match = re_micro_upd.search(line)
-            if match:
-                micro_upd = match.group(1).lower()
-                continue
+        bbu = parse_bbu_status(stdoutdata)
+        batt_type = bbu['batt_type']
+        batt_state = bbu['batt_state']      # optimal
+        voltage = bbu['voltage']            # ok
+        temperature = bbu['temperature']    # ok
+        lc_req = bbu['lc_req']              # no
+        lc_act = bbu['lc_act']              # no
+        lc_state = bbu['lc_state']          # ok
+        lc_timeout = bbu['lc_timeout']      # no
+        i2c_err = bbu['i2c_err']            # no
+        bbu_miss = bbu['bbu_miss']          # no
+        bbu_replace = bbu['bbu_replace']    # no
+        capac_low = bbu['capac_low']        # no
+        per_learn = bbu['per_learn']        # no
+        trans_learn = bbu['trans_learn']    # no
+        no_space = bbu['no_space']          # no
+        pack_fail = bbu['pack_fail']        # no
+        micro_upd = bbu['micro_upd']        # no
 
         add_infos = []
         if exit_code:
@@ -42,6 +42,8 @@ from nagios.plugins import ExtNagiosPlugin
 import nagios_plugins.check_megaraid
 from nagios_plugins.check_megaraid import CheckMegaRaidPlugin
 
+from nagios_plugins.megaraid_parsers import ld_not_exists, parse_ld_info
+
 #---------------------------------------------
 # Some module variables
 
@@ -264,88 +266,34 @@ class CheckMegaRaidLdPlugin(CheckMegaRaidPlugin):
         out = "LD %d of MegaRaid adapter %d seems to be okay." % (
                 self.ld_number, self.adapter_nr)
 
-        # Adapter 0: Virtual Drive 55 Does not Exist.
-        re_not_exists = re.compile(r'^.*Virtual\s+Drive\s+\d+\s+Does\s+not\s+Exist\.',
-                re.IGNORECASE)
-        # RAID Level          : Primary-1, Secondary-0, RAID Level Qualifier-0
-        re_raid_level = re.compile(r'^\s*RAID\s+Level\s*:\s+Primary-(\d+)',
-                re.IGNORECASE)
-        # Size                : 2.728 TB
-        re_size = re.compile(r'^\s*Size\s*:\s+(\d+(?:\.\d*)?)\s*(\S+)?',
-                re.IGNORECASE)
-        # State               : Optimal
-        re_state = re.compile(r'^\s*State\s*:\s+(\S+)', re.IGNORECASE)
-        #Number Of Drives    : 2
-        re_number = re.compile(r'^\s*Number\s+Of\s+Drives\s*:\s+(\d+)',
-                re.IGNORECASE)
-        # Span Depth          : 1
-        re_span = re.compile(r'^\s*Span\s+Depth\s*:\s+(\d+)', re.IGNORECASE)
-        # Is VD Cached: Yes
-        # Is VD Cached: No
-        re_cached = re.compile(r'^\s*Is\s+VD\s+Cached\s*:\s+(\S+)',
-                re.IGNORECASE)
-        # Check Consistency: Completed 95%, Taken 8 min
-        re_consist = re.compile(r'Check\s+Consistency\s*:\s+Completed\s+(\d+)%,\s+Taken\s+(\d+)\s*min',
-                re.IGNORECASE)
-
-        raid_level = None
-        size_val = None
-        size_unit = None
-        ld_state = None
-        pd_number = None
-        span_depth = None
-        ld_cached = None
-        consist_percent = None
-        consist_min = None
-
         args = ('-LdInfo', '-L', ("%d" % (self.ld_number)))
         (stdoutdata, stderrdata, ret, exit_code) = self.megacli(args)
         if self.verbose > 2:
             log.debug("Output on StdOut:\n%s", stdoutdata)
 
-        for line in stdoutdata.splitlines():
-
-            line = line.strip()
-
-            # Logical Drive not exists
-            if re_not_exists.search(line):
-                self.die(line)
-
-            match = re_raid_level.search(line)
-            if match:
-                raid_level = int(match.group(1))
-                continue
-
-            match = re_size.search(line)
-            if match:
-                size_val = float(match.group(1))
-                size_unit = match.group(2)
-                continue
-
-            match = re_state.search(line)
-            if match:
-                ld_state = match.group(1)
-                continue
-
-            match = re_number.search(line)
-            if match:
-                pd_number = int(match.group(1))
-                continue
-
-            match = re_span.search(line)
-            if match:
-                span_depth = int(match.group(1))
-                continue
-
-            match = re_cached.search(line)
-            if match:
-                ld_cached = match.group(1)
-
-            match = re_consist.search(line)
-            if match:
-                consist_percent = int(match.group(1))
-                consist_min = int(match.group(2))
-
+        # Logical Drive not exists
+        not_exists = ld_not_exists(stdoutdata)
+        if not_exists:
+            self.die(not_exists)
+
+        ld = {}
+        lds = parse_ld_info(stdoutdata)
+        for cur_ld in lds:
+            if cur_ld['ld_number'] == self.ld_number:
+                ld = cur_ld
+                break
+        if not ld and lds:
+            ld = lds[0]
+
+        raid_level = ld.get('raid_level')
+        size_val = ld.get('size_val')
+        size_unit = ld.get('size_unit')
+        ld_state = ld.get('state')
+        pd_number = ld.get('pd_number')
+        span_depth = ld.get('span_depth')
+        ld_cached = ld.get('cached')
+        consist_percent = ld.get('consist_percent')
+        consist_min = ld.get('consist_min')
 
         if exit_code:
             state = nagios.state.critical
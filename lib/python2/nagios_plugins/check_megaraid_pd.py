@@ -44,6 +44,8 @@ from nagios.plugins import ExtNagiosPlugin
 import nagios_plugins.check_megaraid
 from nagios_plugins.check_megaraid import CheckMegaRaidPlugin
 
+from nagios_plugins.megaraid_parsers import parse_pd_list, re_pd_enc
+
 #---------------------------------------------
 # Some module variables
 
@@ -132,23 +134,6 @@ class CheckMegaRaidPdPlugin(CheckMegaRaidPlugin):
         out = "State of physical drives of MegaRaid adapter %d seems to be okay." % (
                 self.adapter_nr)
 
-        # Enclosure Device ID: 0
-        re_enc = re.compile(r'^\s*Enclosure\s+Device\s+ID\s*:\s*(\d+)', re.IGNORECASE)
-        # Slot Number: 23
-        re_slot = re.compile(r'^\s*Slot\s+Number\s*:\s*(\d+)', re.IGNORECASE)
-        # Device Id: 6
-        re_dev_id = re.compile(r'^\s*Device\s+Id\s*:\s*(\d+)', re.IGNORECASE)
-        # Media Error Count: 0
-        re_media_errors = re.compile(r'^\s*Media\s+Error\s+Count\s*:\s*(\d+)', re.IGNORECASE)
-        # Other Error Count: 0
-        re_other_errors = re.compile(r'^\s*Other\s+Error\s+Count\s*:\s*(\d+)', re.IGNORECASE)
-        # Predictive Failure Count: 0
-        re_pred_failures = re.compile(r'^\s*Predictive\s+Failure\s+Count\s*:\s*(\d+)', re.IGNORECASE)
-        # Firmware state: Online, Spun Up
-        re_fw_state = re.compile(r'^\s*Firmware\s+state\s*:\s*(\S+.*)', re.IGNORECASE)
-        # Foreign State: None
-        re_foreign_state = re.compile(r'^\s*Foreign\s+state\s*:\s*(\S+.*)', re.IGNORECASE)
-
         good_fw_states = (
             r'Online,\s+Spun\s+Up',
             r'Hotspare,\s+Spun\s+Up',
@@ -164,85 +149,21 @@ class CheckMegaRaidPdPlugin(CheckMegaRaidPlugin):
         re_good_fw_state = re.compile(good_fw_pattern, re.IGNORECASE)
         re_warn_fw_state = re.compile(warn_fw_pattern, re.IGNORECASE)
 
-        drives_total = 0
         args = ('-PdList',)
         (stdoutdata, stderrdata, ret, exit_code) = self.megacli(args)
         if self.verbose > 3:
             log.debug("Output on StdOut:\n%s", stdoutdata)
 
-        cur_dev = None
+        for cur_dev in parse_pd_list(stdoutdata):
+            pd_id = cur_dev['pd_id']
+            self.drive_list.append(pd_id)
+            self.drive[pd_id] = cur_dev
 
+        # all drive blocks, also those without a slot number
+        drives_total = 0
         for line in stdoutdata.splitlines():
-
-            line = line.strip()
-            m = re_enc.search(line)
-            if m:
-                if cur_dev:
-                    if ('enclosure' in cur_dev) and ('slot' in cur_dev):
-                        pd_id = '[%d:%d]' % (
-                                cur_dev['enclosure'], cur_dev['slot'])
-                        self.drive_list.append(pd_id)
-                        self.drive[pd_id] = cur_dev
-
-                cur_dev = {}
+            if re_pd_enc.search(line):
                 drives_total += 1
-                cur_dev = {
-                        'enclosure': int(m.group(1)),
-                        'media_errors': 0,
-                        'other_errors': 0,
-                        'predictive_failures': 0,
-                        'fw_state': None,
-                        'foreign_state': None,
-                }
-                continue
-
-            m = re_slot.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['slot'] = int(m.group(1))
-                continue
-
-            m = re_dev_id.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['dev_id'] = int(m.group(1))
-                continue
-
-            m = re_media_errors.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['media_errors'] = int(m.group(1))
-                continue
-
-            m = re_other_errors.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['other_errors'] = int(m.group(1))
-                continue
-
-            m = re_pred_failures.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['predictive_failures'] = int(m.group(1))
-                continue
-
-            m = re_fw_state.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['fw_state'] = m.group(1)
-                continue
-
-            m = re_foreign_state.search(line)
-            if m:
-                if cur_dev:
-                    cur_dev['foreign_state'] = m.group(1)
-                continue
-
-        if cur_dev:
-            if ('enclosure' in cur_dev) and ('slot' in cur_dev):
-                pd_id = '[%d:%d]' % (cur_dev['enclosure'], cur_dev['slot'])
-                self.drive_list.append(pd_id)
-                self.drive[pd_id] = cur_dev
 
         media_errors = 0
         other_errors = 0
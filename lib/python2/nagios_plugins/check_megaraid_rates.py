@@ -0,0 +1,379 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a class for a nagios/icinga plugin to audit the
+          rate settings (rebuild, patrol read, BGI, CC, reconstruction)
+          of a LSI MegaRaid adapter against an expected profile
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import logging
+import textwrap
+import ConfigParser
+
+from numbers import Number
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp, caller_search_path
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.functions import max_state
+
+from nagios.plugin.range import NagiosRange
+
+from nagios.plugin.threshold import NagiosThreshold
+
+from nagios.plugins import ExtNagiosPluginError
+from nagios.plugins import ExecutionTimeoutError
+from nagios.plugins import CommandNotFoundError
+from nagios.plugins import ExtNagiosPlugin
+
+import nagios_plugins.check_megaraid
+from nagios_plugins.check_megaraid import CheckMegaRaidPlugin
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+# The audited rates: (name in profile, property in -AdpAllInfo, description)
+RATE_PROPERTIES = (
+    ('rebuild', 'Rebuild Rate', 'rebuild rate'),
+    ('patrol_read', 'PR Rate', 'patrol read rate'),
+    ('bgi', 'BGI Rate', 'BGI rate'),
+    ('cc', 'Check Consistency Rate', 'CC rate'),
+    ('reconstruction', 'Reconstruction Rate', 'reconstruction rate'),
+)
+
+re_percent = re.compile(r'^\s*(\d+)\s*%?\s*$')
+
+# Example output (shortened)
+"""
+                Settings
+                ================
+Current Time                     : 11:54:48 11/19, 2013
+Predictive Fail Poll Interval    : 300sec
+Interrupt Throttle Active Count  : 16
+Interrupt Throttle Completion    : 50us
+Rebuild Rate                     : 30%
+PR Rate                          : 30%
+BGI Rate                         : 30%
+Check Consistency Rate           : 30%
+Reconstruction Rate              : 30%
+Cache Flush Interval             : 4s
+"""
+
+#==============================================================================
+class CheckMegaRaidRatesPlugin(CheckMegaRaidPlugin):
+    """
+    A special NagiosPlugin class for auditing the rate settings of a
+    LSI MegaRaid adapter against an expected profile.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the CheckMegaRaidRatesPlugin class.
+        """
+
+        usage = """\
+                %(prog)s [-v] [-a <adapter_nr>] [-C <profile file>]
+                            [--rebuild-rate <PERCENT>] [--pr-rate <PERCENT>]
+                            [--bgi-rate <PERCENT>] [--cc-rate <PERCENT>]
+                            [--reconstruction-rate <PERCENT>] [--critical]
+                """
+        usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s --usage'
+        usage += '\n       %(prog)s --help'
+
+        blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
+        blurb += ("Audits the rebuild, patrol read, BGI, CC and reconstruction " +
+                "rates of a LSI MegaRaid adapter against an expected profile.")
+
+        super(CheckMegaRaidRatesPlugin, self).__init__(
+                shortname = 'MEGARAID_RATES',
+                usage = usage, blurb = blurb,
+                version = __version__,
+        )
+
+        self._expected_rates = {}
+        """
+        @ivar: the expected rates in percent, the keys are the names
+               from RATE_PROPERTIES
+        @type: dict
+        """
+
+        self._expected_properties = {}
+        """
+        @ivar: further expected adapter properties from the profile file,
+               the keys are lowercased property names from -AdpAllInfo
+        @type: dict
+        """
+
+        self._profile_file = None
+        """
+        @ivar: the file with the expected profile
+        @type: str or None
+        """
+
+        self._deviation_state = nagios.state.warning
+        """
+        @ivar: the state to use on a deviation from the profile
+        @type: int
+        """
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def expected_rates(self):
+        """The expected rates in percent."""
+        return self._expected_rates
+
+    #------------------------------------------------------------
+    @property
+    def expected_properties(self):
+        """Further expected adapter properties from the profile file."""
+        return self._expected_properties
+
+    #------------------------------------------------------------
+    @property
+    def profile_file(self):
+        """The file with the expected profile."""
+        return self._profile_file
+
+    #------------------------------------------------------------
+    @property
+    def deviation_state(self):
+        """The state to use on a deviation from the profile."""
+        return self._deviation_state
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckMegaRaidRatesPlugin, self).as_dict()
+
+        d['expected_rates'] = self.expected_rates
+        d['expected_properties'] = self.expected_properties
+        d['profile_file'] = self.profile_file
+        d['deviation_state'] = self.deviation_state
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        help_c = """\
+                A file with the expected profile. It may contain a section
+                [rates] with the keys 'rebuild', 'patrol_read', 'bgi', 'cc'
+                and 'reconstruction' (in percent) and a section [properties]
+                with further properties as shown by 'MegaCli -AdpAllInfo'.
+                Rates given on the command line are overriding the rates
+                from this file.
+                """
+        help_c = textwrap.dedent(help_c).replace('\n', ' ').strip()
+        self.add_arg(
+                '-C', '--config', '--profile',
+                metavar = 'FILE',
+                dest = 'profile_file',
+                help = help_c,
+        )
+
+        for (name, prop, desc) in RATE_PROPERTIES:
+            opt = '--' + name.replace('_', '-') + '-rate'
+            if name == 'patrol_read':
+                opt = '--pr-rate'
+            self.add_arg(
+                    opt,
+                    metavar = 'PERCENT',
+                    dest = ('%s_rate' % (name)),
+                    type = int,
+                    help = "The expected %s of the adapter in percent." % (desc),
+            )
+
+        self.add_arg(
+                '--critical',
+                action = 'store_true',
+                dest = 'critical',
+                help = ("Generate a critical state instead of a warning " +
+                        "on a deviation from the profile."),
+        )
+
+        super(CheckMegaRaidRatesPlugin, self)._add_args()
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        If overridden by successors, it should be called via super().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckMegaRaidRatesPlugin, self).parse_args(args)
+
+        if self.argparser.args.profile_file:
+            self._profile_file = self.argparser.args.profile_file
+            self.read_profile(self.profile_file)
+
+        for (name, prop, desc) in RATE_PROPERTIES:
+            rate = getattr(self.argparser.args, ('%s_rate' % (name)))
+            if rate is None:
+                continue
+            if rate < 0 or rate > 100:
+                self.die("Invalid %s %d%% given." % (desc, rate))
+            self._expected_rates[name] = rate
+
+        if self.argparser.args.critical:
+            self._deviation_state = nagios.state.critical
+
+        if not self.expected_rates and not self.expected_properties:
+            self.die("No expected profile given.")
+
+    #--------------------------------------------------------------------------
+    def read_profile(self, profile_file):
+        """
+        Reads the expected rates and properties from the given profile file.
+
+        @param profile_file: the file with the expected profile
+        @type profile_file: str
+
+        """
+
+        if not os.path.isfile(profile_file):
+            self.die("Profile file %r doesn't exists." % (profile_file))
+
+        parser = ConfigParser.RawConfigParser()
+        try:
+            parser.read(profile_file)
+        except ConfigParser.Error, e:
+            self.die("Could not read profile file %r: %s" % (profile_file, e))
+
+        if parser.has_section('rates'):
+            for (name, prop, desc) in RATE_PROPERTIES:
+                if not parser.has_option('rates', name):
+                    continue
+                value = parser.get('rates', name)
+                match = re_percent.search(value)
+                if not match:
+                    self.die("Invalid %s %r in profile file %r." % (
+                            desc, value, profile_file))
+                self._expected_rates[name] = int(match.group(1))
+
+        if parser.has_section('properties'):
+            for (key, value) in parser.items('properties'):
+                key = ' '.join(key.split()).lower()
+                self._expected_properties[key] = value.strip()
+
+    #--------------------------------------------------------------------------
+    def call(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        state = nagios.state.ok
+
+        (exit_code, properties) = self.get_adapter_properties()
+        if exit_code:
+            self.die("MegaCli -AdpAllInfo exited with code %d." % (exit_code))
+
+        if self.verbose > 2:
+            log.debug("Found adapter properties:\n%s", pp(properties))
+
+        lc_properties = {}
+        for key in properties:
+            lc_properties[key.lower()] = properties[key]
+
+        deviations = []
+        checked = 0
+
+        for (name, prop, desc) in RATE_PROPERTIES:
+            if not name in self.expected_rates:
+                continue
+            expected = self.expected_rates[name]
+            checked += 1
+
+            value = lc_properties.get(prop.lower())
+            if value is None:
+                deviations.append("%s not reported" % (desc))
+                continue
+            match = re_percent.search(value)
+            if not match:
+                deviations.append("%s %r not understood" % (desc, value))
+                continue
+
+            rate = int(match.group(1))
+            self.add_perfdata(
+                    label = ('%s_rate' % (name)),
+                    value = rate,
+                    uom = '%',
+            )
+            if rate != expected:
+                deviations.append("%s %d%% (expected %d%%)" % (
+                        desc, rate, expected))
+
+        for key in sorted(self.expected_properties.keys()):
+            expected = self.expected_properties[key]
+            checked += 1
+            value = lc_properties.get(key)
+            if value is None:
+                deviations.append("%r not reported" % (key))
+                continue
+            if value.lower() != expected.lower():
+                deviations.append("%r is %r (expected %r)" % (
+                        key, value, expected))
+
+        self.add_perfdata(
+                label = 'deviations',
+                value = len(deviations),
+                uom = '',
+        )
+
+        if deviations:
+            state = self.deviation_state
+            out = "MegaRaid adapter %d deviates from profile: %s." % (
+                    self.adapter_nr, ', '.join(deviations))
+        else:
+            out = "All %d audited settings of MegaRaid adapter %d match the profile." % (
+                    checked, self.adapter_nr)
+
+        self.exit(state, out)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
@@ -0,0 +1,395 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for CheckNicLinkPlugin class for checking the link of
+          network interfaces and detecting short link flaps by sampling
+          their operational state and carrier
+"""
+
+# Standard modules
+import os
+import sys
+import logging
+import textwrap
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.range import NagiosRange
+
+from nagios.plugin.threshold import NagiosThreshold
+
+from nagios.plugins import ExtNagiosPlugin
+
+from nagios_plugins.sysfs import SysfsError, SysfsReader
+
+from nagios_plugins.link_flaps import DEFAULT_SAMPLE_INTERVAL
+from nagios_plugins.link_flaps import DEFAULT_FLAP_WARNING
+from nagios_plugins.link_flaps import LinkFlapSampler, evaluate_flaps
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5
+NET_BASE_DIR = os.sep + os.path.join('sys', 'class', 'net')
+
+# Many drivers don't report the operational state ('unknown'), then the
+# carrier decides alone, like in check-nic
+LINK_UP_OPERSTATES = ('up', 'unknown')
+
+#------------------------------------------------------------------------------
+def nic_link_up(values):
+    """
+    Decides from the values of the attributes 'operstate' and 'carrier'
+    of an interface, whether its link is up: it has a carrier and its
+    operational state is 'up' or 'unknown'. Reading the carrier of an
+    interface, which is down, gives no value (None).
+    """
+
+    return (values.get('operstate') in LINK_UP_OPERSTATES and
+            values.get('carrier') == '1')
+
+#==============================================================================
+class CheckNicLinkPlugin(ExtNagiosPlugin):
+    """
+    A special NagiosPlugin class for checking the link of network
+    interfaces, optionally sampling it for some seconds to detect short
+    link flaps, which are missed by a single check.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the CheckNicLinkPlugin class.
+        """
+
+        usage = """\
+                %(prog)s [-v] [--sample-duration <sec> [--sample-interval <ms>]
+                                [--flap-warning <range>] [--flap-critical <range>]]
+                                <interface> [<interface> ...]
+                """
+        usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s --usage'
+        usage += '\n       %(prog)s --help'
+
+        blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
+        blurb += ("Checks the link of network interfaces and detects " +
+                "short link flaps by sampling.")
+
+        super(CheckNicLinkPlugin, self).__init__(
+                shortname = 'NIC_LINK',
+                usage = usage, blurb = blurb,
+                version = __version__, timeout = DEFAULT_TIMEOUT,
+        )
+
+        self._interfaces = []
+        """
+        @ivar: the network interfaces to check
+        @type: list of str
+        """
+
+        self._sample_duration = 0
+        """
+        @ivar: the duration of sampling the links in seconds, no sampling, if 0
+        @type: float
+        """
+
+        self._sample_interval = DEFAULT_SAMPLE_INTERVAL / 1000.0
+        """
+        @ivar: the interval between two samples of the links in seconds
+        @type: float
+        """
+
+        self._flap_threshold = None
+        """
+        @ivar: the threshold object for the link state transitions
+        @type: NagiosThreshold
+        """
+
+        self._flap_stats = None
+        """
+        @ivar: the results of sampling with the interfaces as keys
+        @type: dict of LinkFlapStats
+        """
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def interfaces(self):
+        """The network interfaces to check."""
+        return self._interfaces
+
+    #------------------------------------------------------------
+    @property
+    def sample_duration(self):
+        """The duration of sampling the links in seconds, no sampling, if 0."""
+        return self._sample_duration
+
+    #------------------------------------------------------------
+    @property
+    def sample_interval(self):
+        """The interval between two samples of the links in seconds."""
+        return self._sample_interval
+
+    #------------------------------------------------------------
+    @property
+    def flap_threshold(self):
+        """The threshold object for the link state transitions."""
+        return self._flap_threshold
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckNicLinkPlugin, self).as_dict()
+
+        d['interfaces'] = self.interfaces
+        d['sample_duration'] = self.sample_duration
+        d['sample_interval'] = self.sample_interval
+        d['flap_threshold'] = None
+        if self.flap_threshold:
+            d['flap_threshold'] = self.flap_threshold.as_dict()
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.add_arg(
+                '--sample-duration',
+                metavar = 'SEC',
+                dest = 'sample_duration',
+                type = float,
+                default = 0,
+                help = ("Sampling mode: polls operstate and carrier of the " +
+                        "interfaces for this many seconds before checking " +
+                        "them, to detect short link flaps. Must be lower " +
+                        "than the timeout (Default: no sampling)."),
+        )
+
+        self.add_arg(
+                '--sample-interval',
+                metavar = 'MS',
+                dest = 'sample_interval',
+                type = int,
+                default = DEFAULT_SAMPLE_INTERVAL,
+                help = ("The interval in milliseconds between two samples " +
+                        "of the links (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+                '--flap-warning',
+                metavar = 'RANGE',
+                dest = 'flap_warning',
+                type = NagiosRange,
+                default = NagiosRange(DEFAULT_FLAP_WARNING),
+                help = ("Generate a warning state, if the number of link " +
+                        "state transitions of an interface while sampling " +
+                        "is outside this range (Default: %s).") % (
+                        DEFAULT_FLAP_WARNING),
+        )
+
+        self.add_arg(
+                '--flap-critical',
+                metavar = 'RANGE',
+                dest = 'flap_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the number of link " +
+                        "state transitions of an interface while sampling " +
+                        "is outside this range."),
+        )
+
+        self.add_arg(
+                'interfaces',
+                metavar = 'INTERFACE',
+                nargs = '+',
+                help = "The network interfaces to check.",
+        )
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckNicLinkPlugin, self).parse_args(args)
+
+        for iface in self.argparser.args.interfaces:
+            if iface not in self._interfaces:
+                self._interfaces.append(iface)
+
+        self._sample_duration = self.argparser.args.sample_duration
+        if self.sample_duration < 0:
+            self.die("The sample duration must not be negative.")
+        if self.sample_duration >= self.argparser.args.timeout:
+            self.die("The sample duration must be lower than the timeout.")
+        if self.argparser.args.sample_interval <= 0:
+            self.die("The sample interval must be greater than zero.")
+        self._sample_interval = self.argparser.args.sample_interval / 1000.0
+
+        self._flap_threshold = NagiosThreshold(
+                warning = self.argparser.args.flap_warning,
+                critical = self.argparser.args.flap_critical)
+
+    #--------------------------------------------------------------------------
+    def sample_links(self, net):
+        """
+        Sampling mode: polls operstate and carrier of all interfaces for
+        sample_duration seconds and saves the results in self._flap_stats.
+
+        @param net: the reader of NET_BASE_DIR
+        @type net: SysfsReader
+
+        """
+
+        sampler = LinkFlapSampler(interval = self.sample_interval,
+                duration = self.sample_duration, verbose = self.verbose)
+        for iface in self.interfaces:
+            if not net.has_dir(iface):
+                continue
+            sampler.add_target(iface, net, iface, ('operstate', 'carrier'),
+                    nic_link_up)
+
+        self._flap_stats = sampler.run()
+
+    #--------------------------------------------------------------------------
+    def check_interface(self, net, iface):
+        """
+        Checks the link of the given interface by the matrix of the shell
+        script check-nic:
+
+        if up + cable     if up + NO cable        if down + cable
+        =============     ==========              ==================
+        carrier 1         carrier 0               carrier: Invalid argument
+        operstate up      operstate down          operstate down
+
+        An operational state 'unknown' with a carrier is taken as up, like
+        check-nic does. Other than check-nic, any other operational state
+        than 'up' or 'unknown' (e.g. 'dormant') is critical.
+
+        @param net: the reader of NET_BASE_DIR
+        @type net: SysfsReader
+        @param iface: the name of the interface
+        @type iface: str
+
+        @return: the state and the output
+        @rtype: tuple
+
+        """
+
+        values = net.read_many(iface, ('operstate', 'carrier'))
+        operstate = values['operstate']
+        carrier = values['carrier']
+
+        if operstate is None:
+            return (nagios.state.unknown, "interface doesn't exists")
+
+        state = nagios.state.ok
+        if nic_link_up(values):
+            out = "interface up, carrier is available (cable is in)"
+            if operstate != 'up':
+                out += ", operational state: %s" % (operstate)
+        elif carrier == '0':
+            state = nagios.state.critical
+            out = "interface up, but no carrier (no cable)"
+        elif carrier == '1':
+            state = nagios.state.critical
+            out = "interface up, but operational state: %s" % (operstate)
+        elif operstate == 'up':
+            state = nagios.state.critical
+            out = "interface down - but carrier available (cable is in)"
+        else:
+            state = nagios.state.critical
+            out = "interface down and no carrier (no cable)"
+
+        if self._flap_stats is None:
+            return (state, out)
+
+        (f_state, f_out, f_perfdata) = evaluate_flaps(
+                self._flap_stats.get(iface), self.flap_threshold,
+                iface + '_')
+        state = self.max_state(state, f_state)
+        if f_out:
+            out += ", " + f_out
+        for pd in f_perfdata:
+            self.add_perfdata(**pd)
+
+        return (state, out)
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        net = SysfsReader(NET_BASE_DIR)
+
+        state = nagios.state.ok
+        lines = []
+
+        try:
+            if self.sample_duration:
+                self.sample_links(net)
+
+            for iface in self.interfaces:
+                (i_state, i_out) = self.check_interface(net, iface)
+                state = self.max_state(state, i_state)
+                lines.append("%s: %s" % (iface, i_out))
+        except SysfsError, e:
+            self.die(str(e))
+        finally:
+            net.close()
+
+        out = "%d interfaces checked." % (len(self.interfaces))
+        if len(lines) == 1:
+            out = lines[0] + '.'
+        else:
+            out += "\n" + "\n".join(lines)
+
+        self.exit(state, out)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
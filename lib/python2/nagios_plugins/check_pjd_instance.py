@@ -0,0 +1,2123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for CheckPjdInstancePlugin class, the base class of the
+          plugins checking a running instance of a ProfitBricks provisioning
+          daemon (PPD or VCB) by sending a PJD request
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import logging
+import textwrap
+import signal
+import time
+import math
+
+from numbers import Number
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp, caller_search_path
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.functions import STATUS_TEXT
+
+from nagios.plugin.range import NagiosRange
+
+from nagios.plugin.threshold import NagiosThreshold
+
+from nagios.plugins import ExtNagiosPluginError
+from nagios.plugins import ExecutionTimeoutError
+from nagios.plugins import CommandNotFoundError
+from nagios.plugins import ExtNagiosPlugin
+
+from nagios_plugins.pjd_transport import DEFAULT_BUFFER_SIZE
+from nagios_plugins.pjd_transport import DEFAULT_CONNECT_STAGGER
+from nagios_plugins.pjd_transport import DEFAULT_CONCURRENCY
+from nagios_plugins.pjd_transport import DEFAULT_MAX_REPLY_SIZE
+from nagios_plugins.pjd_transport import SocketTransportError
+from nagios_plugins.pjd_transport import SocketConnectTimeoutError
+from nagios_plugins.pjd_transport import NoListeningError
+from nagios_plugins.pjd_transport import PjdTransport
+from nagios_plugins.pjd_transport import PjdProbe
+from nagios_plugins.pjd_transport import PjdProbeLoop
+
+from nagios_plugins.pjd_resolver import DEFAULT_CACHE_FILE
+from nagios_plugins.pjd_resolver import DEFAULT_TTL, DEFAULT_NEGATIVE_TTL
+from nagios_plugins.pjd_resolver import ResolverCache
+
+from nagios_plugins.pjd_prober import DEFAULT_PROBE_INTERVAL
+from nagios_plugins.pjd_prober import DEFAULT_MAX_BACKOFF
+from nagios_plugins.pjd_prober import MAX_AGE_INTERVALS
+from nagios_plugins.pjd_prober import PjdProber
+from nagios_plugins.pjd_prober import state_key, read_prober_state
+
+from nagios_plugins.clock import monotonic
+
+from nagios_plugins.state_files import STATE_DIR
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.2.5'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_JOB_ID = 1
+DEFAULT_SAMPLES = 1
+DEFAULT_SAMPLE_INTERVAL = 200
+
+SIGNAL_NAMES = {
+    signal.SIGHUP:  'HUP',
+    signal.SIGINT:  'INT',
+    signal.SIGABRT: 'ABRT',
+    signal.SIGTERM: 'TERM',
+    signal.SIGKILL: 'KILL',
+    signal.SIGUSR1: 'USR1',
+    signal.SIGUSR2: 'USR2',
+}
+
+STATUS = {
+    'unknown':          0,
+    'progress':         3,
+    'failed':           4,
+    'succeeded':        5,
+    'in_progress_cont': 6,
+    'continuing':       10,
+}
+
+# States of a status line, which are followed by further status lines
+PROGRESS_STATES = (
+    STATUS['progress'],
+    STATUS['in_progress_cont'],
+    STATUS['continuing'],
+)
+
+# The parts of the latency breakdown of a request, with their perfdata
+# labels and their descriptions
+LATENCY_METRICS = (
+    ('dns', 'dns_time', 'DNS resolution'),
+    ('connect', 'connect_time', 'TCP connect'),
+    ('ttfb', 'ttfb', 'time to first byte'),
+    ('total', 'total_time', 'total reply'),
+)
+
+re_parse_result = re.compile(r'^([^,]+),(\d+),(\d+),(.*)$', re.DOTALL)
+
+re_version_token = re.compile(r'\d+|[a-z]+|-')
+
+re_command_element = re.compile(r'<command>[^<]*</command>', re.IGNORECASE)
+re_command_name = re.compile(r'^[\w.\-]+$')
+
+# Tags of pre-releases, sorting before the release itself
+PRE_RELEASE_TAGS = {
+    'dev': 0,
+    'a': 1,
+    'alpha': 1,
+    'b': 2,
+    'beta': 2,
+    'c': 3,
+    'pre': 3,
+    'preview': 3,
+    'rc': 3,
+}
+
+#==============================================================================
+def parse_version(version):
+    """
+    Parses a version string, as reported by PPD or VCB (e.g. '0.9.48',
+    '8.6.29', '1.2.0~rc1' or '1.2.0-2'), into a tuple, which can be compared
+    with the tuples of other version strings.
+
+    Numeric parts are compared as numbers, trailing zeros are ignored
+    ('1.2' == '1.2.0'). Pre-release tags (dev, alpha, beta, rc ...) sort
+    before the release, all other tags (e.g. post releases) after it.
+    A number after a dash is a post release like in pkg_resources, so
+    '1.2.0' < '1.2.0-2' < '1.2.0-10' < '1.2.1'.
+
+    This replaces pkg_resources.parse_version(), which is expensive to
+    import on every start of a check.
+
+    @param version: the version string to parse
+    @type version: str
+
+    @return: the comparable representation of the version
+    @rtype: tuple
+
+    """
+
+    tokens = re_version_token.findall(str(version).strip().lower())
+    if tokens and tokens[0] == 'v':
+        tokens = tokens[1:]
+
+    parts = []
+    numbers = []
+    after_dash = False
+    for token in tokens + ['']:
+        if after_dash:
+            after_dash = False
+            if token.isdigit():
+                # a post release, between the release and the next one
+                parts.append((1, int(token), 'post'))
+                continue
+        if token.isdigit():
+            numbers.append(int(token))
+            continue
+        while len(numbers) > 1 and numbers[-1] == 0:
+            numbers.pop()
+        for number in numbers:
+            parts.append((2, number, ''))
+        numbers = []
+        if token == '-':
+            # a dash before a tag is only a separator ('1.2-rc1')
+            after_dash = True
+        elif token in PRE_RELEASE_TAGS:
+            parts.append((0, PRE_RELEASE_TAGS[token], token))
+        else:
+            # other tags and the end of the version
+            parts.append((1, 0, token))
+
+    return tuple(parts)
+
+#==============================================================================
+def percentile(values, pct):
+    """
+    Gets the percentile of the given sorted values (nearest rank method),
+    which is the value with the rank ceil(pct / 100 * N).
+    """
+
+    if not values:
+        return None
+    rank = int(math.ceil(pct * len(values) / 100.0))
+    rank = min(max(rank, 1), len(values))
+    return values[rank - 1]
+
+#==============================================================================
+class RequestStatusError(NagiosPluginError):
+    pass
+
+#==============================================================================
+class RequestStatus(object):
+    """
+    A class for handling status replies from provisioning daemon.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, job_id = None, state = None,
+            error_code = None, message = None):
+        """
+        Constructor.
+
+        @param job_id: the job ID of this reply
+        @type job_id: int
+        @param state: the reply state (see VCB)
+        @type state: int
+        @param error_code: the VDC error code
+        @type error_code: int
+        @param message: the textual reply message
+        @type message: str
+
+        @return: None
+
+        """
+
+        self._job_id = job_id
+
+        self._state = state
+
+        self._error_code = error_code
+
+        self._message = message
+
+    #------------------------------------------------------------
+    @property
+    def job_id(self):
+        """The job ID of this reply."""
+        return self._job_id
+
+    #------------------------------------------------------------
+    @property
+    def state(self):
+        """The reply state (see VCB)."""
+        return self._state
+
+    #------------------------------------------------------------
+    @property
+    def error_code(self):
+        """The VDC error code (old unused trash from somewhere)."""
+        return self._error_code
+
+    #------------------------------------------------------------
+    @property
+    def message(self):
+        """The textual reply message."""
+        return self._message
+
+    #--------------------------------------------------------------------------
+    def __str__(self):
+        """
+        Typecasting function for translating object structure into a string.
+
+        @return: string as used as a reply from the provisioning daemon
+        @rtype:  str
+        """
+
+        jid = self.job_id
+        if jid is None:
+            jid = '0'
+
+        st = self.state
+        if st is None:
+            st = 0
+
+        ec = self.error_code
+        if ec is None:
+            ec = 0
+
+        msg = self.message
+        if msg is None:
+            msg = '<No message>'
+
+        s = "%s,%d,%d,%s" % (jid, st, ec, msg)
+        return s
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'error_code': self.error_code,
+            'job_id': self.job_id,
+            'message': self.message,
+            'state': self.state,
+        }
+
+        return res
+
+#==============================================================================
+class CheckPjdInstancePlugin(ExtNagiosPlugin):
+    """
+    A special NagiosPlugin class for checking a running instance of a
+    ProfitBricks provisioning daemon by sending a PJD request.
+    This is the common base class of CheckPpdInstancePlugin and
+    CheckVcbInstancePlugin.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, usage = None, shortname = None, version = None,
+            blurb = None, daemon_name = 'PJD', default_port = None,
+            default_job_id = DEFAULT_JOB_ID, xml_template = None):
+        """
+        Constructor of the CheckPjdInstancePlugin class.
+
+        @param usage: Short usage message used with --usage/-? and with missing
+                      required arguments, and included in the longer --help
+                      output. Can include %(prog)s placeholder which will be
+                      replaced with the plugin name.
+        @type usage: str
+        @param shortname: the shortname of the plugin
+        @type shortname: str
+        @param version: Plugin version number, included in the --version/-V
+                        output, and in the longer --help output.
+        @type version: str
+        @param blurb: Short plugin description, included in the longer
+                      --help output. Maybe omitted.
+        @type blurb: str or None
+        @param daemon_name: the name of the checked daemon used in messages,
+                            e.g. 'PPD'
+        @type daemon_name: str
+        @param default_port: the default TCP port of the daemon
+        @type default_port: int
+        @param default_job_id: the default Job-Id to use in PJD
+        @type default_job_id: int
+        @param xml_template: the template of the PJD request with a
+                             placeholder '%d' for the Job-Id
+        @type xml_template: str
+
+        """
+
+        used_version = __version__
+        if version:
+            used_version = str(version) + (' (%s)' % (__version__))
+
+        super(CheckPjdInstancePlugin, self).__init__(
+                usage = usage, blurb = blurb, shortname = shortname,
+                version = used_version, timeout = DEFAULT_TIMEOUT,
+        )
+
+        self._daemon_name = daemon_name
+        """
+        @ivar: the name of the checked daemon used in messages
+        @type: str
+        """
+
+        self._default_port = default_port
+        """
+        @ivar: the default TCP port of the daemon
+        @type: int
+        """
+
+        self._default_job_id = default_job_id
+        """
+        @ivar: the default Job-Id to use in PJD
+        @type: int
+        """
+
+        self._xml_template = xml_template
+        """
+        @ivar: the template of the PJD request
+        @type: str
+        """
+
+        self._host_address = None
+        """
+        @ivar: the DNS name or IP address of the host, running the daemon
+        @type: str
+        """
+
+        self._port = default_port
+        """
+        @ivar: the TCP port of the daemon on the host to check
+        @type: int
+        """
+
+        self._min_version = None
+        """
+        @ivar: the minimum version number of the running daemon
+        @type: str or None
+        """
+
+        self._job_id = default_job_id
+        """
+        @ivar: the Job-Id to use in PJD to send to the daemon
+        @type: int
+        """
+
+        self._buffer_size = DEFAULT_BUFFER_SIZE
+
+        self._max_reply_size = DEFAULT_MAX_REPLY_SIZE
+        """
+        @ivar: the maximum size of the reply of the daemon in bytes
+        @type: int
+        """
+
+        self._connect_stagger = DEFAULT_CONNECT_STAGGER
+        """
+        @ivar: the delay in seconds between the staggered connection attempts
+               to the resolved addresses of the host
+        @type: float
+        """
+
+        self._transport = None
+        """
+        @ivar: the transport object of the last request
+        @type: PjdTransport or None
+        """
+
+        self._hosts_file = None
+        """
+        @ivar: the file with the list of hosts to check in fleet mode,
+               '-' for stdin
+        @type: str or None
+        """
+
+        self._concurrency = DEFAULT_CONCURRENCY
+        """
+        @ivar: the maximum number of concurrently running probes in fleet mode
+        @type: int
+        """
+
+        self._passive = False
+        """
+        @ivar: output the results of the fleet mode as passive check results
+        @type: bool
+        """
+
+        self._service = shortname
+        """
+        @ivar: the service description used in passive check results
+        @type: str
+        """
+
+        self._command_file = None
+        """
+        @ivar: the external command file of Icinga/Nagios to write the
+               passive check results to
+        @type: str or None
+        """
+
+        self._extra_commands = []
+        """
+        @ivar: further PJD commands to send pipelined on the same connection
+               with their own Job-Ids
+        @type: list of str
+        """
+
+        self._samples = DEFAULT_SAMPLES
+        """
+        @ivar: the number of probes in one run of the plugin
+        @type: int
+        """
+
+        self._sample_interval = DEFAULT_SAMPLE_INTERVAL / 1000.0
+        """
+        @ivar: the interval between the starts of the probes in seconds
+        @type: float
+        """
+
+        self._latency_thresholds = {}
+        """
+        @ivar: the thresholds of the parts of the latency breakdown in seconds
+        @type: dict of NagiosThreshold
+        """
+
+        self._resolver_cache = None
+        """
+        @ivar: the cache of the resolved host addresses
+        @type: ResolverCache or None
+        """
+
+        self._prober = False
+        """
+        @ivar: run as a resident prober of the hosts from the hosts file
+        @type: bool
+        """
+
+        self._from_prober = False
+        """
+        @ivar: take the latest result of the prober instead of probing
+        @type: bool
+        """
+
+        self._prober_state = os.path.join(STATE_DIR, '%s-prober.json' % (
+                daemon_name.lower()))
+        """
+        @ivar: the state file of the prober with the latest results
+        @type: str
+        """
+
+        self._should_shutdown = False
+
+        self._cancel_signal = None
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def daemon_name(self):
+        """The name of the checked daemon used in messages."""
+        return self._daemon_name
+
+    #------------------------------------------------------------
+    @property
+    def xml_template(self):
+        """The template of the PJD request."""
+        return self._xml_template
+
+    #------------------------------------------------------------
+    @property
+    def host_address(self):
+        """The DNS name or IP address of the host, running the daemon."""
+        return self._host_address
+
+    #------------------------------------------------------------
+    @property
+    def port(self):
+        """The TCP port of the daemon on the host to check."""
+        return self._port
+
+    @port.setter
+    def port(self, value):
+        v = abs(int(value))
+        if v == 0:
+            raise ValueError("The port must not be zero.")
+        if v >= 2 ** 16:
+            raise ValueError("The port must not greater than %d." % (
+                    (2 ** 16 - 1)))
+        self._port = v
+
+    #------------------------------------------------------------
+    @property
+    def min_version(self):
+        """The minimum version number of the running daemon."""
+        return self._min_version
+
+    #------------------------------------------------------------
+    @property
+    def cancel_signal(self):
+        """Which signal got the process to cancel it."""
+        return self._cancel_signal
+
+    #------------------------------------------------------------
+    @property
+    def job_id(self):
+        """The Job-Id to use in PJD to send to the daemon."""
+        return self._job_id
+
+    @job_id.setter
+    def job_id(self, value):
+        v = int(value)
+        self._job_id = abs(v)
+
+    #------------------------------------------------------------
+    @property
+    def timeout(self):
+        """Seconds before plugin times out."""
+        if not hasattr(self, 'argparser'):
+            return DEFAULT_TIMEOUT
+        return self.argparser.args.timeout
+
+    #------------------------------------------------------------
+    @property
+    def buffer_size(self):
+        """The size of the buffer for the socket operation."""
+        return self._buffer_size
+
+    @buffer_size.setter
+    def buffer_size(self, value):
+        v = abs(int(value))
+        if v < 512:
+            raise ValueError("The buffer size must be greater than 512 bytes.")
+        self._buffer_size = v
+
+    #------------------------------------------------------------
+    @property
+    def max_reply_size(self):
+        """The maximum size of the reply of the daemon in bytes."""
+        return self._max_reply_size
+
+    @max_reply_size.setter
+    def max_reply_size(self, value):
+        v = abs(int(value))
+        if v < self.buffer_size:
+            raise ValueError("The maximum reply size must not be less than the buffer size.")
+        self._max_reply_size = v
+
+    #------------------------------------------------------------
+    @property
+    def connect_stagger(self):
+        """The delay in seconds between the staggered connection attempts."""
+        return self._connect_stagger
+
+    @connect_stagger.setter
+    def connect_stagger(self, value):
+        v = float(value)
+        if v < 0:
+            raise ValueError("The connection attempt delay must not be negative.")
+        self._connect_stagger = v
+
+    #------------------------------------------------------------
+    @property
+    def transport(self):
+        """The transport object of the last request."""
+        return self._transport
+
+    #------------------------------------------------------------
+    @property
+    def probe(self):
+        """The probe of the last request in single host mode."""
+        if not self.transport:
+            return None
+        return self.transport.probe
+
+    #------------------------------------------------------------
+    @property
+    def hosts_file(self):
+        """The file with the list of hosts to check in fleet mode."""
+        return self._hosts_file
+
+    #------------------------------------------------------------
+    @property
+    def fleet_mode(self):
+        """Are many hosts to check concurrently from a host list."""
+        return self._hosts_file is not None
+
+    #------------------------------------------------------------
+    @property
+    def concurrency(self):
+        """The maximum number of concurrently running probes in fleet mode."""
+        return self._concurrency
+
+    @concurrency.setter
+    def concurrency(self, value):
+        v = int(value)
+        if v < 1:
+            raise ValueError("The concurrency must be at least 1.")
+        self._concurrency = v
+
+    #------------------------------------------------------------
+    @property
+    def passive(self):
+        """Output the results of the fleet mode as passive check results."""
+        return self._passive
+
+    #------------------------------------------------------------
+    @property
+    def service(self):
+        """The service description used in passive check results."""
+        return self._service
+
+    #------------------------------------------------------------
+    @property
+    def command_file(self):
+        """The external command file to write passive check results to."""
+        return self._command_file
+
+    #------------------------------------------------------------
+    @property
+    def extra_commands(self):
+        """The further PJD commands to send on the same connection."""
+        return self._extra_commands
+
+    #------------------------------------------------------------
+    @property
+    def extra_jobs(self):
+        """The Job-Ids and the further PJD commands as a list of tuples."""
+        jobs = []
+        for command in self.extra_commands:
+            jobs.append((self.job_id + len(jobs) + 1, command))
+        return jobs
+
+    #------------------------------------------------------------
+    @property
+    def prober(self):
+        """Run as a resident prober of the hosts from the hosts file."""
+        return self._prober
+
+    #------------------------------------------------------------
+    @property
+    def from_prober(self):
+        """Take the latest result of the prober instead of probing."""
+        return self._from_prober
+
+    #------------------------------------------------------------
+    @property
+    def prober_state(self):
+        """The state file of the prober with the latest results."""
+        return self._prober_state
+
+    #------------------------------------------------------------
+    @property
+    def samples(self):
+        """The number of probes in one run of the plugin."""
+        return self._samples
+
+    #------------------------------------------------------------
+    @property
+    def sample_interval(self):
+        """The interval between the starts of the probes in seconds."""
+        return self._sample_interval
+
+    #------------------------------------------------------------
+    @property
+    def latency_thresholds(self):
+        """The thresholds of the parts of the latency breakdown."""
+        return self._latency_thresholds
+
+    #------------------------------------------------------------
+    @property
+    def resolver_cache(self):
+        """The cache of the resolved host addresses."""
+        return self._resolver_cache
+
+    #------------------------------------------------------------
+    @property
+    def should_shutdown(self):
+        """Should the current process shutdown by a signal from outside."""
+        return self._should_shutdown
+
+    @should_shutdown.setter
+    def should_shutdown(self, value):
+        self._should_shutdown = bool(value)
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckPjdInstancePlugin, self).as_dict()
+
+        d['daemon_name'] = self.daemon_name
+        d['host_address'] = self.host_address
+        d['port'] = self.port
+        d['min_version'] = self.min_version
+        d['job_id'] = self.job_id
+        d['timeout'] = self.timeout
+        d['should_shutdown'] = self.should_shutdown
+        d['buffer_size'] = self.buffer_size
+        d['max_reply_size'] = self.max_reply_size
+        d['connect_stagger'] = self.connect_stagger
+        d['cancel_signal'] = self.cancel_signal
+        d['hosts_file'] = self.hosts_file
+        d['fleet_mode'] = self.fleet_mode
+        d['concurrency'] = self.concurrency
+        d['passive'] = self.passive
+        d['service'] = self.service
+        d['command_file'] = self.command_file
+        d['extra_commands'] = self.extra_commands
+        d['samples'] = self.samples
+        d['sample_interval'] = self.sample_interval
+        d['prober'] = self.prober
+        d['from_prober'] = self.from_prober
+        d['prober_state'] = self.prober_state
+        d['latency_thresholds'] = {}
+        for (name, threshold) in self.latency_thresholds.items():
+            d['latency_thresholds'][name] = threshold.as_dict()
+        d['resolver_cache'] = None
+        if self.resolver_cache:
+            d['resolver_cache'] = self.resolver_cache.as_dict()
+        d['transport'] = None
+        if self.transport:
+            d['transport'] = self.transport.as_dict()
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.add_arg(
+                '-H', '--host-address', '--host',
+                metavar = 'ADDRESS',
+                dest = 'host_address',
+                help = ("The DNS name or IP address of the host, " +
+                        "running the %s (mandantory, if no host list " +
+                        "is given).") % (self.daemon_name),
+        )
+
+        self.add_arg(
+                '-P', '--port',
+                metavar = 'PORT',
+                dest = 'port',
+                type = int,
+                default = self._default_port,
+                help = ("The TCP port of %s on the host to check " +
+                        "(Default: %%(default)d).") % (self.daemon_name),
+        )
+
+        self.add_arg(
+                '--min-version',
+                metavar = 'VERSION',
+                dest = 'min_version',
+                help = ("The minimum version number of the running %s. " +
+                        "If given and the %s version is less then this, " +
+                        "a warning is generated.") % (
+                        self.daemon_name, self.daemon_name),
+        )
+
+        self.add_arg(
+                '-J', '--job-id',
+                metavar = 'ID',
+                dest = 'job_id',
+                type = int,
+                default = self._default_job_id,
+                help = ("The Job-Id to use in PJD to send to %s " +
+                        "(Default: %%(default)d).") % (self.daemon_name),
+        )
+
+        self.add_arg(
+                '--command',
+                metavar = 'NAME',
+                dest = 'extra_commands',
+                action = 'append',
+                default = [],
+                help = ("A further PJD command to send pipelined on the " +
+                        "same connection with the next free Job-Id, may be " +
+                        "given multiple times. Its status is added to the " +
+                        "output, a failed status results in CRITICAL. The " +
+                        "daemon must answer pipelined requests."),
+        )
+
+        self.add_arg(
+            '-b', '--buffer',
+            metavar = 'SIZE',
+            dest = 'buffer_size',
+            type = int,
+            default = DEFAULT_BUFFER_SIZE,
+            help = ("The size of the buffer for the socket operation in " +
+                    "bytes (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--max-reply-size',
+            metavar = 'BYTES',
+            dest = 'max_reply_size',
+            type = int,
+            default = DEFAULT_MAX_REPLY_SIZE,
+            help = ("The maximum size of the reply of the %s in bytes. " +
+                    "A larger reply is treated as an error " +
+                    "(Default: %%(default)d).") % (self.daemon_name),
+        )
+
+        self.add_arg(
+            '--connect-delay',
+            metavar = 'MS',
+            dest = 'connect_delay',
+            type = int,
+            default = int(DEFAULT_CONNECT_STAGGER * 1000),
+            help = ("The delay in milliseconds between the staggered " +
+                    "parallel connection attempts to all resolved addresses " +
+                    "of the host, 0 starts all attempts at once " +
+                    "(Default: %(default)d)."),
+        )
+
+        for (name, label, desc) in LATENCY_METRICS:
+
+            self.add_arg(
+                '--%s-warning' % (name),
+                metavar = 'RANGE',
+                dest = '%s_warning' % (name),
+                type = NagiosRange,
+                help = ("Generate a warning state, if the %s time in " +
+                        "seconds is outside this range.") % (desc),
+            )
+
+            self.add_arg(
+                '--%s-critical' % (name),
+                metavar = 'RANGE',
+                dest = '%s_critical' % (name),
+                type = NagiosRange,
+                help = ("Generate a critical state, if the %s time in " +
+                        "seconds is outside this range.") % (desc),
+            )
+
+        self.add_arg(
+            '--samples',
+            metavar = 'NUMBER',
+            dest = 'samples',
+            type = int,
+            default = DEFAULT_SAMPLES,
+            help = ("The number of probes in one run of the plugin. With " +
+                    "more than one probe, the min/median/p95/max reply " +
+                    "times and the failure ratio are reported and the " +
+                    "latency thresholds apply to the 95th percentile. Failed " +
+                    "probes (errors or CRITICAL replies) result in WARNING, " +
+                    "if all probes failed, in CRITICAL (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--interval',
+            metavar = 'MS',
+            dest = 'sample_interval',
+            type = int,
+            default = DEFAULT_SAMPLE_INTERVAL,
+            help = ("The interval in milliseconds between the starts of " +
+                    "the probes with --samples (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--resolver-cache',
+            metavar = 'FILE',
+            dest = 'resolver_cache',
+            default = DEFAULT_CACHE_FILE,
+            help = ("The file of the cache of resolved host addresses " +
+                    "(Default: %(default)r)."),
+        )
+
+        self.add_arg(
+            '--no-resolver-cache',
+            action = 'store_true',
+            dest = 'no_resolver_cache',
+            help = ("Don't use the resolver cache file, resolve the " +
+                    "host addresses on every run."),
+        )
+
+        self.add_arg(
+            '--dns-ttl',
+            metavar = 'SECONDS',
+            dest = 'dns_ttl',
+            type = int,
+            default = DEFAULT_TTL,
+            help = ("The time in seconds, resolved host addresses are " +
+                    "valid in the resolver cache. If resolving fails " +
+                    "afterwards, the expired addresses are used further " +
+                    "(Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--dns-negative-ttl',
+            metavar = 'SECONDS',
+            dest = 'dns_negative_ttl',
+            type = int,
+            default = DEFAULT_NEGATIVE_TTL,
+            help = ("The time in seconds, failed resolutions are " +
+                    "cached (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--hosts-file',
+            metavar = 'FILE',
+            dest = 'hosts_file',
+            help = ("Fleet mode: checks all hosts from the given file " +
+                    "('-' for stdin) concurrently in one process. Every " +
+                    "line contains a host address and optionally a TCP " +
+                    "port, separated by whitespace. Empty lines and lines " +
+                    "beginning with '#' are ignored."),
+        )
+
+        self.add_arg(
+            '--concurrency',
+            metavar = 'NUMBER',
+            dest = 'concurrency',
+            type = int,
+            default = DEFAULT_CONCURRENCY,
+            help = ("The maximum number of concurrently running probes " +
+                    "in fleet mode (Default: %(default)d)."),
+        )
+
+        self.add_arg(
+            '--passive',
+            action = 'store_true',
+            dest = 'passive',
+            help = ("Fleet mode: output the result of every host as a " +
+                    "passive check result (PROCESS_SERVICE_CHECK_RESULT) " +
+                    "for Icinga/Nagios."),
+        )
+
+        self.add_arg(
+            '--service',
+            metavar = 'NAME',
+            dest = 'service',
+            default = self.shortname,
+            help = ("The service description used in passive check " +
+                    "results, for a host with another port than the " +
+                    "default one, the port is appended as ':<port>' " +
+                    "(Default: %(default)r)."),
+        )
+
+        self.add_arg(
+            '--command-file',
+            metavar = 'FILE',
+            dest = 'command_file',
+            help = ("The external command file of Icinga/Nagios to write " +
+                    "the passive check results to. If not given, they are " +
+                    "written to stdout."),
+        )
+
+        self.add_arg(
+            '--prober',
+            action = 'store_true',
+            dest = 'prober',
+            help = ("Runs as a resident prober of all hosts from the " +
+                    "hosts file until it gets a signal. The hosts are " +
+                    "probed every --probe-interval seconds, the latest " +
+                    "results are saved to the prober state file, and with " +
+                    "--passive written as passive check results."),
+        )
+
+        self.add_arg(
+            '--probe-interval',
+            metavar = 'SECONDS',
+            dest = 'probe_interval',
+            type = float,
+            default = DEFAULT_PROBE_INTERVAL,
+            help = "The interval of the prober (Default: %(default)s).",
+        )
+
+        self.add_arg(
+            '--max-backoff',
+            metavar = 'SECONDS',
+            dest = 'max_backoff',
+            type = float,
+            default = DEFAULT_MAX_BACKOFF,
+            help = ("The maximum delay of the next connection attempt of " +
+                    "the prober after failed attempts, 1, 2, 4 ... probe " +
+                    "intervals are skipped after consecutive failed " +
+                    "attempts (Default: %(default)s)."),
+        )
+
+        self.add_arg(
+            '--no-keep-alive',
+            action = 'store_true',
+            dest = 'no_keep_alive',
+            help = ("Don't keep the connections of the prober open " +
+                    "between the probes."),
+        )
+
+        self.add_arg(
+            '--from-prober',
+            action = 'store_true',
+            dest = 'from_prober',
+            help = ("Takes the latest result of the given host from the " +
+                    "prober state file instead of probing it. A result older " +
+                    ("than %d probe intervals is UNKNOWN.") % (MAX_AGE_INTERVALS)),
+        )
+
+        self.add_arg(
+            '--prober-state',
+            metavar = 'FILE',
+            dest = 'prober_state',
+            default = self.prober_state,
+            help = "The state file of the prober (Default: %(default)r).",
+        )
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        If overridden by successors, it should be called via super().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckPjdInstancePlugin, self).parse_args(args)
+
+        self._host_address = self.argparser.args.host_address
+        if self.argparser.args.port:
+            self.port = self.argparser.args.port
+        if self.argparser.args.min_version:
+            self._min_version = self.argparser.args.min_version
+        if self.argparser.args.job_id:
+            self.job_id = self.argparser.args.job_id
+        if self.argparser.args.buffer_size is not None:
+            self.buffer_size = self.argparser.args.buffer_size
+        if self.argparser.args.max_reply_size is not None:
+            try:
+                self.max_reply_size = self.argparser.args.max_reply_size
+            except ValueError, e:
+                self.die(str(e))
+        if self.argparser.args.connect_delay is not None:
+            try:
+                self.connect_stagger = (
+                        self.argparser.args.connect_delay / 1000.0)
+            except ValueError, e:
+                self.die(str(e))
+
+        self._hosts_file = self.argparser.args.hosts_file
+        if self.argparser.args.concurrency is not None:
+            try:
+                self.concurrency = self.argparser.args.concurrency
+            except ValueError, e:
+                self.die(str(e))
+        self._passive = bool(self.argparser.args.passive)
+        if self.argparser.args.service:
+            self._service = self.argparser.args.service
+        self._command_file = self.argparser.args.command_file
+
+        for command in self.argparser.args.extra_commands:
+            if not re_command_name.search(command):
+                self.die("Invalid PJD command %r given." % (command))
+            self._extra_commands.append(command)
+
+        for (name, label, desc) in LATENCY_METRICS:
+            warn = getattr(self.argparser.args, '%s_warning' % (name))
+            crit = getattr(self.argparser.args, '%s_critical' % (name))
+            if warn is not None or crit is not None:
+                self._latency_thresholds[name] = NagiosThreshold(
+                        warning = warn, critical = crit)
+
+        self._samples = self.argparser.args.samples
+        if self.samples < 1:
+            self.die("The number of samples must be at least one.")
+        if self.argparser.args.sample_interval < 0:
+            self.die("The interval of the samples may not be negative.")
+        self._sample_interval = self.argparser.args.sample_interval / 1000.0
+
+        self._prober = bool(self.argparser.args.prober)
+        self._from_prober = bool(self.argparser.args.from_prober)
+        if self.argparser.args.prober_state:
+            self._prober_state = self.argparser.args.prober_state
+        if self.argparser.args.probe_interval <= 0:
+            self.die("The probe interval must be greater than zero.")
+
+        cache_file = None
+        if not self.argparser.args.no_resolver_cache:
+            cache_file = self.argparser.args.resolver_cache
+        self._resolver_cache = ResolverCache(
+                cache_file = cache_file,
+                ttl = self.argparser.args.dns_ttl,
+                negative_ttl = self.argparser.args.dns_negative_ttl,
+                verbose = self.verbose,
+        )
+
+        if self.fleet_mode:
+            if self.host_address:
+                self.die("The options --host-address and --hosts-file " +
+                        "may not be given together.")
+        else:
+            if not self.host_address:
+                self.die("No host address to check given.")
+            if self.passive:
+                self.die("The option --passive is only possible with --hosts-file.")
+            if self.prober:
+                self.die("The option --prober is only possible with --hosts-file.")
+        if self.from_prober and self.fleet_mode:
+            self.die("The options --from-prober and --hosts-file " +
+                    "may not be given together.")
+        if self.samples > 1 and (self.fleet_mode or self.from_prober):
+            self.die("The option --samples is only possible for a single host.")
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        signal.signal(signal.SIGHUP, self.exit_signal_handler)
+        signal.signal(signal.SIGINT, self.exit_signal_handler)
+        signal.signal(signal.SIGABRT, self.exit_signal_handler)
+        signal.signal(signal.SIGTERM, self.exit_signal_handler)
+        signal.signal(signal.SIGUSR1, self.exit_signal_handler)
+        signal.signal(signal.SIGUSR2, self.exit_signal_handler)
+
+        if self.prober:
+            self.run_prober()
+            return
+
+        if self.fleet_mode:
+            self.check_fleet()
+            return
+
+        if self.from_prober:
+            self.check_from_prober()
+            return
+
+        if self.samples > 1:
+            self.check_samples()
+            return
+
+        xml = self.get_request_xml()
+
+        result = None
+        error = None
+
+        try:
+            result = self.send(xml)
+        except Exception, e:
+            error = e
+
+        (state, out, perfdata) = self.evaluate(self.host_address, self.port,
+                result = result, error = error, probe = self.probe)
+
+        for pd in perfdata:
+            self.add_perfdata(
+                    label = pd['label'],
+                    value = pd['value'],
+                    uom = pd['uom'],
+                    threshold = pd['threshold'],
+            )
+
+        self.exit(state, out)
+
+    #--------------------------------------------------------------------------
+    def get_request_xml(self):
+        """
+        Generates the PJD request to send to the daemon.
+        """
+
+        xml = self.xml_template % (self.job_id)
+        for (job_id, command) in self.extra_jobs:
+            xml += re_command_element.sub('<command>%s</command>' % (command),
+                    self.xml_template % (job_id))
+        if self.verbose > 3:
+            log.debug("XML to send:\n%s", xml)
+        return xml
+
+    #--------------------------------------------------------------------------
+    def evaluate(self, host_address, port, result = None, error = None,
+            probe = None, check_latencies = True):
+        """
+        Evaluates the reply of the daemon or the error on requesting it.
+
+        @param host_address: the address of the checked host
+        @type host_address: str
+        @param port: the TCP port of the checked daemon
+        @type port: int
+        @param result: the cleaned up reply of the daemon
+        @type result: str or None
+        @param error: the error on requesting the daemon
+        @type error: Exception or None
+        @param probe: the probe of the request, for the connection info
+                      and the latencies
+        @type probe: PjdProbe or None
+        @param check_latencies: add the latencies of the probe to the
+                                performance data and check their thresholds
+        @type check_latencies: bool
+
+        @return: the state, the output and the performance data of the
+                 check, the latter as a list of dicts with the keys 'label',
+                 'value', 'uom' and 'threshold'
+        @rtype: tuple of int, str and list
+
+        """
+
+        state = nagios.state.ok
+        result_rcvd = False
+        perfdata = []
+
+        if error is not None:
+            state = nagios.state.critical
+            if isinstance(error, SocketTransportError):
+                result = "Error: " + str(error).strip()
+            else:
+                result = "Error %s on checking %s on %r port %d: %s" % (
+                        error.__class__.__name__, self.daemon_name,
+                        host_address, port, error)
+        else:
+            result = result.strip()
+            result_rcvd = True
+
+        blocks = None
+        if result_rcvd and self.extra_commands:
+            blocks = self.demux_reply(result)
+            result = blocks[str(self.job_id)]
+
+        if self.verbose > 1:
+            log.debug("Got result from %r:\n%s.", host_address, result)
+
+        if result_rcvd:
+            try:
+                rstatus = self.get_request_status(result)
+                if rstatus.state != STATUS['succeeded']:
+                    state = self.max_state(state, nagios.state.critical)
+                result = rstatus.message
+            except RequestStatusError, e:
+                result = "Could not understand message: %s" % (result)
+                state = self.max_state(state, nagios.state.critical)
+
+            got_version = self.parse_for_version(result)
+            (metrics_state, metrics_msgs, metrics_perfdata) = \
+                    self.evaluate_metrics(result)
+            result = self.format_message(result)
+            log.debug("Got a version of: %r", got_version)
+            if got_version is None:
+                state = self.max_state(state, nagios.state.warning)
+                result += ' - no version found.'
+            elif self.min_version is not None:
+                parsed_version_expected = parse_version(self.min_version)
+                if self.verbose > 1:
+                    log.debug("Expecting parsed version %r.", parsed_version_expected)
+                parsed_version_got = parse_version(got_version)
+                if self.verbose > 1:
+                    log.debug("Got parsed version %r.", parsed_version_got)
+                if parsed_version_got < parsed_version_expected:
+                    state = self.max_state(state, nagios.state.warning)
+                    result += ' - version is less than %r.' % (self.min_version)
+
+            state = self.max_state(state, metrics_state)
+            for msg in metrics_msgs:
+                result += ' - ' + msg
+            perfdata += metrics_perfdata
+
+            if blocks is not None:
+                (extra_state, extra_msgs) = self.evaluate_extra_jobs(blocks)
+                state = self.max_state(state, extra_state)
+                for msg in extra_msgs:
+                    result += ' - ' + msg
+
+        if probe and probe.connect_time is not None:
+            connect_ms = probe.connect_time * 1000
+            result += ' - connected via %s to %s in %0.1f ms.' % (
+                    probe.family_name, probe.connected_address, connect_ms)
+
+        if probe and check_latencies:
+            latencies = self.get_latencies(probe)
+            for (name, label, desc) in LATENCY_METRICS:
+                if latencies[name] is None:
+                    continue
+                threshold = self.latency_thresholds.get(name)
+                perfdata.append({'label': label,
+                        'value': round(latencies[name], 6), 'uom': 's',
+                        'threshold': threshold})
+                if threshold is None:
+                    continue
+                lat_state = threshold.get_status(latencies[name])
+                if lat_state != nagios.state.ok:
+                    state = self.max_state(state, lat_state)
+                    result += ' - %s time %0.3f s is %s.' % (desc,
+                            latencies[name], STATUS_TEXT[lat_state])
+
+        return (state, result, perfdata)
+
+    #--------------------------------------------------------------------------
+    def evaluate_metrics(self, msg):
+        """
+        Evaluates further metrics in the message of the reply.
+        May be overridden by inherited classes.
+
+        @param msg: the message of the final status reply
+        @type msg: str
+
+        @return: the state, additional output messages and the performance
+                 data of the metrics (see evaluate())
+        @rtype: tuple of int, list and list
+
+        """
+
+        return (nagios.state.ok, [], [])
+
+    #--------------------------------------------------------------------------
+    def evaluate_extra_jobs(self, blocks):
+        """
+        Evaluates the replies of the further PJD commands, which were sent
+        on the same connection.
+
+        @param blocks: the demultiplexed reply (see demux_reply())
+        @type blocks: dict
+
+        @return: the state and the output messages of the further commands
+        @rtype: tuple of int and list
+
+        """
+
+        state = nagios.state.ok
+        msgs = []
+
+        for (job_id, command) in self.extra_jobs:
+            block = blocks.get(str(job_id), '').strip()
+            if not block:
+                state = self.max_state(state, nagios.state.critical)
+                msgs.append("%s: no reply." % (command))
+                continue
+            try:
+                rstatus = self.get_request_status(block)
+            except RequestStatusError, e:
+                state = self.max_state(state, nagios.state.critical)
+                msgs.append("%s: could not understand reply: %s" % (
+                        command, block))
+                continue
+            if rstatus.state != STATUS['succeeded']:
+                state = self.max_state(state, nagios.state.critical)
+            msgs.append("%s: %s" % (command,
+                    self.format_message(rstatus.message)))
+
+        return (state, msgs)
+
+    #--------------------------------------------------------------------------
+    def demux_reply(self, reply):
+        """
+        Splits the reply on several pipelined PJD requests into the replies
+        of the single requests by the Job-Ids of the status lines. Lines
+        without a status (e.g. key=value lines) belong to the job of the
+        last status line, leading lines to the first job.
+
+        @param reply: the complete reply
+        @type reply: str
+
+        @return: the replies with the Job-Ids as strings as keys
+        @rtype: dict
+
+        """
+
+        lines = {}
+        lines[str(self.job_id)] = []
+        for (job_id, command) in self.extra_jobs:
+            lines[str(job_id)] = []
+
+        current = str(self.job_id)
+        for line in reply.splitlines():
+            match = re_parse_result.search(line.strip())
+            if match and match.group(1) in lines:
+                current = match.group(1)
+            lines[current].append(line)
+
+        blocks = {}
+        for job_id in lines.keys():
+            blocks[job_id] = '\n'.join(lines[job_id])
+        return blocks
+
+    #--------------------------------------------------------------------------
+    def get_final_line_checker(self):
+        """
+        Gives back the function to detect the end of the reply, which is
+        is_final_line() for a single request. With further pipelined
+        commands, the reply is complete after the final lines of all jobs.
+
+        @return: a function taking a complete line of the reply
+        @rtype: callable
+
+        """
+
+        if not self.extra_commands:
+            return self.is_final_line
+
+        pending = {}
+        pending[str(self.job_id)] = True
+        for (job_id, command) in self.extra_jobs:
+            pending[str(job_id)] = True
+        current = [str(self.job_id)]
+
+        def is_final_line(line):
+            match = re_parse_result.search(line.strip())
+            if match and match.group(1) in pending:
+                current[0] = match.group(1)
+            if self.is_final_line(line) and current[0] in pending:
+                del pending[current[0]]
+            return not pending
+
+        return is_final_line
+
+    #--------------------------------------------------------------------------
+    def get_latencies(self, probe):
+        """
+        Gets the latency breakdown of the given request in seconds.
+
+        The DNS resolution time is taken from the resolver cache, if the
+        host was resolved there (zero, if it was cached), because the
+        probe only gets the addresses from the cache. A reused connection
+        has neither a DNS nor a connect time.
+
+        @param probe: the probe of the request
+        @type probe: PjdProbe
+
+        @return: the durations of the parts of the request with the names
+                 from LATENCY_METRICS as keys, None, if the part was
+                 not reached
+        @rtype: dict
+
+        """
+
+        dns_time = None
+        if self.resolver_cache and not probe.reused:
+            dns_time = self.resolver_cache.resolve_time(
+                    probe.host_address, probe.port)
+        if dns_time is None:
+            dns_time = probe.dns_time
+
+        total_time = probe.duration
+        if total_time is not None and dns_time is not None:
+            if probe.dns_time is not None:
+                total_time -= probe.dns_time
+            total_time += dns_time
+
+        return {
+            'dns': dns_time,
+            'connect': probe.connect_time,
+            'ttfb': probe.ttfb,
+            'total': total_time,
+        }
+
+    #--------------------------------------------------------------------------
+    def format_perfdata(self, perfdata):
+        """
+        Formats the given performance data (see evaluate()) for a passive
+        check result.
+        """
+
+        result = []
+        for pd in perfdata:
+            warn = ''
+            crit = ''
+            threshold = pd['threshold']
+            if threshold:
+                if threshold.warning:
+                    warn = str(threshold.warning)
+                if threshold.critical:
+                    crit = str(threshold.critical)
+            value = pd['value']
+            if isinstance(value, float):
+                value = ('%f' % (value)).rstrip('0').rstrip('.')
+            result.append("%s=%s%s;%s;%s" % (pd['label'], value,
+                    pd['uom'] or '', warn, crit))
+        return ' '.join(result)
+
+    #--------------------------------------------------------------------------
+    def passive_service(self, port = None):
+        """
+        The service description of a passive check result. The port is
+        appended, if it differs from the default one, so the results of
+        several daemons on the same host don't overwrite each other.
+        """
+
+        if port is None or port == self.port:
+            return self.service
+        return "%s:%d" % (self.service, port)
+
+    #--------------------------------------------------------------------------
+    def format_passive_result(self, host_address, state, out, perfdata,
+            timestamp = None, port = None):
+        """
+        Formats a check result as an external command for Icinga/Nagios
+        (PROCESS_SERVICE_CHECK_RESULT) with a trailing line feed.
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+        out = out.replace('\n', ' ')
+        perfdata = self.format_perfdata(perfdata)
+        if perfdata:
+            out += ' | ' + perfdata
+        return "[%d] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%d;%s %s - %s\n" % (
+                int(timestamp), host_address, self.passive_service(port), state,
+                self.shortname, STATUS_TEXT[state], out)
+
+    #--------------------------------------------------------------------------
+    def read_hosts_file(self):
+        """
+        Reads the list of hosts to check in fleet mode from the hosts file.
+
+        @return: the hosts and ports to check
+        @rtype: list of tuple
+
+        """
+
+        if self.hosts_file == '-':
+            fh = sys.stdin
+        else:
+            try:
+                fh = open(self.hosts_file, 'r')
+            except IOError, e:
+                self.die("Could not open hosts file %r: %s" % (
+                        self.hosts_file, e.strerror))
+
+        targets = []
+        try:
+            lineno = 0
+            for line in fh:
+                lineno += 1
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split()
+                port = self.port
+                if len(fields) > 1:
+                    try:
+                        port = int(fields[1])
+                    except ValueError:
+                        self.die("Invalid port %r in line %d of %r." % (
+                                fields[1], lineno, self.hosts_file))
+                    if port <= 0 or port >= 2 ** 16:
+                        self.die("Invalid port %d in line %d of %r." % (
+                                port, lineno, self.hosts_file))
+                targets.append((fields[0], port))
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+        return targets
+
+    #--------------------------------------------------------------------------
+    def check_fleet(self):
+        """
+        Checks all hosts from the hosts file concurrently and generates one
+        result line per host, or one passive check result per host.
+        """
+
+        targets = self.read_hosts_file()
+        if not targets:
+            self.die("No hosts to check found in %r." % (self.hosts_file))
+
+        xml = self.get_request_xml()
+
+        begin = monotonic()
+        self.resolver_cache.resolve_many(targets, timeout = self.timeout)
+        self.resolver_cache.save()
+
+        probes = []
+        for (host_address, port) in targets:
+            probe = PjdProbe(
+                    host_address, port, xml, timeout = self.timeout,
+                    buffer_size = self.buffer_size,
+                    daemon_name = self.daemon_name,
+                    connect_stagger = self.connect_stagger,
+                    is_final_line = self.get_final_line_checker(),
+                    max_reply_size = self.max_reply_size,
+                    resolver = self.resolver_cache.get,
+                    verbose = self.verbose,
+            )
+            probes.append(probe)
+
+        counts = {}
+        for st in (nagios.state.ok, nagios.state.warning,
+                nagios.state.critical, nagios.state.unknown):
+            counts[st] = 0
+        lines = []
+
+        cmd_fh = None
+        if self.passive and self.command_file:
+            try:
+                cmd_fh = open(self.command_file, 'a')
+            except IOError, e:
+                self.die("Could not open command file %r: %s" % (
+                        self.command_file, e.strerror))
+
+        def finished(probe):
+            result = None
+            if probe.error is None:
+                result = self.finish_reply(probe.reply)
+            (state, out, perfdata) = self.evaluate(probe.host_address, probe.port,
+                    result = result, error = probe.error, probe = probe)
+            counts[state] = counts.get(state, 0) + 1
+
+            if self.passive:
+                line = self.format_passive_result(probe.host_address,
+                        state, out, perfdata, port = probe.port)
+                if cmd_fh:
+                    cmd_fh.write(line)
+                    cmd_fh.flush()
+                else:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+            else:
+                lines.append("%s port %d: %s - %s" % (probe.host_address,
+                        probe.port, STATUS_TEXT[state], out))
+
+        loop = PjdProbeLoop(concurrency = self.concurrency,
+                should_shutdown = lambda: self.should_shutdown,
+                verbose = self.verbose)
+        try:
+            loop.run(probes, callback = finished)
+        finally:
+            if cmd_fh:
+                cmd_fh.close()
+        duration = monotonic() - begin
+
+        state = nagios.state.ok
+        if not self.passive:
+            for st in counts.keys():
+                if counts[st]:
+                    state = self.max_state(state, st)
+        if self.should_shutdown:
+            state = self.max_state(state, nagios.state.unknown)
+
+        out = "%d %s instances checked in %0.3f seconds: %d OK, %d WARNING, " \
+                "%d CRITICAL, %d UNKNOWN." % (
+                len(probes), self.daemon_name, duration,
+                counts[nagios.state.ok], counts[nagios.state.warning],
+                counts[nagios.state.critical], counts[nagios.state.unknown])
+        if self.cancel_signal:
+            out += " Canceled by signal %s." % (self.cancel_signal)
+        if lines:
+            out += "\n" + "\n".join(lines)
+
+        self.add_perfdata(label = 'hosts', value = len(probes))
+        self.add_perfdata(label = 'ok', value = counts[nagios.state.ok])
+        self.add_perfdata(label = 'warning', value = counts[nagios.state.warning])
+        self.add_perfdata(label = 'critical', value = counts[nagios.state.critical])
+        self.add_perfdata(label = 'unknown', value = counts[nagios.state.unknown])
+        self.add_perfdata(label = 'duration', value = round(duration, 3),
+                uom = 's')
+
+        self.exit(state, out)
+
+    #--------------------------------------------------------------------------
+    def run_prober(self):
+        """
+        Runs as a resident prober of all hosts from the hosts file until
+        it gets a signal (see PjdProber).
+        """
+
+        targets = self.read_hosts_file()
+        if not targets:
+            self.die("No hosts to probe found in %r." % (self.hosts_file))
+
+        cmd_fh = None
+        writer = None
+        if self.passive:
+            if self.command_file:
+                try:
+                    cmd_fh = open(self.command_file, 'a')
+                except IOError, e:
+                    self.die("Could not open command file %r: %s" % (
+                            self.command_file, e.strerror))
+                out_fh = cmd_fh
+            else:
+                out_fh = sys.stdout
+
+            def writer(line):
+                out_fh.write(line)
+                out_fh.flush()
+
+        prober = PjdProber(self, targets,
+                interval = self.argparser.args.probe_interval,
+                state_file = self.prober_state,
+                max_backoff = self.argparser.args.max_backoff,
+                keep_alive = not self.argparser.args.no_keep_alive,
+                writer = writer, verbose = self.verbose)
+        try:
+            prober.run()
+        finally:
+            if cmd_fh:
+                cmd_fh.close()
+
+        if self.verbose > 2:
+            log.debug("Prober:\n%s", pp(prober.as_dict()))
+
+        out = "%s prober of %d instances stopped after %d rounds." % (
+                self.daemon_name, len(targets), prober.rounds)
+        if self.cancel_signal:
+            out += " Canceled by signal %s." % (self.cancel_signal)
+        self.exit(nagios.state.ok, out)
+
+    #--------------------------------------------------------------------------
+    def check_samples(self):
+        """
+        Probes the host several times in one run and checks the percentiles
+        of the latencies instead of a single observation.
+        """
+
+        xml = self.get_request_xml()
+
+        begin = monotonic()
+        deadline = begin + self.timeout
+        states = []
+        outs = []
+        failed = 0
+        last_failure = None
+        latencies = {}
+        for (name, label, desc) in LATENCY_METRICS:
+            latencies[name] = []
+
+        for i in range(self.samples):
+            if self.should_shutdown:
+                break
+            if i:
+                wait = begin + i * self.sample_interval - monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                log.debug("Timeout reached after %d samples.", i)
+                break
+
+            result = None
+            error = None
+            try:
+                result = self.send(xml, timeout = remaining)
+            except Exception, e:
+                error = e
+
+            (state, out, perfdata) = self.evaluate(self.host_address,
+                    self.port, result = result, error = error,
+                    probe = self.probe, check_latencies = False)
+            if error is not None or state == nagios.state.critical:
+                failed += 1
+                last_failure = out
+            else:
+                states.append(state)
+                outs.append(out)
+            if error is None:
+                sample_latencies = self.get_latencies(self.probe)
+                for (name, label, desc) in LATENCY_METRICS:
+                    if sample_latencies[name] is not None:
+                        latencies[name].append(sample_latencies[name])
+            # the following samples take the address from the cache
+            self.resolver_cache.resolve_times.clear()
+            if self.verbose > 1:
+                log.debug("Sample %d: %s - %s", i + 1, STATUS_TEXT[state], out)
+
+        count = failed + len(states)
+        if not count:
+            self.die("No probe done.")
+
+        if not states:
+            state = nagios.state.critical
+            out = "All %d probes failed, last: %s" % (count, last_failure)
+        else:
+            # the output of the first probe with the worst state
+            state = nagios.state.ok
+            out = outs[0]
+            for (st, o) in zip(states, outs):
+                if self.max_state(state, st) != state:
+                    state = st
+                    out = o
+            if failed:
+                state = self.max_state(state, nagios.state.warning)
+                out += ' - %d of %d probes failed, last: %s' % (failed, count,
+                        last_failure)
+
+
+        for (name, label, desc) in LATENCY_METRICS:
+            values = sorted(latencies[name])
+            if not values:
+                continue
+            p95 = percentile(values, 95)
+            threshold = self.latency_thresholds.get(name)
+            if name == 'total':
+                out += ' - reply time min/median/p95/max: ' \
+                        '%0.1f/%0.1f/%0.1f/%0.1f ms.' % (values[0] * 1000,
+                        percentile(values, 50) * 1000, p95 * 1000,
+                        values[-1] * 1000)
+                self.add_perfdata(label = 'reply_min',
+                        value = round(values[0], 6), uom = 's')
+                self.add_perfdata(label = 'reply_median',
+                        value = round(percentile(values, 50), 6), uom = 's')
+                self.add_perfdata(label = 'reply_p95',
+                        value = round(p95, 6), uom = 's', threshold = threshold)
+                self.add_perfdata(label = 'reply_max',
+                        value = round(values[-1], 6), uom = 's')
+            else:
+                self.add_perfdata(label = '%s_p95' % (label),
+                        value = round(p95, 6), uom = 's', threshold = threshold)
+            if threshold is None:
+                continue
+            lat_state = threshold.get_status(p95)
+            if lat_state != nagios.state.ok:
+                state = self.max_state(state, lat_state)
+                out += ' - 95th percentile of the %s time %0.3f s is %s.' % (
+                        desc, p95, STATUS_TEXT[lat_state])
+
+        self.add_perfdata(label = 'samples', value = count)
+        self.add_perfdata(label = 'failure_ratio',
+                value = round(100.0 * failed / count, 1), uom = '%')
+
+        if self.cancel_signal:
+            out += " Canceled by signal %s." % (self.cancel_signal)
+        self.exit(state, out)
+
+    #--------------------------------------------------------------------------
+    def check_from_prober(self):
+        """
+        Takes the latest result of the host from the state file of the
+        prober instead of probing it.
+        """
+
+        try:
+            prober_state = read_prober_state(self.prober_state)
+        except (IOError, ValueError), e:
+            self.die("Could not read prober state file %r: %s" % (
+                    self.prober_state, e))
+
+        entry = prober_state['results'].get(state_key(self.host_address,
+                self.port))
+        if not entry:
+            self.die("No result of the prober for %r port %d found." % (
+                    self.host_address, self.port))
+
+        age = time.time() - entry['time']
+        max_age = MAX_AGE_INTERVALS * prober_state['interval'] + self.timeout
+        if age > max_age:
+            self.exit(nagios.state.unknown,
+                    "The latest result of the prober for %r port %d is %d seconds old." % (
+                    self.host_address, self.port, int(age)))
+
+        for pd in entry['perfdata']:
+            threshold = None
+            if pd['warning'] or pd['critical']:
+                threshold = NagiosThreshold(warning = pd['warning'],
+                        critical = pd['critical'])
+            self.add_perfdata(
+                    label = pd['label'],
+                    value = pd['value'],
+                    uom = pd['uom'],
+                    threshold = threshold,
+            )
+
+        self.exit(entry['state'], entry['output'])
+
+    #--------------------------------------------------------------------------
+    def parse_for_version(self, msg):
+        """
+        Parses in the given message for a version string.
+        Must be overridden by inherited classes.
+        """
+
+        self.die("The method parse_for_version() must be overridden in inherited class %r." % (
+                self.__class__.__name__))
+
+    #--------------------------------------------------------------------------
+    def format_message(self, msg):
+        """
+        Formats the message of the reply for the plugin output.
+        May be overridden by inherited classes.
+        """
+
+        return msg
+
+    #--------------------------------------------------------------------------
+    def is_final_line(self, line):
+        """
+        Checks, whether the given line of the reply is the last one, so the
+        reading can be stopped before the remote closes the connection.
+        It is called for every complete line as soon as it was received.
+
+        The default is a complete 'job,state,err,msg' status line with a
+        final state (not a progress state).
+        May be overridden by inherited classes.
+
+        @param line: a complete line of the reply without the line feed
+        @type line: str
+
+        @return: the line is the last line of the reply
+        @rtype: bool
+
+        """
+
+        match = re_parse_result.search(line.strip())
+        if not match:
+            return False
+        return int(match.group(2)) not in PROGRESS_STATES
+
+    #--------------------------------------------------------------------------
+    def finish_reply(self, reply):
+        """
+        Cleans up the complete received reply before parsing it.
+        May be overridden by inherited classes.
+        """
+
+        return reply
+
+    #--------------------------------------------------------------------------
+    def get_request_status(self, result):
+        """
+        Gets the final request status from the received reply by skipping
+        all leading progress status lines.
+        May be overridden by inherited classes.
+
+        @raise RequestStatusError: if not successful.
+
+        @return: the final request status
+        @rtype: RequestStatus
+
+        """
+
+        rstatus = self.parse_result(result)
+        while rstatus.state in PROGRESS_STATES:
+            lines = result.splitlines()
+            line_removed = lines.pop(0)
+            log.debug("Removed first line %r", line_removed)
+            result = '\n'.join(lines)
+            rstatus = self.parse_result(result)
+
+        return rstatus
+
+    #--------------------------------------------------------------------------
+    def exit_signal_handler(self, signum, frame):
+        """
+        Handler as a callback function for getting a signal from somewhere.
+
+        @param signum: the gotten signal number
+        @type signum: int
+        @param frame: the current stack frame
+        @type frame: None or a frame object
+
+        """
+
+        signame = "%d"  % (signum)
+        if signum in SIGNAL_NAMES:
+            signame = SIGNAL_NAMES[signum]
+
+        log.debug("Got a signal %r.", signame)
+
+        if (signum == signal.SIGUSR1) or (signum == signal.SIGUSR2):
+            log.debug("Nothing to do on signal USR1 or USR2.")
+            return
+
+        log.info("Canceled.")
+        self._cancel_signal = signame
+
+        self.should_shutdown = True
+
+    #--------------------------------------------------------------------------
+    def send(self, message, timeout = None):
+        """
+        Sends the message over network socket to the recipient.
+        It waits for all replies and gives them back all.
+
+        @raise NoListeningError: if the daemon isn't listening on the given port
+        @raise SocketTransportError: on some communication errors or timeouts
+
+        @param message: the message to send over the network
+        @type message: str
+        @param timeout: the timeout in seconds, if not the timeout
+                        of the plugin
+        @type timeout: float or None
+
+        @return: response from server
+        @rtype: str
+
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+
+        begin = monotonic()
+        self.resolver_cache.resolve_many([(self.host_address, self.port)],
+                timeout = timeout)
+        self.resolver_cache.save()
+        timeout = max(timeout - (monotonic() - begin), 0.1)
+
+        transport = PjdTransport(
+                self.host_address, self.port, timeout = timeout,
+                buffer_size = self.buffer_size, daemon_name = self.daemon_name,
+                connect_stagger = self.connect_stagger,
+                max_reply_size = self.max_reply_size,
+                resolver = self.resolver_cache.get, verbose = self.verbose,
+        )
+        self._transport = transport
+
+        reply = transport.send(message,
+                is_final_line = self.get_final_line_checker(),
+                should_shutdown = lambda: self.should_shutdown)
+
+        return self.finish_reply(reply)
+
+    #--------------------------------------------------------------------------
+    def parse_result(self, message):
+        """
+        Parses the given string to get an instance of a RequestStatus object.
+
+        @raise RequestStatusError: if not successful.
+
+        @param message: the message to parse into a RequestStatus object.
+        @type message: str
+
+
+        """
+
+        if message is None:
+            raise RequestStatusError("Cannot parse a None object.")
+
+        message = str(message).strip()
+
+        match = re_parse_result.search(message)
+        if not match:
+            msg = (("Parsing error. Message %r doesn't match " +
+                    "a status reply message.") % (message))
+            raise RequestStatusError(msg)
+
+        request_status = RequestStatus(
+            job_id = str(match.group(1)).strip(),
+            state = int(match.group(2)),
+            error_code = int(match.group(3)),
+            message = match.group(4),
+        )
+
+        return request_status
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
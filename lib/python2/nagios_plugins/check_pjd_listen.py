@@ -0,0 +1,378 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for CheckPjdListenPlugin class for checking the accept
+          queues and the connections of the local PPD and VCB ports
+"""
+
+# Standard modules
+import os
+import sys
+import logging
+import textwrap
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.functions import STATUS_TEXT
+
+from nagios.plugin.range import NagiosRange
+
+from nagios.plugin.threshold import NagiosThreshold
+
+from nagios.plugins import ExtNagiosPlugin
+
+from nagios_plugins.check_ppd_instance import DEFAULT_PPD_PORT
+from nagios_plugins.check_vcb_instance import DEFAULT_VCB_PORT
+
+from nagios_plugins.sock_diag import SockDiagError
+from nagios_plugins.sock_diag import port_socket_stats
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.2.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_PORTS = (DEFAULT_PPD_PORT, DEFAULT_VCB_PORT)
+
+# Thresholds of the fill level of the accept queue in percent of the backlog
+DEFAULT_QUEUE_WARNING = '50'
+DEFAULT_QUEUE_CRITICAL = '90'
+
+#==============================================================================
+class CheckPjdListenPlugin(ExtNagiosPlugin):
+    """
+    A special NagiosPlugin class for checking the accept queues of the
+    listening sockets, the half open (SYN_RECV) and the established
+    connections of the local PPD and VCB ports.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the CheckPjdListenPlugin class.
+        """
+
+        usage = """\
+                %(prog)s [-v] [-P <port> ...] [--queue-warning <range>]
+                                    [--queue-critical <range>]
+                                    [--queue-length-warning <range>]
+                                    [--queue-length-critical <range>] [--no-netlink]
+                """
+        usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s --usage'
+        usage += '\n       %(prog)s --help'
+
+        blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
+        blurb += ("Checks the accept queues and the connections of the " +
+                "local PPD and VCB ports.")
+
+        super(CheckPjdListenPlugin, self).__init__(
+                shortname = 'PJD_LISTEN',
+                usage = usage, blurb = blurb,
+                version = __version__, timeout = DEFAULT_TIMEOUT,
+        )
+
+        self._ports = list(DEFAULT_PORTS)
+        """
+        @ivar: the local TCP ports to check
+        @type: list of int
+        """
+
+        self._thresholds = {}
+        """
+        @ivar: the thresholds of the fill level of the accept queue in
+               percent ('queue'), of its length ('queue_length') and of
+               the numbers of the half open ('syn_recv') and the
+               established connections ('established')
+        @type: dict of NagiosThreshold
+        """
+
+        self._use_netlink = True
+        """
+        @ivar: read the sockets through sock_diag netlink, before falling
+               back to /proc/net/tcp
+        @type: bool
+        """
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def ports(self):
+        """The local TCP ports to check."""
+        return self._ports
+
+    #------------------------------------------------------------
+    @property
+    def thresholds(self):
+        """The thresholds of the accept queue and the connections."""
+        return self._thresholds
+
+    #------------------------------------------------------------
+    @property
+    def use_netlink(self):
+        """Read the sockets through sock_diag netlink."""
+        return self._use_netlink
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckPjdListenPlugin, self).as_dict()
+
+        d['ports'] = self.ports
+        d['use_netlink'] = self.use_netlink
+        d['thresholds'] = {}
+        for (name, threshold) in self.thresholds.items():
+            d['thresholds'][name] = threshold.as_dict()
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.add_arg(
+                '-P', '--port',
+                metavar = 'PORT',
+                dest = 'ports',
+                type = int,
+                action = 'append',
+                help = ("A local TCP port to check, may be given multiple " +
+                        "times (Default: %s).") % (
+                        ', '.join(str(x) for x in DEFAULT_PORTS)),
+        )
+
+        self.add_arg(
+                '--queue-warning',
+                metavar = 'RANGE',
+                dest = 'queue_warning',
+                type = NagiosRange,
+                default = NagiosRange(DEFAULT_QUEUE_WARNING),
+                help = ("Generate a warning state, if the fill level of " +
+                        "the accept queue in percent of the backlog is " +
+                        "outside this range (Default: %s).") % (
+                        DEFAULT_QUEUE_WARNING),
+        )
+
+        self.add_arg(
+                '--queue-critical',
+                metavar = 'RANGE',
+                dest = 'queue_critical',
+                type = NagiosRange,
+                default = NagiosRange(DEFAULT_QUEUE_CRITICAL),
+                help = ("Generate a critical state, if the fill level of " +
+                        "the accept queue in percent of the backlog is " +
+                        "outside this range (Default: %s).") % (
+                        DEFAULT_QUEUE_CRITICAL),
+        )
+
+        self.add_arg(
+                '--queue-length-warning',
+                metavar = 'RANGE',
+                dest = 'queue_length_warning',
+                type = NagiosRange,
+                help = ("Generate a warning state, if the number of " +
+                        "connections in the accept queue of a port is " +
+                        "outside this range."),
+        )
+
+        self.add_arg(
+                '--queue-length-critical',
+                metavar = 'RANGE',
+                dest = 'queue_length_critical',
+                type = NagiosRange,
+                help = ("Generate a critical state, if the number of " +
+                        "connections in the accept queue of a port is " +
+                        "outside this range."),
+        )
+
+        for (name, desc) in (('syn-recv', 'half open (SYN_RECV)'),
+                ('established', 'established')):
+
+            self.add_arg(
+                    '--%s-warning' % (name),
+                    metavar = 'RANGE',
+                    dest = '%s_warning' % (name.replace('-', '_')),
+                    type = NagiosRange,
+                    help = ("Generate a warning state, if the number of %s " +
+                            "connections of a port is outside this range.") % (
+                            desc),
+            )
+
+            self.add_arg(
+                    '--%s-critical' % (name),
+                    metavar = 'RANGE',
+                    dest = '%s_critical' % (name.replace('-', '_')),
+                    type = NagiosRange,
+                    help = ("Generate a critical state, if the number of %s " +
+                            "connections of a port is outside this range.") % (
+                            desc),
+            )
+
+        self.add_arg(
+                '--no-netlink',
+                action = 'store_true',
+                dest = 'no_netlink',
+                help = ("Read the sockets from /proc/net/tcp{,6} instead of " +
+                        "through sock_diag netlink. There the backlog is not " +
+                        "available, so the fill level of the accept queue " +
+                        "can't be checked, use --queue-length-warning and " +
+                        "--queue-length-critical instead."),
+        )
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckPjdListenPlugin, self).parse_args(args)
+
+        if self.argparser.args.ports:
+            self._ports = []
+            for port in self.argparser.args.ports:
+                if port <= 0 or port >= 2 ** 16:
+                    self.die("Invalid port %d given." % (port))
+                if port not in self._ports:
+                    self._ports.append(port)
+
+        self._thresholds['queue'] = NagiosThreshold(
+                warning = self.argparser.args.queue_warning,
+                critical = self.argparser.args.queue_critical)
+
+        for name in ('queue_length', 'syn_recv', 'established'):
+            warn = getattr(self.argparser.args, '%s_warning' % (name))
+            crit = getattr(self.argparser.args, '%s_critical' % (name))
+            if warn is not None or crit is not None:
+                self._thresholds[name] = NagiosThreshold(
+                        warning = warn, critical = crit)
+
+        self._use_netlink = not self.argparser.args.no_netlink
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        try:
+            (stats, source) = port_socket_stats(self.ports,
+                    use_netlink = self.use_netlink)
+        except SockDiagError, e:
+            self.die(str(e))
+
+        if self.verbose > 1:
+            log.debug("Got socket states through %s.", source)
+
+        state = nagios.state.ok
+        msgs = []
+
+        for port in self.ports:
+            st = stats[port]
+            if self.verbose > 2:
+                log.debug("State of port %d:\n%s", port, pp(st.as_dict()))
+
+            if not st.listeners:
+                state = self.max_state(state, nagios.state.critical)
+                msgs.append("port %d: nothing listening" % (port))
+                continue
+
+            # the backlog is only available through netlink, an estimate
+            # from net.core.somaxconn would be much too high, as the
+            # backlog is min(listen() backlog, somaxconn)
+            backlog = st.backlog
+            length_threshold = self.thresholds.get('queue_length')
+
+            msg = "port %d: accept queue %d" % (port, st.queue)
+            if backlog:
+                fill = 100.0 * st.queue / backlog
+                msg += "/%d (%0.1f%%)" % (backlog, fill)
+                threshold = self.thresholds['queue']
+                q_state = threshold.get_status(fill)
+                if q_state != nagios.state.ok:
+                    state = self.max_state(state, q_state)
+                    msg += " %s" % (STATUS_TEXT[q_state])
+                self.add_perfdata(label = 'queue_pct_%d' % (port),
+                        value = round(fill, 1), uom = '%',
+                        threshold = threshold)
+                self.add_perfdata(label = 'backlog_%d' % (port),
+                        value = backlog)
+            elif length_threshold is None:
+                state = self.max_state(state, nagios.state.unknown)
+                msg += " (backlog unknown, fill level not checked)"
+
+            if length_threshold is not None:
+                l_state = length_threshold.get_status(st.queue)
+                if l_state != nagios.state.ok:
+                    state = self.max_state(state, l_state)
+                    msg += " (queue length %s)" % (STATUS_TEXT[l_state])
+            self.add_perfdata(label = 'queue_%d' % (port), value = st.queue,
+                    threshold = length_threshold)
+
+            msg += ", %d SYN_RECV, %d established" % (st.syn_recv,
+                    st.established)
+            for (name, value) in (('syn_recv', st.syn_recv),
+                    ('established', st.established)):
+                threshold = self.thresholds.get(name)
+                self.add_perfdata(label = '%s_%d' % (name, port),
+                        value = value, threshold = threshold)
+                if threshold is None:
+                    continue
+                c_state = threshold.get_status(value)
+                if c_state != nagios.state.ok:
+                    state = self.max_state(state, c_state)
+                    msg += " (%s %s)" % (name,
+                            STATUS_TEXT[c_state])
+
+            msgs.append(msg)
+
+        out = '; '.join(msgs) + '.'
+        if source != 'netlink':
+            out += " The backlog is not available without netlink."
+
+        self.exit(state, out)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
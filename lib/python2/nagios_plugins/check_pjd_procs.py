@@ -0,0 +1,502 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for CheckPjdProcsPlugin class for checking the I/O and
+          scheduling pressure of the PPD and VCB processes from /proc
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import time
+import errno
+import logging
+import textwrap
+
+# Third party modules
+
+# Own modules
+
+import nagios
+from nagios import BaseNagiosError
+
+from nagios.common import pp
+
+from nagios.plugin import NagiosPluginError
+
+from nagios.plugin.functions import STATUS_TEXT
+
+from nagios.plugin.range import NagiosRange
+
+from nagios.plugin.threshold import NagiosThreshold
+
+from nagios.plugins import ExtNagiosPlugin
+
+from nagios_plugins.clock import monotonic
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.1'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_COMMANDS = ('ppd', 'vcb')
+DEFAULT_INTERVAL = 1000
+
+PROC_DIR = os.sep + 'proc'
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+# The interpreters of interpreted daemons, their script is taken as the
+# command name
+re_interpreter = re.compile(r'^(?:python|perl|ruby)[\d.]*$|^(?:ba)?sh$')
+
+# The metrics of the processes, with their perfdata labels, units and
+# descriptions
+PROC_METRICS = (
+    ('read', 'read', 'B', 'read bytes per second'),
+    ('write', 'write', 'B', 'written bytes per second'),
+    ('cpu', 'cpu', '%', 'CPU usage in percent'),
+    ('vcs', 'vol_ctxsw', '', 'voluntary context switches per second'),
+    ('ivcs', 'invol_ctxsw', '', 'involuntary context switches per second'),
+    ('threads', 'threads', '', 'number of threads'),
+    ('fds', 'open_fds', '', 'number of open file descriptors'),
+)
+
+#==============================================================================
+def read_proc_file(pid, name):
+    """
+    Reads the given file of the given process from /proc.
+
+    @return: the content of the file or None, if the process has gone
+             or the file may not be read
+    @rtype: str or None
+
+    """
+
+    try:
+        fh = open(os.path.join(PROC_DIR, str(pid), name), 'r')
+        try:
+            return fh.read()
+        finally:
+            fh.close()
+    except IOError, e:
+        if e.errno not in (errno.ENOENT, errno.ESRCH, errno.EACCES, errno.EPERM):
+            raise
+        return None
+
+#==============================================================================
+def find_processes(commands):
+    """
+    Finds the processes of the given commands in one scan of /proc. A
+    process matches, if its command name (comm) or the base name of its
+    executable is one of the commands, or for interpreted daemons (e.g.
+    'python /usr/bin/ppd') the base name of its script. The arguments of
+    other processes (e.g. 'grep ppd') are not taken.
+
+    @param commands: the command names to search for
+    @type commands: list of str
+
+    @return: the PIDs of the found processes with the command names as keys
+    @rtype: dict of list
+
+    """
+
+    found = {}
+    for command in commands:
+        found[command] = []
+
+    for entry in os.listdir(PROC_DIR):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        if pid == os.getpid():
+            continue
+
+        names = []
+        comm = read_proc_file(pid, 'comm')
+        if comm:
+            names.append(comm.strip())
+        cmdline = read_proc_file(pid, 'cmdline')
+        if cmdline:
+            args = cmdline.split('\0')
+            executable = os.path.basename(args[0])
+            names.append(executable)
+            if re_interpreter.search(executable):
+                for arg in args[1:]:
+                    if arg and not arg.startswith('-'):
+                        names.append(os.path.basename(arg))
+                        break
+
+        for command in commands:
+            if command in names:
+                found[command].append(pid)
+                break
+
+    return found
+
+#==============================================================================
+def sample_process(pid):
+    """
+    Reads the counters and states of the given process from /proc/PID/io,
+    /proc/PID/stat, /proc/PID/status and /proc/PID/fd.
+
+    @return: the counters with the keys 'time' (monotonic), 'read', 'write',
+             'ticks', 'vcs', 'ivcs', 'threads' and 'fds', 'read' and 'write' are
+             None, if /proc/PID/io may not be read. None, if the process
+             has gone.
+    @rtype: dict or None
+
+    """
+
+    sample = {'time': monotonic(), 'read': None, 'write': None,
+            'fds': None}
+
+    stat = read_proc_file(pid, 'stat')
+    status = read_proc_file(pid, 'status')
+    if stat is None or status is None:
+        return None
+
+    # the command name in parentheses may contain blanks
+    fields = stat[stat.rindex(')') + 2:].split()
+    # utime and stime are the fields 14 and 15, num_threads the field 20
+    sample['ticks'] = int(fields[11]) + int(fields[12])
+    sample['threads'] = int(fields[17])
+
+    for line in status.splitlines():
+        (key, sep, value) = line.partition(':')
+        if key == 'voluntary_ctxt_switches':
+            sample['vcs'] = int(value)
+        elif key == 'nonvoluntary_ctxt_switches':
+            sample['ivcs'] = int(value)
+
+    io = read_proc_file(pid, 'io')
+    if io is not None:
+        for line in io.splitlines():
+            (key, sep, value) = line.partition(':')
+            if key == 'read_bytes':
+                sample['read'] = int(value)
+            elif key == 'write_bytes':
+                sample['write'] = int(value)
+
+    try:
+        sample['fds'] = len(os.listdir(os.path.join(PROC_DIR, str(pid), 'fd')))
+    except OSError:
+        pass
+
+    return sample
+
+#==============================================================================
+class CheckPjdProcsPlugin(ExtNagiosPlugin):
+    """
+    A special NagiosPlugin class for checking the I/O and scheduling
+    pressure of the PPD and VCB processes by sampling their counters
+    in /proc twice.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the CheckPjdProcsPlugin class.
+        """
+
+        usage = """\
+                %(prog)s [-v] [-C <command> ...] [--interval <ms>]
+                                   [--<metric>-warning <range>]
+                                   [--<metric>-critical <range>]
+                """
+        usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s --usage'
+        usage += '\n       %(prog)s --help'
+
+        blurb = "Copyright (c) 2013 Frank Brehm, Berlin.\n\n"
+        blurb += ("Checks the I/O and scheduling pressure of the PPD and " +
+                "VCB processes.")
+
+        super(CheckPjdProcsPlugin, self).__init__(
+                shortname = 'PJD_PROCS',
+                usage = usage, blurb = blurb,
+                version = __version__, timeout = DEFAULT_TIMEOUT,
+        )
+
+        self._commands = list(DEFAULT_COMMANDS)
+        """
+        @ivar: the command names of the processes to check
+        @type: list of str
+        """
+
+        self._interval = DEFAULT_INTERVAL / 1000.0
+        """
+        @ivar: the interval between the two samples in seconds
+        @type: float
+        """
+
+        self._thresholds = {}
+        """
+        @ivar: the thresholds of the metrics of a command
+        @type: dict of NagiosThreshold
+        """
+
+        self._add_args()
+
+    #------------------------------------------------------------
+    @property
+    def commands(self):
+        """The command names of the processes to check."""
+        return self._commands
+
+    #------------------------------------------------------------
+    @property
+    def interval(self):
+        """The interval between the two samples in seconds."""
+        return self._interval
+
+    #------------------------------------------------------------
+    @property
+    def thresholds(self):
+        """The thresholds of the metrics of a command."""
+        return self._thresholds
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        d = super(CheckPjdProcsPlugin, self).as_dict()
+
+        d['commands'] = self.commands
+        d['interval'] = self.interval
+        d['thresholds'] = {}
+        for (name, threshold) in self.thresholds.items():
+            d['thresholds'][name] = threshold.as_dict()
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.add_arg(
+                '-C', '--command',
+                metavar = 'NAME',
+                dest = 'commands',
+                action = 'append',
+                help = ("The command name of the processes to check, may be " +
+                        "given multiple times (Default: %s).") % (
+                        ', '.join(DEFAULT_COMMANDS)),
+        )
+
+        self.add_arg(
+                '--interval',
+                metavar = 'MS',
+                dest = 'interval',
+                type = int,
+                default = DEFAULT_INTERVAL,
+                help = ("The interval in milliseconds between the two " +
+                        "samples of the counters (Default: %(default)d)."),
+        )
+
+        for (name, label, uom, desc) in PROC_METRICS:
+
+            self.add_arg(
+                    '--%s-warning' % (name),
+                    metavar = 'RANGE',
+                    dest = '%s_warning' % (name),
+                    type = NagiosRange,
+                    help = ("Generate a warning state, if the %s of all " +
+                            "processes of a command is outside this range.") % (
+                            desc),
+            )
+
+            self.add_arg(
+                    '--%s-critical' % (name),
+                    metavar = 'RANGE',
+                    dest = '%s_critical' % (name),
+                    type = NagiosRange,
+                    help = ("Generate a critical state, if the %s of all " +
+                            "processes of a command is outside this range.") % (
+                            desc),
+            )
+
+    #--------------------------------------------------------------------------
+    def parse_args(self, args = None):
+        """
+        Executes self.argparser.parse_args().
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        """
+
+        super(CheckPjdProcsPlugin, self).parse_args(args)
+
+        if self.argparser.args.commands:
+            self._commands = []
+            for command in self.argparser.args.commands:
+                if command not in self._commands:
+                    self._commands.append(command)
+
+        if self.argparser.args.interval <= 0:
+            self.die("The interval must be greater than zero.")
+        self._interval = self.argparser.args.interval / 1000.0
+
+        for (name, label, uom, desc) in PROC_METRICS:
+            warn = getattr(self.argparser.args, '%s_warning' % (name))
+            crit = getattr(self.argparser.args, '%s_critical' % (name))
+            if warn is not None or crit is not None:
+                self._thresholds[name] = NagiosThreshold(
+                        warning = warn, critical = crit)
+
+    #--------------------------------------------------------------------------
+    def get_metrics(self, pids, first, second):
+        """
+        Calculates the metrics of all processes of a command from the
+        two samples of their counters.
+
+        @param pids: the PIDs of the processes
+        @type pids: list of int
+        @param first: the first samples with the PIDs as keys
+        @type first: dict
+        @param second: the second samples with the PIDs as keys
+        @type second: dict
+
+        @return: the metrics with the names from PROC_METRICS as keys,
+                 None, if not available
+        @rtype: dict
+
+        """
+
+        metrics = {}
+        for (name, label, uom, desc) in PROC_METRICS:
+            metrics[name] = None
+
+        for pid in pids:
+            s1 = first.get(pid)
+            s2 = second.get(pid)
+            if s1 is None or s2 is None:
+                continue
+            elapsed = s2['time'] - s1['time']
+            if elapsed <= 0:
+                continue
+
+            values = {
+                'cpu': 100.0 * (s2['ticks'] - s1['ticks']) / CLK_TCK / elapsed,
+                'vcs': (s2['vcs'] - s1['vcs']) / elapsed,
+                'ivcs': (s2['ivcs'] - s1['ivcs']) / elapsed,
+                'threads': s2['threads'],
+                'fds': s2['fds'],
+            }
+            for name in ('read', 'write'):
+                if s1[name] is not None and s2[name] is not None:
+                    values[name] = (s2[name] - s1[name]) / elapsed
+
+            for (name, value) in values.items():
+                if value is None:
+                    continue
+                if metrics[name] is None:
+                    metrics[name] = 0
+                metrics[name] += value
+
+        return metrics
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        """
+        Method to call the plugin directly.
+        """
+
+        self.parse_args()
+        self.init_root_logger()
+
+        if self.verbose > 2:
+            log.debug("Current object:\n%s", pp(self.as_dict()))
+
+        found = find_processes(self.commands)
+
+        all_pids = []
+        for command in self.commands:
+            if self.verbose > 1:
+                log.debug("Found processes of %r: %r", command, found[command])
+            all_pids += found[command]
+
+        first = {}
+        for pid in all_pids:
+            first[pid] = sample_process(pid)
+        time.sleep(self.interval)
+        second = {}
+        for pid in all_pids:
+            second[pid] = sample_process(pid)
+
+        state = nagios.state.ok
+        msgs = []
+
+        for command in self.commands:
+            pids = found[command]
+            if not pids:
+                state = self.max_state(state, nagios.state.critical)
+                msgs.append("%s: no process found" % (command))
+                continue
+
+            metrics = self.get_metrics(pids, first, second)
+            if self.verbose > 1:
+                log.debug("Metrics of %r:\n%s", command, pp(metrics))
+
+            msg = "%s: %d process(es), CPU %0.1f%%, %d threads, " % (
+                    command, len(pids), metrics['cpu'] or 0,
+                    metrics['threads'] or 0)
+            if metrics['fds'] is None:
+                msg += "open fds unknown"
+            else:
+                msg += "%d open fds" % (metrics['fds'])
+            if metrics['read'] is None:
+                msg += ", I/O unknown"
+            else:
+                msg += ", read %0.0f B/s, write %0.0f B/s" % (
+                        metrics['read'], metrics['write'])
+            msg += ", %0.1f/%0.1f (in)voluntary context switches/s" % (
+                    metrics['vcs'] or 0, metrics['ivcs'] or 0)
+
+            for (name, label, uom, desc) in PROC_METRICS:
+                value = metrics[name]
+                if value is None:
+                    continue
+                threshold = self.thresholds.get(name)
+                if isinstance(value, float):
+                    value = round(value, 2)
+                self.add_perfdata(label = '%s_%s' % (command, label),
+                        value = value, uom = uom, threshold = threshold)
+                if threshold is None:
+                    continue
+                m_state = threshold.get_status(value)
+                if m_state != nagios.state.ok:
+                    state = self.max_state(state, m_state)
+                    msg += " - %s is %s" % (desc, STATUS_TEXT[m_state])
+
+            msgs.append(msg)
+
+        out = '; '.join(msgs) + '.'
+        self.exit(state, out)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
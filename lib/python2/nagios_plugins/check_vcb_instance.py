@@ -12,18 +12,13 @@ import os
 import sys
 import re
 import logging
-import socket
 import textwrap
-import time
-import select
-import signal
+import fnmatch
 
 from numbers import Number
 
 # Third party modules
 
-from pkg_resources import parse_version
-
 # Own modules
 
 import nagios
@@ -33,6 +28,8 @@ from nagios.common import pp, caller_search_path
 
 from nagios.plugin import NagiosPluginError
 
+from nagios.plugin.functions import STATUS_TEXT
+
 from nagios.plugin.range import NagiosRange
 
 from nagios.plugin.threshold import NagiosThreshold
@@ -42,18 +39,26 @@ from nagios.plugins import ExecutionTimeoutError
 from nagios.plugins import CommandNotFoundError
 from nagios.plugins import ExtNagiosPlugin
 
+from nagios_plugins.pjd_transport import DEFAULT_BUFFER_SIZE
+from nagios_plugins.pjd_transport import SocketTransportError
+from nagios_plugins.pjd_transport import SocketConnectTimeoutError
+from nagios_plugins.pjd_transport import NoListeningError
+
+from nagios_plugins.check_pjd_instance import DEFAULT_TIMEOUT
+from nagios_plugins.check_pjd_instance import SIGNAL_NAMES, STATUS
+from nagios_plugins.check_pjd_instance import RequestStatusError
+from nagios_plugins.check_pjd_instance import RequestStatus
+from nagios_plugins.check_pjd_instance import CheckPjdInstancePlugin
+
 #---------------------------------------------
 # Some module variables
 
-__version__ = '0.1.0'
+__version__ = '0.4.0'
 
 log = logging.getLogger(__name__)
 
-DEFAULT_TIMEOUT = 30
 DEFAULT_VCB_PORT = 8072
 DEFAULT_JOB_ID = 2
-DEFAULT_POLLING_INTERVAL = 0.05
-DEFAULT_BUFFER_SIZE = 8192
 
 XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <pjd>
@@ -63,27 +68,6 @@ XML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 </pjd>
 """
 
-SIGNAL_NAMES = {
-    signal.SIGHUP:  'HUP',
-    signal.SIGINT:  'INT',
-    signal.SIGABRT: 'ABRT',
-    signal.SIGTERM: 'TERM',
-    signal.SIGKILL: 'KILL',
-    signal.SIGUSR1: 'USR1',
-    signal.SIGUSR2: 'USR2',
-}
-
-STATUS = {
-    'unknown':          0,
-    'progress':         3,
-    'failed':           4,
-    'succeeded':        5,
-    'in_progress_cont': 6,
-    'continuing':       10,
-}
-
-re_parse_result = re.compile(r'^([^,]+),(\d+),(\d+),(.*)$', re.DOTALL)
-
 # VCB_VERSION=8.6.29
 re_version = re.compile(r'^\s*VCB_VERSION\s*=\s*(\S+)',
         re.IGNORECASE | re.MULTILINE)
@@ -93,129 +77,16 @@ re_end_of_data = re.compile(r'^\s*end_of_data\s*=\s*(\S+)',
         re.IGNORECASE | re.MULTILINE)
 re_true = re.compile(r'^(?:true|yes|[1-9])', re.IGNORECASE)
 
-#==============================================================================
-class SocketTransportError(NagiosPluginError):
-    pass
+# QUEUE_LENGTH=12
+re_key_value = re.compile(r'^\s*([A-Za-z_][\w.\-]*)\s*=\s*(.*?)\s*$')
 
-#==============================================================================
-class SocketConnectTimeoutError(SocketTransportError):
-    pass
+# 12, -0.5, 1.5e3, 250ms, 80%
+re_numeric_value = re.compile(
+        r'^([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*' +
+        r'(%|s|ms|us|B|KB|MB|GB|TB|c)?$')
 
 #==============================================================================
-class NoListeningError(SocketTransportError):
-    pass
-
-#==============================================================================
-class RequestStatusError(NagiosPluginError):
-    pass
-
-#==============================================================================
-class RequestStatus(object):
-    """
-    A class for handling status replies from provisioning daemon.
-    """
-
-    #--------------------------------------------------------------------------
-    def __init__(self, job_id = None, state = None,
-            error_code = None, message = None):
-        """
-        Constructor.
-
-        @param job_id: the job ID of this reply
-        @type job_id: int
-        @param state: the reply state (see VCB)
-        @type state: int
-        @param error_code: the VDC error code
-        @type error_code: int
-        @param message: the textual reply message
-        @type message: str
-
-        @return: None
-
-        """
-
-        self._job_id = job_id
-
-        self._state = state
-
-        self._error_code = error_code
-
-        self._message = message
-
-    #------------------------------------------------------------
-    @property
-    def job_id(self):
-        """The job ID of this reply."""
-        return self._job_id
-
-    #------------------------------------------------------------
-    @property
-    def state(self):
-        """The reply state (see VCB)."""
-        return self._state
-
-    #------------------------------------------------------------
-    @property
-    def error_code(self):
-        """The VDC error code (old unused trash from somewhere)."""
-        return self._error_code
-
-    #------------------------------------------------------------
-    @property
-    def message(self):
-        """The textual reply message."""
-        return self._message
-
-    #--------------------------------------------------------------------------
-    def __str__(self):
-        """
-        Typecasting function for translating object structure into a string.
-
-        @return: string as used as a reply from the provisioning daemon
-        @rtype:  str
-        """
-
-        jid = self.job_id
-        if jid is None:
-            jid = '0'
-
-        st = self.state
-        if st is None:
-            st = 0
-
-        ec = self.error_code
-        if ec is None:
-            ec = 0
-
-        msg = self.message
-        if msg is None:
-            msg = '<No message>'
-
-        s = "%s,%d,%d,%s" % (jid, st, ec, msg)
-        return s
-
-    #--------------------------------------------------------------------------
-    def as_dict(self):
-        """
-        Typecasting into a dictionary.
-
-        @return: structure as dict
-        @rtype:  dict
-
-        """
-
-        res = {
-           '__class_name__': self.__class__.__name__,
-            'error_code': self.error_code,
-            'job_id': self.job_id,
-            'message': self.message,
-            'state': self.state,
-        }
-
-        return res
-
-#==============================================================================
-class CheckVcbInstancePlugin(ExtNagiosPlugin):
+class CheckVcbInstancePlugin(CheckPjdInstancePlugin):
     """
     A special NagiosPlugin class for checking a running instance of VCB
     on a ProfitBricks physical server (pserver).
@@ -231,6 +102,15 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
                 %(prog)s [options] -H <server_address> [-P <VCB port>]
                 """
         usage = textwrap.dedent(usage).strip()
+        usage += '\n       %(prog)s [options] -H <server_address> --command <NAME> ...'
+        usage += ('\n       %(prog)s [options] -H <server_address> ' +
+                '--samples <N> [--interval <MS>]')
+        usage += ('\n       %(prog)s [options] --hosts-file <FILE> ' +
+                '[--passive [--command-file <FILE>]]')
+        usage += ('\n       %(prog)s [options] --hosts-file <FILE> --prober ' +
+                '[--probe-interval <SECONDS>] [--passive]')
+        usage += ('\n       %(prog)s [options] -H <server_address> ' +
+                '--from-prober [--prober-state <FILE>]')
         usage += '\n       %(prog)s --usage'
         usage += '\n       %(prog)s --help'
 
@@ -240,131 +120,38 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
         super(CheckVcbInstancePlugin, self).__init__(
                 shortname = 'VCB_INSTANCE',
                 usage = usage, blurb = blurb,
-                version = __version__, timeout = DEFAULT_TIMEOUT,
+                version = __version__,
+                daemon_name = 'VCB',
+                default_port = DEFAULT_VCB_PORT,
+                default_job_id = DEFAULT_JOB_ID,
+                xml_template = XML_TEMPLATE,
         )
 
-        self._host_address = None
-        """
-        @ivar: the DNS name or IP address of the host, running the VCB
-        @type: str
-        """
-
-        self._vcb_port = DEFAULT_VCB_PORT
-        """
-        @ivar: the TCP port of VCB on the host to check
-        @type: int
+        self._metrics = []
         """
-
-        self._min_version = None
+        @ivar: the selected keys of the reply to export as performance data,
+               as tuples of a key pattern and a NagiosThreshold or None
+        @type: list of tuple
         """
-        @ivar: the minimum version number of the running VCB
-        @type: str or None
-        """
-
-        self._job_id = DEFAULT_JOB_ID
-        """
-        @ivar: the Job-Id to use in PJD to send to VCB
-        @type: int
-        """
-
-        self._polling_interval = DEFAULT_POLLING_INTERVAL
-
-        self._buffer_size = DEFAULT_BUFFER_SIZE
 
-        self._should_shutdown = False
-
-        self._cancel_signal = None
-
-        self._add_args()
-
-    #------------------------------------------------------------
-    @property
-    def host_address(self):
-        """The DNS name or IP address of the host, running the VCB."""
-        return self._host_address
+        self._parsed_msg = None
+        self._parsed_values = {}
 
     #------------------------------------------------------------
     @property
     def vcb_port(self):
         """The TCP port of VCB on the host to check."""
-        return self._vcb_port
+        return self.port
 
     @vcb_port.setter
     def vcb_port(self, value):
-        v = abs(int(value))
-        if v == 0:
-            raise ValueError("The port must not be zero.")
-        if v >= 2 ** 16:
-            raise ValueError("The port must not greater than %d." % (
-                    (2 ** 16 - 1)))
-        self._vcb_port = v
+        self.port = value
 
     #------------------------------------------------------------
     @property
-    def min_version(self):
-        """The minimum version number of the running VCB."""
-        return self._min_version
-
-    #------------------------------------------------------------
-    @property
-    def cancel_signal(self):
-        """Which signal got the process to cancel it."""
-        return self._cancel_signal
-
-    #------------------------------------------------------------
-    @property
-    def job_id(self):
-        """The Job-Id to use in PJD to send to VCB."""
-        return self._job_id
-
-    @job_id.setter
-    def job_id(self, value):
-        v = int(value)
-        self._job_id = abs(v)
-
-    #------------------------------------------------------------
-    @property
-    def timeout(self):
-        """Seconds before plugin times out."""
-        if not hasattr(self, 'argparser'):
-            return DEFAULT_TIMEOUT
-        return self.argparser.args.timeout
-
-    #------------------------------------------------------------
-    @property
-    def polling_interval(self):
-        """The polling interval on network socket."""
-        return self._polling_interval
-
-    @polling_interval.setter
-    def polling_interval(self, value):
-        v = float(value)
-        if v == 0:
-            raise ValueError("The polling interval must not be zero.")
-        self._polling_interval = abs(v)
-
-    #------------------------------------------------------------
-    @property
-    def buffer_size(self):
-        """The size of the buffer for the socket operation."""
-        return self._buffer_size
-
-    @buffer_size.setter
-    def buffer_size(self, value):
-        v = abs(int(value))
-        if v < 512:
-            raise ValueError("The buffer size must be greater than 512 bytes.")
-        self._buffer_size = v
-
-    #------------------------------------------------------------
-    @property
-    def should_shutdown(self):
-        """Should the current process shutdown by a signal from outside."""
-        return self._should_shutdown
-
-    @should_shutdown.setter
-    def should_shutdown(self, value):
-        self._should_shutdown = bool(value)
+    def metrics(self):
+        """The selected keys of the reply to export as performance data."""
+        return self._metrics
 
     #--------------------------------------------------------------------------
     def as_dict(self):
@@ -378,15 +165,13 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
 
         d = super(CheckVcbInstancePlugin, self).as_dict()
 
-        d['host_address'] = self.host_address
         d['vcb_port'] = self.vcb_port
-        d['min_version'] = self.min_version
-        d['job_id'] = self.job_id
-        d['timeout'] = self.timeout
-        d['polling_interval'] = self.polling_interval
-        d['should_shutdown'] = self.should_shutdown
-        d['buffer_size'] = self.buffer_size
-        d['cancel_signal'] = self.cancel_signal
+        d['metrics'] = []
+        for (pattern, threshold) in self.metrics:
+            t = None
+            if threshold:
+                t = threshold.as_dict()
+            d['metrics'].append({'pattern': pattern, 'threshold': t})
 
         return d
 
@@ -396,52 +181,19 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
         Adding all necessary arguments to the commandline argument parser.
         """
 
-        self.add_arg(
-                '-H', '--host-address', '--host',
-                metavar = 'ADDRESS',
-                dest = 'host_address',
-                required = True,
-                help = ("The DNS name or IP address of the host, " +
-                        "running the VCB (mandantory)."),
-        )
-
-        self.add_arg(
-                '-P', '--port',
-                metavar = 'PORT',
-                dest = 'vcb_port',
-                type = int,
-                default = DEFAULT_VCB_PORT,
-                help = ("The TCP port of VCB on the host to check " +
-                        "(Default: %(default)d)."),
-        )
-
-        self.add_arg(
-                '--min-version',
-                metavar = 'VERSION',
-                dest = 'min_version',
-                help = ("The minimum version number of the running VCB. " +
-                        "If given and the VCB version is less then this, " +
-                        "a warning is generated."),
-        )
-
-        self.add_arg(
-                '-J', '--job-id',
-                metavar = 'ID',
-                dest = 'job_id',
-                type = int,
-                default = DEFAULT_JOB_ID,
-                help = ("The Job-Id to use in PJD to send to VCB " +
-                        "(Default: %(default)d)."),
-        )
+        super(CheckVcbInstancePlugin, self)._add_args()
 
         self.add_arg(
-            '-b', '--buffer',
-            metavar = 'SIZE',
-            dest = 'buffer_size',
-            type = int,
-            default = DEFAULT_BUFFER_SIZE,
-            help = ("The size of the buffer for the socket operation in " +
-                    "bytes (Default: %(default)d)."),
+                '--metric',
+                metavar = 'KEY[,WARN[,CRIT]]',
+                dest = 'metrics',
+                action = 'append',
+                default = [],
+                help = ("Export the numeric value of the given key of the " +
+                        "vcb-info reply as performance data, optionally " +
+                        "with a warning and critical range, e.g. " +
+                        "'QUEUE_LENGTH,50,100'. The key may be a shell " +
+                        "pattern, e.g. 'JOBS_*'. May be given multiple times."),
         )
 
     #--------------------------------------------------------------------------
@@ -457,109 +209,53 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
 
         super(CheckVcbInstancePlugin, self).parse_args(args)
 
-        self._host_address = self.argparser.args.host_address
-        if self.argparser.args.vcb_port:
-            self.vcb_port = self.argparser.args.vcb_port
-        if self.argparser.args.min_version:
-            self._min_version = self.argparser.args.min_version
-        if self.argparser.args.job_id:
-            self.job_id = self.argparser.args.job_id
-        if self.argparser.args.buffer_size is not None:
-            self.buffer_size = self.argparser.args.buffer_size
+        for selector in self.argparser.args.metrics:
+            fields = [x.strip() for x in selector.split(',', 2)]
+            pattern = fields[0].upper()
+            if not pattern:
+                self.die("Invalid metric selector %r." % (selector))
+            warn = None
+            crit = None
+            try:
+                if len(fields) > 1 and fields[1]:
+                    warn = NagiosRange(fields[1])
+                if len(fields) > 2 and fields[2]:
+                    crit = NagiosRange(fields[2])
+            except Exception, e:
+                self.die("Invalid range in metric selector %r: %s" % (
+                        selector, e))
+            threshold = None
+            if warn is not None or crit is not None:
+                threshold = NagiosThreshold(warning = warn, critical = crit)
+            self._metrics.append((pattern, threshold))
 
     #--------------------------------------------------------------------------
-    def __call__(self):
+    def parse_values(self, msg):
         """
-        Method to call the plugin directly.
+        Parses all 'KEY=VALUE' lines of the message in one pass into a
+        dictionary with the upper case keys. The result of the last
+        message is kept, so the message is parsed only once.
+
+        @param msg: the message of the reply
+        @type msg: str
+
+        @return: the values of the keys
+        @rtype: dict
+
         """
 
-        self.parse_args()
-        self.init_root_logger()
+        if msg is self._parsed_msg:
+            return self._parsed_values
 
-        state = nagios.state.ok
-        out = "VCB on %r port %d seems to be okay." % (
-                self.host_address, self.vcb_port)
-
-        if self.verbose > 2:
-            log.debug("Current object:\n%s", pp(self.as_dict()))
-
-
-        signal.signal(signal.SIGHUP, self.exit_signal_handler)
-        signal.signal(signal.SIGINT, self.exit_signal_handler)
-        signal.signal(signal.SIGABRT, self.exit_signal_handler)
-        signal.signal(signal.SIGTERM, self.exit_signal_handler)
-        signal.signal(signal.SIGUSR1, self.exit_signal_handler)
-        signal.signal(signal.SIGUSR2, self.exit_signal_handler)
-
-        xml = XML_TEMPLATE % (self.job_id)
-        if self.verbose > 3:
-            log.debug("XML to send:\n%s", xml)
-
-        result = ''
-        do_parse = False
-        result_rcvd = False
-        rstatus = None
-        got_version = None
-
-        try:
-            result = self.send(xml)
-            result = result.strip()
-            do_parse = True
-            result_rcvd = True
-        except NoListeningError, e:
-            result = "Error: " + str(e).strip()
-            state = nagios.state.critical
-        except SocketTransportError, e:
-            result = "Error: " + str(e).strip()
-            state = nagios.state.critical
-        except Exception, e:
-            result = "Error %s on checking VCB on %r port %d: %s" % (
-                    e.__class__.__name__, self.host_address,
-                    self.vcb_port, e)
-            state = nagios.state.critical
-
-        if self.verbose > 1:
-            log.debug("Got result:\n%s.", result)
-
-        if do_parse:
-            try:
-                rstatus = self.parse_result(result)
-                while rstatus.state == STATUS['progress']:
-                    lines = result.splitlines()
-                    line_removed = lines.pop(0)
-                    log.debug("Removed first line %r", line_removed)
-                    result = '\n'.join(lines)
-                    rstatus = self.parse_result(result)
-
-                if rstatus.state != STATUS['succeeded']:
-                    state = self.max_state(state, nagios.state.critical)
-                result = rstatus.message
-                result_rcvd = True
-            except RequestStatusError, e:
-                result = "Could not understand message: %s" % (result)
-                state = self.max_state(state, nagios.state.critical)
-
-        if result_rcvd:
-            got_version = self.parse_for_version(result)
-            result = ' '.join(result.splitlines())
-            log.debug("Got a version of: %r", got_version)
-            if got_version is None:
-                state = self.max_state(state, nagios.state.warning)
-                result += ' - no version found.'
-            elif self.min_version is not None:
-                parsed_version_expected = parse_version(self.min_version)
-                if self.verbose > 1:
-                    log.debug("Expecting parsed version %r.", parsed_version_expected)
-                parsed_version_got = parse_version(got_version)
-                if self.verbose > 1:
-                    log.debug("Got parsed version %r.", parsed_version_got)
-                if parsed_version_got < parsed_version_expected:
-                    state = self.max_state(state, nagios.state.warning)
-                    result += ' - version is less than %r.' % (self.min_version)
-
-        out = result
-
-        self.exit(state, out)
+        values = {}
+        for line in msg.splitlines():
+            match = re_key_value.search(line)
+            if match:
+                values[match.group(1).upper()] = match.group(2)
+
+        self._parsed_msg = msg
+        self._parsed_values = values
+        return values
 
     #--------------------------------------------------------------------------
     def parse_for_version(self, msg):
@@ -567,213 +263,88 @@ class CheckVcbInstancePlugin(ExtNagiosPlugin):
         Parses in the given message for a version string.
         """
 
-        match = re_version.search(msg)
-        if not match:
-            return None
-        return match.group(1)
+        return self.parse_values(msg).get('VCB_VERSION')
 
     #--------------------------------------------------------------------------
-    def exit_signal_handler(self, signum, frame):
+    def evaluate_metrics(self, msg):
         """
-        Handler as a callback function for getting a signal from somewhere.
+        Evaluates the selected keys of the reply as numeric metrics.
 
-        @param signum: the gotten signal number
-        @type signum: int
-        @param frame: the current stack frame
-        @type frame: None or a frame object
+        @param msg: the message of the final status reply
+        @type msg: str
+
+        @return: the state, additional output messages and the performance
+                 data of the metrics
+        @rtype: tuple of int, list and list
 
         """
 
-        signame = "%d"  % (signum)
-        if signum in SIGNAL_NAMES:
-            signame = SIGNAL_NAMES[signum]
+        state = nagios.state.ok
+        msgs = []
+        perfdata = []
 
-        log.debug("Got a signal %r.", signame)
+        if not self.metrics:
+            return (state, msgs, perfdata)
 
-        if (signum == signal.SIGUSR1) or (signum == signal.SIGUSR2):
-            log.debug("Nothing to do on signal USR1 or USR2.")
-            return
+        values = self.parse_values(msg)
+        for (pattern, threshold) in self.metrics:
 
-        log.info("Canceled.")
-        self._cancel_signal = signame
+            keys = sorted(fnmatch.filter(values.keys(), pattern))
+            if not keys:
+                state = self.max_state(state, nagios.state.unknown)
+                msgs.append("key %s not found." % (pattern))
+                continue
 
-        self.should_shutdown = True
+            for key in keys:
+                match = re_numeric_value.search(values[key])
+                if not match:
+                    state = self.max_state(state, nagios.state.unknown)
+                    msgs.append("value of %s is not numeric: %r." % (
+                            key, values[key]))
+                    continue
+                value = float(match.group(1))
+                if value.is_integer() and not 'e' in match.group(1).lower():
+                    value = int(value)
+                perfdata.append({'label': key.lower(), 'value': value,
+                        'uom': match.group(2), 'threshold': threshold})
+                if threshold is None:
+                    continue
+                m_state = threshold.get_status(value)
+                if m_state != nagios.state.ok:
+                    state = self.max_state(state, m_state)
+                    msgs.append("%s=%s is %s." % (key, values[key],
+                            STATUS_TEXT[m_state]))
+
+        return (state, msgs, perfdata)
 
     #--------------------------------------------------------------------------
-    def send(self, message):
+    def format_message(self, msg):
         """
-        Sends the message over network socket to the recipient.
-        It waits for all replies and gives them back all.
-
-        @raise NoListeningError: if VCB isn't listening on the given port
-        @raise SocketTransportError: on some communication errors or timeouts
-
-        @param message: the message to send over the network
-        @type message: str
-
-        @return: response from server, or None
-        @rtype: str
-
+        Joins the lines of the message for the plugin output.
         """
 
-        if self.verbose > 2:
-            msg = "Sending message to %r, port %d with a timeout of %d seconds."
-            log.debug(msg, self.host_address, self.vcb_port, self.timeout)
-
-        def connect_alarm_caller(signum, sigframe):
-            '''
-            This nested function will be called in event of a timeout
-
-            @param signum:   the signal number (POSIX) which happend
-            @type signum:    int
-            @param sigframe: the frame of the signal
-            @type sigframe:  object
-            '''
-
-            raise SocketConnectTimeoutError("Timeout connecting to %r port %d." % (
-                self.host_address, self.vcb_port))
-
-        s = None
-        sa = None
-        for res in socket.getaddrinfo(self.host_address, self.vcb_port,
-                socket.AF_UNSPEC, socket.SOCK_STREAM):
-
-            if self.verbose > 3:
-                log.debug("Socket address info: %r", res)
-            af, socktype, proto, canonname, sa = res
-
-            # Get the socket:
-            try:
-                signal.signal(signal.SIGALRM, connect_alarm_caller)
-                signal.alarm(self.timeout)
-                s = socket.socket(af, socktype, proto)
-            except socket.error, msg:
-                s = None
-                continue
-            finally:
-                signal.alarm(0)
-
-            if self.verbose > 3:
-                log.debug("Got a socket: %r.", s)
-
-            # Connect to the socket
-            try:
-                signal.signal(signal.SIGALRM, connect_alarm_caller)
-                signal.alarm(self.timeout)
-                s.connect(sa)
-            except socket.error, msg:
-                s.close()
-                s = None
-                continue
-            finally:
-                signal.alarm(0)
-            break
-
-        if s is None:
-            msg = "VCB seems not to listen on %r, port %d." % (
-                    self.host_address, self.vcb_port)
-            raise NoListeningError(msg)
-
-        if self.verbose > 3:
-            msg = ("Got a socket address of %s." % (str(sa)))
-            log.debug(msg)
-
-        # Fileno of client socket
-        s_fn = s.fileno()
-
-        # Sending the message
-        s.send(message)
-
-        # Wait for an answer
-        begin = time.time()
-        data = ''
-        break_on_timeout = False
-        result_line = ''
-        chunk = ''
-
-        try:
-            while not self.should_shutdown:
-
-                cur_time = time.time()
-                secs = cur_time - begin
-                if self.verbose > 2:
-                    log.debug("Current seconds: %0.2f", secs)
-
-                if secs > self.timeout:
-                    break_on_timeout = True
-                    break
-
-                rlist, wlist, elist = select.select(
-                        [s_fn], [], [], self.polling_interval)
-
-                if s_fn in rlist:
-                    data = s.recv(self.buffer_size)
-                    if data == '':
-                        if self.verbose > 3:
-                            log.debug("Socket closed from remote.")
-                        if chunk != '':
-                            break
-                    result_line += data
-                    chunk += data
-                    match = re_end_of_data.search(result_line)
-                    if match:
-                        eod = match.group(1)
-                        if re_true.search(eod):
-                            log.debug("End of data reached.")
-                            result_line = re_end_of_data.sub('', result_line)
-                            break
-
-                else:
-                    if chunk != '':
-                        chunk = ''
-
-        except select.error, e:
-            if e[0] == 4:
-                pass
-            else:
-                log.error("Error in select(): "  + str(e))
-
-        s.close()
-
-        if break_on_timeout:
-            secs = time.time() - begin
-            msg = 'Timeout after %0.2f seconds.' % (secs)
-            raise SocketTransportError(msg)
-
-        return result_line
+        return ' '.join(msg.splitlines())
 
     #--------------------------------------------------------------------------
-    def parse_result(self, message):
+    def is_final_line(self, line):
         """
-        Parses the given string to get an instance of a RequestStatus object.
-
-        @raise RequestStatusError: if not successful.
-
-        @param message: the message to parse into a RequestStatus object.
-        @type message: str
-
-
+        Checks, whether the given line of the reply is the
+        'END_OF_DATA=TRUE' marker.
         """
 
-        if message is None:
-            raise RequestStatusError("Cannot parse a None object.")
-
-        message = str(message).strip()
-
-        match = re_parse_result.search(message)
-        if not match:
-            msg = (("Parsing error. Message %r doesn't match " +
-                    "a status reply message.") % (message))
-            raise RequestStatusError(msg)
+        match = re_end_of_data.search(line)
+        if match and re_true.search(match.group(1)):
+            log.debug("End of data reached.")
+            return True
+        return False
 
-        request_status = RequestStatus(
-            job_id = str(match.group(1)).strip(),
-            state = int(match.group(2)),
-            error_code = int(match.group(3)),
-            message = match.group(4),
-        )
+    #--------------------------------------------------------------------------
+    def finish_reply(self, reply):
+        """
+        Removes the 'END_OF_DATA' marker from the reply.
+        """
 
-        return request_status
+        return re_end_of_data.sub('', reply)
 
 #==============================================================================
 
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a monotonic clock for deadlines, intervals and
+          latencies, which doesn't jump on a step of the system time
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import logging
+
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+
+# Third party modules
+
+# Own modules
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+# from linux/time.h
+CLOCK_MONOTONIC = 1
+
+#==============================================================================
+_clock_gettime = None
+
+if ctypes is not None:
+
+    class _Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    # clock_gettime() is in librt for glibc before 2.17
+    for _libname in ('librt.so.1', 'libc.so.6'):
+        try:
+            _clock_gettime = ctypes.CDLL(_libname, use_errno = True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+        _clock_gettime.restype = ctypes.c_int
+        break
+
+#------------------------------------------------------------------------------
+def monotonic():
+    """
+    The current value of CLOCK_MONOTONIC in seconds (Python 2 has no
+    time.monotonic()). Falls back to time.time(), if clock_gettime()
+    is not available.
+
+    @rtype: float
+    """
+
+    if _clock_gettime is None:
+        return time.time()
+
+    ts = _Timespec()
+    if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return ts.tv_sec + ts.tv_nsec / 1e9
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,624 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for reading the port counters of Infiniband HCAs from
+          sysfs and for keeping their last snapshot with a monotonic
+          timestamp in a small state file between two checks.
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import logging
+import tempfile
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Third party modules
+
+# Own modules
+
+from nagios_plugins.state_files import open_trusted
+
+from nagios_plugins.clock import monotonic
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.4.0'
+
+log = logging.getLogger(__name__)
+
+BOOT_ID_FILE = os.sep + os.path.join('proc', 'sys', 'kernel', 'random',
+        'boot_id')
+
+# The data counters count in units of 4 octets (IBA spec, PortCounters)
+DATA_COUNTERS = ('port_xmit_data', 'port_rcv_data')
+DATA_COUNTER_SCALE = 4
+
+PACKET_COUNTERS = ('port_xmit_packets', 'port_rcv_packets')
+
+# The octets of the smallest packet counted by the data counters:
+# LRH (8), BTH (12), ICRC (4) and VCRC (2)
+MIN_PACKET_SIZE = 26
+
+THROUGHPUT_COUNTERS = DATA_COUNTERS + PACKET_COUNTERS
+
+# The data and the packet counter of the same direction, they must agree
+# about a wrap
+COUNTER_PAIRS = {
+    'port_xmit_data': 'port_xmit_packets',
+    'port_xmit_packets': 'port_xmit_data',
+    'port_rcv_data': 'port_rcv_packets',
+    'port_rcv_packets': 'port_rcv_data',
+}
+
+# The 64 bit counters of PortCountersExtended, provided by some drivers
+# (e.g. mlx4) in an additional directory with a suffix on their names
+EXT_COUNTERS_DIR = 'counters_ext'
+EXT_COUNTER_SUFFIX = '_64'
+EXT_COUNTER_WIDTH = 64
+EXT_COUNTERS = THROUGHPUT_COUNTERS
+
+# The ticks, a port had data to transmit, but no flow control credits
+XMIT_WAIT_COUNTER = 'port_xmit_wait'
+
+# The counters sampled within a short window, if a port has only
+# 32 bit data and packet counters
+WINDOW_COUNTERS = THROUGHPUT_COUNTERS + (XMIT_WAIT_COUNTER, )
+
+# The longest window between the two snapshots in seconds, it is shortened
+# to the half of the time, a 32 bit data counter needs to wrap at the rate
+# of the port (about 3.4 seconds at QDR)
+DEFAULT_COUNTER_WINDOW = 1.0
+
+# The error counters and their widths in bits (IBA spec, PortCounters)
+ERROR_COUNTERS = (
+    ('symbol_error', 16),
+    ('link_error_recovery', 8),
+    ('link_downed', 8),
+    ('port_rcv_errors', 16),
+    ('port_xmit_discards', 16),
+    ('excessive_buffer_overrun_errors', 4),
+)
+
+# The widths of the other counters in bits
+COUNTER_WIDTHS = {
+    'port_xmit_data': 32,
+    'port_rcv_data': 32,
+    'port_xmit_packets': 32,
+    'port_rcv_packets': 32,
+    'port_xmit_wait': 32,
+}
+for (_name, _width) in ERROR_COUNTERS:
+    COUNTER_WIDTHS[_name] = _width
+
+#==============================================================================
+def get_boot_id():
+    """
+    The boot ID of the running kernel, the monotonic clock is only
+    comparable within the same boot. None, if it could not be read.
+    """
+
+    try:
+        fh = open(BOOT_ID_FILE, 'r')
+        try:
+            return fh.read().strip()
+        finally:
+            fh.close()
+    except IOError:
+        return None
+
+#==============================================================================
+def base_counter_name(key):
+    """
+    The name of a counter without the suffix of the 64 bit counters
+    (e.g. 'port_xmit_data' for 'port_xmit_data_64').
+    """
+
+    if key.endswith(EXT_COUNTER_SUFFIX):
+        return key[:-len(EXT_COUNTER_SUFFIX)]
+    return key
+
+#------------------------------------------------------------------------------
+def counter_width(key, value = None):
+    """
+    The width in bits of the given counter. Newer kernels fill the data and
+    packet counters in the 'counters' directory from PortCountersExtended,
+    if the HCA supports them, so a value exceeding the width of the IBA
+    spec shows a 64 bit counter.
+
+    @param key: the name of the counter as read by read_port_counters()
+    @type key: str
+    @param value: the largest known value of the counter
+    @type value: int or None
+
+    @rtype: int
+
+    """
+
+    if key.endswith(EXT_COUNTER_SUFFIX):
+        return EXT_COUNTER_WIDTH
+    width = COUNTER_WIDTHS.get(key, EXT_COUNTER_WIDTH)
+    if value is not None and value >= (1 << width):
+        return EXT_COUNTER_WIDTH
+    return width
+
+#------------------------------------------------------------------------------
+def max_counter_delta(name, rate_val, elapsed):
+    """
+    The largest possible increase of a data or packet counter of a port
+    with the given rate in the given time, a packet has at least
+    MIN_PACKET_SIZE octets. None for other counters or without a rate.
+
+    @param name: the name of the counter without suffix
+    @type name: str
+    @param rate_val: the current rate of the port in Gb/sec
+    @type rate_val: int
+    @param elapsed: the seconds between the two snapshots
+    @type elapsed: float
+
+    @rtype: int or None
+
+    """
+
+    if name not in THROUGHPUT_COUNTERS or not rate_val:
+        return None
+    max_bytes = rate_val * 1000.0 ** 3 / 8 * elapsed
+    if name in DATA_COUNTERS:
+        return int(max_bytes / DATA_COUNTER_SCALE)
+    return int(max_bytes / MIN_PACKET_SIZE)
+
+#------------------------------------------------------------------------------
+def counter_window(rate_val):
+    """
+    The window in seconds between two snapshots of the 32 bit data and
+    packet counters of a port with the given rate, within which they can
+    wrap at most once.
+
+    @param rate_val: the current rate of the port in Gb/sec
+    @type rate_val: int
+
+    @rtype: float
+
+    """
+
+    if not rate_val:
+        return DEFAULT_COUNTER_WINDOW
+    wrap_time = float(1 << COUNTER_WIDTHS['port_xmit_data']) / (
+            rate_val * 1000.0 ** 3 / 8 / DATA_COUNTER_SCALE)
+    return min(DEFAULT_COUNTER_WINDOW, wrap_time / 2)
+
+#------------------------------------------------------------------------------
+def counter_delta(previous, current, width, max_delta = None):
+    """
+    Computes the increase of a port counter between two snapshots.
+
+    The PortCounters of the IBA spec don't wrap, they stop at their maximum
+    value, so a saturated counter gives only a lower bound of the increase.
+    Many drivers let the 32 bit data and packet counters wrap around
+    instead, which happens within seconds at QDR or FDR rate. A counter
+    lower than before has wrapped, if the increase across the wrap is
+    possible within max_delta, otherwise it was reset (e.g. by
+    'perfquery -R' or a driver reload), then its current value is the
+    increase since the reset. Multiple wraps between two snapshots can't
+    be detected.
+
+    @param previous: the value of the previous snapshot
+    @type previous: int
+    @param current: the current value
+    @type current: int
+    @param width: the width of the counter in bits
+    @type width: int
+    @param max_delta: the largest possible increase of the counter between
+                      the snapshots, None, if the counter doesn't wrap
+    @type max_delta: int or None
+
+    @return: the increase and whether the counter is saturated
+    @rtype: tuple of int and bool
+
+    """
+
+    limit = 1 << width
+    saturated = (current >= limit - 1)
+    if current >= previous:
+        return (current - previous, saturated)
+
+    if max_delta is not None:
+        wrapped = current + limit - previous
+        if wrapped <= max_delta:
+            return (wrapped, False)
+
+    return (current, saturated)
+
+#------------------------------------------------------------------------------
+def counter_deltas(previous, current, rate_val, elapsed):
+    """
+    Computes the increases of the counters of a HCA port between two
+    snapshots as read by read_port_counters(). Counters of another source
+    than before (e.g. the 64 bit ones after a driver update) have another
+    key and are omitted once.
+
+    The increase of a 32 bit data or packet counter is unknown, if it may
+    have wrapped unnoticed within the elapsed time at the rate of the port.
+    A reset (e.g. by 'perfquery -R' or a driver reload) lowers all counters,
+    a wrap usually only one of them. So a lower data or packet counter is
+    taken as wrapped only, if the counter of the other kind of the same
+    direction is lower too and both wraps are possible, if only one of them
+    is lower, its increase is unknown, otherwise both were reset.
+
+    @param previous: the counters of the previous snapshot
+    @type previous: dict
+    @param current: the current counters
+    @type current: dict
+    @param rate_val: the current rate of the port in Gb/sec
+    @type rate_val: int
+    @param elapsed: the seconds between the two snapshots
+    @type elapsed: float
+
+    @return: the increases with the names of the counters without suffix
+             as keys, the names of the saturated counters and the names of
+             the counters with an unknown increase
+    @rtype: tuple of dict, list of str and list of str
+
+    """
+
+    values = {}
+    for (key, value) in current.items():
+        if key not in previous:
+            continue
+        last = previous[key]
+        values[base_counter_name(key)] = (last, value,
+                counter_width(key, max(value, last)))
+
+    def wrap_possible(name):
+        (last, value, width) = values[name]
+        max_delta = max_counter_delta(name, rate_val, elapsed)
+        if max_delta is None:
+            return False
+        return value + (1 << width) - last <= max_delta
+
+    deltas = {}
+    saturated = []
+    unknown = []
+    for (name, (last, value, width)) in values.items():
+        max_delta = None
+        if width < EXT_COUNTER_WIDTH:
+            max_delta = max_counter_delta(name, rate_val, elapsed)
+        if max_delta is not None:
+            if max_delta >= (1 << width):
+                unknown.append(name)
+                continue
+            if value < last:
+                pair = COUNTER_PAIRS[name]
+                if pair not in values or values[pair][1] >= values[pair][0]:
+                    unknown.append(name)
+                    continue
+                if not (wrap_possible(name) and wrap_possible(pair)):
+                    max_delta = None
+        (delta, is_saturated) = counter_delta(last, value, width, max_delta)
+        deltas[name] = delta
+        if is_saturated:
+            saturated.append(name)
+
+    return (deltas, saturated, unknown)
+
+#==============================================================================
+def read_port_counters(sysfs, port_dir, names):
+    """
+    Reads the given counters of a HCA port. The 64 bit counters from the
+    'counters_ext' directory are preferred, they are returned with their
+    suffix (e.g. 'port_xmit_data_64'), the others are read from the
+    'counters' directory. Counters not provided by the driver are omitted.
+
+    @raise SysfsError: if a counter could not be read
+
+    @param sysfs: the reader of the sysfs directory of the HCAs
+    @type sysfs: SysfsReader
+    @param port_dir: the directory of the HCA port relative to the one
+                     of the reader (e.g. 'mlx4_0/ports/1')
+    @type port_dir: str
+    @param names: the names of the counters to read
+    @type names: list of str
+
+    @return: the values of the counters with their names as read as keys
+    @rtype: dict
+
+    """
+
+    counters = {}
+    counters_dir = os.path.join(port_dir, 'counters')
+    ext_dir = os.path.join(port_dir, EXT_COUNTERS_DIR)
+    for name in names:
+        if name in EXT_COUNTERS:
+            key = name + EXT_COUNTER_SUFFIX
+            value = sysfs.read_int(ext_dir, key)
+            if value is not None:
+                counters[key] = value
+                continue
+        value = sysfs.read_int(counters_dir, name)
+        if value is not None:
+            counters[name] = value
+
+    return counters
+
+#==============================================================================
+class CounterWindowSampler(object):
+    """
+    Takes two snapshots of the data, packet and transmit wait counters of
+    HCA ports within one short window inside a check. It is used for ports
+    with only 32 bit data and packet counters, which may wrap unnoticed
+    between two checks, but at most once within the window.
+
+    The counters are opened once and reread for the second snapshot, like
+    by read_port_counters() the 64 bit counters are preferred.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, sysfs, verbose = 0):
+        """
+        Constructor.
+
+        @param sysfs: the reader of the sysfs directory of the HCAs
+        @type sysfs: SysfsReader
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.sysfs = sysfs
+        self.verbose = verbose
+
+        self.targets = []
+        """
+        @ivar: the sampled ports as tuples of their key, the opened counters
+               (a dict with the names as read as keys and the file
+               descriptors as values), the monotonic time of the first
+               snapshot and the first snapshot
+        @type: list of tuple
+        """
+
+    #--------------------------------------------------------------------------
+    def _read(self, fds):
+
+        counters = {}
+        for (key, fd) in fds.items():
+            value = self.sysfs.reread(fd)
+            if value is None:
+                continue
+            try:
+                counters[key] = int(value)
+            except ValueError:
+                continue
+        return counters
+
+    #--------------------------------------------------------------------------
+    def add_port(self, key, port_dir):
+        """
+        Opens the counters of the given port and takes the first snapshot,
+        if the port has only 32 bit data or packet counters.
+
+        @raise SysfsError: if a counter could not be opened or read
+
+        @param key: the key of the port in the result of run()
+        @type key: object
+        @param port_dir: the directory of the HCA port relative to the one
+                         of the reader (e.g. 'mlx4_0/ports/1')
+        @type port_dir: str
+
+        @return: whether the port is sampled
+        @rtype: bool
+
+        """
+
+        fds = {}
+        counters_dir = os.path.join(port_dir, 'counters')
+        ext_dir = os.path.join(port_dir, EXT_COUNTERS_DIR)
+        for name in WINDOW_COUNTERS:
+            if name in EXT_COUNTERS:
+                fd = self.sysfs.open_attr(ext_dir, name + EXT_COUNTER_SUFFIX)
+                if fd is not None:
+                    fds[name + EXT_COUNTER_SUFFIX] = fd
+                    continue
+            fd = self.sysfs.open_attr(counters_dir, name)
+            if fd is not None:
+                fds[name] = fd
+
+        counters = self._read(fds)
+        now = monotonic()
+
+        narrow = False
+        for (name, value) in counters.items():
+            if name in THROUGHPUT_COUNTERS and (
+                    counter_width(name, value) < EXT_COUNTER_WIDTH):
+                narrow = True
+        if not narrow:
+            return False
+
+        self.targets.append((key, fds, now, counters))
+        return True
+
+    #--------------------------------------------------------------------------
+    def run(self, window):
+        """
+        Waits for the window and takes the second snapshots.
+
+        @raise SysfsError: if a counter could not be read
+
+        @param window: the window between the snapshots in seconds
+        @type window: float
+
+        @return: the elapsed seconds, the first and the second snapshot with
+                 the keys of the sampled ports as keys
+        @rtype: dict of tuple
+
+        """
+
+        results = {}
+        if not self.targets:
+            return results
+
+        if self.verbose > 1:
+            log.debug("Sampling the 32 bit counters of %d ports within " +
+                    "%0.3f seconds.", len(self.targets), window)
+        time.sleep(window)
+
+        for (key, fds, begin, first) in self.targets:
+            second = self._read(fds)
+            results[key] = (monotonic() - begin, first, second)
+
+        return results
+
+#==============================================================================
+class IbCounterState(object):
+    """
+    The snapshots of the counters of Infiniband ports from the previous
+    check, with their monotonic timestamps, saved to a compact JSON file.
+    Snapshots of a different boot are discarded.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, state_file):
+
+        self.state_file = state_file
+        self.boot_id = get_boot_id()
+
+        self.snapshots = {}
+        """
+        @ivar: the snapshots with '<HCA>:<port>' as keys and dicts with the
+               keys 'time' (monotonic timestamp) and 'counters' as values
+        @type: dict
+        """
+
+        self.changed = False
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'state_file': self.state_file,
+            'boot_id': self.boot_id,
+            'snapshots': self.snapshots,
+            'changed': self.changed,
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def key(hca_name, hca_port):
+        """The key of the snapshot of a HCA port."""
+        return '%s:%d' % (hca_name, hca_port)
+
+    #--------------------------------------------------------------------------
+    def load(self):
+        """
+        Loads the snapshots from the state file. A missing, broken or
+        untrusted state file (see open_trusted()) or one of a previous boot
+        results in no snapshots.
+        """
+
+        try:
+            fh = open_trusted(self.state_file)
+            try:
+                data = json.load(fh)
+            finally:
+                fh.close()
+        except (IOError, ValueError), e:
+            log.debug("Could not load counter state %r: %s",
+                    self.state_file, e)
+            return
+
+        if not isinstance(data, dict):
+            return
+        if data.get('boot_id') != self.boot_id:
+            log.debug("Discarding counter state %r of a previous boot.",
+                    self.state_file)
+            return
+
+        snapshots = data.get('ports')
+        if isinstance(snapshots, dict):
+            self.snapshots = snapshots
+
+    #--------------------------------------------------------------------------
+    def get(self, hca_name, hca_port):
+        """
+        The previous snapshot of the given HCA port.
+
+        @return: the monotonic timestamp and the counters, or None
+        @rtype: tuple or None
+
+        """
+
+        snapshot = self.snapshots.get(self.key(hca_name, hca_port))
+        if not snapshot:
+            return None
+        return (snapshot['time'], snapshot['counters'])
+
+    #--------------------------------------------------------------------------
+    def set(self, hca_name, hca_port, timestamp, counters):
+        """
+        Stores the current snapshot of the given HCA port.
+        """
+
+        self.snapshots[self.key(hca_name, hca_port)] = {
+            'time': timestamp,
+            'counters': counters,
+        }
+        self.changed = True
+
+    #--------------------------------------------------------------------------
+    def save(self):
+        """
+        Saves the snapshots atomically to the state file, if they were changed.
+        """
+
+        if not self.state_file or not self.changed:
+            return
+
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        tmp_file = None
+        try:
+            (fd, tmp_file) = tempfile.mkstemp(
+                    prefix = os.path.basename(self.state_file) + '.',
+                    dir = state_dir)
+            fh = os.fdopen(fd, 'w')
+            try:
+                json.dump({'boot_id': self.boot_id, 'ports': self.snapshots},
+                        fh, separators = (',', ':'))
+            finally:
+                fh.close()
+            os.rename(tmp_file, self.state_file)
+        except (IOError, OSError), e:
+            log.warn("Could not save counter state %r: %s",
+                    self.state_file, e)
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+
+        self.changed = False
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
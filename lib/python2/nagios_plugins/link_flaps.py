@@ -0,0 +1,316 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for sampling the link state of Infiniband ports and
+          network interfaces from sysfs in-process at a sub-second
+          interval for detecting short link flaps.
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import logging
+
+# Third party modules
+
+# Own modules
+
+import nagios
+
+from nagios.plugin.functions import STATUS_TEXT
+
+from nagios_plugins.clock import monotonic
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_INTERVAL = 100
+
+# Warning threshold of the link state transitions while sampling
+DEFAULT_FLAP_WARNING = '0'
+
+#==============================================================================
+def evaluate_flaps(stats, threshold, prefix = ''):
+    """
+    Evaluates the link state transitions, the time spent down and the
+    longest outage of a link found by sampling.
+
+    @param stats: the results of sampling the link
+    @type stats: LinkFlapStats or None
+    @param threshold: the threshold of the number of transitions
+    @type threshold: NagiosThreshold
+    @param prefix: the prefix of the labels of the performance data
+    @type prefix: str
+
+    @return: the state, the output and the performance data as a list
+             of dicts with the keys 'label', 'value', 'uom' and 'threshold'
+    @rtype: tuple
+
+    """
+
+    state = nagios.state.ok
+    perfdata = []
+    if stats is None or not stats.samples:
+        return (state, None, perfdata)
+
+    perfdata.append({'label': prefix + 'transitions',
+            'value': stats.transitions, 'uom': None, 'threshold': threshold})
+    perfdata.append({'label': prefix + 'down_time',
+            'value': round(stats.down_time, 3), 'uom': 's',
+            'threshold': None})
+    perfdata.append({'label': prefix + 'longest_outage',
+            'value': round(stats.longest_outage, 3), 'uom': 's',
+            'threshold': None})
+
+    if not stats.transitions:
+        return (state, None, perfdata)
+
+    msg = ("%d link transitions in %d samples, down %0.1f s, longest " +
+            "outage %0.1f s") % (stats.transitions, stats.samples,
+            stats.down_time, stats.longest_outage)
+    f_state = threshold.get_status(stats.transitions)
+    if f_state != nagios.state.ok:
+        state = f_state
+        msg += " " + STATUS_TEXT[f_state]
+
+    return (state, msg, perfdata)
+
+#==============================================================================
+class LinkFlapStats(object):
+    """
+    The transitions and outages of the link of a port or interface
+    found by sampling its state.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+
+        self.samples = 0
+        self.transitions = 0
+
+        self.down_time = 0.0
+        """
+        @ivar: the seconds, the link was down, a link is taken as down
+               from the sample, it was found down
+        @type: float
+        """
+
+        self.longest_outage = 0.0
+        """
+        @ivar: the longest outage of the link in seconds
+        @type: float
+        """
+
+        self.up = None
+        """
+        @ivar: the state of the link in the last sample
+        @type: bool or None
+        """
+
+        self.last_time = None
+        self.outage_start = None
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'samples': self.samples,
+            'transitions': self.transitions,
+            'down_time': self.down_time,
+            'longest_outage': self.longest_outage,
+            'up': self.up,
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def add(self, up, now):
+        """
+        Adds a sample of the link state.
+
+        @param up: the link is up
+        @type up: bool
+        @param now: the monotonic timestamp of the sample
+        @type now: float
+
+        """
+
+        if self.up is not None:
+            if not self.up:
+                self.down_time += now - self.last_time
+            if up != self.up:
+                self.transitions += 1
+                if up:
+                    self.longest_outage = max(self.longest_outage,
+                            now - self.outage_start)
+                    self.outage_start = None
+
+        if not up and self.outage_start is None:
+            self.outage_start = now
+
+        self.up = up
+        self.last_time = now
+        self.samples += 1
+
+    #--------------------------------------------------------------------------
+    def finish(self):
+        """
+        Takes an outage lasting until the last sample into account.
+        """
+
+        if self.outage_start is not None:
+            self.longest_outage = max(self.longest_outage,
+                    self.last_time - self.outage_start)
+
+#==============================================================================
+class LinkFlapSampler(object):
+    """
+    Polls the state attributes of links in sysfs at a fixed interval for a
+    given duration. The attributes are opened once and re-read from their
+    beginning on every sample.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, interval = DEFAULT_SAMPLE_INTERVAL / 1000.0,
+            duration = 1.0, should_shutdown = None, verbose = 0):
+        """
+        Constructor.
+
+        @param interval: the interval between two samples in seconds
+        @type interval: float
+        @param duration: the duration of sampling in seconds
+        @type duration: float
+        @param should_shutdown: a callable, which returns True, if the
+                                sampling should be canceled
+        @type should_shutdown: callable or None
+        @param verbose: verbosity level
+        @type verbose: int
+
+        """
+
+        self.interval = interval
+        self.duration = duration
+        self.should_shutdown = should_shutdown
+        self.verbose = verbose
+
+        self.targets = []
+        """
+        @ivar: the links to sample as tuples of key, reader, the file
+               descriptors of the attributes with their names as keys
+               and the callable deciding from their values, whether the
+               link is up
+        @type: list of tuple
+        """
+
+        self.stats = {}
+        """
+        @ivar: the results of the links with their keys as keys
+        @type: dict of LinkFlapStats
+        """
+
+    #--------------------------------------------------------------------------
+    def add_target(self, key, reader, rel_dir, names, is_up):
+        """
+        Adds a link to sample.
+
+        @raise SysfsError: if an attribute could not be opened
+
+        @param key: the key of the link in the results
+        @param reader: the reader of the sysfs directory of the link
+        @type reader: SysfsReader
+        @param rel_dir: the directory of the link relative to the one of
+                        the reader
+        @type rel_dir: str
+        @param names: the names of the state attributes
+        @type names: list of str
+        @param is_up: gets the values of the attributes (None for missing
+                      ones) with their names as keys and returns, whether
+                      the link is up
+        @type is_up: callable
+
+        """
+
+        fds = {}
+        for name in names:
+            fds[name] = reader.open_attr(rel_dir, name)
+        self.targets.append((key, reader, fds, is_up))
+        self.stats[key] = LinkFlapStats()
+
+    #--------------------------------------------------------------------------
+    def sample(self):
+        """
+        Takes one sample of all links.
+        """
+
+        for (key, reader, fds, is_up) in self.targets:
+            values = {}
+            for (name, fd) in fds.items():
+                values[name] = None
+                if fd is not None:
+                    values[name] = reader.reread(fd)
+            self.stats[key].add(bool(is_up(values)), monotonic())
+
+    #--------------------------------------------------------------------------
+    def run(self):
+        """
+        Samples all links for the given duration.
+
+        @return: the results with the keys of the links as keys
+        @rtype: dict of LinkFlapStats
+
+        """
+
+        begin = monotonic()
+        end = begin + self.duration
+        next_sample = begin
+
+        while True:
+            self.sample()
+            if self.should_shutdown and self.should_shutdown():
+                break
+            next_sample += self.interval
+            now = monotonic()
+            if next_sample > end:
+                break
+            if next_sample > now:
+                time.sleep(next_sample - now)
+            else:
+                # too slow, skip the missed samples
+                while next_sample < now:
+                    next_sample += self.interval
+
+        for stats in self.stats.values():
+            stats.finish()
+
+        if self.verbose > 1:
+            log.debug("Sampled %d links %d times in %0.3f seconds.",
+                    len(self.targets), self.stats and
+                    self.stats.values()[0].samples or 0, monotonic() - begin)
+
+        return self.stats
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,518 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for an offline analyzer of archived MegaCli dumps
+          (-PdList, -LdInfo and -AdpBbuCmd -GetBbuStatus) of a whole
+          fleet of storage nodes, generating a fleet wide report.
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import csv
+import time
+import fnmatch
+import logging
+import argparse
+import textwrap
+import multiprocessing
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Third party modules
+
+# Own modules
+
+from nagios_plugins.megaraid_parsers import re_pd_enc, re_ld_number
+from nagios_plugins.megaraid_parsers import re_bbu_header, BBU_PROPERTIES
+from nagios_plugins.megaraid_parsers import parse_pd_list, parse_ld_info
+from nagios_plugins.megaraid_parsers import parse_bbu_status
+from nagios_plugins.megaraid_parsers import bbu_needs_replacement
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATTERN = '*'
+DEFAULT_CHUNKSIZE = 64
+# Dumps greater than this are not MegaCli output, but something else
+MAX_DUMP_SIZE = 16 * 1024 * 1024
+
+CSV_FIELDS = ('category', 'node', 'file', 'item', 'state', 'detail')
+
+re_bbu_type = BBU_PROPERTIES[0][1]
+
+#==============================================================================
+def analyze_dump(args):
+    """
+    Parses a single dump file. This function is executed in the worker
+    processes of the process pool, so it returns only a small summary
+    instead of the complete parser results.
+
+    @param args: a tuple with the node name and the path of the dump file
+    @type args: tuple
+
+    @return: a dict with the keys 'node', 'file', 'kinds', 'drives',
+             'lds', 'bbus' and 'error'
+    @rtype: dict
+
+    """
+
+    (node, path) = args
+    result = {
+        'node': node,
+        'file': path,
+        'kinds': [],
+        'drives': [],
+        'lds': [],
+        'bbus': [],
+        'error': None,
+    }
+
+    try:
+        if os.path.getsize(path) > MAX_DUMP_SIZE:
+            result['error'] = 'file too big'
+            return result
+        fh = open(path, 'rb')
+        try:
+            output = fh.read()
+        finally:
+            fh.close()
+    except (IOError, OSError), e:
+        result['error'] = str(e)
+        return result
+
+    # A dump may contain the output of more than one MegaCli command
+    if find_line(re_pd_enc, output):
+        result['kinds'].append('pd')
+        for drive in parse_pd_list(output):
+            result['drives'].append({
+                'pd_id': drive['pd_id'],
+                'fw_state': drive['fw_state'],
+                'media_errors': drive['media_errors'],
+                'other_errors': drive['other_errors'],
+                'predictive_failures': drive['predictive_failures'],
+            })
+
+    if find_line(re_ld_number, output):
+        result['kinds'].append('ld')
+        for ld in parse_ld_info(output):
+            result['lds'].append({
+                'ld_number': ld['ld_number'],
+                'raid_level': ld['raid_level'],
+                'state': ld['state'],
+            })
+
+    if find_line(re_bbu_header, output) or find_line(re_bbu_type, output):
+        result['kinds'].append('bbu')
+        bbu = parse_bbu_status(output)
+        result['bbus'].append({
+            'batt_type': bbu['batt_type'],
+            'batt_state': bbu['batt_state'],
+            'replace': bbu_needs_replacement(bbu),
+        })
+
+    if not result['kinds']:
+        result['error'] = 'no MegaCli output found'
+
+    return result
+
+#==============================================================================
+def find_line(regex, output):
+    """
+    Searches linewise for the given regular expression in the output,
+    because all parser regexes are anchored at the beginning of a line.
+
+    @return: the line matching the regex or None
+    @rtype: str or None
+
+    """
+
+    for line in output.splitlines():
+        if regex.search(line):
+            return line
+    return None
+
+#==============================================================================
+class MegaRaidFleetReport(object):
+    """
+    Collects the summaries of analyze_dump() into a fleet wide report.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor.
+        """
+
+        self.files_total = 0
+        self.files_failed = []
+        self.nodes = set()
+        self.drives_total = 0
+        self.drives_by_fw_state = {}
+        self.drives_with_errors = []
+        self.lds_total = 0
+        self.lds_not_optimal = []
+        self.bbus_total = 0
+        self.bbus_to_replace = []
+
+    #--------------------------------------------------------------------------
+    def add(self, result):
+        """
+        Adds the summary of a single dump file to the report.
+
+        @param result: the result of analyze_dump()
+        @type result: dict
+
+        """
+
+        node = result['node']
+        path = result['file']
+        self.files_total += 1
+
+        if result['error']:
+            self.files_failed.append({'node': node, 'file': path,
+                    'error': result['error']})
+            return
+
+        self.nodes.add(node)
+
+        for drive in result['drives']:
+            self.drives_total += 1
+            fw_state = drive['fw_state'] or 'unknown'
+            self.drives_by_fw_state[fw_state] = self.drives_by_fw_state.get(
+                    fw_state, 0) + 1
+            if (drive['media_errors'] or drive['other_errors'] or
+                    drive['predictive_failures']):
+                d = {'node': node, 'file': path}
+                d.update(drive)
+                self.drives_with_errors.append(d)
+
+        for ld in result['lds']:
+            self.lds_total += 1
+            if not ld['state'] or ld['state'].lower() != 'optimal':
+                d = {'node': node, 'file': path}
+                d.update(ld)
+                self.lds_not_optimal.append(d)
+
+        for bbu in result['bbus']:
+            self.bbus_total += 1
+            if bbu['replace']:
+                d = {'node': node, 'file': path}
+                d.update(bbu)
+                self.bbus_to_replace.append(d)
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        def sort_key(d):
+            return (d['node'], d['file'])
+
+        d = {
+            'summary': {
+                'files_total': self.files_total,
+                'files_failed': len(self.files_failed),
+                'nodes_total': len(self.nodes),
+                'drives_total': self.drives_total,
+                'drives_with_errors': len(self.drives_with_errors),
+                'lds_total': self.lds_total,
+                'lds_not_optimal': len(self.lds_not_optimal),
+                'bbus_total': self.bbus_total,
+                'bbus_to_replace': len(self.bbus_to_replace),
+            },
+            'drives_by_fw_state': self.drives_by_fw_state,
+            'drives_with_errors': sorted(self.drives_with_errors, key = sort_key),
+            'lds_not_optimal': sorted(self.lds_not_optimal, key = sort_key),
+            'bbus_to_replace': sorted(self.bbus_to_replace, key = sort_key),
+            'files_failed': sorted(self.files_failed, key = sort_key),
+        }
+
+        return d
+
+    #--------------------------------------------------------------------------
+    def csv_rows(self):
+        """
+        Generates the findings of the report as rows for a CSV file
+        with the fields of CSV_FIELDS.
+
+        @return: the rows as dicts
+        @rtype: list of dict
+
+        """
+
+        d = self.as_dict()
+        rows = []
+
+        for fw_state in sorted(d['drives_by_fw_state'].keys()):
+            rows.append({'category': 'fw_state', 'node': '', 'file': '',
+                    'item': '', 'state': fw_state,
+                    'detail': d['drives_by_fw_state'][fw_state]})
+
+        for drive in d['drives_with_errors']:
+            detail = "%d media errors, %d other errors, %d predictive failures" % (
+                    drive['media_errors'], drive['other_errors'],
+                    drive['predictive_failures'])
+            rows.append({'category': 'drive_errors', 'node': drive['node'],
+                    'file': drive['file'], 'item': drive['pd_id'],
+                    'state': drive['fw_state'], 'detail': detail})
+
+        for ld in d['lds_not_optimal']:
+            item = ''
+            if ld['ld_number'] is not None:
+                item = 'LD %d' % (ld['ld_number'])
+            detail = ''
+            if ld['raid_level'] is not None:
+                detail = 'RAID-%d' % (ld['raid_level'])
+            rows.append({'category': 'ld_not_optimal', 'node': ld['node'],
+                    'file': ld['file'], 'item': item,
+                    'state': ld['state'], 'detail': detail})
+
+        for bbu in d['bbus_to_replace']:
+            rows.append({'category': 'bbu_replace', 'node': bbu['node'],
+                    'file': bbu['file'], 'item': bbu['batt_type'],
+                    'state': bbu['batt_state'],
+                    'detail': ', '.join(bbu['replace'])})
+
+        for failed in d['files_failed']:
+            rows.append({'category': 'file_failed', 'node': failed['node'],
+                    'file': failed['file'], 'item': '', 'state': '',
+                    'detail': failed['error']})
+
+        return rows
+
+#==============================================================================
+class MegaRaidFleetAnalyzer(object):
+    """
+    Application class for walking a directory tree with archived MegaCli
+    dumps, parsing them in parallel with a process pool and writing
+    a fleet wide report as JSON or CSV.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the MegaRaidFleetAnalyzer class.
+        """
+
+        self.args = None
+        self.report = MegaRaidFleetReport()
+
+        usage = """\
+                %(prog)s [-v] [-j <jobs>] [-p <pattern>] [-f json|csv]
+                                      [-o <output file>] <directory> [<directory> ...]
+                """
+        usage = textwrap.dedent(usage).strip()
+
+        desc = ("Walks the given directory trees with archived MegaCli dumps " +
+                "(-PdList, -LdInfo, -AdpBbuCmd -GetBbuStatus) and writes " +
+                "a fleet wide report. The node name of a dump is the first " +
+                "directory below the given directory, or the file name " +
+                "without extension, if the dump is directly located there.")
+
+        self.argparser = argparse.ArgumentParser(
+                usage = usage,
+                description = desc,
+        )
+
+        self._add_args()
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.argparser.add_argument(
+                '-v', '--verbose',
+                action = 'count',
+                dest = 'verbose',
+                default = 0,
+                help = 'Increase the verbosity level',
+        )
+
+        self.argparser.add_argument(
+                '-j', '--jobs',
+                metavar = 'JOBS',
+                dest = 'jobs',
+                type = int,
+                default = multiprocessing.cpu_count(),
+                help = ("The number of parallel worker processes " +
+                        "(Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '-p', '--pattern',
+                metavar = 'PATTERN',
+                dest = 'pattern',
+                default = DEFAULT_PATTERN,
+                help = ("A shell pattern for the names of the dump files " +
+                        "(Default: %(default)r)."),
+        )
+
+        self.argparser.add_argument(
+                '-f', '--format',
+                dest = 'format',
+                choices = ('json', 'csv'),
+                default = 'json',
+                help = "The format of the report (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '-o', '--output',
+                metavar = 'FILE',
+                dest = 'output',
+                help = "The file to write the report to (Default: STDOUT).",
+        )
+
+        self.argparser.add_argument(
+                'directories',
+                metavar = 'DIRECTORY',
+                nargs = '+',
+                help = "The directories with the archived MegaCli dumps.",
+        )
+
+    #--------------------------------------------------------------------------
+    def collect_dumps(self):
+        """
+        Walks the directory trees and generates the dump files to analyze.
+
+        @return: tuples of the node name and the path of the dump file
+        @rtype: iterator of tuple
+
+        """
+
+        for top in self.args.directories:
+            top = os.path.abspath(top)
+            for (dirpath, dirnames, filenames) in os.walk(top):
+                dirnames.sort()
+                rel_dir = os.path.relpath(dirpath, top)
+                node = None
+                if rel_dir != os.curdir:
+                    node = rel_dir.split(os.sep)[0]
+                for filename in sorted(filenames):
+                    if not fnmatch.fnmatch(filename, self.args.pattern):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    if node is None:
+                        yield (os.path.splitext(filename)[0], path)
+                    else:
+                        yield (node, path)
+
+    #--------------------------------------------------------------------------
+    def analyze(self):
+        """
+        Parses all dump files in the process pool and collects the results.
+        """
+
+        jobs = max(self.args.jobs, 1)
+        begin = time.time()
+
+        if jobs == 1:
+            results = (analyze_dump(dump) for dump in self.collect_dumps())
+            for result in results:
+                self.report.add(result)
+        else:
+            pool = multiprocessing.Pool(processes = jobs)
+            try:
+                results = pool.imap_unordered(analyze_dump,
+                        self.collect_dumps(), DEFAULT_CHUNKSIZE)
+                for result in results:
+                    self.report.add(result)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+        log.info("Analyzed %d files in %0.2f seconds.",
+                self.report.files_total, (time.time() - begin))
+
+    #--------------------------------------------------------------------------
+    def write_report(self, fh):
+        """
+        Writes the report in the requested format.
+
+        @param fh: the file object to write to
+        @type fh: file
+
+        """
+
+        if self.args.format == 'csv':
+            writer = csv.DictWriter(fh, CSV_FIELDS)
+            writer.writerow(dict((f, f) for f in CSV_FIELDS))
+            for row in self.report.csv_rows():
+                writer.writerow(row)
+            return
+
+        json.dump(self.report.as_dict(), fh, indent = 2, sort_keys = True)
+        fh.write('\n')
+
+    #--------------------------------------------------------------------------
+    def __call__(self, args = None):
+        """
+        Method to call the application directly.
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        @return: the exit code
+        @rtype: int
+
+        """
+
+        self.args = self.argparser.parse_args(args)
+
+        level = logging.WARNING
+        if self.args.verbose > 1:
+            level = logging.DEBUG
+        elif self.args.verbose:
+            level = logging.INFO
+        logging.basicConfig(level = level,
+                format = '[%(asctime)s]: %(levelname)s - %(message)s')
+
+        for top in self.args.directories:
+            if not os.path.isdir(top):
+                sys.stderr.write("Directory %r doesn't exists.\n" % (top))
+                return 1
+
+        self.analyze()
+
+        if self.args.output:
+            fh = open(self.args.output, 'wb')
+            try:
+                self.write_report(fh)
+            finally:
+                fh.close()
+        else:
+            self.write_report(sys.stdout)
+
+        return 0
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
@@ -0,0 +1,430 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Parsers for the output of the LSI MegaCli command. They are
+          independent of the Nagios plugin machinery, so they can be used
+          as a library, e.g. for analyzing archived MegaCli dumps.
+"""
+
+# Standard modules
+import re
+import logging
+
+# Third party modules
+
+# Own modules
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+re_exit_code = re.compile(r'^\s*Exit\s*Code\s*:\s+0x([0-9a-f]+)', re.IGNORECASE)
+re_no_adapter = re.compile(r'^\s*User\s+specified\s+controller\s+is\s+not\s+present',
+        re.IGNORECASE)
+
+# Rebuild Rate                     : 30%
+re_adp_property = re.compile(r'^\s*([^:]*\S)\s*:\s*(\S.*)?$')
+
+#------------------------
+# -PdList
+
+# Enclosure Device ID: 0
+re_pd_enc = re.compile(r'^\s*Enclosure\s+Device\s+ID\s*:\s*(\d+)', re.IGNORECASE)
+# Slot Number: 23
+re_pd_slot = re.compile(r'^\s*Slot\s+Number\s*:\s*(\d+)', re.IGNORECASE)
+# Device Id: 6
+re_pd_dev_id = re.compile(r'^\s*Device\s+Id\s*:\s*(\d+)', re.IGNORECASE)
+# Media Error Count: 0
+re_pd_media_errors = re.compile(r'^\s*Media\s+Error\s+Count\s*:\s*(\d+)', re.IGNORECASE)
+# Other Error Count: 0
+re_pd_other_errors = re.compile(r'^\s*Other\s+Error\s+Count\s*:\s*(\d+)', re.IGNORECASE)
+# Predictive Failure Count: 0
+re_pd_pred_failures = re.compile(r'^\s*Predictive\s+Failure\s+Count\s*:\s*(\d+)', re.IGNORECASE)
+# Firmware state: Online, Spun Up
+re_pd_fw_state = re.compile(r'^\s*Firmware\s+state\s*:\s*(\S+.*)', re.IGNORECASE)
+# Foreign State: None
+re_pd_foreign_state = re.compile(r'^\s*Foreign\s+state\s*:\s*(\S+.*)', re.IGNORECASE)
+
+#------------------------
+# -LdInfo
+
+# Adapter 0: Virtual Drive 55 Does not Exist.
+re_ld_not_exists = re.compile(r'^.*Virtual\s+Drive\s+\d+\s+Does\s+not\s+Exist\.',
+        re.IGNORECASE)
+# Virtual Drive: 0 (Target Id: 0)
+re_ld_number = re.compile(r'^\s*Virtual\s+Drive\s*:\s*(\d+)', re.IGNORECASE)
+# RAID Level          : Primary-1, Secondary-0, RAID Level Qualifier-0
+re_ld_raid_level = re.compile(r'^\s*RAID\s+Level\s*:\s+Primary-(\d+)',
+        re.IGNORECASE)
+# Size                : 2.728 TB
+re_ld_size = re.compile(r'^\s*Size\s*:\s+(\d+(?:\.\d*)?)\s*(\S+)?',
+        re.IGNORECASE)
+# State               : Optimal
+re_ld_state = re.compile(r'^\s*State\s*:\s+(\S+)', re.IGNORECASE)
+#Number Of Drives    : 2
+re_ld_pd_number = re.compile(r'^\s*Number\s+Of\s+Drives\s*:\s+(\d+)',
+        re.IGNORECASE)
+# Span Depth          : 1
+re_ld_span = re.compile(r'^\s*Span\s+Depth\s*:\s+(\d+)', re.IGNORECASE)
+# Is VD Cached: Yes
+# Is VD Cached: No
+re_ld_cached = re.compile(r'^\s*Is\s+VD\s+Cached\s*:\s+(\S+)',
+        re.IGNORECASE)
+# Check Consistency: Completed 95%, Taken 8 min
+re_ld_consist = re.compile(r'Check\s+Consistency\s*:\s+Completed\s+(\d+)%,\s+Taken\s+(\d+)\s*min',
+        re.IGNORECASE)
+
+#------------------------
+# -AdpBbuCmd -GetBbuStatus
+
+# The BBU properties: (key in result, regex, lowercase value)
+BBU_PROPERTIES = (
+    ('batt_type', re.compile(r'^\s*BatteryType\s*:\s*(\S+.*)', re.IGNORECASE), False),
+    ('batt_state', re.compile(r'^\s*Battery\s*State\s*:\s*(\S+.*)', re.IGNORECASE), False),
+    ('voltage', re.compile(r'^\s*Voltage\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('temperature', re.compile(r'^\s*Temperature\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('lc_req', re.compile(r'^\s*Learn\s+Cycle\s+Requested\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('lc_act', re.compile(r'^\s*Learn\s+Cycle\s+Active\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('lc_state', re.compile(r'^\s*Learn\s+Cycle\s+Status\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('lc_timeout', re.compile(r'^\s*Learn\s+Cycle\s+Timeout\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('i2c_err', re.compile(r'^\s*I2c\s+Errors\s+Detected\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('bbu_miss', re.compile(r'^\s*Battery\s+Pack\s+Missing\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('bbu_replace', re.compile(r'^\s*Battery\s+Replacement\s+required\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('capac_low', re.compile(r'^\s*Remaining\s+Capacity\s+Low\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('per_learn', re.compile(r'^\s*Periodic\s+Learn\s+Required\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('trans_learn', re.compile(r'^\s*Transparent\s+Learn\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('no_space', re.compile(r'^\s*No\s+space\s+to\s+cache\s+offload\s*:\s+(\S+)', re.IGNORECASE), True),
+    ('pack_fail', re.compile(r'^\s*Pack\s+is\s+about\s+to\s+fail\s+.*:\s+(\S+)', re.IGNORECASE), True),
+    ('micro_upd', re.compile(r'^\s*Module\s+microcode\s+update\s+required\s*:\s+(\S+)', re.IGNORECASE), True),
+)
+
+# BBU status for Adapter: 0
+re_bbu_header = re.compile(r'^\s*BBU\s+status\s+for\s+Adapter\s*:\s*(\d+)', re.IGNORECASE)
+
+#==============================================================================
+def parse_exit_code(output):
+    """
+    Searches the output of MegaCli for the exit code.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: the extracted exit code, or None, if not found
+    @rtype: int or None
+
+    """
+
+    exit_code = None
+    for line in output.splitlines():
+        match = re_exit_code.search(line)
+        if match:
+            exit_code = int(match.group(1), 16)
+
+    return exit_code
+
+#==============================================================================
+def parse_adapter_properties(output):
+    """
+    Collects all 'Key : Value' lines of the output of 'MegaCli -AdpAllInfo'.
+    Whitespace in the keys is normalized to single blanks. If a key occurs
+    multiple times, the first occurence wins.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: all found adapter properties
+    @rtype: dict
+
+    """
+
+    properties = {}
+    for line in output.splitlines():
+
+        match = re_adp_property.search(line)
+        if not match:
+            continue
+
+        key = ' '.join(match.group(1).split())
+        if key in properties or re_exit_code.search(line):
+            continue
+        value = match.group(2)
+        if value is None:
+            value = ''
+        properties[key] = value.strip()
+
+    return properties
+
+#==============================================================================
+def parse_pd_list(output):
+    """
+    Parses the output of 'MegaCli -PdList' into a list of physical drives.
+    Only drives with an enclosure ID and a slot number are taken.
+
+    Every drive is a dict with the keys 'pd_id' (e.g. '[32:4]'), 'enclosure',
+    'slot', 'dev_id', 'media_errors', 'other_errors', 'predictive_failures',
+    'fw_state' and 'foreign_state'.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: the found physical drives in the order of the output
+    @rtype: list of dict
+
+    """
+
+    drives = []
+    cur_dev = None
+
+    def append_dev(dev):
+        if ('enclosure' in dev) and ('slot' in dev):
+            dev['pd_id'] = '[%d:%d]' % (dev['enclosure'], dev['slot'])
+            drives.append(dev)
+
+    for line in output.splitlines():
+
+        line = line.strip()
+        m = re_pd_enc.search(line)
+        if m:
+            if cur_dev:
+                append_dev(cur_dev)
+            cur_dev = {
+                    'enclosure': int(m.group(1)),
+                    'media_errors': 0,
+                    'other_errors': 0,
+                    'predictive_failures': 0,
+                    'fw_state': None,
+                    'foreign_state': None,
+            }
+            continue
+
+        if not cur_dev:
+            continue
+
+        m = re_pd_slot.search(line)
+        if m:
+            cur_dev['slot'] = int(m.group(1))
+            continue
+
+        m = re_pd_dev_id.search(line)
+        if m:
+            cur_dev['dev_id'] = int(m.group(1))
+            continue
+
+        m = re_pd_media_errors.search(line)
+        if m:
+            cur_dev['media_errors'] = int(m.group(1))
+            continue
+
+        m = re_pd_other_errors.search(line)
+        if m:
+            cur_dev['other_errors'] = int(m.group(1))
+            continue
+
+        m = re_pd_pred_failures.search(line)
+        if m:
+            cur_dev['predictive_failures'] = int(m.group(1))
+            continue
+
+        m = re_pd_fw_state.search(line)
+        if m:
+            cur_dev['fw_state'] = m.group(1)
+            continue
+
+        m = re_pd_foreign_state.search(line)
+        if m:
+            cur_dev['foreign_state'] = m.group(1)
+            continue
+
+    if cur_dev:
+        append_dev(cur_dev)
+
+    return drives
+
+#==============================================================================
+def ld_not_exists(output):
+    """
+    Checks the output of 'MegaCli -LdInfo' for the message, that the
+    requested logical drive doesn't exists.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: the found error message line or None
+    @rtype: str or None
+
+    """
+
+    for line in output.splitlines():
+        line = line.strip()
+        if re_ld_not_exists.search(line):
+            return line
+
+    return None
+
+#==============================================================================
+def parse_ld_info(output):
+    """
+    Parses the output of 'MegaCli -LdInfo' into a list of logical drives.
+
+    Every logical drive is a dict with the keys 'ld_number', 'raid_level',
+    'size_val', 'size_unit', 'state', 'pd_number', 'span_depth', 'cached',
+    'consist_percent' and 'consist_min'. Not found values are None.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: the found logical drives in the order of the output
+    @rtype: list of dict
+
+    """
+
+    lds = []
+    cur_ld = None
+
+    def new_ld(ld_number = None):
+        ld = {
+            'ld_number': ld_number,
+            'raid_level': None,
+            'size_val': None,
+            'size_unit': None,
+            'state': None,
+            'pd_number': None,
+            'span_depth': None,
+            'cached': None,
+            'consist_percent': None,
+            'consist_min': None,
+        }
+        lds.append(ld)
+        return ld
+
+    for line in output.splitlines():
+
+        line = line.strip()
+
+        match = re_ld_number.search(line)
+        if match:
+            cur_ld = new_ld(int(match.group(1)))
+            continue
+
+        match = re_ld_raid_level.search(line)
+        if match:
+            if cur_ld is None:
+                cur_ld = new_ld()
+            cur_ld['raid_level'] = int(match.group(1))
+            continue
+
+        match = re_ld_size.search(line)
+        if match:
+            if cur_ld is None:
+                cur_ld = new_ld()
+            cur_ld['size_val'] = float(match.group(1))
+            cur_ld['size_unit'] = match.group(2)
+            continue
+
+        match = re_ld_state.search(line)
+        if match:
+            if cur_ld is None:
+                cur_ld = new_ld()
+            cur_ld['state'] = match.group(1)
+            continue
+
+        if cur_ld is None:
+            continue
+
+        match = re_ld_pd_number.search(line)
+        if match:
+            cur_ld['pd_number'] = int(match.group(1))
+            continue
+
+        match = re_ld_span.search(line)
+        if match:
+            cur_ld['span_depth'] = int(match.group(1))
+            continue
+
+        match = re_ld_cached.search(line)
+        if match:
+            cur_ld['cached'] = match.group(1)
+
+        match = re_ld_consist.search(line)
+        if match:
+            cur_ld['consist_percent'] = int(match.group(1))
+            cur_ld['consist_min'] = int(match.group(2))
+
+    return lds
+
+#==============================================================================
+def parse_bbu_status(output):
+    """
+    Parses the output of 'MegaCli -AdpBbuCmd -GetBbuStatus'.
+
+    The result is a dict with the keys from BBU_PROPERTIES. 'batt_type'
+    defaults to 'unknown', all other not found values are None. All values
+    except 'batt_type' and 'batt_state' are lowercased.
+
+    @param output: the output of MegaCli on StdOut
+    @type output: str
+
+    @return: the found BBU properties
+    @rtype: dict
+
+    """
+
+    bbu = {}
+    for (key, regex, lower) in BBU_PROPERTIES:
+        bbu[key] = None
+    bbu['batt_type'] = 'unknown'
+
+    for line in output.splitlines():
+
+        line = line.strip()
+
+        for (key, regex, lower) in BBU_PROPERTIES:
+            match = regex.search(line)
+            if match:
+                value = match.group(1)
+                if lower:
+                    value = value.lower()
+                bbu[key] = value
+                break
+
+    return bbu
+
+#==============================================================================
+def bbu_needs_replacement(bbu):
+    """
+    Evaluates the result of parse_bbu_status(), whether the BBU has to be
+    replaced.
+
+    @param bbu: the result of parse_bbu_status()
+    @type bbu: dict
+
+    @return: a list of reasons for a replacement, empty if not necessary
+    @rtype: list of str
+
+    """
+
+    reasons = []
+    if bbu['bbu_miss'] and bbu['bbu_miss'] != 'no':
+        reasons.append('Battery Pack Missing')
+    if bbu['bbu_replace'] and bbu['bbu_replace'] != 'no':
+        reasons.append('Battery Replacement required')
+    if bbu['pack_fail'] and bbu['pack_fail'] != 'no':
+        reasons.append('Pack is about to fail')
+
+    return reasons
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
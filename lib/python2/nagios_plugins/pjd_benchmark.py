@@ -0,0 +1,344 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a load benchmark of the PPD and VCB checks, either
+          by forking the check plugins for every probe or by probing
+          in-process like the fleet mode, reporting the probes per second
+          and latency percentiles.
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import logging
+import argparse
+import textwrap
+import subprocess
+
+# Third party modules
+
+# Own modules
+
+import nagios
+
+from nagios_plugins.pjd_transport import PjdProbe
+from nagios_plugins.pjd_transport import PjdProbeLoop
+from nagios_plugins.pjd_transport import DEFAULT_CONCURRENCY
+
+from nagios_plugins.check_pjd_instance import percentile
+
+from nagios_plugins.check_ppd_instance import CheckPpdInstancePlugin
+from nagios_plugins.check_vcb_instance import CheckVcbInstancePlugin
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PROBES = 1000
+DEFAULT_TIMEOUT = 10
+
+DAEMONS = {
+    'ppd': (CheckPpdInstancePlugin, 'check-ppd-instance'),
+    'vcb': (CheckVcbInstancePlugin, 'check-vcb-instance'),
+}
+
+PERCENTILES = (50, 90, 99)
+
+#==============================================================================
+class PjdProbeBenchmark(object):
+    """
+    Application class for running many probes against PPD or VCB instances,
+    usually a local stand-in server, and reporting the throughput and
+    the latency percentiles.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the PjdProbeBenchmark class.
+        """
+
+        self.args = None
+
+        self.latencies = []
+        self.failed = 0
+        self.duration = None
+
+        usage = """\
+                %(prog)s [-v] [-d ppd|vcb] [-m fleet|plugin] [-H <address>]
+                                      [-P <port>] [-n <port count>] [-N <probes>]
+                                      [-c <concurrency>] [-t <timeout>]
+                """
+        usage = textwrap.dedent(usage).strip()
+
+        desc = ("Runs many probes against PPD or VCB instances (e.g. a " +
+                "local stand-in server, see pjd-standin-server) and " +
+                "reports the probes per second and the latency " +
+                "percentiles. In 'fleet' mode the probes are done " +
+                "in-process like the fleet mode of the checks, in " +
+                "'plugin' mode the check plugin is forked for every probe.")
+
+        self.argparser = argparse.ArgumentParser(
+                usage = usage,
+                description = desc,
+        )
+
+        self._add_args()
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.argparser.add_argument(
+                '-v', '--verbose',
+                action = 'count',
+                dest = 'verbose',
+                default = 0,
+                help = 'Increase the verbosity level',
+        )
+
+        self.argparser.add_argument(
+                '-d', '--daemon',
+                dest = 'daemon',
+                choices = sorted(DAEMONS.keys()),
+                default = 'ppd',
+                help = "The kind of the probed daemon (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '-m', '--mode',
+                dest = 'mode',
+                choices = ('fleet', 'plugin'),
+                default = 'fleet',
+                help = "The kind of probing (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '-H', '--host-address',
+                metavar = 'ADDRESS',
+                dest = 'host_address',
+                default = DEFAULT_HOST,
+                help = "The address of the probed daemons (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '-P', '--port',
+                metavar = 'PORT',
+                dest = 'port',
+                type = int,
+                help = ("The (first) TCP port of the probed daemons " +
+                        "(Default: the port of the daemon)."),
+        )
+
+        self.argparser.add_argument(
+                '-n', '--port-count',
+                metavar = 'COUNT',
+                dest = 'port_count',
+                type = int,
+                default = 1,
+                help = ("The number of consecutive ports, the probes are " +
+                        "distributed over (Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '-N', '--probes',
+                metavar = 'NUMBER',
+                dest = 'probes',
+                type = int,
+                default = DEFAULT_PROBES,
+                help = "The total number of probes (Default: %(default)d).",
+        )
+
+        self.argparser.add_argument(
+                '-c', '--concurrency',
+                metavar = 'NUMBER',
+                dest = 'concurrency',
+                type = int,
+                help = ("The maximum number of concurrent probes (Default: " +
+                        ("%d in fleet mode, the number of CPUs in plugin " +
+                        "mode).") % (DEFAULT_CONCURRENCY)),
+        )
+
+        self.argparser.add_argument(
+                '-t', '--timeout',
+                metavar = 'SECONDS',
+                dest = 'timeout',
+                type = float,
+                default = DEFAULT_TIMEOUT,
+                help = "The timeout of a single probe (Default: %(default)s).",
+        )
+
+    #--------------------------------------------------------------------------
+    def targets(self, port):
+        """
+        Generates the host addresses and ports of all probes.
+        """
+
+        count = max(self.args.port_count, 1)
+        for i in range(self.args.probes):
+            yield (self.args.host_address, port + (i % count))
+
+    #--------------------------------------------------------------------------
+    def run_fleet(self, plugin, port):
+        """
+        Runs the probes in-process with an event loop.
+        """
+
+        concurrency = self.args.concurrency or DEFAULT_CONCURRENCY
+        xml = plugin.get_request_xml()
+
+        def probes():
+            for (host_address, p) in self.targets(port):
+                yield PjdProbe(host_address, p, xml,
+                        timeout = self.args.timeout,
+                        daemon_name = plugin.daemon_name,
+                        is_final_line = plugin.is_final_line)
+
+        def finished(probe):
+            if probe.error is not None:
+                self.failed += 1
+                log.debug("Probe failed: %s", probe.error)
+                return
+            (state, out, perfdata) = plugin.evaluate(probe.host_address, probe.port,
+                    result = plugin.finish_reply(probe.reply))
+            if state != nagios.state.ok:
+                self.failed += 1
+                log.debug("Probe not OK: %s", out)
+            self.latencies.append(probe.duration)
+
+        loop = PjdProbeLoop(concurrency = concurrency)
+        loop.run(probes(), callback = finished)
+
+    #--------------------------------------------------------------------------
+    def run_plugin(self, script, port):
+        """
+        Runs the probes by forking the check plugin for every probe.
+        """
+
+        concurrency = self.args.concurrency
+        if not concurrency:
+            try:
+                import multiprocessing
+                concurrency = multiprocessing.cpu_count()
+            except (ImportError, NotImplementedError):
+                concurrency = 1
+
+        targets = self.targets(port)
+        running = []
+        devnull = open(os.devnull, 'w')
+        try:
+            exhausted = False
+            while running or not exhausted:
+                while not exhausted and len(running) < concurrency:
+                    try:
+                        (host_address, port) = targets.next()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    cmd = [sys.executable, script, '-H', host_address,
+                            '-P', str(port), '-t', str(int(self.args.timeout)),
+                            '--no-resolver-cache']
+                    proc = subprocess.Popen(cmd, stdout = devnull,
+                            stderr = devnull, close_fds = True)
+                    running.append((proc, time.time()))
+
+                still_running = []
+                for (proc, begin) in running:
+                    if proc.poll() is None:
+                        still_running.append((proc, begin))
+                        continue
+                    if proc.returncode != 0:
+                        self.failed += 1
+                    else:
+                        self.latencies.append(time.time() - begin)
+                running = still_running
+                if running:
+                    time.sleep(0.001)
+        finally:
+            devnull.close()
+
+    #--------------------------------------------------------------------------
+    def report(self):
+        """
+        Writes the results of the benchmark to stdout.
+        """
+
+        self.latencies.sort()
+        total = len(self.latencies) + self.failed
+        print "Mode:        %s (%s)" % (self.args.mode, self.args.daemon)
+        print "Probes:      %d (%d failed)" % (total, self.failed)
+        print "Duration:    %0.3f s" % (self.duration)
+        if self.duration > 0:
+            print "Throughput:  %0.1f probes/s" % (total / self.duration)
+        if not self.latencies:
+            return
+        for pct in PERCENTILES:
+            print "Latency p%-3d %0.2f ms" % (pct,
+                    percentile(self.latencies, pct) * 1000)
+        print "Latency max  %0.2f ms" % (self.latencies[-1] * 1000)
+
+    #--------------------------------------------------------------------------
+    def __call__(self, args = None):
+        """
+        Method to call the application directly.
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        @return: the exit code
+        @rtype: int
+
+        """
+
+        self.args = self.argparser.parse_args(args)
+
+        level = logging.WARNING
+        if self.args.verbose > 1:
+            level = logging.DEBUG
+        elif self.args.verbose:
+            level = logging.INFO
+        logging.basicConfig(level = level,
+                format = '[%(asctime)s]: %(levelname)s - %(message)s')
+
+        (plugin_class, script) = DAEMONS[self.args.daemon]
+        plugin = plugin_class()
+        port = self.args.port or plugin.port
+
+        begin = time.time()
+        if self.args.mode == 'fleet':
+            self.run_fleet(plugin, port)
+        else:
+            bindir = os.path.dirname(os.path.abspath(sys.argv[0]))
+            script = os.path.join(bindir, script)
+            if not os.path.exists(script):
+                sys.stderr.write("Check plugin %r not found.\n" % (script))
+                return 1
+            self.run_plugin(script, port)
+        self.duration = time.time() - begin
+
+        self.report()
+
+        if self.failed:
+            return 1
+        return 0
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
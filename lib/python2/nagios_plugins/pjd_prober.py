@@ -0,0 +1,524 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a resident prober of provisioning daemons (PPD or VCB),
+          which probes a list of daemons on a fixed schedule, keeps the
+          connections open where the daemon allows it, reconnects with
+          backoff and saves the latest results to a state file for
+          the --from-prober mode of the checks.
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import logging
+import tempfile
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Third party modules
+
+# Own modules
+
+import nagios
+
+from nagios_plugins.pjd_transport import PjdProbe
+from nagios_plugins.pjd_transport import PjdProbeLoop
+from nagios_plugins.pjd_transport import connection_reusable
+
+from nagios_plugins.clock import monotonic
+
+from nagios_plugins.state_files import open_trusted
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.2'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL = 30
+DEFAULT_MAX_BACKOFF = 300
+
+# A result older than this number of probe intervals is outdated
+MAX_AGE_INTERVALS = 3
+
+#==============================================================================
+def state_key(host_address, port):
+    """
+    The key of the result of the given daemon in the state file.
+    """
+
+    return "%s|%d" % (host_address, port)
+
+#==============================================================================
+def read_prober_state(state_file):
+    """
+    Reads the state file of a prober. It is only trusted, if nobody else
+    than the plugin user could have written it (see open_trusted()).
+
+    @raise IOError: if the state file could not be read or is not trusted
+    @raise ValueError: if the state file is broken
+
+    @param state_file: the state file of the prober
+    @type state_file: str
+
+    @return: the state with the keys 'daemon', 'pid', 'interval', 'updated'
+             and 'results' (the latest results with the keys from
+             state_key())
+    @rtype: dict
+
+    """
+
+    fh = open_trusted(state_file)
+    try:
+        state = json.load(fh)
+    finally:
+        fh.close()
+
+    if not isinstance(state, dict) or not isinstance(
+            state.get('results'), dict):
+        raise ValueError("Invalid content of the state file.")
+
+    return state
+
+#==============================================================================
+class PjdProberTarget(object):
+    """
+    A daemon probed by the prober with its open connection and the
+    counters of its connections.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, host_address, port):
+        """
+        Constructor.
+
+        @param host_address: the DNS name or IP address of the host,
+                             running the daemon
+        @type host_address: str
+        @param port: the TCP port of the daemon on the host
+        @type port: int
+
+        """
+
+        self.host_address = host_address
+        self.port = port
+
+        self.sock = None
+        """
+        @ivar: the open connection of the last probe for reuse
+        @type: socket.socket or None
+        """
+
+        self.probes = 0
+        self.connects = 0
+
+        self.reconnects = 0
+        """
+        @ivar: the number of connections established again after a
+               kept-alive connection was lost (e.g. closed by the daemon)
+        @type: int
+        """
+
+        self.lost_connection = False
+        """
+        @ivar: the kept-alive connection was lost and the next established
+               connection is a reconnect
+        @type: bool
+        """
+
+        self.failures = 0
+        """
+        @ivar: the number of consecutive failed connection attempts
+        @type: int
+        """
+
+        self.skip_rounds = 0
+        """
+        @ivar: the number of rounds to skip before the next connection
+               attempt (backoff)
+        @type: int
+        """
+
+        self.last_error = None
+        self.result = None
+
+    #------------------------------------------------------------
+    @property
+    def key(self):
+        """The key of the result in the state file."""
+        return state_key(self.host_address, self.port)
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'host_address': self.host_address,
+            'port': self.port,
+            'connected': self.sock is not None,
+            'probes': self.probes,
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'lost_connection': self.lost_connection,
+            'failures': self.failures,
+            'skip_rounds': self.skip_rounds,
+            'last_error': self.last_error,
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """
+        Closes the open connection.
+        """
+
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+#==============================================================================
+class PjdProber(object):
+    """
+    Probes the given daemons with the request and the evaluation of the
+    given check plugin every interval seconds, until the plugin should
+    shutdown (by a signal).
+
+    The connection of a probe is kept open, if keep_alive is set and the
+    daemon doesn't close it, and is reused by the next probe. If the daemon
+    has closed it meanwhile (it doesn't honour keep-alive), a new connection
+    is established. If it breaks during the probe, the probe is repeated at
+    once with a new connection, which is counted as a reconnect. After failed connection attempts, the next attempt is
+    delayed exponentially by skipping rounds (1, 2, 4 ... intervals) up to
+    max_backoff seconds.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, plugin, targets, interval = DEFAULT_PROBE_INTERVAL,
+            state_file = None, max_backoff = DEFAULT_MAX_BACKOFF,
+            keep_alive = True, writer = None, verbose = 0):
+        """
+        Constructor.
+
+        @param plugin: the check plugin, which defines the request and
+                       evaluates the replies
+        @type plugin: CheckPjdInstancePlugin
+        @param targets: the host addresses and ports of the daemons
+        @type targets: list of tuple
+        @param interval: the interval of the probes in seconds
+        @type interval: float
+        @param state_file: the file to save the latest results to
+        @type state_file: str or None
+        @param max_backoff: the maximum delay of a connection attempt after
+                            failed attempts in seconds
+        @type max_backoff: float
+        @param keep_alive: keep the connections open between the probes
+        @type keep_alive: bool
+        @param writer: a callable, which gets every result as a passive check
+                       result line (see format_passive_result() of the plugin)
+        @type writer: callable or None
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.plugin = plugin
+        self.interval = float(interval)
+        self.state_file = state_file
+        self.max_backoff = float(max_backoff)
+        self.keep_alive = bool(keep_alive)
+        self.writer = writer
+        self.verbose = verbose
+
+        self.targets = []
+        for (host_address, port) in targets:
+            self.targets.append(PjdProberTarget(host_address, port))
+
+        self.rounds = 0
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'interval': self.interval,
+            'state_file': self.state_file,
+            'max_backoff': self.max_backoff,
+            'keep_alive': self.keep_alive,
+            'rounds': self.rounds,
+            'targets': [],
+        }
+        for target in self.targets:
+            res['targets'].append(target.as_dict())
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def run(self, rounds = 0):
+        """
+        Probes all daemons on a fixed schedule. Rounds, which are missed,
+        because a round took longer than the interval, are skipped.
+
+        @param rounds: the number of rounds to run, zero means until
+                       a shutdown
+        @type rounds: int
+
+        """
+
+        plugin = self.plugin
+        next_round = monotonic()
+        try:
+            while not plugin.should_shutdown:
+                now = monotonic()
+                if now < next_round:
+                    # sleeping in short slices to notice a shutdown
+                    time.sleep(min(next_round - now, 0.5))
+                    continue
+
+                self.run_round()
+                self.save()
+                self.rounds += 1
+                if rounds and self.rounds >= rounds:
+                    break
+
+                next_round += self.interval
+                now = monotonic()
+                if next_round < now:
+                    missed = int((now - next_round) / self.interval) + 1
+                    log.warn("Probing took too long, skipping %d round(s).",
+                            missed)
+                    next_round += missed * self.interval
+        finally:
+            for target in self.targets:
+                target.close()
+
+    #--------------------------------------------------------------------------
+    def run_round(self):
+        """
+        Probes all daemons once, except those waiting for the next
+        connection attempt.
+        """
+
+        plugin = self.plugin
+
+        due = []
+        for target in self.targets:
+            if target.sock is None and target.skip_rounds > 0:
+                target.skip_rounds -= 1
+                self._store(target, nagios.state.critical,
+                        "%s - next connection attempt in %d seconds." % (
+                        target.last_error,
+                        int((target.skip_rounds + 1) * self.interval)), [])
+                continue
+            if target.sock is not None and not connection_reusable(
+                    target.sock):
+                # the daemon doesn't honour keep-alive (e.g. it closes idle
+                # connections), that's no lost connection
+                if self.verbose > 1:
+                    log.debug("Connection to %r port %d was closed while " +
+                            "idle, connecting again.", target.host_address,
+                            target.port)
+                target.close()
+            due.append(target)
+
+        # the DNS times of the former rounds are no more valid
+        plugin.resolver_cache.resolve_times.clear()
+        to_resolve = []
+        for target in due:
+            if target.sock is None:
+                to_resolve.append((target.host_address, target.port))
+        if to_resolve:
+            plugin.resolver_cache.resolve_many(to_resolve,
+                    timeout = plugin.timeout)
+            plugin.resolver_cache.save()
+
+        xml = plugin.get_request_xml()
+        by_probe = {}
+        retry = []
+
+        def finished(probe):
+            target = by_probe[id(probe)]
+            if probe.reused and (probe.error is not None or not probe.reply):
+                if self.verbose > 1:
+                    log.debug("Connection to %r port %d was closed, " +
+                            "reconnecting.", target.host_address, target.port)
+                target.lost_connection = True
+                retry.append(target)
+                return
+            self._evaluate(target, probe)
+
+        def new_probes(targets):
+            for target in targets:
+                probe = PjdProbe(
+                        target.host_address, target.port, xml,
+                        timeout = plugin.timeout,
+                        buffer_size = plugin.buffer_size,
+                        daemon_name = plugin.daemon_name,
+                        connect_stagger = plugin.connect_stagger,
+                        is_final_line = plugin.get_final_line_checker(),
+                        max_reply_size = plugin.max_reply_size,
+                        resolver = plugin.resolver_cache.get,
+                        sock = target.sock,
+                        keep_open = self.keep_alive,
+                        verbose = self.verbose,
+                )
+                target.sock = None
+                by_probe[id(probe)] = target
+                yield probe
+
+        loop = PjdProbeLoop(concurrency = plugin.concurrency,
+                should_shutdown = lambda: plugin.should_shutdown,
+                verbose = self.verbose)
+        loop.run(new_probes(due), callback = finished)
+        if retry:
+            loop.run(new_probes(retry), callback = finished)
+
+    #--------------------------------------------------------------------------
+    def _evaluate(self, target, probe):
+        """
+        Updates the counters of the target with the finished probe and
+        stores its result.
+        """
+
+        plugin = self.plugin
+
+        target.probes += 1
+        if probe.kept_socket is not None:
+            target.sock = probe.kept_socket
+
+        # a reused connection, which the daemon closes after the reply,
+        # shows only, that it doesn't honour keep-alive
+        if probe.reused:
+            if self.verbose > 1 and probe.kept_socket is None:
+                log.debug("Daemon on %r port %d closed the connection " +
+                        "after the reply.", target.host_address, target.port)
+        elif probe.connected_address is not None:
+            if target.lost_connection:
+                target.reconnects += 1
+                target.lost_connection = False
+            target.connects += 1
+            target.failures = 0
+        elif not plugin.should_shutdown:
+            target.failures += 1
+            target.skip_rounds = min(2 ** (target.failures - 1),
+                    int(self.max_backoff / self.interval))
+
+        result = None
+        if probe.error is None:
+            result = plugin.finish_reply(probe.reply)
+        (state, out, perfdata) = plugin.evaluate(target.host_address,
+                target.port, result = result, error = probe.error,
+                probe = probe)
+        if probe.error is not None:
+            target.last_error = out
+
+        perfdata.append({'label': 'reconnects', 'value': target.reconnects,
+                'uom': 'c', 'threshold': None})
+        self._store(target, state, out, perfdata)
+
+    #--------------------------------------------------------------------------
+    def _store(self, target, state, out, perfdata):
+        """
+        Stores the result of a daemon and writes it as a passive check result.
+        """
+
+        now = time.time()
+
+        if self.writer:
+            self.writer(self.plugin.format_passive_result(target.host_address,
+                    state, out, perfdata, timestamp = now, port = target.port))
+
+        pds = []
+        for pd in perfdata:
+            warn = None
+            crit = None
+            threshold = pd['threshold']
+            if threshold:
+                if threshold.warning:
+                    warn = str(threshold.warning)
+                if threshold.critical:
+                    crit = str(threshold.critical)
+            pds.append({'label': pd['label'], 'value': pd['value'],
+                    'uom': pd['uom'], 'warning': warn, 'critical': crit})
+
+        target.result = {
+            'time': now,
+            'state': state,
+            'output': out,
+            'perfdata': pds,
+            'probes': target.probes,
+            'reconnects': target.reconnects,
+        }
+
+    #--------------------------------------------------------------------------
+    def save(self):
+        """
+        Saves the latest results atomically to the state file.
+        """
+
+        if not self.state_file:
+            return
+
+        results = {}
+        for target in self.targets:
+            if target.result is not None:
+                results[target.key] = target.result
+
+        state = {
+            'daemon': self.plugin.daemon_name,
+            'pid': os.getpid(),
+            'interval': self.interval,
+            'updated': time.time(),
+            'results': results,
+        }
+
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        tmp_file = None
+        try:
+            (fd, tmp_file) = tempfile.mkstemp(
+                    prefix = os.path.basename(self.state_file) + '.',
+                    dir = state_dir)
+            fh = os.fdopen(fd, 'w')
+            try:
+                json.dump(state, fh)
+            finally:
+                fh.close()
+            os.rename(tmp_file, self.state_file)
+        except (IOError, OSError), e:
+            log.warn("Could not save prober state %r: %s",
+                    self.state_file, e)
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,446 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a small on-disk cache of resolved addresses of the
+          hosts running a provisioning daemon (PPD or VCB), with TTL,
+          negative caching and a fallback to stale entries on resolver
+          errors.
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import socket
+import logging
+import tempfile
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Third party modules
+
+# Own modules
+
+from nagios_plugins.pjd_transport import SocketTransportError
+
+from nagios_plugins.clock import monotonic
+
+from nagios_plugins.state_files import STATE_DIR
+from nagios_plugins.state_files import UntrustedFileError, open_trusted
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.2'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = os.path.join(STATE_DIR, 'pjd-resolver.json')
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 60
+# Positive entries are kept so long for the fallback on resolver errors
+DEFAULT_MAX_STALE = 24 * 60 * 60
+DEFAULT_RESOLVER_THREADS = 20
+
+#==============================================================================
+class ResolverCache(object):
+    """
+    A cache of the results of socket.getaddrinfo() for host addresses
+    and ports, which can be saved to and loaded from a file.
+
+    Positive results are valid for ttl seconds, failed resolutions for
+    negative_ttl seconds. If resolving fails, an expired positive entry
+    younger than max_stale seconds is used instead (stale-on-error).
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, cache_file = None, ttl = DEFAULT_TTL,
+            negative_ttl = DEFAULT_NEGATIVE_TTL,
+            max_stale = DEFAULT_MAX_STALE, verbose = 0):
+        """
+        Constructor.
+
+        @param cache_file: the file to load the cache from and to save it to,
+                           if None, the cache is held only in memory
+        @type cache_file: str or None
+        @param ttl: the time to live of resolved addresses in seconds
+        @type ttl: float
+        @param negative_ttl: the time to live of failed resolutions
+                             in seconds
+        @type negative_ttl: float
+        @param max_stale: the maximum age of resolved addresses in seconds
+                          to use them, if resolving fails
+        @type max_stale: float
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.cache_file = cache_file
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self.max_stale = float(max_stale)
+        self.verbose = verbose
+
+        self.entries = {}
+        """
+        @ivar: the cache entries with 'host|port' as keys and dicts with
+               the keys 'resolved' (time of the last successful resolution),
+               'addresses' (its result), 'failed' (time of the last failed
+               resolution, if it was the last one) and 'error' as values
+        @type: dict
+        """
+
+        self.changed = False
+
+        self.resolve_times = {}
+        """
+        @ivar: the durations of the resolutions done by this process in
+               seconds with 'host|port' as keys
+        @type: dict
+        """
+
+        self._lock = threading.Lock()
+
+        if self.cache_file:
+            self.load()
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'cache_file': self.cache_file,
+            'ttl': self.ttl,
+            'negative_ttl': self.negative_ttl,
+            'max_stale': self.max_stale,
+            'entries': len(self.entries),
+            'changed': self.changed,
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def key(host_address, port):
+        return "%s|%d" % (host_address, port)
+
+    #--------------------------------------------------------------------------
+    def load(self):
+        """
+        Loads the cache entries from the cache file. A missing, broken or
+        untrusted cache file (see open_trusted()) results in an empty cache.
+        """
+
+        if not os.path.exists(self.cache_file):
+            return
+
+        try:
+            fh = open_trusted(self.cache_file)
+            try:
+                entries = json.load(fh)
+            finally:
+                fh.close()
+        except UntrustedFileError, e:
+            log.warn("Ignoring the resolver cache: %s", e)
+            return
+        except (IOError, ValueError), e:
+            log.debug("Could not load resolver cache %r: %s",
+                    self.cache_file, e)
+            return
+
+        if not isinstance(entries, dict):
+            return
+
+        for (key, entry) in entries.items():
+            addresses = None
+            if entry.get('addresses') is not None:
+                addresses = []
+                for (af, socktype, proto, canonname, sa) in entry['addresses']:
+                    addresses.append((af, socktype, proto, canonname,
+                            tuple(sa)))
+            self.entries[key] = {
+                'resolved': entry.get('resolved'),
+                'addresses': addresses,
+                'failed': entry.get('failed'),
+                'error': entry.get('error'),
+            }
+
+        if self.verbose > 2:
+            log.debug("Loaded %d entries from resolver cache %r.",
+                    len(self.entries), self.cache_file)
+
+    #--------------------------------------------------------------------------
+    def save(self):
+        """
+        Saves the cache entries atomically to the cache file, if they were
+        changed. Entries, which are useless also as a stale fallback,
+        are dropped.
+        """
+
+        if not self.cache_file or not self.changed:
+            return
+
+        now = time.time()
+        entries = {}
+        for (key, entry) in self.entries.items():
+            if entry['addresses'] is not None:
+                if now - entry['resolved'] <= self.max_stale:
+                    entries[key] = entry
+            elif now - entry['failed'] <= self.negative_ttl:
+                entries[key] = entry
+
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+        tmp_file = None
+        try:
+            (fd, tmp_file) = tempfile.mkstemp(
+                    prefix = os.path.basename(self.cache_file) + '.',
+                    dir = cache_dir)
+            fh = os.fdopen(fd, 'w')
+            try:
+                json.dump(entries, fh)
+            finally:
+                fh.close()
+            os.rename(tmp_file, self.cache_file)
+        except (IOError, OSError), e:
+            log.warn("Could not save resolver cache %r: %s",
+                    self.cache_file, e)
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+
+        self.changed = False
+
+    #--------------------------------------------------------------------------
+    def _store(self, key, addresses = None, error = None):
+        """
+        Stores the result of a resolution. The addresses of a preceding
+        successful resolution are kept on errors as a stale fallback.
+        """
+
+        self._lock.acquire()
+        try:
+            now = time.time()
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = {'resolved': None, 'addresses': None,
+                        'failed': None, 'error': None}
+                self.entries[key] = entry
+            if error is None:
+                entry['resolved'] = now
+                entry['addresses'] = addresses
+                entry['failed'] = None
+                entry['error'] = None
+            else:
+                entry['failed'] = now
+                entry['error'] = error
+            self.changed = True
+        finally:
+            self._lock.release()
+
+    #--------------------------------------------------------------------------
+    def is_fresh(self, key, now = None):
+        """
+        Is the result of the last resolution of the given key still valid.
+        """
+
+        if now is None:
+            now = time.time()
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry['failed'] is not None:
+            return (now - entry['failed']) <= self.negative_ttl
+        return (now - entry['resolved']) <= self.ttl
+
+    #--------------------------------------------------------------------------
+    def _resolve(self, host_address, port):
+        """
+        Resolves the host address without cache and stores the result.
+        """
+
+        key = self.key(host_address, port)
+        begin = monotonic()
+        try:
+            addresses = socket.getaddrinfo(host_address, port,
+                    socket.AF_UNSPEC, socket.SOCK_STREAM)
+        except socket.gaierror, e:
+            if self.verbose > 1:
+                log.debug("Could not resolve %r: %s", host_address, e)
+            self.resolve_times[key] = monotonic() - begin
+            self._store(key, error = str(e))
+            return
+        self.resolve_times[key] = monotonic() - begin
+        self._store(key, addresses = addresses)
+
+    #--------------------------------------------------------------------------
+    def resolve_time(self, host_address, port):
+        """
+        The duration of the resolution of the host address in seconds,
+        zero if it was taken from the cache. None, if it was not resolved
+        until now (e.g. on a timeout).
+        """
+
+        key = self.key(host_address, port)
+        if key in self.resolve_times:
+            return self.resolve_times[key]
+        if key in self.entries:
+            return 0.0
+        return None
+
+    #--------------------------------------------------------------------------
+    def lookup(self, host_address, port):
+        """
+        Gives back the addresses of the host from the cache, resolves them
+        if not cached.
+
+        @raise SocketTransportError: if the host address could not be resolved
+                                     and there is no stale entry
+
+        @return: the address infos as from socket.getaddrinfo()
+        @rtype: list of tuple
+
+        """
+
+        if not self.is_fresh(self.key(host_address, port)):
+            self._resolve(host_address, port)
+        return self.get(host_address, port)
+
+    #--------------------------------------------------------------------------
+    def get(self, host_address, port):
+        """
+        Gives back the addresses of the host from the cache without
+        resolving it. If the last resolution failed, a stale entry is
+        used instead, if there is one.
+
+        @raise SocketTransportError: if the host address could not be resolved
+                                     and there is no stale entry
+
+        @return: the address infos as from socket.getaddrinfo()
+        @rtype: list of tuple
+
+        """
+
+        key = self.key(host_address, port)
+        entry = self.entries.get(key)
+        if entry is None:
+            raise SocketTransportError("Could not resolve %r: not resolved." % (
+                    host_address))
+
+        if entry['failed'] is None:
+            return entry['addresses']
+
+        now = time.time()
+        if (entry['addresses'] is not None and
+                now - entry['resolved'] <= self.max_stale):
+            log.info("Could not resolve %r (%s), using addresses from %d seconds ago.",
+                    host_address, entry['error'], int(now - entry['resolved']))
+            return entry['addresses']
+
+        raise SocketTransportError("Could not resolve %r: %s" % (
+                host_address, entry['error']))
+
+    #--------------------------------------------------------------------------
+    def resolve_many(self, targets, timeout = None,
+            threads = DEFAULT_RESOLVER_THREADS):
+        """
+        Resolves all given targets, which are not validly cached, in
+        parallel threads. Targets, which could not be resolved until the
+        timeout, are treated as failed resolutions.
+
+        @param targets: the host addresses and ports to resolve
+        @type targets: list of tuple
+        @param timeout: the maximum time to wait for the resolution in seconds
+        @type timeout: float or None
+        @param threads: the maximum number of resolving threads
+        @type threads: int
+
+        """
+
+        now = time.time()
+        todo = []
+        seen = {}
+        for (host_address, port) in targets:
+            key = self.key(host_address, port)
+            if key in seen:
+                continue
+            seen[key] = True
+            if not self.is_fresh(key, now):
+                todo.append((host_address, port))
+
+        if not todo:
+            return
+
+        if self.verbose > 1:
+            log.debug("Resolving %d of %d targets.", len(todo), len(seen))
+
+        pending = list(todo)
+        pending_lock = threading.Lock()
+
+        def worker():
+            while True:
+                pending_lock.acquire()
+                try:
+                    if not pending:
+                        return
+                    (host_address, port) = pending.pop(0)
+                finally:
+                    pending_lock.release()
+                self._resolve(host_address, port)
+
+        workers = []
+        for i in range(min(threads, len(todo))):
+            t = threading.Thread(target = worker)
+            # a hanging resolver may not block the end of the process
+            t.setDaemon(True)
+            t.start()
+            workers.append(t)
+
+        # the wall clock time for the expiry stamps of the cache entries,
+        # the monotonic clock for the deadline and the durations
+        started = time.time()
+        begin = monotonic()
+        deadline = None
+        if timeout is not None:
+            deadline = begin + timeout
+        for t in workers:
+            if deadline is None:
+                t.join()
+            else:
+                t.join(max(deadline - monotonic(), 0))
+
+        pending_lock.acquire()
+        try:
+            del pending[:]
+        finally:
+            pending_lock.release()
+
+        for (host_address, port) in todo:
+            key = self.key(host_address, port)
+            if not self.is_fresh(key, started):
+                self.resolve_times[key] = monotonic() - begin
+                self._store(key, error = 'Timeout on resolving')
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
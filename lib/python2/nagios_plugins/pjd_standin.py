@@ -0,0 +1,611 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a local stand-in server of a ProfitBricks provisioning
+          daemon (PPD or VCB), speaking the PJD request and status reply
+          protocol for the commands 'info', 'vcb-info' and 'status' (also
+          pipelined on one connection), with adjustable latency, partial
+          writes, slow closes and oversized replies.
+          It is used for testing and benchmarking the PPD and VCB checks.
+"""
+
+# Standard modules
+import os
+import sys
+import re
+import time
+import socket
+import random
+import select
+import logging
+import argparse
+import textwrap
+import threading
+import SocketServer
+
+# Third party modules
+
+# Own modules
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LISTEN_ADDRESS = '127.0.0.1'
+DEFAULT_PORT = 8073
+DEFAULT_PPD_VERSION = '0.9.48'
+DEFAULT_VCB_VERSION = '8.6.29'
+DEFAULT_REQUEST_QUEUE_SIZE = 1024
+MAX_REQUEST_SIZE = 64 * 1024
+# The time to wait for further requests on the same connection
+DEFAULT_IDLE_TIMEOUT = 0.05
+
+re_job_id = re.compile(r'<job-id>\s*(\d+)\s*</job-id>', re.IGNORECASE)
+re_command = re.compile(r'<command>\s*([^<\s]+)\s*</command>', re.IGNORECASE)
+re_request_end = re.compile(r'</pjd>', re.IGNORECASE)
+re_answer_to_socket = re.compile(r'<answer-to-socket>\s*yes\s*</answer-to-socket>',
+        re.IGNORECASE)
+
+#==============================================================================
+class PjdStandinConfig(object):
+    """
+    The behaviour of the stand-in server.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, ppd_version = DEFAULT_PPD_VERSION,
+            vcb_version = DEFAULT_VCB_VERSION, latency = 0.0, jitter = 0.0,
+            chunk_size = 0, chunk_delay = 0.0, close_delay = 0.0,
+            oversize = 0, end_of_data = True, fail_rate = 0.0,
+            idle_timeout = DEFAULT_IDLE_TIMEOUT):
+        """
+        Constructor.
+
+        @param ppd_version: the version reported on the 'info' command
+        @type ppd_version: str
+        @param vcb_version: the version reported on the 'vcb-info' command
+        @type vcb_version: str
+        @param latency: the delay in seconds before replying
+        @type latency: float
+        @param jitter: a random additional delay in seconds up to this value
+        @type jitter: float
+        @param chunk_size: if not zero, the reply is written in chunks
+                           of this size (partial writes)
+        @type chunk_size: int
+        @param chunk_delay: the delay in seconds between the chunks
+        @type chunk_delay: float
+        @param close_delay: the delay in seconds between the end of the
+                            reply and closing the connection (slow close)
+        @type close_delay: float
+        @param oversize: the number of bytes of filler lines to add
+                         to the reply
+        @type oversize: int
+        @param end_of_data: add the 'END_OF_DATA=TRUE' marker to the
+                            'vcb-info' reply
+        @type end_of_data: bool
+        @param fail_rate: the probability of a failed status reply (0 - 1)
+        @type fail_rate: float
+        @param idle_timeout: the time in seconds to wait for further
+                             requests on the same connection
+        @type idle_timeout: float
+
+        """
+
+        self.ppd_version = ppd_version
+        self.vcb_version = vcb_version
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.chunk_size = int(chunk_size)
+        self.chunk_delay = float(chunk_delay)
+        self.close_delay = float(close_delay)
+        self.oversize = int(oversize)
+        self.end_of_data = bool(end_of_data)
+        self.fail_rate = float(fail_rate)
+        self.idle_timeout = float(idle_timeout)
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'ppd_version': self.ppd_version,
+            'vcb_version': self.vcb_version,
+            'latency': self.latency,
+            'jitter': self.jitter,
+            'chunk_size': self.chunk_size,
+            'chunk_delay': self.chunk_delay,
+            'close_delay': self.close_delay,
+            'oversize': self.oversize,
+            'end_of_data': self.end_of_data,
+            'fail_rate': self.fail_rate,
+            'idle_timeout': self.idle_timeout,
+        }
+
+        return res
+
+#==============================================================================
+def filler_lines(size):
+    """
+    Generates filler lines of the given total size for oversized replies.
+    """
+
+    lines = []
+    total = 0
+    nr = 0
+    while total < size:
+        line = "FILLER_%08d=%s\n" % (nr, 'x' * 48)
+        lines.append(line)
+        total += len(line)
+        nr += 1
+    return ''.join(lines)
+
+#==============================================================================
+def build_reply(command, job_id, config):
+    """
+    Builds the reply of the stand-in server on the given command.
+
+    @param command: the command of the PJD request
+    @type command: str
+    @param job_id: the Job-Id of the PJD request
+    @type job_id: int
+    @param config: the behaviour of the stand-in server
+    @type config: PjdStandinConfig
+
+    @return: the reply
+    @rtype: str
+
+    """
+
+    failed = config.fail_rate > 0 and random.random() < config.fail_rate
+    filler = ''
+    if config.oversize > 0:
+        filler = filler_lines(config.oversize)
+
+    if command == 'info':
+        if failed:
+            return "%d,4,1,Simulated failure of PPD\n" % (job_id)
+        return "%d,5,0,PPD Version [%s], Operation type [storage]\n%s" % (
+                job_id, config.ppd_version, filler)
+
+    if command == 'vcb-info':
+        reply = "%d,3,0,Processing vcb-info\n" % (job_id)
+        if failed:
+            reply += "%d,4,1,Simulated failure of VCB\n" % (job_id)
+        else:
+            reply += "%d,5,0,VCB_VERSION=%s\n" % (job_id, config.vcb_version)
+            reply += "VCB_UPTIME=%d\n" % (int(time.time()) % 86400)
+            reply += "VCB_JOBS_ACTIVE=%d\n" % (random.randint(0, 8))
+            reply += "VCB_QUEUE_LENGTH=%d\n" % (random.randint(0, 40))
+            reply += "VCB_LOAD=%0.2f%%\n" % (random.random() * 100)
+            reply += filler
+        if config.end_of_data:
+            reply += "END_OF_DATA=TRUE\n"
+        return reply
+
+    if command == 'status':
+        if failed:
+            return "%d,4,1,Simulated failure of the job status\n" % (job_id)
+        return "%d,5,0,%d jobs running, %d jobs queued\n" % (job_id,
+                random.randint(0, 8), random.randint(0, 40))
+
+    return "%d,4,1,Unknown command %r\n" % (job_id, command)
+
+#==============================================================================
+class PjdStandinHandler(SocketServer.BaseRequestHandler):
+    """
+    Handles a single connection to the stand-in server.
+    """
+
+    #--------------------------------------------------------------------------
+    def handle(self):
+
+        config = self.server.config
+        sock = self.request
+
+        # Several requests may be sent on the same connection (also
+        # pipelined), they are answered in order.
+        buf = ''
+        answered = 0
+        while True:
+            match = re_request_end.search(buf)
+            if match:
+                request = buf[:match.end()]
+                buf = buf[match.end():]
+                if not self.answer(request):
+                    return
+                answered += 1
+                continue
+
+            if answered and not buf.strip():
+                (rlist, wlist, xlist) = select.select([sock], [], [],
+                        config.idle_timeout)
+                if not rlist:
+                    break
+            try:
+                data = sock.recv(4096)
+            except socket.error, e:
+                log.debug("Error on receiving request: %s", e)
+                return
+            if not data:
+                break
+            buf += data
+            if len(buf) > MAX_REQUEST_SIZE:
+                log.debug("Request too large.")
+                return
+
+        if config.close_delay > 0:
+            time.sleep(config.close_delay)
+
+    #--------------------------------------------------------------------------
+    def answer(self, request):
+        """
+        Answers a single PJD request.
+
+        @return: the reply could be sent
+        @rtype: bool
+
+        """
+
+        config = self.server.config
+        sock = self.request
+
+        job_id = 0
+        match = re_job_id.search(request)
+        if match:
+            job_id = int(match.group(1))
+        command = ''
+        match = re_command.search(request)
+        if match:
+            command = match.group(1).lower()
+
+        log.debug("Got command %r with Job-Id %d from %s.", command, job_id,
+                self.client_address[0])
+
+        delay = config.latency
+        if config.jitter > 0:
+            delay += random.random() * config.jitter
+        if delay > 0:
+            time.sleep(delay)
+
+        reply = build_reply(command, job_id, config)
+        # the VCB ends every reply to the socket with the marker
+        if (command != 'vcb-info' and config.end_of_data and
+                re_answer_to_socket.search(request)):
+            reply += "END_OF_DATA=TRUE\n"
+
+        try:
+            if config.chunk_size > 0:
+                offset = 0
+                while offset < len(reply):
+                    sock.sendall(reply[offset:offset + config.chunk_size])
+                    offset += config.chunk_size
+                    if config.chunk_delay > 0 and offset < len(reply):
+                        time.sleep(config.chunk_delay)
+            else:
+                sock.sendall(reply)
+        except socket.error, e:
+            log.debug("Error on sending reply: %s", e)
+            return False
+
+        return True
+
+#==============================================================================
+class PjdStandinServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    A threading TCP server, acting as a stand-in of a provisioning daemon.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = DEFAULT_REQUEST_QUEUE_SIZE
+
+    #--------------------------------------------------------------------------
+    def __init__(self, address, config):
+        """
+        Constructor.
+
+        @param address: the address and port to listen on
+        @type address: tuple
+        @param config: the behaviour of the stand-in server
+        @type config: PjdStandinConfig
+
+        """
+
+        if ':' in address[0]:
+            self.address_family = socket.AF_INET6
+        self.config = config
+        SocketServer.TCPServer.__init__(self, address, PjdStandinHandler)
+
+#==============================================================================
+class PjdStandinApp(object):
+    """
+    Application class for running stand-in servers on one or more ports.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the PjdStandinApp class.
+        """
+
+        self.args = None
+        self.servers = []
+
+        usage = """\
+                %(prog)s [-v] [-L <address>] [-P <port>] [-n <count>]
+                                     [--latency <ms>] [--jitter <ms>]
+                                     [--chunk-size <bytes>] [--chunk-delay <ms>]
+                                     [--close-delay <ms>] [--oversize <bytes>]
+                                     [--no-end-of-data] [--fail-rate <rate>]
+                                     [--idle-timeout <ms>]
+                """
+        usage = textwrap.dedent(usage).strip()
+
+        desc = ("Runs a local stand-in server of a ProfitBricks provisioning " +
+                "daemon, which answers PJD requests with the commands " +
+                "'info' (PPD), 'vcb-info' (VCB) and 'status' with status " +
+                "replies ('job,state,err,msg'), also pipelined on one " +
+                "connection. It is intended for testing and " +
+                "benchmarking the PPD and VCB checks.")
+
+        self.argparser = argparse.ArgumentParser(
+                usage = usage,
+                description = desc,
+        )
+
+        self._add_args()
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.argparser.add_argument(
+                '-v', '--verbose',
+                action = 'count',
+                dest = 'verbose',
+                default = 0,
+                help = 'Increase the verbosity level',
+        )
+
+        self.argparser.add_argument(
+                '-L', '--listen',
+                metavar = 'ADDRESS',
+                dest = 'listen',
+                default = DEFAULT_LISTEN_ADDRESS,
+                help = "The address to listen on (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '-P', '--port',
+                metavar = 'PORT',
+                dest = 'port',
+                type = int,
+                default = DEFAULT_PORT,
+                help = "The (first) TCP port to listen on (Default: %(default)d).",
+        )
+
+        self.argparser.add_argument(
+                '-n', '--port-count',
+                metavar = 'COUNT',
+                dest = 'port_count',
+                type = int,
+                default = 1,
+                help = ("The number of consecutive ports to listen on, " +
+                        "e.g. for simulating many daemons " +
+                        "(Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '--ppd-version',
+                metavar = 'VERSION',
+                dest = 'ppd_version',
+                default = DEFAULT_PPD_VERSION,
+                help = "The reported PPD version (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '--vcb-version',
+                metavar = 'VERSION',
+                dest = 'vcb_version',
+                default = DEFAULT_VCB_VERSION,
+                help = "The reported VCB version (Default: %(default)r).",
+        )
+
+        self.argparser.add_argument(
+                '--latency',
+                metavar = 'MS',
+                dest = 'latency',
+                type = float,
+                default = 0,
+                help = ("The delay in milliseconds before replying " +
+                        "(Default: %(default)s)."),
+        )
+
+        self.argparser.add_argument(
+                '--jitter',
+                metavar = 'MS',
+                dest = 'jitter',
+                type = float,
+                default = 0,
+                help = ("A random additional delay in milliseconds up to " +
+                        "this value (Default: %(default)s)."),
+        )
+
+        self.argparser.add_argument(
+                '--chunk-size',
+                metavar = 'BYTES',
+                dest = 'chunk_size',
+                type = int,
+                default = 0,
+                help = ("Write the reply in chunks of this size (partial " +
+                        "writes), zero means at once (Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '--chunk-delay',
+                metavar = 'MS',
+                dest = 'chunk_delay',
+                type = float,
+                default = 0,
+                help = ("The delay in milliseconds between the chunks " +
+                        "of the reply (Default: %(default)s)."),
+        )
+
+        self.argparser.add_argument(
+                '--close-delay',
+                metavar = 'MS',
+                dest = 'close_delay',
+                type = float,
+                default = 0,
+                help = ("The delay in milliseconds between the end of the " +
+                        "reply and closing the connection (Default: %(default)s)."),
+        )
+
+        self.argparser.add_argument(
+                '--oversize',
+                metavar = 'BYTES',
+                dest = 'oversize',
+                type = int,
+                default = 0,
+                help = ("Add filler lines of this size to the replies " +
+                        "(Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '--no-end-of-data',
+                action = 'store_false',
+                dest = 'end_of_data',
+                default = True,
+                help = "Omit the 'END_OF_DATA=TRUE' marker in 'vcb-info' replies.",
+        )
+
+        self.argparser.add_argument(
+                '--fail-rate',
+                metavar = 'RATE',
+                dest = 'fail_rate',
+                type = float,
+                default = 0,
+                help = ("The probability of a failed status reply, " +
+                        "between 0 and 1 (Default: %(default)s)."),
+        )
+
+        self.argparser.add_argument(
+                '--idle-timeout',
+                metavar = 'MS',
+                dest = 'idle_timeout',
+                type = float,
+                default = DEFAULT_IDLE_TIMEOUT * 1000,
+                help = ("The time in milliseconds to wait for further " +
+                        "requests on the same connection before closing it " +
+                        "(Default: %(default)s)."),
+        )
+
+    #--------------------------------------------------------------------------
+    def get_config(self):
+        """
+        Creates the behaviour of the stand-in servers from the arguments.
+        """
+
+        return PjdStandinConfig(
+                ppd_version = self.args.ppd_version,
+                vcb_version = self.args.vcb_version,
+                latency = self.args.latency / 1000.0,
+                jitter = self.args.jitter / 1000.0,
+                chunk_size = self.args.chunk_size,
+                chunk_delay = self.args.chunk_delay / 1000.0,
+                close_delay = self.args.close_delay / 1000.0,
+                oversize = self.args.oversize,
+                end_of_data = self.args.end_of_data,
+                fail_rate = self.args.fail_rate,
+                idle_timeout = self.args.idle_timeout / 1000.0,
+        )
+
+    #--------------------------------------------------------------------------
+    def __call__(self, args = None):
+        """
+        Method to call the application directly.
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        @return: the exit code
+        @rtype: int
+
+        """
+
+        self.args = self.argparser.parse_args(args)
+
+        level = logging.WARNING
+        if self.args.verbose > 1:
+            level = logging.DEBUG
+        elif self.args.verbose:
+            level = logging.INFO
+        logging.basicConfig(level = level,
+                format = '[%(asctime)s]: %(levelname)s - %(message)s')
+
+        config = self.get_config()
+        if self.args.verbose > 1:
+            log.debug("Configuration: %r", config.as_dict())
+
+        for i in range(max(self.args.port_count, 1)):
+            port = self.args.port + i
+            try:
+                server = PjdStandinServer((self.args.listen, port), config)
+            except socket.error, e:
+                sys.stderr.write("Could not listen on %s port %d: %s\n" % (
+                        self.args.listen, port, e))
+                self.shutdown()
+                return 1
+            thread = threading.Thread(target = server.serve_forever)
+            thread.setDaemon(True)
+            thread.start()
+            self.servers.append(server)
+
+        log.info("Listening on %s, port %d - %d.", self.args.listen,
+                self.args.port, self.args.port + len(self.servers) - 1)
+
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            log.info("Interrupted.")
+
+        self.shutdown()
+        return 0
+
+    #--------------------------------------------------------------------------
+    def shutdown(self):
+        """
+        Shuts down all running servers.
+        """
+
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
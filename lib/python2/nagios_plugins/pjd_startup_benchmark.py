@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a benchmark of the start-up costs (interpreter start
+          and module imports) of the bin/check-*-instance entry points,
+          optionally with preloaded modules to show their import costs.
+"""
+
+# Standard modules
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+import textwrap
+import subprocess
+
+# Third party modules
+
+# Own modules
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RUNS = 20
+DEFAULT_PATTERN = 'check-*-instance'
+
+# Runs the entry point like the interpreter, after importing the modules
+PRELOAD_CODE = """\
+import sys
+for module in %r:
+    __import__(module)
+sys.argv = %r
+execfile(sys.argv[0])
+"""
+
+#==============================================================================
+class PjdStartupBenchmark(object):
+    """
+    Application class for measuring the start-up time of the entry points
+    by running them with '--version' several times.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        """
+        Constructor of the PjdStartupBenchmark class.
+        """
+
+        self.args = None
+
+        usage = """\
+                %(prog)s [-v] [-r <runs>] [--preload <module>]
+                                       [<entry point> ...]
+                """
+        usage = textwrap.dedent(usage).strip()
+
+        desc = ("Measures the start-up time of the given entry points " +
+                "(Default: all bin/%s scripts) by running them with " +
+                "'--version'. With --preload the given modules are imported " +
+                "before, e.g. '--preload pkg_resources' shows the start-up " +
+                "time as it was before pkg_resources was dropped from the " +
+                "start-up path.") % (DEFAULT_PATTERN)
+
+        self.argparser = argparse.ArgumentParser(
+                usage = usage,
+                description = desc,
+        )
+
+        self._add_args()
+
+    #--------------------------------------------------------------------------
+    def _add_args(self):
+        """
+        Adding all necessary arguments to the commandline argument parser.
+        """
+
+        self.argparser.add_argument(
+                '-v', '--verbose',
+                action = 'count',
+                dest = 'verbose',
+                default = 0,
+                help = 'Increase the verbosity level',
+        )
+
+        self.argparser.add_argument(
+                '-r', '--runs',
+                metavar = 'RUNS',
+                dest = 'runs',
+                type = int,
+                default = DEFAULT_RUNS,
+                help = ("The number of runs of every entry point " +
+                        "(Default: %(default)d)."),
+        )
+
+        self.argparser.add_argument(
+                '--preload',
+                metavar = 'MODULE',
+                dest = 'preload',
+                action = 'append',
+                default = [],
+                help = ("A module to import before running the entry point, " +
+                        "may be given multiple times."),
+        )
+
+        self.argparser.add_argument(
+                'scripts',
+                metavar = 'ENTRY_POINT',
+                nargs = '*',
+                help = "The entry points to measure.",
+        )
+
+    #--------------------------------------------------------------------------
+    def measure(self, script, preload = None):
+        """
+        Runs the given entry point several times.
+
+        @param script: the path of the entry point
+        @type script: str
+        @param preload: the modules to import before
+        @type preload: list of str or None
+
+        @return: the sorted durations of the runs in seconds
+        @rtype: list of float
+
+        """
+
+        argv = [script, '--version']
+        if preload:
+            cmd = [sys.executable, '-c', PRELOAD_CODE % (list(preload), argv)]
+        else:
+            cmd = [sys.executable] + argv
+
+        durations = []
+        devnull = open(os.devnull, 'w')
+        try:
+            for i in range(max(self.args.runs, 1)):
+                begin = time.time()
+                proc = subprocess.Popen(cmd, stdout = devnull,
+                        stderr = devnull, close_fds = True)
+                proc.wait()
+                durations.append(time.time() - begin)
+                log.debug("%s exited with %d after %0.3f seconds.", script,
+                        proc.returncode, durations[-1])
+        finally:
+            devnull.close()
+
+        durations.sort()
+        return durations
+
+    #--------------------------------------------------------------------------
+    def __call__(self, args = None):
+        """
+        Method to call the application directly.
+
+        @param args: the argument strings to parse. If not given, they are
+                     taken from sys.argv.
+        @type args: list of str or None
+
+        @return: the exit code
+        @rtype: int
+
+        """
+
+        self.args = self.argparser.parse_args(args)
+
+        level = logging.WARNING
+        if self.args.verbose > 1:
+            level = logging.DEBUG
+        elif self.args.verbose:
+            level = logging.INFO
+        logging.basicConfig(level = level,
+                format = '[%(asctime)s]: %(levelname)s - %(message)s')
+
+        scripts = self.args.scripts
+        if not scripts:
+            bindir = os.path.dirname(os.path.abspath(sys.argv[0]))
+            scripts = sorted(glob.glob(os.path.join(bindir, DEFAULT_PATTERN)))
+        if not scripts:
+            sys.stderr.write("No entry points found.\n")
+            return 1
+
+        variants = [('plain', None)]
+        if self.args.preload:
+            variants.append(('+' + ','.join(self.args.preload),
+                    self.args.preload))
+
+        print "%-24s %-20s %10s %10s %10s" % ('Entry point', 'Variant',
+                'min [ms]', 'med [ms]', 'max [ms]')
+        for script in scripts:
+            for (name, preload) in variants:
+                durations = self.measure(script, preload)
+                print "%-24s %-20s %10.1f %10.1f %10.1f" % (
+                        os.path.basename(script), name,
+                        durations[0] * 1000,
+                        durations[len(durations) // 2] * 1000,
+                        durations[-1] * 1000)
+
+        return 0
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et
@@ -0,0 +1,985 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for the network transport of PJD requests to a
+          ProfitBricks provisioning daemon (PPD or VCB) with non-blocking
+          sockets and a fractional deadline for the whole request.
+          Many requests to different hosts can be driven concurrently
+          by one event loop.
+"""
+
+# Standard modules
+import os
+import sys
+import errno
+import logging
+import socket
+import select
+
+# Third party modules
+
+# Own modules
+
+from nagios.plugin import NagiosPluginError
+
+from nagios_plugins.clock import monotonic
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.3.1'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_BUFFER_SIZE = 8192
+DEFAULT_MAX_REPLY_SIZE = 16 * 1024 * 1024
+DEFAULT_CONCURRENCY = 100
+
+# Delay between the staggered connection attempts, see RFC 8305
+DEFAULT_CONNECT_STAGGER = 0.25
+
+CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+SOCKET_RETRY = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+# memoryview() for receiving into the reply buffer without copying
+# is available since Python 2.7
+HAS_MEMORYVIEW = True
+try:
+    memoryview
+except NameError:
+    HAS_MEMORYVIEW = False
+
+FAMILY_NAMES = {
+    socket.AF_INET: 'IPv4',
+    socket.AF_INET6: 'IPv6',
+}
+
+#==============================================================================
+class SocketTransportError(NagiosPluginError):
+    pass
+
+#==============================================================================
+class SocketConnectTimeoutError(SocketTransportError):
+    pass
+
+#==============================================================================
+class NoListeningError(SocketTransportError):
+    pass
+
+#==============================================================================
+def connection_reusable(sock):
+    """
+    Checks an idle connection kept open after a former probe, before it is
+    reused. It is not reusable, if the daemon has closed (EOF) or reset it
+    meanwhile, or if it has sent unexpected data.
+
+    @param sock: the kept open connection
+    @type sock: socket.socket
+
+    @rtype: bool
+
+    """
+
+    try:
+        r, w, x = select.select([sock], [], [], 0)
+    except (select.error, socket.error, ValueError), e:
+        return False
+    if not r:
+        return True
+
+    try:
+        sock.recv(1, socket.MSG_PEEK)
+    except socket.error, e:
+        if e.errno in SOCKET_RETRY:
+            return True
+        return False
+
+    # EOF or data, nobody asked for
+    return False
+
+#==============================================================================
+class PjdProbe(object):
+    """
+    A single non-blocking request/reply exchange with a provisioning
+    daemon. It is a state machine ('init', 'connecting', 'sending',
+    'receiving', 'done' or 'failed'), which is driven by a PjdProbeLoop.
+
+    Connecting uses staggered parallel connection attempts to all resolved
+    addresses of the host (Happy Eyeballs, RFC 6555/8305): a new attempt is
+    started every connect_stagger seconds, or at once, if an attempt failed.
+    The first established connection wins, all other attempts are canceled.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, host_address, port, message, timeout = DEFAULT_TIMEOUT,
+            buffer_size = DEFAULT_BUFFER_SIZE, daemon_name = 'PJD',
+            connect_stagger = DEFAULT_CONNECT_STAGGER, is_final_line = None,
+            max_reply_size = DEFAULT_MAX_REPLY_SIZE, resolver = None,
+            sock = None, keep_open = False, verbose = 0):
+        """
+        Constructor.
+
+        @param host_address: the DNS name or IP address of the host,
+                             running the daemon
+        @type host_address: str
+        @param port: the TCP port of the daemon on the host
+        @type port: int
+        @param message: the message to send to the daemon
+        @type message: str
+        @param timeout: the timeout of the whole request in seconds
+        @type timeout: float
+        @param buffer_size: the size of the buffer for the socket operation
+        @type buffer_size: int
+        @param daemon_name: the name of the daemon used in messages
+        @type daemon_name: str
+        @param connect_stagger: the delay in seconds between the staggered
+                                connection attempts to the resolved addresses
+        @type connect_stagger: float
+        @param is_final_line: a callable, which gets every complete line
+                              of the reply as soon as it was received and
+                              returns True, if it is the last line of the
+                              reply, so reading can be stopped before the
+                              remote closes the connection
+        @type is_final_line: callable or None
+        @param max_reply_size: the maximum size of the reply in bytes
+        @type max_reply_size: int
+        @param resolver: a callable, which gets the host address and the port
+                         and returns the address infos as from
+                         socket.getaddrinfo() or raises a
+                         SocketTransportError, used instead of
+                         socket.getaddrinfo()
+        @type resolver: callable or None
+        @param sock: an established connection of a former probe to the
+                     same daemon (see kept_socket) to reuse instead of
+                     connecting
+        @type sock: socket.socket or None
+        @param keep_open: keep the connection open after the final line
+                          of the reply for the next probe (see kept_socket)
+        @type keep_open: bool
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.host_address = host_address
+        self.port = port
+        self.message = message
+        self.timeout = float(timeout)
+        self.buffer_size = buffer_size
+        self.daemon_name = daemon_name
+        self.connect_stagger = float(connect_stagger)
+        self.is_final_line = is_final_line
+        self.max_reply_size = int(max_reply_size)
+        self.resolver = resolver
+        self.keep_open = bool(keep_open)
+        self.verbose = verbose
+
+        # the connection was reused from a former probe
+        self.reused = False
+        # the still open connection after the probe, if keep_open was set
+        self.kept_socket = None
+
+        self.state = 'init'
+        self.reply = None
+        self.error = None
+
+        self.begin = None
+        self.deadline = None
+        self.end = None
+
+        self.connected_address = None
+        self.connected_family = None
+
+        # the latency breakdown of the request in seconds
+        self.dns_time = None
+        self.connect_time = None
+        self.ttfb = None
+
+        self._reuse_sock = sock
+        self._connect_begin = None
+        self._sent = None
+        self._addresses = []
+        # fileno -> (socket, address info) of the pending connection attempts
+        self._pending = {}
+        self._next_start = None
+        self._sock = None
+        self._offset = 0
+        # the reply buffer, it grows geometrically up to max_reply_size
+        self._buffer = None
+        # the number of received bytes in the reply buffer
+        self._length = 0
+        # the begin of the incomplete last line in the reply buffer
+        self._line_start = 0
+
+    #------------------------------------------------------------
+    @property
+    def done(self):
+        """The probe is finished, successful or not."""
+        return self.state in ('done', 'failed')
+
+    #------------------------------------------------------------
+    @property
+    def family_name(self):
+        """The name of the address family of the established connection."""
+        if self.connected_family is None:
+            return None
+        return FAMILY_NAMES.get(self.connected_family,
+                str(self.connected_family))
+
+    #------------------------------------------------------------
+    @property
+    def duration(self):
+        """The duration of the whole probe in seconds."""
+        if self.begin is None or self.end is None:
+            return None
+        return self.end - self.begin
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'host_address': self.host_address,
+            'port': self.port,
+            'timeout': self.timeout,
+            'buffer_size': self.buffer_size,
+            'max_reply_size': self.max_reply_size,
+            'daemon_name': self.daemon_name,
+            'connect_stagger': self.connect_stagger,
+            'state': self.state,
+            'received': self._length,
+            'error': self.error,
+            'connected_address': self.connected_address,
+            'connected_family': self.family_name,
+            'dns_time': self.dns_time,
+            'connect_time': self.connect_time,
+            'ttfb': self.ttfb,
+            'duration': self.duration,
+            'keep_open': self.keep_open,
+            'reused': self.reused,
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def resolve(self):
+        """
+        Resolves the host address into the socket addresses to connect to.
+        The address families are interleaved (e.g. IPv6, IPv4, IPv6 ...),
+        beginning with the family of the first resolved address.
+
+        @raise SocketTransportError: if the host address could not be resolved
+
+        @return: the address infos as from socket.getaddrinfo()
+        @rtype: list of tuple
+
+        """
+
+        if self.resolver:
+            addresses = self.resolver(self.host_address, self.port)
+        else:
+            try:
+                addresses = socket.getaddrinfo(self.host_address, self.port,
+                        socket.AF_UNSPEC, socket.SOCK_STREAM)
+            except socket.gaierror, e:
+                msg = "Could not resolve %r: %s" % (self.host_address, e)
+                raise SocketTransportError(msg)
+
+        families = []
+        by_family = {}
+        for res in addresses:
+            af = res[0]
+            if not af in by_family:
+                families.append(af)
+                by_family[af] = []
+            by_family[af].append(res)
+
+        interleaved = []
+        while len(interleaved) < len(addresses):
+            for af in families:
+                if by_family[af]:
+                    interleaved.append(by_family[af].pop(0))
+
+        return interleaved
+
+    #--------------------------------------------------------------------------
+    def start(self, now = None):
+        """
+        Resolves the host address and starts the first connection attempt.
+        """
+
+        if now is None:
+            now = monotonic()
+        self.begin = now
+        self.deadline = now + self.timeout
+
+        if self.verbose > 2:
+            msg = "Sending message to %r, port %d with a timeout of %0.3f seconds."
+            log.debug(msg, self.host_address, self.port, self.timeout)
+
+        if self._reuse_sock is not None:
+            self._reuse(now)
+            return
+
+        try:
+            self._addresses = self.resolve()
+        except SocketTransportError, e:
+            self._fail(e)
+            return
+
+        now = monotonic()
+        self.dns_time = now - self.begin
+        self._connect_begin = now
+
+        self.state = 'connecting'
+        self._next_start = now
+        self._start_attempts(now)
+
+    #--------------------------------------------------------------------------
+    def _reuse(self, now):
+        """
+        Takes over the established connection of a former probe, there is
+        no resolving and connecting (and so no DNS and connect time).
+        """
+
+        s = self._reuse_sock
+        self._reuse_sock = None
+        self._sock = s
+        self.reused = True
+        try:
+            peer = s.getpeername()
+        except socket.error, e:
+            self._fail(SocketTransportError(
+                    "The reused connection is broken: %s" % (e)))
+            return
+
+        self.connected_address = peer[0]
+        self.connected_family = s.family
+        self.state = 'sending'
+
+        if self.verbose > 2:
+            log.debug("Reusing the connection to %s (%s).",
+                    self.connected_address, self.family_name)
+
+    #--------------------------------------------------------------------------
+    def _start_attempts(self, now):
+        """
+        Starts the next connection attempts, if they are due.
+        """
+
+        while (self.state == 'connecting' and self._addresses and
+                (not self._pending or now >= self._next_start)):
+
+            res = self._addresses.pop(0)
+            if self.verbose > 3:
+                log.debug("Socket address info: %r", res)
+            af, socktype, proto, canonname, sa = res
+            try:
+                s = socket.socket(af, socktype, proto)
+            except socket.error, e:
+                continue
+            s.setblocking(0)
+
+            err = s.connect_ex(sa)
+            if not err or err == errno.EISCONN:
+                self._connected(s, res, now)
+                return
+            if err in CONNECT_IN_PROGRESS or err == errno.EINTR:
+                self._pending[s.fileno()] = (s, res)
+                self._next_start = now + self.connect_stagger
+            else:
+                if self.verbose > 3:
+                    log.debug("Could not connect to %s: %s", str(sa),
+                            os.strerror(err))
+                s.close()
+
+        if self.state == 'connecting' and not self._pending:
+            msg = "%s seems not to listen on %r, port %d." % (
+                    self.daemon_name, self.host_address, self.port)
+            self._fail(NoListeningError(msg))
+
+    #--------------------------------------------------------------------------
+    def _connected(self, s, res, now):
+        """
+        Records the address and the duration of an established connection
+        and cancels all other connection attempts.
+        """
+
+        self._close_pending()
+        self._sock = s
+        self.connected_address = res[4][0]
+        self.connected_family = res[0]
+        self.connect_time = now - self._connect_begin
+        self.state = 'sending'
+
+        if self.verbose > 2:
+            log.debug("Connected to %s (%s) after %0.3f seconds.",
+                    self.connected_address, self.family_name,
+                    self.connect_time)
+
+    #--------------------------------------------------------------------------
+    def _close_pending(self):
+
+        for (s, res) in self._pending.values():
+            s.close()
+        self._pending.clear()
+
+    #--------------------------------------------------------------------------
+    def _close(self):
+
+        self._close_pending()
+        if self._reuse_sock is not None:
+            self._reuse_sock.close()
+            self._reuse_sock = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    #--------------------------------------------------------------------------
+    def _fail(self, error):
+
+        self._close()
+        self.error = error
+        self.state = 'failed'
+        self.end = monotonic()
+
+        if self.verbose > 2:
+            log.debug("Probe of %r port %d failed: %s", self.host_address,
+                    self.port, error)
+
+    #--------------------------------------------------------------------------
+    def _finish(self, closed = False):
+
+        # the connection can only be reused, if nothing is left over
+        if (self.keep_open and not closed and self._sock is not None and
+                self._line_start >= self._length):
+            self.kept_socket = self._sock
+            self._sock = None
+        self._close()
+        if self._buffer is None:
+            self.reply = ''
+        else:
+            self.reply = str(self._buffer[:self._length])
+        self._buffer = None
+        self.state = 'done'
+        self.end = monotonic()
+
+        if self.verbose > 2:
+            log.debug("Got a reply of %d bytes from %r after %0.3f seconds.",
+                    len(self.reply), self.host_address, self.duration)
+
+    #--------------------------------------------------------------------------
+    def cancel(self):
+        """
+        Cancels the probe.
+        """
+
+        if self.done:
+            return
+        secs = 0.0
+        if self.begin is not None:
+            secs = monotonic() - self.begin
+        self._fail(SocketTransportError('Canceled after %0.3f seconds.' % (secs)))
+
+    #--------------------------------------------------------------------------
+    def events(self):
+        """
+        The file descriptors, the probe is currently waiting for.
+
+        @return: a dict with the file descriptors as keys and 'r' (waiting
+                 for readability) or 'w' (waiting for writability) as values
+        @rtype: dict
+
+        """
+
+        if self.state == 'connecting':
+            return dict((fd, 'w') for fd in self._pending.keys())
+        if self.state == 'sending':
+            return {self._sock.fileno(): 'w'}
+        if self.state == 'receiving':
+            return {self._sock.fileno(): 'r'}
+        return {}
+
+    #--------------------------------------------------------------------------
+    def wakeup_time(self):
+        """
+        The next point of time, the probe must be woken up, even without
+        any socket event (deadline or next connection attempt).
+        """
+
+        if self.done:
+            return None
+        wakeup = self.deadline
+        if self.state == 'connecting' and self._addresses:
+            wakeup = min(wakeup, self._next_start)
+        return wakeup
+
+    #--------------------------------------------------------------------------
+    def handle_timer(self, now):
+        """
+        Handles the reaching of the deadline or of the start time of the
+        next connection attempt.
+        """
+
+        if self.done:
+            return
+
+        if now >= self.deadline:
+            secs = now - self.begin
+            if self.state == 'connecting':
+                msg = "Timeout connecting to %r port %d." % (
+                        self.host_address, self.port)
+                self._fail(SocketConnectTimeoutError(msg))
+            elif self.state == 'sending':
+                self._fail(SocketTransportError("Timeout on sending message."))
+            else:
+                self._fail(SocketTransportError(
+                        'Timeout after %0.3f seconds.' % (secs)))
+            return
+
+        if self.state == 'connecting':
+            self._start_attempts(now)
+
+    #--------------------------------------------------------------------------
+    def handle_event(self, fd, now):
+        """
+        Handles a readability or writability event on the given file
+        descriptor.
+        """
+
+        if self.state == 'connecting':
+            if not fd in self._pending:
+                return
+            (s, res) = self._pending.pop(fd)
+            err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if not err or err == errno.EISCONN:
+                self._connected(s, res, now)
+                return
+            if self.verbose > 3:
+                log.debug("Could not connect to %s: %s", str(res[4]),
+                        os.strerror(err))
+            s.close()
+            # start the next attempt at once
+            self._next_start = now
+            self._start_attempts(now)
+            return
+
+        if self.state == 'sending':
+            try:
+                self._offset += self._sock.send(self.message[self._offset:])
+            except socket.error, e:
+                if e[0] not in SOCKET_RETRY:
+                    self._fail(SocketTransportError(
+                            "Error on sending message: %s" % (e)))
+                return
+            if self._offset >= len(self.message):
+                self._sent = monotonic()
+                self.state = 'receiving'
+            return
+
+        if self.state == 'receiving':
+            self._receive()
+
+    #--------------------------------------------------------------------------
+    def _receive(self):
+        """
+        Receives the next part of the reply directly into the reply buffer
+        and scans it for the final line.
+        """
+
+        if self._buffer is None:
+            self._buffer = bytearray(min(self.buffer_size, self.max_reply_size))
+
+        free = len(self._buffer) - self._length
+        if not free:
+            if len(self._buffer) >= self.max_reply_size:
+                msg = "The reply of %s on %r exceeds the maximum size of %d bytes." % (
+                        self.daemon_name, self.host_address, self.max_reply_size)
+                self._fail(SocketTransportError(msg))
+                return
+            grow = min(len(self._buffer), self.max_reply_size - len(self._buffer))
+            self._buffer.extend(bytearray(grow))
+            free = grow
+
+        start = self._length
+        try:
+            if HAS_MEMORYVIEW:
+                view = memoryview(self._buffer)
+                try:
+                    count = self._sock.recv_into(view[start:],
+                            min(free, self.buffer_size))
+                finally:
+                    # release the export, so the buffer may grow
+                    del view
+            else:
+                data = self._sock.recv(min(free, self.buffer_size))
+                count = len(data)
+                self._buffer[start:start + count] = data
+        except socket.error, e:
+            if e[0] not in SOCKET_RETRY:
+                self._fail(SocketTransportError(
+                        "Error on receiving reply: %s" % (e)))
+            return
+
+        if not count:
+            if self.verbose > 3:
+                log.debug("Socket closed from remote.")
+            self._finish(closed = True)
+            return
+
+        if self.ttfb is None:
+            self.ttfb = monotonic() - self._sent
+        self._length += count
+        if self.is_final_line and self._scan_lines(start):
+            if self.verbose > 3:
+                log.debug("Reply is complete.")
+            self._finish()
+
+    #--------------------------------------------------------------------------
+    def _scan_lines(self, start):
+        """
+        Scans the newly received data in the reply buffer for complete lines
+        and checks them with is_final_line(). Only the new data is searched
+        for line feeds, the reply received so far is never scanned again.
+
+        @param start: the offset of the newly received data in the buffer
+        @type start: int
+
+        @return: the final line of the reply was received
+        @rtype: bool
+
+        """
+
+        pos = self._buffer.find('\n', start, self._length)
+        while pos >= 0:
+            line = str(self._buffer[self._line_start:pos])
+            self._line_start = pos + 1
+            if self.is_final_line(line):
+                return True
+            pos = self._buffer.find('\n', self._line_start, self._length)
+        return False
+
+#==============================================================================
+class PjdProbeLoop(object):
+    """
+    An event loop driving many PjdProbe objects concurrently with poll()
+    (or select(), if poll() is not available). The number of concurrently
+    running probes is bounded.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, concurrency = DEFAULT_CONCURRENCY,
+            should_shutdown = None, verbose = 0):
+        """
+        Constructor.
+
+        @param concurrency: the maximum number of concurrently running probes
+        @type concurrency: int
+        @param should_shutdown: a callable, which returns True, if all
+                                probes should be canceled
+        @type should_shutdown: callable or None
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.concurrency = max(int(concurrency), 1)
+        self.should_shutdown = should_shutdown
+        self.verbose = verbose
+
+    #--------------------------------------------------------------------------
+    def run(self, probes, callback = None):
+        """
+        Runs all given probes until they are finished.
+
+        @param probes: the probes to run, they are started in this order
+        @type probes: iterable of PjdProbe
+        @param callback: a callable, which is called with every finished
+                         probe as soon as it is finished
+        @type callback: callable or None
+
+        """
+
+        waiting = iter(probes)
+        exhausted = False
+        active = []
+
+        while active or not exhausted:
+
+            if self.should_shutdown and self.should_shutdown():
+                for probe in active:
+                    probe.cancel()
+                    if callback:
+                        callback(probe)
+                for probe in waiting:
+                    probe.cancel()
+                    if callback:
+                        callback(probe)
+                return
+
+            while not exhausted and len(active) < self.concurrency:
+                try:
+                    probe = waiting.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                probe.start()
+                if probe.done:
+                    if callback:
+                        callback(probe)
+                else:
+                    active.append(probe)
+
+            if not active:
+                continue
+
+            fd_map = {}
+            wakeup = None
+            for probe in active:
+                for (fd, ev) in probe.events().items():
+                    fd_map[fd] = (probe, ev)
+                w = probe.wakeup_time()
+                if w is not None and (wakeup is None or w < wakeup):
+                    wakeup = w
+
+            timeout = 0
+            if wakeup is not None:
+                timeout = max(wakeup - monotonic(), 0)
+
+            ready = self._wait(fd_map, timeout)
+
+            now = monotonic()
+            for fd in ready:
+                (probe, ev) = fd_map[fd]
+                if not probe.done:
+                    probe.handle_event(fd, now)
+
+            still_active = []
+            for probe in active:
+                if not probe.done:
+                    w = probe.wakeup_time()
+                    if w is not None and now >= w:
+                        probe.handle_timer(now)
+                if probe.done:
+                    if callback:
+                        callback(probe)
+                else:
+                    still_active.append(probe)
+            active = still_active
+
+    #--------------------------------------------------------------------------
+    def _wait(self, fd_map, timeout):
+        """
+        Waits for events on the given file descriptors.
+
+        @return: the file descriptors with events
+        @rtype: list of int
+
+        """
+
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            for (fd, (probe, ev)) in fd_map.items():
+                if ev == 'r':
+                    poller.register(fd, select.POLLIN)
+                else:
+                    poller.register(fd, select.POLLOUT)
+            try:
+                events = poller.poll(timeout * 1000)
+            except select.error, e:
+                if e[0] == errno.EINTR:
+                    return []
+                raise SocketTransportError("Error in poll(): %s" % (e))
+            return [x[0] for x in events]
+
+        rlist = [fd for (fd, (probe, ev)) in fd_map.items() if ev == 'r']
+        wlist = [fd for (fd, (probe, ev)) in fd_map.items() if ev == 'w']
+        try:
+            r, w, x = select.select(rlist, wlist, wlist, timeout)
+        except select.error, e:
+            if e[0] == errno.EINTR:
+                return []
+            raise SocketTransportError("Error in select(): %s" % (e))
+        return list(set(r + w + x))
+
+#==============================================================================
+class PjdTransport(object):
+    """
+    Sends a message to a provisioning daemon and receives its reply.
+
+    All socket operations are non-blocking and bound to one deadline
+    for the whole request, which is evaluated with fractional seconds.
+    Waiting for the reply is event driven, there is no polling interval.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, host_address, port, timeout = DEFAULT_TIMEOUT,
+            buffer_size = DEFAULT_BUFFER_SIZE, daemon_name = 'PJD',
+            connect_stagger = DEFAULT_CONNECT_STAGGER,
+            max_reply_size = DEFAULT_MAX_REPLY_SIZE, resolver = None,
+            verbose = 0):
+        """
+        Constructor.
+
+        @param host_address: the DNS name or IP address of the host,
+                             running the daemon
+        @type host_address: str
+        @param port: the TCP port of the daemon on the host
+        @type port: int
+        @param timeout: the timeout of the whole request in seconds
+        @type timeout: float
+        @param buffer_size: the size of the buffer for the socket operation
+        @type buffer_size: int
+        @param daemon_name: the name of the daemon used in messages
+        @type daemon_name: str
+        @param connect_stagger: the delay in seconds between the staggered
+                                connection attempts to the resolved addresses
+        @type connect_stagger: float
+        @param max_reply_size: the maximum size of the reply in bytes
+        @type max_reply_size: int
+        @param resolver: a callable used instead of socket.getaddrinfo()
+                         to resolve the host address, see PjdProbe
+        @type resolver: callable or None
+        @param verbose: the verbosity level
+        @type verbose: int
+
+        """
+
+        self.host_address = host_address
+        self.port = port
+        self.timeout = float(timeout)
+        self.buffer_size = buffer_size
+        self.daemon_name = daemon_name
+        self.connect_stagger = float(connect_stagger)
+        self.max_reply_size = int(max_reply_size)
+        self.resolver = resolver
+        self.verbose = verbose
+
+        self.probe = None
+        """
+        @ivar: the probe of the last request
+        @type: PjdProbe or None
+        """
+
+    #------------------------------------------------------------
+    @property
+    def connected_address(self):
+        """The address of the established connection."""
+        if not self.probe:
+            return None
+        return self.probe.connected_address
+
+    #------------------------------------------------------------
+    @property
+    def family_name(self):
+        """The name of the address family of the established connection."""
+        if not self.probe:
+            return None
+        return self.probe.family_name
+
+    #------------------------------------------------------------
+    @property
+    def connect_time(self):
+        """The duration of establishing the connection in seconds."""
+        if not self.probe:
+            return None
+        return self.probe.connect_time
+
+    #------------------------------------------------------------
+    @property
+    def ttfb(self):
+        """The time from sending the request to the first byte of the reply."""
+        if not self.probe:
+            return None
+        return self.probe.ttfb
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'host_address': self.host_address,
+            'port': self.port,
+            'timeout': self.timeout,
+            'buffer_size': self.buffer_size,
+            'daemon_name': self.daemon_name,
+            'connect_stagger': self.connect_stagger,
+            'max_reply_size': self.max_reply_size,
+            'verbose': self.verbose,
+            'probe': None,
+        }
+        if self.probe:
+            res['probe'] = self.probe.as_dict()
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def send(self, message, is_final_line = None, should_shutdown = None):
+        """
+        Sends the message over network socket to the recipient.
+        It waits for all replies and gives them back all.
+
+        @raise NoListeningError: if the daemon isn't listening on the given port
+        @raise SocketConnectTimeoutError: on a timeout on connecting
+        @raise SocketTransportError: on some communication errors or timeouts
+
+        @param message: the message to send over the network
+        @type message: str
+        @param is_final_line: a callable, which gets every complete line
+                              of the reply and returns True, if it is the
+                              last line of the reply
+        @type is_final_line: callable or None
+        @param should_shutdown: a callable, which returns True, if the
+                                request should be canceled
+        @type should_shutdown: callable or None
+
+        @return: response from server
+        @rtype: str
+
+        """
+
+        self.probe = PjdProbe(
+                self.host_address, self.port, message, timeout = self.timeout,
+                buffer_size = self.buffer_size, daemon_name = self.daemon_name,
+                connect_stagger = self.connect_stagger,
+                is_final_line = is_final_line,
+                max_reply_size = self.max_reply_size,
+                resolver = self.resolver, verbose = self.verbose,
+        )
+
+        loop = PjdProbeLoop(concurrency = 1,
+                should_shutdown = should_shutdown, verbose = self.verbose)
+        loop.run([self.probe])
+
+        if self.probe.error:
+            raise self.probe.error
+
+        return self.probe.reply
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,330 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for reading the state of the local TCP sockets through
+          sock_diag netlink (like 'ss') with a fallback to /proc/net/tcp
+          and /proc/net/tcp6, without forking 'ss' or 'netstat'.
+"""
+
+# Standard modules
+import os
+import sys
+import errno
+import socket
+import struct
+import logging
+
+# Third party modules
+
+# Own modules
+
+from nagios.plugin import NagiosPluginError
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.1'
+
+log = logging.getLogger(__name__)
+
+# TCP states from include/net/tcp_states.h
+TCP_ESTABLISHED = 1
+TCP_SYN_RECV = 3
+TCP_LISTEN = 10
+
+TCP_STATE_NAMES = {
+    TCP_ESTABLISHED: 'ESTABLISHED',
+    TCP_SYN_RECV: 'SYN_RECV',
+    TCP_LISTEN: 'LISTEN',
+}
+
+# Constants from linux/netlink.h, linux/sock_diag.h and linux/inet_diag.h
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+# family, protocol, ext, pad, states, followed by the zeroed socket id
+INET_DIAG_REQ_V2 = struct.Struct('=BBBBI48x')
+# family, state, timer, retrans, sport, dport
+INET_DIAG_MSG_HEAD = struct.Struct('=BBBB')
+INET_DIAG_MSG_PORTS = struct.Struct('!HH')
+# expires, rqueue, wqueue, uid, inode after the socket id
+INET_DIAG_MSG_TAIL = struct.Struct('=IIIII')
+INET_DIAG_MSG_TAIL_OFFSET = 4 + 48
+
+RECV_BUFFER_SIZE = 64 * 1024
+
+PROC_NET_TCP = {
+    socket.AF_INET: os.sep + os.path.join('proc', 'net', 'tcp'),
+    socket.AF_INET6: os.sep + os.path.join('proc', 'net', 'tcp6'),
+}
+
+#==============================================================================
+class SockDiagError(NagiosPluginError):
+    pass
+
+#==============================================================================
+def netlink_tcp_sockets(family, states):
+    """
+    Dumps the TCP sockets of the given address family in the given states
+    through sock_diag netlink.
+
+    For listening sockets, the receive queue is the current length of the
+    accept queue and the send queue is its backlog.
+
+    @raise SockDiagError: if sock_diag netlink is not available
+
+    @param family: the address family (socket.AF_INET or socket.AF_INET6)
+    @type family: int
+    @param states: the TCP states of the sockets to dump
+    @type states: list of int
+
+    @return: the sockets as tuples of state, local port, receive queue
+             and send queue
+    @rtype: list of tuple
+
+    """
+
+    if not hasattr(socket, 'AF_NETLINK'):
+        raise SockDiagError("Netlink sockets are not supported.")
+
+    state_mask = 0
+    for state in states:
+        state_mask |= (1 << state)
+
+    req = INET_DIAG_REQ_V2.pack(family, socket.IPPROTO_TCP, 0, 0, state_mask)
+    msg = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(req), SOCK_DIAG_BY_FAMILY,
+            NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + req
+
+    sockets = []
+    try:
+        nl = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                NETLINK_SOCK_DIAG)
+    except socket.error, e:
+        raise SockDiagError("Could not open sock_diag netlink socket: %s" % (e))
+
+    try:
+        try:
+            nl.sendto(msg, (0, 0))
+            done = False
+            while not done:
+                data = nl.recv(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+                offset = 0
+                while offset + NLMSG_HEADER.size <= len(data):
+                    (length, msg_type, flags, seq, pid) = \
+                            NLMSG_HEADER.unpack_from(data, offset)
+                    if length < NLMSG_HEADER.size:
+                        done = True
+                        break
+                    payload = offset + NLMSG_HEADER.size
+                    if msg_type == NLMSG_DONE:
+                        done = True
+                        break
+                    if msg_type == NLMSG_ERROR:
+                        err = -struct.unpack_from('=i', data, payload)[0]
+                        raise SockDiagError(
+                                "Error on sock_diag netlink request: %s" % (
+                                os.strerror(err)))
+                    (fam, state, timer, retrans) = \
+                            INET_DIAG_MSG_HEAD.unpack_from(data, payload)
+                    (sport, dport) = INET_DIAG_MSG_PORTS.unpack_from(data,
+                            payload + INET_DIAG_MSG_HEAD.size)
+                    (expires, rqueue, wqueue, uid, inode) = \
+                            INET_DIAG_MSG_TAIL.unpack_from(data,
+                            payload + INET_DIAG_MSG_TAIL_OFFSET)
+                    sockets.append((state, sport, rqueue, wqueue))
+                    # netlink messages are aligned to 4 bytes
+                    offset += (length + 3) & ~3
+        except socket.error, e:
+            raise SockDiagError("Error on sock_diag netlink request: %s" % (e))
+    finally:
+        nl.close()
+
+    return sockets
+
+#==============================================================================
+def proc_tcp_sockets(family, states):
+    """
+    Reads the TCP sockets of the given address family in the given states
+    from /proc/net/tcp or /proc/net/tcp6.
+
+    For listening sockets, the receive queue is the current length of the
+    accept queue. The backlog is not available there, so the send queue
+    is always None.
+
+    @raise SockDiagError: if the file could not be read
+
+    @param family: the address family (socket.AF_INET or socket.AF_INET6)
+    @type family: int
+    @param states: the TCP states of the sockets to read
+    @type states: list of int
+
+    @return: the sockets as tuples of state, local port, receive queue
+             and send queue
+    @rtype: list of tuple
+
+    """
+
+    proc_file = PROC_NET_TCP[family]
+    if not os.path.exists(proc_file):
+        # no IPv6 support
+        return []
+
+    wanted = {}
+    for state in states:
+        wanted[state] = True
+
+    sockets = []
+    try:
+        fh = open(proc_file, 'r')
+        try:
+            fh.readline()
+            for line in fh:
+                # sl local_address rem_address st tx_queue:rx_queue ...
+                fields = line.split(None, 5)
+                if len(fields) < 5:
+                    continue
+                state = int(fields[3], 16)
+                if state not in wanted:
+                    continue
+                port = int(fields[1].rsplit(':', 1)[1], 16)
+                rqueue = int(fields[4].split(':')[1], 16)
+                sockets.append((state, port, rqueue, None))
+        finally:
+            fh.close()
+    except (IOError, ValueError, IndexError), e:
+        raise SockDiagError("Could not read %r: %s" % (proc_file, e))
+
+    return sockets
+
+#==============================================================================
+class PortSocketStats(object):
+    """
+    The summarized state of the TCP sockets of a local port.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, port):
+
+        self.port = port
+        self.listeners = 0
+
+        self.queue = 0
+        """
+        @ivar: the current length of the accept queues of the listening sockets
+        @type: int
+        """
+
+        self.backlog = None
+        """
+        @ivar: the sum of the backlogs of the listening sockets,
+               None, if not known
+        @type: int or None
+        """
+
+        self.syn_recv = 0
+        self.established = 0
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'port': self.port,
+            'listeners': self.listeners,
+            'queue': self.queue,
+            'backlog': self.backlog,
+            'syn_recv': self.syn_recv,
+            'established': self.established,
+        }
+
+        return res
+
+#==============================================================================
+def port_socket_stats(ports, use_netlink = True):
+    """
+    Gets the state of the TCP sockets of the given local ports in one pass
+    over all TCP sockets, through sock_diag netlink or, if not available,
+    from /proc/net/tcp and /proc/net/tcp6.
+
+    @raise SockDiagError: if the sockets could not be read at all
+
+    @param ports: the local TCP ports
+    @type ports: list of int
+    @param use_netlink: try sock_diag netlink first
+    @type use_netlink: bool
+
+    @return: the states of the ports with the ports as keys and the
+             source ('netlink' or 'proc')
+    @rtype: tuple of dict and str
+
+    """
+
+    states = (TCP_LISTEN, TCP_SYN_RECV, TCP_ESTABLISHED)
+    families = (socket.AF_INET, socket.AF_INET6)
+
+    sockets = None
+    source = None
+    if use_netlink:
+        try:
+            sockets = []
+            for family in families:
+                sockets += netlink_tcp_sockets(family, states)
+            source = 'netlink'
+        except SockDiagError, e:
+            log.debug("%s Falling back to /proc/net/tcp.", e)
+            sockets = None
+
+    if sockets is None:
+        sockets = []
+        for family in families:
+            sockets += proc_tcp_sockets(family, states)
+        source = 'proc'
+
+    stats = {}
+    for port in ports:
+        stats[port] = PortSocketStats(port)
+
+    for (state, port, rqueue, wqueue) in sockets:
+        if port not in stats:
+            continue
+        st = stats[port]
+        if state == TCP_LISTEN:
+            st.listeners += 1
+            st.queue += rqueue
+            if wqueue is not None:
+                if st.backlog is None:
+                    st.backlog = 0
+                st.backlog += wqueue
+        elif state == TCP_SYN_RECV:
+            st.syn_recv += 1
+        elif state == TCP_ESTABLISHED:
+            st.established += 1
+
+    return (stats, source)
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for the state and cache files of the plugins, which are
+          kept between two runs in a directory of the plugin user and are
+          only trusted, if nobody else could have written them
+"""
+
+# Standard modules
+import os
+import sys
+import stat
+import errno
+import logging
+
+# Third party modules
+
+# Own modules
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+# The home directory of the user running the plugins, not world-writable
+# like /var/tmp, where any local user could plant a state file
+STATE_DIR = os.sep + os.path.join('var', 'lib', 'nagios')
+
+#==============================================================================
+class UntrustedFileError(IOError):
+    """
+    Error class for a state file, which could have been written by another
+    user than the plugin user.
+    """
+    pass
+
+#==============================================================================
+def open_trusted(filename):
+    """
+    Opens a state file for reading, if it is owned by the effective user
+    and is not writable by the group or others. Symbolic links are not
+    followed.
+
+    @raise IOError: if the file could not be opened
+    @raise UntrustedFileError: if the file is not trusted
+
+    @param filename: the state file to open
+    @type filename: str
+
+    @return: the opened file
+    @rtype: file
+
+    """
+
+    flags = os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0)
+    try:
+        fd = os.open(filename, flags)
+    except OSError, e:
+        raise IOError(e.errno, e.strerror, filename)
+
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            raise UntrustedFileError(errno.EPERM, "Not a regular file",
+                    filename)
+        if st.st_uid != os.geteuid():
+            raise UntrustedFileError(errno.EPERM,
+                    "Owned by UID %d instead of %d" % (st.st_uid,
+                    os.geteuid()), filename)
+        if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise UntrustedFileError(errno.EPERM,
+                    "Writable by group or others (mode %04o)" % (
+                    stat.S_IMODE(st.st_mode)), filename)
+    except:
+        os.close(fd)
+        raise
+
+    return os.fdopen(fd, 'r')
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
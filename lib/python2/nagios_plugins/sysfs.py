@@ -0,0 +1,376 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Module for a batched reader of sysfs attributes for the sysfs
+          based checks. Every attribute is opened and read directly,
+          relative to cached directory file descriptors (openat), without
+          checking its existence before. Attributes to be polled can be
+          kept open and re-read with pread.
+"""
+
+# Standard modules
+import os
+import sys
+import errno
+import logging
+
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+
+# Third party modules
+
+# Own modules
+
+from nagios.plugin import NagiosPluginError
+
+#---------------------------------------------
+# Some module variables
+
+__version__ = '0.2.0'
+
+log = logging.getLogger(__name__)
+
+# sysfs attributes are at most one page
+MAX_ATTR_SIZE = 4096
+
+# Python 2 doesn't know O_CLOEXEC
+O_CLOEXEC = getattr(os, 'O_CLOEXEC', 02000000)
+
+# Errors of opening or reading an attribute, which are results: the
+# attribute doesn't exists or has no value in the current state of the
+# device (e.g. the carrier of an interface, which is down)
+MISSING_ERRNOS = (errno.ENOENT, errno.EINVAL)
+
+#==============================================================================
+_openat = None
+_pread = None
+
+if ctypes is not None:
+    try:
+        _libc = ctypes.CDLL('libc.so.6', use_errno = True)
+    except OSError:
+        _libc = None
+
+    if _libc is not None:
+        try:
+            _openat = _libc.openat
+            _openat.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int,
+                    ctypes.c_int]
+            _openat.restype = ctypes.c_int
+        except AttributeError:
+            _openat = None
+
+        try:
+            _pread = _libc.pread
+            _pread.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                    ctypes.c_long]
+            _pread.restype = ctypes.c_ssize_t
+        except AttributeError:
+            _pread = None
+
+#==============================================================================
+class SysfsError(NagiosPluginError):
+    """
+    Error on opening or reading a sysfs attribute or directory.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, errno, strerror, filename):
+
+        self.errno = errno
+        self.strerror = strerror
+        self.filename = filename
+
+    #--------------------------------------------------------------------------
+    def __str__(self):
+
+        return "Could not read %r: %s" % (self.filename, self.strerror)
+
+#==============================================================================
+class SysfsReader(object):
+    """
+    A reader of the attributes below a sysfs directory (e.g.
+    '/sys/class/infiniband'). The file descriptors of the directories are
+    cached, the attributes are opened relative to them (openat(2) through
+    ctypes, Python 2 has no os.openat()) and read with a single read.
+    Without openat() the attributes are opened by their full path.
+    """
+
+    #--------------------------------------------------------------------------
+    def __init__(self, base_dir):
+
+        self.base_dir = base_dir
+
+        self.dir_fds = {}
+        """
+        @ivar: the file descriptors of the opened directories with their
+               paths relative to base_dir as keys
+        @type: dict
+        """
+
+        self.attr_fds = {}
+        """
+        @ivar: the absolute paths of the attributes kept open by open_attr()
+               with their file descriptors as keys
+        @type: dict
+        """
+
+        self._buffer = None
+
+    #--------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Typecasting into a dictionary.
+
+        @return: structure as dict
+        @rtype:  dict
+
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'base_dir': self.base_dir,
+            'dir_fds': self.dir_fds,
+            'attr_fds': self.attr_fds,
+            'openat': bool(_openat),
+            'pread': bool(_pread),
+        }
+
+        return res
+
+    #--------------------------------------------------------------------------
+    def path(self, rel_dir, name = None):
+        """The absolute path of a directory or attribute."""
+
+        path = os.path.join(self.base_dir, rel_dir)
+        if name:
+            path = os.path.join(path, name)
+        return os.path.normpath(path)
+
+    #--------------------------------------------------------------------------
+    def _open(self, rel_dir, name, flags):
+        """
+        Opens a file relative to the directory rel_dir.
+
+        @raise OSError: on errors
+
+        @return: the file descriptor
+        @rtype: int
+
+        """
+
+        flags |= O_CLOEXEC
+        if _openat is None:
+            return os.open(self.path(rel_dir, name), flags)
+
+        fd = _openat(self.dir_fd(rel_dir), name, flags, 0)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), self.path(rel_dir, name))
+        return fd
+
+    #--------------------------------------------------------------------------
+    def dir_fd(self, rel_dir = ''):
+        """
+        The file descriptor of the given directory, it is opened relative
+        to its parent directory on the first access.
+
+        @raise OSError: if the directory could not be opened
+
+        @param rel_dir: the path of the directory relative to base_dir
+        @type rel_dir: str
+
+        @return: the file descriptor
+        @rtype: int
+
+        """
+
+        rel_dir = rel_dir.strip(os.sep)
+        if rel_dir in self.dir_fds:
+            return self.dir_fds[rel_dir]
+
+        flags = os.O_RDONLY | os.O_DIRECTORY
+        if not rel_dir:
+            fd = os.open(self.base_dir, flags | O_CLOEXEC)
+        else:
+            (parent, name) = os.path.split(rel_dir)
+            fd = self._open(parent, name, flags)
+
+        self.dir_fds[rel_dir] = fd
+        return fd
+
+    #--------------------------------------------------------------------------
+    def has_dir(self, rel_dir = ''):
+        """
+        Returns, whether the given directory exists (and can be opened).
+        """
+
+        try:
+            self.dir_fd(rel_dir)
+        except OSError:
+            return False
+        return True
+
+    #--------------------------------------------------------------------------
+    def listdir(self, rel_dir = ''):
+        """
+        Lists the entries of the given directory, sorted. A missing
+        directory results in an empty list.
+        """
+
+        try:
+            return sorted(os.listdir(self.path(rel_dir)))
+        except OSError, e:
+            if e.errno in MISSING_ERRNOS or e.errno == errno.ENOTDIR:
+                return []
+            raise SysfsError(e.errno, e.strerror, self.path(rel_dir))
+
+    #--------------------------------------------------------------------------
+    def read(self, rel_dir, name, default = None):
+        """
+        Reads the given attribute.
+
+        @raise SysfsError: on other errors than a missing attribute or
+                           an attribute without a value
+
+        @param rel_dir: the directory of the attribute relative to base_dir
+        @type rel_dir: str
+        @param name: the name of the attribute
+        @type name: str
+        @param default: the result for a missing attribute or an attribute
+                        without a value (ENOENT, EINVAL)
+
+        @return: the stripped content of the attribute
+        @rtype: str
+
+        """
+
+        try:
+            fd = self._open(rel_dir, name, os.O_RDONLY)
+            try:
+                return os.read(fd, MAX_ATTR_SIZE).strip()
+            finally:
+                os.close(fd)
+        except OSError, e:
+            if e.errno in MISSING_ERRNOS or e.errno == errno.ENOTDIR:
+                return default
+            raise SysfsError(e.errno, e.strerror, self.path(rel_dir, name))
+
+    #--------------------------------------------------------------------------
+    def read_many(self, rel_dir, names, default = None):
+        """
+        Reads the given attributes of a directory.
+
+        @raise SysfsError: on other errors than a missing attribute or
+                           an attribute without a value
+
+        @return: the stripped contents of the attributes with their names
+                 as keys, default for missing attributes
+        @rtype: dict
+
+        """
+
+        result = {}
+        for name in names:
+            result[name] = self.read(rel_dir, name, default)
+        return result
+
+    #--------------------------------------------------------------------------
+    def read_int(self, rel_dir, name, default = None):
+        """
+        Reads the given attribute as an integer, default, if it is missing
+        or not an integer.
+        """
+
+        value = self.read(rel_dir, name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            return default
+
+    #--------------------------------------------------------------------------
+    def open_attr(self, rel_dir, name):
+        """
+        Opens the given attribute to be read repeatedly with reread(). It
+        is closed by close().
+
+        @raise SysfsError: on other errors than a missing attribute
+
+        @return: the file descriptor or None, if the attribute is missing
+        @rtype: int or None
+
+        """
+
+        try:
+            fd = self._open(rel_dir, name, os.O_RDONLY)
+        except OSError, e:
+            if e.errno in MISSING_ERRNOS or e.errno == errno.ENOTDIR:
+                return None
+            raise SysfsError(e.errno, e.strerror, self.path(rel_dir, name))
+
+        self.attr_fds[fd] = self.path(rel_dir, name)
+        return fd
+
+    #--------------------------------------------------------------------------
+    def reread(self, fd, default = None):
+        """
+        Reads an attribute opened by open_attr() again from its beginning
+        with one pread(2) (through ctypes, Python 2 has no os.pread()), or
+        lseek() and read() without it.
+
+        @raise SysfsError: on other errors than an attribute without a value
+
+        @return: the stripped content of the attribute, default for an
+                 attribute without a value (EINVAL)
+        @rtype: str
+
+        """
+
+        try:
+            if _pread is None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                return os.read(fd, MAX_ATTR_SIZE).strip()
+
+            if self._buffer is None:
+                self._buffer = ctypes.create_string_buffer(MAX_ATTR_SIZE)
+            length = _pread(fd, self._buffer, MAX_ATTR_SIZE, 0)
+            if length < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            return self._buffer.raw[:length].strip()
+        except OSError, e:
+            if e.errno in MISSING_ERRNOS:
+                return default
+            raise SysfsError(e.errno, e.strerror, self.attr_fds.get(fd, fd))
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """
+        Closes all cached directory file descriptors and all attributes
+        opened by open_attr().
+        """
+
+        for fd in self.dir_fds.values() + self.attr_fds.keys():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.dir_fds = {}
+        self.attr_fds = {}
+
+#==============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
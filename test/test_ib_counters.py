@@ -0,0 +1,346 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of reading the port counters of Infiniband HCAs from a
+          temporary sysfs tree and of computing their increases
+"""
+
+# Standard modules
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.sysfs import SysfsReader
+
+from nagios_plugins.ib_counters import THROUGHPUT_COUNTERS
+from nagios_plugins.ib_counters import XMIT_WAIT_COUNTER
+from nagios_plugins.ib_counters import read_port_counters
+from nagios_plugins.ib_counters import counter_width, counter_delta
+from nagios_plugins.ib_counters import counter_deltas, counter_window
+from nagios_plugins.ib_counters import max_counter_delta
+from nagios_plugins.ib_counters import MIN_PACKET_SIZE
+from nagios_plugins.ib_counters import DEFAULT_COUNTER_WINDOW
+from nagios_plugins.ib_counters import CounterWindowSampler
+
+#---------------------------------------------
+# Some module variables
+
+# The rate of a 4X QDR port in Gb/sec, the 32 bit data counters may wrap
+# within about 3.4 seconds
+QDR_RATE = 40
+
+WRAP_32 = 1 << 32
+
+COUNTER_NAMES = list(THROUGHPUT_COUNTERS) + [XMIT_WAIT_COUNTER,
+        'symbol_error']
+
+#==============================================================================
+class TestIbCounters(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.base_dir = tempfile.mkdtemp(prefix = 'test_ib_counters.')
+        self.sysfs = SysfsReader(self.base_dir)
+
+        # port 1: only the 32 bit counters
+        self.write_counters('mlx4_0/ports/1/counters', {
+            'port_xmit_data': 4000000000,
+            'port_rcv_data': 17,
+            'port_xmit_packets': 1000,
+            'port_rcv_packets': 2,
+            'port_xmit_wait': 5,
+            'symbol_error': 0,
+        })
+
+        # port 2: additional 64 bit counters, but not all of them
+        self.write_counters('mlx4_0/ports/2/counters', {
+            'port_xmit_data': WRAP_32 - 1,
+            'port_rcv_data': WRAP_32 - 1,
+            'port_xmit_packets': 42,
+            'port_rcv_packets': 43,
+        })
+        self.write_counters('mlx4_0/ports/2/counters_ext', {
+            'port_xmit_data_64': 1 << 40,
+            'port_rcv_data_64': 1 << 41,
+            'port_xmit_packets_64': 1 << 30,
+        })
+
+        # port 3: all data and packet counters with 64 bit
+        self.write_counters('mlx4_0/ports/3/counters', {
+            'port_xmit_data': 1,
+            'port_xmit_wait': 2,
+        })
+        self.write_counters('mlx4_0/ports/3/counters_ext', {
+            'port_xmit_data_64': 1 << 40,
+            'port_rcv_data_64': 1 << 41,
+            'port_xmit_packets_64': 1 << 30,
+            'port_rcv_packets_64': 1 << 31,
+        })
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        self.sysfs.close()
+        shutil.rmtree(self.base_dir)
+
+    #--------------------------------------------------------------------------
+    def write_counters(self, rel_dir, counters):
+
+        counters_dir = os.path.join(self.base_dir, rel_dir)
+        if not os.path.isdir(counters_dir):
+            os.makedirs(counters_dir)
+        for (name, value) in counters.items():
+            fh = open(os.path.join(counters_dir, name), 'w')
+            try:
+                fh.write("%d\n" % (value))
+            finally:
+                fh.close()
+
+    #--------------------------------------------------------------------------
+    def test_read_32_bit(self):
+
+        counters = read_port_counters(self.sysfs, 'mlx4_0/ports/1',
+                COUNTER_NAMES)
+        self.assertEqual(counters, {
+            'port_xmit_data': 4000000000,
+            'port_rcv_data': 17,
+            'port_xmit_packets': 1000,
+            'port_rcv_packets': 2,
+            'port_xmit_wait': 5,
+            'symbol_error': 0,
+        })
+
+    #--------------------------------------------------------------------------
+    def test_read_ext_preferred(self):
+
+        counters = read_port_counters(self.sysfs, 'mlx4_0/ports/2',
+                COUNTER_NAMES)
+        self.assertEqual(counters, {
+            'port_xmit_data_64': 1 << 40,
+            'port_rcv_data_64': 1 << 41,
+            'port_xmit_packets_64': 1 << 30,
+            'port_rcv_packets': 43,
+        })
+
+    #--------------------------------------------------------------------------
+    def test_counter_width(self):
+
+        self.assertEqual(counter_width('port_xmit_data'), 32)
+        self.assertEqual(counter_width('port_xmit_data', WRAP_32 - 1), 32)
+        self.assertEqual(counter_width('port_xmit_data_64'), 64)
+        self.assertEqual(counter_width('port_xmit_packets_64', 1), 64)
+        self.assertEqual(counter_width('symbol_error'), 16)
+        self.assertEqual(counter_width('link_downed', 3), 8)
+
+        # a 64 bit value in the 'counters' directory
+        self.assertEqual(counter_width('port_xmit_data', WRAP_32), 64)
+        self.assertEqual(counter_width('port_rcv_packets', 1 << 40), 64)
+
+    #--------------------------------------------------------------------------
+    def test_counter_delta(self):
+
+        self.assertEqual(counter_delta(10, 25, 32), (15, False))
+        self.assertEqual(counter_delta(7, 7, 32), (0, False))
+
+        # wrap within the possible increase
+        self.assertEqual(counter_delta(WRAP_32 - 10, 5, 32, 100), (15, False))
+
+        # an impossible wrap is a reset
+        self.assertEqual(counter_delta(4000000000, 5, 32, 1000), (5, False))
+
+        # counters without max_delta don't wrap
+        self.assertEqual(counter_delta(WRAP_32 - 10, 5, 32), (5, False))
+
+        # saturated counters of the IBA spec
+        self.assertEqual(counter_delta(65000, 65535, 16), (535, True))
+        self.assertEqual(counter_delta(65535, 65535, 16), (0, True))
+
+        # a 64 bit value in the 'counters' directory
+        value = 1 << 40
+        width = counter_width('port_xmit_data', value)
+        self.assertEqual(counter_delta(value, value + 100, width),
+                (100, False))
+
+    #--------------------------------------------------------------------------
+    def test_deltas_wrap(self):
+
+        previous = {'port_xmit_data': WRAP_32 - 1000,
+                'port_xmit_packets': WRAP_32 - 10}
+        current = {'port_xmit_data': 3000, 'port_xmit_packets': 5}
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 1.0)
+        self.assertEqual(deltas, {'port_xmit_data': 4000,
+                'port_xmit_packets': 15})
+        self.assertEqual(saturated, [])
+        self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_deltas_reset(self):
+
+        # reset by 'perfquery -R', the packet counter can't have wrapped
+        previous = {'port_xmit_data': 4000000000, 'port_xmit_packets': 1000,
+                'symbol_error': 12}
+        current = {'port_xmit_data': 5, 'port_xmit_packets': 1,
+                'symbol_error': 0}
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 1.0)
+        self.assertEqual(deltas, {'port_xmit_data': 5,
+                'port_xmit_packets': 1, 'symbol_error': 0})
+        self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_deltas_disagree(self):
+
+        # the data counter is lower, but the packet counter isn't: no
+        # traffic is made up from a wrap
+        previous = {'port_xmit_data': 4000000000, 'port_xmit_packets': 1000}
+        current = {'port_xmit_data': 5, 'port_xmit_packets': 1001}
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 1.0)
+        self.assertEqual(deltas, {'port_xmit_packets': 1})
+        self.assertEqual(unknown, ['port_xmit_data'])
+
+    #--------------------------------------------------------------------------
+    def test_deltas_long_interval(self):
+
+        # the 32 bit counters may wrap unnoticed within 60 seconds at QDR
+        previous = {'port_rcv_data': 10, 'port_rcv_packets': 1,
+                'port_xmit_data_64': 100, 'port_xmit_wait': 3}
+        current = {'port_rcv_data': 20, 'port_rcv_packets': 2,
+                'port_xmit_data_64': 200, 'port_xmit_wait': 4}
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 60.0)
+        self.assertEqual(deltas, {'port_xmit_data': 100,
+                'port_xmit_wait': 1})
+        self.assertEqual(sorted(unknown), ['port_rcv_data',
+                'port_rcv_packets'])
+
+        # no rate, no wraps
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                0, 60.0)
+        self.assertEqual(deltas['port_rcv_data'], 10)
+        self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_deltas_64_bit_in_counters(self):
+
+        previous = {'port_xmit_data': 1 << 40, 'port_xmit_packets': 1 << 35}
+        current = {'port_xmit_data': (1 << 40) + 100,
+                'port_xmit_packets': (1 << 35) + 2}
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 60.0)
+        self.assertEqual(deltas, {'port_xmit_data': 100,
+                'port_xmit_packets': 2})
+        self.assertEqual(saturated, [])
+        self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_deltas_source_changed(self):
+
+        # the 64 bit counters appeared since the previous snapshot
+        previous = read_port_counters(self.sysfs, 'mlx4_0/ports/1',
+                COUNTER_NAMES)
+        current = read_port_counters(self.sysfs, 'mlx4_0/ports/2',
+                COUNTER_NAMES)
+        (deltas, saturated, unknown) = counter_deltas(previous, current,
+                QDR_RATE, 1.0)
+        self.assertEqual(deltas, {'port_rcv_packets': 41})
+        self.assertEqual(saturated, [])
+        self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_max_counter_delta(self):
+
+        # 1.25 * 10**9 data words per second at QDR
+        self.assertEqual(max_counter_delta('port_rcv_data', QDR_RATE, 2.0),
+                2500000000)
+        self.assertEqual(max_counter_delta('port_rcv_packets', QDR_RATE, 1.0),
+                int(5 * 1000 ** 3 / MIN_PACKET_SIZE))
+        self.assertEqual(max_counter_delta('port_xmit_wait', QDR_RATE, 1.0),
+                None)
+        self.assertEqual(max_counter_delta('port_rcv_data', 0, 1.0), None)
+
+    #--------------------------------------------------------------------------
+    def test_counter_window(self):
+
+        self.assertEqual(counter_window(10), DEFAULT_COUNTER_WINDOW)
+        self.assertEqual(counter_window(0), DEFAULT_COUNTER_WINDOW)
+        self.assertTrue(counter_window(200) < 0.35)
+
+        # the 32 bit counters can't wrap unnoticed within the window
+        for rate_val in (10, 20, 40, 56, 100, 200):
+            window = counter_window(rate_val)
+            for name in THROUGHPUT_COUNTERS:
+                self.assertTrue(max_counter_delta(name, rate_val, window) <
+                        WRAP_32)
+            previous = {'port_xmit_data': 10, 'port_xmit_packets': 1}
+            current = {'port_xmit_data': 20, 'port_xmit_packets': 2}
+            (deltas, saturated, unknown) = counter_deltas(previous, current,
+                    rate_val, window)
+            self.assertEqual(unknown, [])
+
+    #--------------------------------------------------------------------------
+    def test_window_sampler(self):
+
+        sampler = CounterWindowSampler(self.sysfs)
+        self.assertTrue(sampler.add_port(1, 'mlx4_0/ports/1'))
+        # a single 32 bit packet counter needs the window
+        self.assertTrue(sampler.add_port(2, 'mlx4_0/ports/2'))
+        self.assertFalse(sampler.add_port(3, 'mlx4_0/ports/3'))
+
+        self.write_counters('mlx4_0/ports/1/counters', {
+            'port_xmit_data': 10,
+            'port_xmit_packets': 1001,
+            'port_xmit_wait': 25,
+        })
+        self.write_counters('mlx4_0/ports/2/counters', {
+            'port_rcv_packets': 53,
+        })
+
+        results = sampler.run(0.01)
+        self.assertEqual(sorted(results.keys()), [1, 2])
+
+        (elapsed, first, second) = results[1]
+        self.assertTrue(elapsed >= 0.01)
+        self.assertEqual(first['port_xmit_data'], 4000000000)
+        self.assertEqual(second['port_xmit_data'], 10)
+        self.assertFalse('symbol_error' in second)
+
+        (deltas, saturated, unknown) = counter_deltas(first, second,
+                QDR_RATE, elapsed)
+        # the data counter is lower, the packet counter isn't
+        self.assertEqual(unknown, ['port_xmit_data'])
+        self.assertEqual(deltas['port_xmit_packets'], 1)
+        self.assertEqual(deltas['port_xmit_wait'], 20)
+        self.assertEqual(deltas['port_rcv_data'], 0)
+
+        (elapsed, first, second) = results[2]
+        self.assertEqual(sorted(second.keys()), ['port_rcv_data_64',
+                'port_rcv_packets', 'port_xmit_data_64',
+                'port_xmit_packets_64'])
+        self.assertEqual(second['port_rcv_packets'] -
+                first['port_rcv_packets'], 10)
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of counting the transitions and outages of sampled links
+"""
+
+# Standard modules
+import os
+import sys
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.link_flaps import LinkFlapStats
+
+#==============================================================================
+class TestLinkFlapStats(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def sample(self, states, interval = 0.1):
+
+        stats = LinkFlapStats()
+        now = 100.0
+        for up in states:
+            stats.add(up, now)
+            now += interval
+        stats.finish()
+        return stats
+
+    #--------------------------------------------------------------------------
+    def test_stable_up(self):
+
+        stats = self.sample([True] * 10)
+        self.assertEqual(stats.samples, 10)
+        self.assertEqual(stats.transitions, 0)
+        self.assertEqual(stats.down_time, 0.0)
+        self.assertEqual(stats.longest_outage, 0.0)
+        self.assertEqual(stats.up, True)
+
+    #--------------------------------------------------------------------------
+    def test_flaps(self):
+
+        # down for 2 and for 3 intervals
+        stats = self.sample([True, False, False, True, True, False, False,
+                False, True, True])
+        self.assertEqual(stats.samples, 10)
+        self.assertEqual(stats.transitions, 4)
+        self.assertAlmostEqual(stats.down_time, 0.5)
+        self.assertAlmostEqual(stats.longest_outage, 0.3)
+        self.assertEqual(stats.up, True)
+
+    #--------------------------------------------------------------------------
+    def test_down_at_the_end(self):
+
+        # the outage until the last sample counts as the longest one
+        stats = self.sample([True, False, True, False, False, False, False])
+        self.assertEqual(stats.transitions, 3)
+        self.assertAlmostEqual(stats.down_time, 0.4)
+        self.assertAlmostEqual(stats.longest_outage, 0.3)
+        self.assertEqual(stats.up, False)
+
+    #--------------------------------------------------------------------------
+    def test_stable_down(self):
+
+        stats = self.sample([False] * 5)
+        self.assertEqual(stats.transitions, 0)
+        self.assertAlmostEqual(stats.down_time, 0.4)
+        self.assertAlmostEqual(stats.longest_outage, 0.4)
+
+    #--------------------------------------------------------------------------
+    def test_no_samples(self):
+
+        stats = LinkFlapStats()
+        stats.finish()
+        self.assertEqual(stats.samples, 0)
+        self.assertEqual(stats.longest_outage, 0.0)
+        self.assertEqual(stats.up, None)
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of the parsers of archived MegaCli dumps and of the
+          offline fleet analyzer on a temporary directory tree
+"""
+
+# Standard modules
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import unittest
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.megaraid_parsers import parse_exit_code
+from nagios_plugins.megaraid_parsers import parse_adapter_properties
+from nagios_plugins.megaraid_parsers import parse_pd_list
+from nagios_plugins.megaraid_parsers import ld_not_exists, parse_ld_info
+from nagios_plugins.megaraid_parsers import parse_bbu_status
+from nagios_plugins.megaraid_parsers import bbu_needs_replacement
+
+from nagios_plugins.megaraid_fleet import MegaRaidFleetAnalyzer
+
+#---------------------------------------------
+# Some module variables
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+        'megaraid')
+
+ONLINE = 'Online, Spun Up'
+UNCONFIGURED = 'Unconfigured(good), Spun down'
+
+#==============================================================================
+def read_dump(name):
+
+    fh = open(os.path.join(DATA_DIR, name), 'rb')
+    try:
+        return fh.read()
+    finally:
+        fh.close()
+
+#==============================================================================
+class TestMegaRaidParsers(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_exit_code(self):
+
+        self.assertEqual(parse_exit_code(read_dump('pdlist.txt')), 0)
+        self.assertEqual(parse_exit_code("Exit Code: 0x01\n"), 1)
+        self.assertEqual(parse_exit_code("no exit code\n"), None)
+
+    #--------------------------------------------------------------------------
+    def test_adapter_properties(self):
+
+        properties = parse_adapter_properties(read_dump('adpallinfo.txt'))
+        self.assertEqual(properties['Product Name'],
+                'LSI MegaRAID SAS 9260-8i')
+        self.assertEqual(properties['FW Package Build'], '12.12.0-0124')
+        self.assertEqual(properties['Mfg. Date'], '06/15/12')
+        self.assertEqual(properties['Revision No'], '')
+        self.assertEqual(properties['Degraded'], '1')
+        # the first occurence wins
+        self.assertEqual(properties['Memory Size'], '512MB')
+        self.assertFalse('Exit Code' in properties)
+
+    #--------------------------------------------------------------------------
+    def test_pd_list(self):
+
+        drives = parse_pd_list(read_dump('pdlist.txt'))
+        self.assertEqual([d['pd_id'] for d in drives],
+                ['[32:0]', '[32:1]', '[32:2]'])
+        self.assertEqual([d['dev_id'] for d in drives], [8, 9, 10])
+        self.assertEqual([d['fw_state'] for d in drives],
+                [ONLINE, ONLINE, UNCONFIGURED])
+        self.assertEqual([d['foreign_state'] for d in drives],
+                ['None', 'None', 'Foreign'])
+
+        drive = drives[1]
+        self.assertEqual(drive['enclosure'], 32)
+        self.assertEqual(drive['slot'], 1)
+        self.assertEqual(drive['media_errors'], 12)
+        self.assertEqual(drive['other_errors'], 3)
+        self.assertEqual(drive['predictive_failures'], 1)
+
+    #--------------------------------------------------------------------------
+    def test_pd_list_without_slot(self):
+
+        output = "Enclosure Device ID: 32\nDevice Id: 8\n"
+        self.assertEqual(parse_pd_list(output), [])
+
+    #--------------------------------------------------------------------------
+    def test_ld_info(self):
+
+        output = read_dump('ldinfo.txt')
+        self.assertEqual(ld_not_exists(output), None)
+
+        lds = parse_ld_info(output)
+        self.assertEqual(len(lds), 2)
+        self.assertEqual(lds[0], {
+            'ld_number': 0,
+            'raid_level': 1,
+            'size_val': 558.375,
+            'size_unit': 'GB',
+            'state': 'Optimal',
+            'pd_number': 2,
+            'span_depth': 1,
+            'cached': 'No',
+            'consist_percent': None,
+            'consist_min': None,
+        })
+        self.assertEqual(lds[1]['raid_level'], 6)
+        self.assertEqual(lds[1]['size_unit'], 'TB')
+        self.assertEqual(lds[1]['state'], 'Degraded')
+        self.assertEqual(lds[1]['cached'], 'Yes')
+        self.assertEqual(lds[1]['consist_percent'], 37)
+        self.assertEqual(lds[1]['consist_min'], 122)
+
+    #--------------------------------------------------------------------------
+    def test_ld_not_exists(self):
+
+        output = ("Adapter 0: Virtual Drive 3 Does not Exist.\n\n" +
+                "Exit Code: 0x01\n")
+        self.assertEqual(ld_not_exists(output),
+                "Adapter 0: Virtual Drive 3 Does not Exist.")
+        self.assertEqual(parse_ld_info(output), [])
+
+    #--------------------------------------------------------------------------
+    def test_bbu_status(self):
+
+        bbu = parse_bbu_status(read_dump('bbu.txt'))
+        self.assertEqual(bbu['batt_type'], 'iBBU')
+        self.assertEqual(bbu['batt_state'], 'Failed')
+        # the status lines of the BBU firmware follow the measured values
+        self.assertEqual(bbu['voltage'], 'ok')
+        self.assertEqual(bbu['temperature'], 'ok')
+        self.assertEqual(bbu['lc_state'], 'ok')
+        self.assertEqual(bbu['bbu_miss'], 'no')
+        self.assertEqual(bbu['bbu_replace'], 'yes')
+        self.assertEqual(bbu['pack_fail'], 'no')
+        self.assertEqual(bbu_needs_replacement(bbu),
+                ['Battery Replacement required'])
+
+    #--------------------------------------------------------------------------
+    def test_bbu_status_empty(self):
+
+        bbu = parse_bbu_status('')
+        self.assertEqual(bbu['batt_type'], 'unknown')
+        self.assertEqual(bbu['batt_state'], None)
+        self.assertEqual(bbu_needs_replacement(bbu), [])
+
+#==============================================================================
+class TestMegaRaidFleetAnalyzer(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.base_dir = tempfile.mkdtemp(prefix = 'test_megaraid_fleet.')
+        self.top = os.path.join(self.base_dir, 'dumps')
+
+        self.write_dump('node1/pdlist.txt', read_dump('pdlist.txt'))
+        self.write_dump('node1/2013/ldinfo.txt', read_dump('ldinfo.txt'))
+        self.write_dump('node2/bbu.txt', read_dump('bbu.txt'))
+        # a dump with the output of two commands directly in the top dir
+        self.write_dump('node3.txt', read_dump('pdlist.txt') +
+                read_dump('bbu.txt'))
+        self.write_dump('garbage.txt', "no MegaCli here\n")
+        self.write_dump('node2/ignored.log', read_dump('bbu.txt'))
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self.base_dir)
+
+    #--------------------------------------------------------------------------
+    def write_dump(self, rel_path, content):
+
+        path = os.path.join(self.top, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fh = open(path, 'wb')
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+
+    #--------------------------------------------------------------------------
+    def run_analyzer(self, fmt, jobs):
+
+        report_file = os.path.join(self.base_dir, 'report.' + fmt)
+        analyzer = MegaRaidFleetAnalyzer()
+        ret = analyzer(['-j', str(jobs), '-p', '*.txt', '-f', fmt,
+                '-o', report_file, self.top])
+        self.assertEqual(ret, 0)
+        return report_file
+
+    #--------------------------------------------------------------------------
+    def test_json_report(self):
+
+        fh = open(self.run_analyzer('json', 2), 'r')
+        try:
+            report = json.load(fh)
+        finally:
+            fh.close()
+
+        self.assertEqual(report['summary'], {
+            'files_total': 5,
+            'files_failed': 1,
+            'nodes_total': 3,
+            'drives_total': 6,
+            'drives_with_errors': 2,
+            'lds_total': 2,
+            'lds_not_optimal': 1,
+            'bbus_total': 2,
+            'bbus_to_replace': 2,
+        })
+        self.assertEqual(report['drives_by_fw_state'],
+                {ONLINE: 4, UNCONFIGURED: 2})
+
+        self.assertEqual([(d['node'], d['pd_id'], d['media_errors'])
+                for d in report['drives_with_errors']],
+                [('node1', '[32:1]', 12), ('node3', '[32:1]', 12)])
+
+        ld = report['lds_not_optimal'][0]
+        self.assertEqual((ld['node'], ld['ld_number'], ld['raid_level'],
+                ld['state']), ('node1', 1, 6, 'Degraded'))
+        self.assertEqual(ld['file'],
+                os.path.join(self.top, 'node1', '2013', 'ldinfo.txt'))
+
+        self.assertEqual([(b['node'], b['batt_type'], b['replace'])
+                for b in report['bbus_to_replace']],
+                [('node2', 'iBBU', ['Battery Replacement required']),
+                ('node3', 'iBBU', ['Battery Replacement required'])])
+
+        failed = report['files_failed'][0]
+        self.assertEqual((failed['node'], failed['error']),
+                ('garbage', 'no MegaCli output found'))
+
+    #--------------------------------------------------------------------------
+    def test_csv_report(self):
+
+        fh = open(self.run_analyzer('csv', 1), 'rb')
+        try:
+            rows = list(csv.DictReader(fh))
+        finally:
+            fh.close()
+
+        self.assertEqual([(r['category'], r['node'], r['item'], r['state'],
+                r['detail']) for r in rows], [
+            ('fw_state', '', '', ONLINE, '4'),
+            ('fw_state', '', '', UNCONFIGURED, '2'),
+            ('drive_errors', 'node1', '[32:1]', ONLINE,
+                    '12 media errors, 3 other errors, 1 predictive failures'),
+            ('drive_errors', 'node3', '[32:1]', ONLINE,
+                    '12 media errors, 3 other errors, 1 predictive failures'),
+            ('ld_not_optimal', 'node1', 'LD 1', 'Degraded', 'RAID-6'),
+            ('bbu_replace', 'node2', 'iBBU', 'Failed',
+                    'Battery Replacement required'),
+            ('bbu_replace', 'node3', 'iBBU', 'Failed',
+                    'Battery Replacement required'),
+            ('file_failed', 'garbage', '', '', 'no MegaCli output found'),
+        ])
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of the helper functions of the PPD/VCB instance checks
+          and of splitting pipelined replies
+"""
+
+# Standard modules
+import os
+import sys
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.check_pjd_instance import parse_version, percentile
+
+from nagios_plugins.check_ppd_instance import CheckPpdInstancePlugin
+
+#==============================================================================
+class TestParseVersion(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def assertVersionsAscending(self, versions):
+
+        for (lower, higher) in zip(versions[:-1], versions[1:]):
+            self.assertTrue(parse_version(lower) < parse_version(higher),
+                    "%r is not lower than %r" % (lower, higher))
+
+    #--------------------------------------------------------------------------
+    def test_releases(self):
+
+        self.assertVersionsAscending(['0.9.48', '0.9.49', '0.10.0', '1.2',
+                '1.2.0.1', '8.6.29', '8.6.100'])
+
+    #--------------------------------------------------------------------------
+    def test_trailing_zeros(self):
+
+        self.assertEqual(parse_version('1.2'), parse_version('1.2.0'))
+        self.assertEqual(parse_version('1.2'), parse_version('1.2.0.0'))
+        self.assertEqual(parse_version('v1.2'), parse_version('1.2'))
+        self.assertEqual(parse_version(' 1.2.0 '), parse_version('1.2'))
+
+    #--------------------------------------------------------------------------
+    def test_pre_releases(self):
+
+        self.assertVersionsAscending(['1.2.0~dev1', '1.2.0alpha1',
+                '1.2.0~beta2', '1.2.0~rc1', '1.2.0~rc2', '1.2.0'])
+        self.assertEqual(parse_version('1.2.0~rc1'),
+                parse_version('1.2-rc1'))
+
+    #--------------------------------------------------------------------------
+    def test_post_releases(self):
+
+        self.assertVersionsAscending(['1.0', '1.0-1', '1.0-2', '1.0-10',
+                '1.0-10.1', '1.0.1', '1.0.1-1', '1.1'])
+        self.assertNotEqual(parse_version('1.0-1'), parse_version('1.0.1'))
+        self.assertEqual(parse_version('1.2.0-2'), parse_version('1.2-2'))
+        self.assertVersionsAscending(['1.2.0', '1.2.0-2', '1.2.0.1'])
+
+    #--------------------------------------------------------------------------
+    def test_other_tags(self):
+
+        self.assertVersionsAscending(['1.2.0', '1.2.0post1', '1.2.0.1'])
+
+#==============================================================================
+class TestPercentile(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_percentile(self):
+
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 0), 1)
+
+    #--------------------------------------------------------------------------
+    def test_nearest_rank(self):
+
+        values = [0.01, 0.02, 0.05, 0.4]
+        self.assertEqual(percentile(values, 50), 0.02)
+        self.assertEqual(percentile(values, 75), 0.05)
+        self.assertEqual(percentile(values, 90), 0.4)
+        self.assertEqual(percentile([0.3], 95), 0.3)
+
+    #--------------------------------------------------------------------------
+    def test_no_values(self):
+
+        self.assertEqual(percentile([], 50), None)
+
+#==============================================================================
+class TestDemuxReply(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.plugin = CheckPpdInstancePlugin()
+        self.plugin.parse_args(['--hosts-file', os.devnull,
+                '--no-resolver-cache', '-J', '100', '--command', 'job-status',
+                '--command', 'ppd-info'])
+
+    #--------------------------------------------------------------------------
+    def test_extra_jobs(self):
+
+        self.assertEqual(self.plugin.extra_jobs,
+                [(101, 'job-status'), (102, 'ppd-info')])
+
+    #--------------------------------------------------------------------------
+    def test_demux(self):
+
+        reply = ("greeting of the daemon\n" +
+                "100,3,0,Processing ppd-info\n" +
+                "101,5,0,2 jobs running, 0 jobs queued\n" +
+                "100,5,0,PPD Version [0.9.48]\n" +
+                "KEY=value\n" +
+                "102,4,1,Unknown command\n" +
+                "4711,5,0,status of a foreign job\n")
+        self.assertEqual(self.plugin.demux_reply(reply), {
+            '100': "greeting of the daemon\n100,3,0,Processing ppd-info\n" +
+                    "100,5,0,PPD Version [0.9.48]\nKEY=value",
+            '101': "101,5,0,2 jobs running, 0 jobs queued",
+            '102': "102,4,1,Unknown command\n4711,5,0,status of a foreign job",
+        })
+
+    #--------------------------------------------------------------------------
+    def test_missing_reply(self):
+
+        blocks = self.plugin.demux_reply("100,5,0,PPD Version [0.9.48]\n")
+        self.assertEqual(blocks['101'], '')
+        self.assertEqual(blocks['102'], '')
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of the resident prober with kept-alive connections to
+          a local stand-in server on an ephemeral port
+"""
+
+# Standard modules
+import os
+import sys
+import threading
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.pjd_standin import PjdStandinServer, PjdStandinConfig
+
+from nagios_plugins.pjd_prober import PjdProber
+
+from nagios_plugins.check_ppd_instance import CheckPpdInstancePlugin
+
+#---------------------------------------------
+# Some module variables
+
+ROUNDS = 5
+PROBE_INTERVAL = 0.2
+
+#==============================================================================
+class TestPjdProberKeepAlive(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def start_server(self, idle_timeout):
+
+        config = PjdStandinConfig(idle_timeout = idle_timeout)
+        self.server = PjdStandinServer(('127.0.0.1', 0), config)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(5)
+
+    #--------------------------------------------------------------------------
+    def run_prober(self):
+
+        plugin = CheckPpdInstancePlugin()
+        plugin.parse_args(['--hosts-file', os.devnull,
+                '--no-resolver-cache', '-t', '5'])
+        prober = PjdProber(plugin, [('127.0.0.1', self.port)],
+                interval = PROBE_INTERVAL, keep_alive = True)
+        prober.run(rounds = ROUNDS)
+        return prober.targets[0]
+
+    #--------------------------------------------------------------------------
+    def test_idle_connections_closed(self):
+
+        # the default idle timeout of the stand-in is far below the interval
+        self.start_server(PjdStandinConfig().idle_timeout)
+        target = self.run_prober()
+
+        self.assertEqual(target.probes, ROUNDS)
+        self.assertEqual(target.connects, ROUNDS)
+        self.assertEqual(target.reconnects, 0)
+        self.assertEqual(target.result['reconnects'], 0)
+        self.assertEqual(target.result['state'], 0)
+
+    #--------------------------------------------------------------------------
+    def test_connection_kept(self):
+
+        self.start_server(10)
+        target = self.run_prober()
+
+        self.assertEqual(target.probes, ROUNDS)
+        self.assertEqual(target.connects, 1)
+        self.assertEqual(target.reconnects, 0)
+        self.assertEqual(target.result['state'], 0)
+        target.close()
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of finding and sampling the PPD and VCB processes in a
+          synthetic procfs tree
+"""
+
+# Standard modules
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+import nagios_plugins.check_pjd_procs as check_pjd_procs
+
+from nagios_plugins.check_pjd_procs import find_processes, sample_process
+
+#---------------------------------------------
+# Some module variables
+
+# The processes of the synthetic procfs tree: comm and argv
+PROCESSES = {
+    100: ('ppd', ['/usr/sbin/ppd', '-f']),
+    101: ('python', ['/usr/bin/python2.7', '-u', '/usr/bin/vcb']),
+    102: ('grep', ['grep', 'ppd']),
+    103: ('vim', ['vim', 'vcb']),
+    104: ('bash', ['/bin/bash', '/usr/local/bin/ppd', 'start']),
+    105: ('pgrep', ['pgrep', '-f', 'ppd']),
+    106: ('man', ['man', 'vcb']),
+    107: ('kworker/0:1', []),
+}
+
+#==============================================================================
+class TestPjdProcs(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.proc_dir = tempfile.mkdtemp(prefix = 'test_pjd_procs.')
+        self.old_proc_dir = check_pjd_procs.PROC_DIR
+        check_pjd_procs.PROC_DIR = self.proc_dir
+
+        for (pid, (comm, argv)) in PROCESSES.items():
+            self.write_proc_file(pid, 'comm', comm + '\n')
+            cmdline = ''
+            if argv:
+                cmdline = '\0'.join(argv) + '\0'
+            self.write_proc_file(pid, 'cmdline', cmdline)
+        self.write_proc_file('self', 'comm', 'python\n')
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        check_pjd_procs.PROC_DIR = self.old_proc_dir
+        shutil.rmtree(self.proc_dir)
+
+    #--------------------------------------------------------------------------
+    def write_proc_file(self, pid, name, content):
+
+        pid_dir = os.path.join(self.proc_dir, str(pid))
+        if not os.path.isdir(pid_dir):
+            os.makedirs(pid_dir)
+        fh = open(os.path.join(pid_dir, name), 'w')
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+
+    #--------------------------------------------------------------------------
+    def test_find_processes(self):
+
+        found = find_processes(['ppd', 'vcb'])
+        self.assertEqual(sorted(found['ppd']), [100, 104])
+        self.assertEqual(sorted(found['vcb']), [101])
+
+    #--------------------------------------------------------------------------
+    def test_sample_process(self):
+
+        # utime and stime are the fields 14 and 15, num_threads the field 20
+        fields = ['S', '1', '100', '100', '0', '-1', '4194560', '0', '0',
+                '0', '0', '1500', '250', '0', '0', '20', '0', '12', '0']
+        self.write_proc_file(100, 'stat',
+                '100 (ppd (main)) ' + ' '.join(fields) + '\n')
+        self.write_proc_file(100, 'status', "Name:\tppd\nThreads:\t12\n" +
+                "voluntary_ctxt_switches:\t4711\n" +
+                "nonvoluntary_ctxt_switches:\t42\n")
+        self.write_proc_file(100, 'io', "rchar: 1000\nread_bytes: 8192\n" +
+                "write_bytes: 4096\ncancelled_write_bytes: 0\n")
+        fd_dir = os.path.join(self.proc_dir, '100', 'fd')
+        os.makedirs(fd_dir)
+        for fd in range(5):
+            os.symlink('/dev/null', os.path.join(fd_dir, str(fd)))
+
+        sample = sample_process(100)
+        self.assertEqual(sample['ticks'], 1750)
+        self.assertEqual(sample['threads'], 12)
+        self.assertEqual(sample['vcs'], 4711)
+        self.assertEqual(sample['ivcs'], 42)
+        self.assertEqual(sample['read'], 8192)
+        self.assertEqual(sample['write'], 4096)
+        self.assertEqual(sample['fds'], 5)
+
+        # a gone process
+        self.assertEqual(sample_process(999), None)
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of the PJD transport with oversized replies streamed
+          from a local stand-in server on an ephemeral port
+"""
+
+# Standard modules
+import os
+import sys
+import threading
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.pjd_standin import PjdStandinServer, PjdStandinConfig
+from nagios_plugins.pjd_standin import filler_lines
+
+from nagios_plugins.pjd_transport import DEFAULT_MAX_REPLY_SIZE
+from nagios_plugins.pjd_transport import SocketTransportError
+from nagios_plugins.pjd_transport import PjdTransport
+from nagios_plugins.pjd_transport import PjdProbe, PjdProbeLoop
+
+from nagios_plugins.check_vcb_instance import CheckVcbInstancePlugin
+
+#---------------------------------------------
+# Some module variables
+
+# 32 MiB of filler lines, twice the default maximum reply size
+OVERSIZE = 2 * DEFAULT_MAX_REPLY_SIZE
+
+VCB_INFO_REQUEST = ("<pjd><job-id>4711</job-id><command>vcb-info</command>" +
+        "<answer-to-socket>yes</answer-to-socket></pjd>\n")
+
+#==============================================================================
+class TestPjdTransportOversize(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        config = PjdStandinConfig(oversize = OVERSIZE)
+        self.server = PjdStandinServer(('127.0.0.1', 0), config)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+        self.plugin = CheckVcbInstancePlugin()
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(5)
+
+    #--------------------------------------------------------------------------
+    def test_default_limit(self):
+
+        transport = PjdTransport('127.0.0.1', self.port, timeout = 30,
+                daemon_name = 'VCB')
+        try:
+            transport.send(VCB_INFO_REQUEST,
+                    is_final_line = self.plugin.is_final_line)
+        except SocketTransportError, e:
+            self.assertTrue('exceeds the maximum size of %d bytes' % (
+                    DEFAULT_MAX_REPLY_SIZE) in str(e))
+        else:
+            self.fail("The oversized reply was accepted.")
+
+        probe = transport.probe
+        self.assertEqual(probe.state, 'failed')
+        self.assertTrue(probe.reply is None)
+        self.assertTrue(probe.done)
+
+    #--------------------------------------------------------------------------
+    def test_probe_loop_limit(self):
+
+        probes = []
+        for i in range(3):
+            probes.append(PjdProbe('127.0.0.1', self.port, VCB_INFO_REQUEST,
+                    timeout = 30, daemon_name = 'VCB',
+                    is_final_line = self.plugin.is_final_line,
+                    max_reply_size = 1024 * 1024))
+        finished = []
+        loop = PjdProbeLoop(concurrency = 3)
+        loop.run(probes, callback = finished.append)
+
+        self.assertEqual(len(finished), 3)
+        for probe in probes:
+            self.assertEqual(probe.state, 'failed')
+            self.assertTrue(isinstance(probe.error, SocketTransportError))
+            self.assertTrue(probe.reply is None)
+
+    #--------------------------------------------------------------------------
+    def test_raised_limit(self):
+
+        transport = PjdTransport('127.0.0.1', self.port, timeout = 30,
+                daemon_name = 'VCB', max_reply_size = 4 * OVERSIZE)
+        reply = transport.send(VCB_INFO_REQUEST,
+                is_final_line = self.plugin.is_final_line)
+
+        self.assertEqual(transport.probe.state, 'done')
+        self.assertTrue(len(reply) > OVERSIZE)
+        self.assertTrue(reply.endswith("END_OF_DATA=TRUE\n"))
+
+        result = self.plugin.finish_reply(reply)
+        rstatus = self.plugin.get_request_status(result)
+        self.assertEqual(rstatus.job_id, '4711')
+        self.assertEqual(rstatus.state, 5)
+
+        values = self.plugin.parse_values(rstatus.message)
+        self.assertEqual(values.get('VCB_VERSION'), '8.6.29')
+        self.assertTrue('VCB_LOAD' in values)
+        filler = [k for k in values.keys() if k.startswith('FILLER_')]
+        self.assertEqual(len(filler), filler_lines(OVERSIZE).count('\n'))
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
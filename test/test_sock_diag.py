@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of reading the TCP sockets from synthetic /proc/net/tcp
+          and /proc/net/tcp6 files
+"""
+
+# Standard modules
+import os
+import sys
+import socket
+import shutil
+import tempfile
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+import nagios_plugins.sock_diag as sock_diag
+
+from nagios_plugins.sock_diag import TCP_ESTABLISHED, TCP_LISTEN
+from nagios_plugins.sock_diag import SockDiagError, proc_tcp_sockets
+
+#---------------------------------------------
+# Some module variables
+
+PROC_NET_TCP = (
+    "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when " +
+            "retrnsmt   uid  timeout inode\n" +
+    "   0: 00000000:1F89 00000000:0000 0A 00000000:00000000 00:00000000 " +
+            "00000000     0        0 1234 1 0000000000000000 100 0 0 10 0\n" +
+    "   1: 0100007F:1F8A 00000000:0000 0A 00000000:00000011 00:00000000 " +
+            "00000000     0        0 1235 1 0000000000000000 100 0 0 10 0\n" +
+    "   2: 0100007F:1F89 0100007F:D431 01 00000100:00000000 00:00000000 " +
+            "00000000   106        0 1236 1 0000000000000000 20 4 30 10 -1\n" +
+    "   3: 0100007F:D431 0100007F:1F89 06 00000000:00000000 03:00000CB5 " +
+            "00000000     0        0 0 3 0000000000000000\n"
+)
+
+PROC_NET_TCP6 = (
+    "  sl  local_address                         remote_address        " +
+            "                st tx_queue rx_queue tr tm->when retrnsmt   " +
+            "uid  timeout inode\n" +
+    "   0: 00000000000000000000000000000000:1F89 " +
+            "00000000000000000000000000000000:0000 0A 00000000:00000080 " +
+            "00:00000000 00000000     0        0 2234 1 0000000000000000 " +
+            "100 0 0 10 0\n"
+)
+
+#==============================================================================
+class TestProcTcpSockets(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.proc_dir = tempfile.mkdtemp(prefix = 'test_sock_diag.')
+        self.old_files = sock_diag.PROC_NET_TCP.copy()
+        sock_diag.PROC_NET_TCP[socket.AF_INET] = self.write_file('tcp',
+                PROC_NET_TCP)
+        sock_diag.PROC_NET_TCP[socket.AF_INET6] = self.write_file('tcp6',
+                PROC_NET_TCP6)
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        sock_diag.PROC_NET_TCP.clear()
+        sock_diag.PROC_NET_TCP.update(self.old_files)
+        shutil.rmtree(self.proc_dir)
+
+    #--------------------------------------------------------------------------
+    def write_file(self, name, content):
+
+        filename = os.path.join(self.proc_dir, name)
+        fh = open(filename, 'w')
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+        return filename
+
+    #--------------------------------------------------------------------------
+    def test_listen(self):
+
+        # the receive queue of a listening socket is its accept queue
+        self.assertEqual(proc_tcp_sockets(socket.AF_INET, [TCP_LISTEN]),
+                [(TCP_LISTEN, 8073, 0, None), (TCP_LISTEN, 8074, 17, None)])
+        self.assertEqual(proc_tcp_sockets(socket.AF_INET6, [TCP_LISTEN]),
+                [(TCP_LISTEN, 8073, 128, None)])
+
+    #--------------------------------------------------------------------------
+    def test_states(self):
+
+        self.assertEqual(proc_tcp_sockets(socket.AF_INET,
+                [TCP_ESTABLISHED]), [(TCP_ESTABLISHED, 8073, 0, None)])
+        self.assertEqual(len(proc_tcp_sockets(socket.AF_INET,
+                [TCP_ESTABLISHED, TCP_LISTEN])), 3)
+        self.assertEqual(proc_tcp_sockets(socket.AF_INET6,
+                [TCP_ESTABLISHED]), [])
+
+    #--------------------------------------------------------------------------
+    def test_short_lines(self):
+
+        self.write_file('tcp', PROC_NET_TCP + "   4: 0100007F:1F89\n\n")
+        self.assertEqual(len(proc_tcp_sockets(socket.AF_INET,
+                [TCP_LISTEN])), 2)
+
+    #--------------------------------------------------------------------------
+    def test_missing_file(self):
+
+        # a kernel without IPv6
+        os.remove(sock_diag.PROC_NET_TCP[socket.AF_INET6])
+        self.assertEqual(proc_tcp_sockets(socket.AF_INET6, [TCP_LISTEN]), [])
+
+    #--------------------------------------------------------------------------
+    def test_garbage(self):
+
+        self.write_file('tcp', PROC_NET_TCP +
+                "   4: 0100007F:XYZ 00000000:0000 0A 00000000:00000000\n")
+        self.assertRaises(SockDiagError, proc_tcp_sockets, socket.AF_INET,
+                [TCP_LISTEN])
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of trusting the state and cache files of the plugins only,
+          if nobody else than the plugin user could have written them
+"""
+
+# Standard modules
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.state_files import UntrustedFileError, open_trusted
+
+from nagios_plugins.pjd_resolver import ResolverCache
+
+from nagios_plugins.pjd_prober import read_prober_state
+
+#---------------------------------------------
+# Some module variables
+
+PROBER_STATE = {
+    'daemon': 'PPD',
+    'pid': 4711,
+    'interval': 30,
+    'updated': 1370000000,
+    'results': {},
+}
+
+RESOLVER_ENTRIES = {
+    'ppd.example.com|8073': {
+        'resolved': 1370000000,
+        'addresses': [[2, 1, 6, '', ['192.0.2.1', 8073]]],
+        'failed': None,
+        'error': None,
+    },
+}
+
+#==============================================================================
+class TestStateFiles(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.base_dir = tempfile.mkdtemp(prefix = 'test_state_files.')
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self.base_dir)
+
+    #--------------------------------------------------------------------------
+    def write_json(self, name, data, mode = 0600):
+
+        filename = os.path.join(self.base_dir, name)
+        fh = open(filename, 'w')
+        try:
+            json.dump(data, fh)
+        finally:
+            fh.close()
+        os.chmod(filename, mode)
+        return filename
+
+    #--------------------------------------------------------------------------
+    def test_open_trusted(self):
+
+        filename = self.write_json('state.json', PROBER_STATE, 0644)
+        fh = open_trusted(filename)
+        try:
+            self.assertEqual(json.load(fh), PROBER_STATE)
+        finally:
+            fh.close()
+
+    #--------------------------------------------------------------------------
+    def test_writable_by_others(self):
+
+        for mode in (0620, 0602, 0666):
+            filename = self.write_json('state.json', PROBER_STATE, mode)
+            self.assertRaises(UntrustedFileError, open_trusted, filename)
+
+    #--------------------------------------------------------------------------
+    def test_other_owner(self):
+
+        if os.geteuid() != 0:
+            return
+        filename = self.write_json('state.json', PROBER_STATE)
+        os.chown(filename, 4711, -1)
+        self.assertRaises(UntrustedFileError, open_trusted, filename)
+
+    #--------------------------------------------------------------------------
+    def test_symlink(self):
+
+        filename = self.write_json('state.json', PROBER_STATE)
+        link = os.path.join(self.base_dir, 'link.json')
+        os.symlink(filename, link)
+        self.assertRaises(IOError, open_trusted, link)
+
+    #--------------------------------------------------------------------------
+    def test_missing(self):
+
+        filename = os.path.join(self.base_dir, 'missing.json')
+        self.assertRaises(IOError, open_trusted, filename)
+
+    #--------------------------------------------------------------------------
+    def test_prober_state(self):
+
+        filename = self.write_json('ppd-prober.json', PROBER_STATE)
+        self.assertEqual(read_prober_state(filename), PROBER_STATE)
+
+        os.chmod(filename, 0666)
+        self.assertRaises(UntrustedFileError, read_prober_state, filename)
+
+    #--------------------------------------------------------------------------
+    def test_resolver_cache(self):
+
+        filename = self.write_json('pjd-resolver.json', RESOLVER_ENTRIES)
+        cache = ResolverCache(cache_file = filename)
+        self.assertEqual(cache.entries.keys(), RESOLVER_ENTRIES.keys())
+        entry = cache.entries['ppd.example.com|8073']
+        self.assertEqual(entry['addresses'],
+                [(2, 1, 6, '', ('192.0.2.1', 8073))])
+
+        # a planted cache file is ignored
+        os.chmod(filename, 0666)
+        cache = ResolverCache(cache_file = filename)
+        self.assertEqual(cache.entries, {})
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
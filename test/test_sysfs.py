@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of the batched sysfs reader on a temporary sysfs tree,
+          with and without openat() and pread()
+"""
+
+# Standard modules
+import os
+import sys
+import errno
+import shutil
+import tempfile
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+import nagios_plugins.sysfs as sysfs
+
+from nagios_plugins.sysfs import SysfsError, SysfsReader
+
+#==============================================================================
+class TestSysfsReader(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.base_dir = tempfile.mkdtemp(prefix = 'test_sysfs.')
+        self.old_openat = sysfs._openat
+        self.old_pread = sysfs._pread
+
+        self.write_attr('eth0/operstate', 'up\n')
+        self.write_attr('eth0/carrier', '1\n')
+        self.write_attr('eth0/mtu', '9000\n')
+        self.write_attr('eth0/speed', 'unknown\n')
+        self.write_attr('eth0/statistics/rx_bytes', '4711\n')
+
+        self.reader = SysfsReader(self.base_dir)
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+
+        sysfs._openat = self.old_openat
+        sysfs._pread = self.old_pread
+        self.reader.close()
+        shutil.rmtree(self.base_dir)
+
+    #--------------------------------------------------------------------------
+    def write_attr(self, rel_path, content):
+
+        path = os.path.join(self.base_dir, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fh = open(path, 'w')
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+
+    #--------------------------------------------------------------------------
+    def failing_openat(self, failing_name, err):
+        """
+        An openat() failing with the given error on the given attribute
+        like the kernel does for attributes without a value.
+        """
+
+        real_openat = self.old_openat
+
+        def openat(dir_fd, name, flags, mode):
+            if name == failing_name:
+                sysfs.ctypes.set_errno(err)
+                return -1
+            return real_openat(dir_fd, name, flags, mode)
+
+        return openat
+
+    #--------------------------------------------------------------------------
+    def check_read(self):
+
+        self.assertEqual(self.reader.read('eth0', 'operstate'), 'up')
+        self.assertEqual(self.reader.read('eth0/statistics', 'rx_bytes'),
+                '4711')
+        self.assertEqual(self.reader.read_many('eth0',
+                ['carrier', 'mtu', 'duplex'], 'n/a'),
+                {'carrier': '1', 'mtu': '9000', 'duplex': 'n/a'})
+        self.assertEqual(self.reader.read_int('eth0', 'mtu'), 9000)
+        self.assertEqual(self.reader.read_int('eth0', 'speed', -1), -1)
+
+        # ENOENT and ENOTDIR are results, not errors
+        self.assertEqual(self.reader.read('eth0', 'duplex'), None)
+        self.assertEqual(self.reader.read('eth1', 'operstate', 'gone'),
+                'gone')
+        self.assertEqual(self.reader.read('eth0/mtu', 'operstate'), None)
+
+    #--------------------------------------------------------------------------
+    def test_read(self):
+
+        self.check_read()
+        if self.old_openat is not None:
+            self.assertTrue('eth0/statistics' in self.reader.dir_fds)
+
+    #--------------------------------------------------------------------------
+    def test_read_without_openat(self):
+
+        sysfs._openat = None
+        self.check_read()
+        self.assertEqual(self.reader.dir_fds, {})
+
+    #--------------------------------------------------------------------------
+    def test_read_einval(self):
+
+        if self.old_openat is None:
+            return
+        sysfs._openat = self.failing_openat('speed', errno.EINVAL)
+        self.assertEqual(self.reader.read('eth0', 'speed', 'n/a'), 'n/a')
+        self.assertEqual(self.reader.open_attr('eth0', 'speed'), None)
+        self.assertEqual(self.reader.read('eth0', 'mtu'), '9000')
+
+    #--------------------------------------------------------------------------
+    def test_read_error(self):
+
+        if self.old_openat is None:
+            return
+        sysfs._openat = self.failing_openat('mtu', errno.EIO)
+        self.assertRaises(SysfsError, self.reader.read, 'eth0', 'mtu')
+        self.assertRaises(SysfsError, self.reader.open_attr, 'eth0', 'mtu')
+
+    #--------------------------------------------------------------------------
+    def test_listdir(self):
+
+        self.assertEqual(self.reader.listdir('eth0'), ['carrier', 'mtu',
+                'operstate', 'speed', 'statistics'])
+        self.assertEqual(self.reader.listdir('eth1'), [])
+        self.assertTrue(self.reader.has_dir('eth0'))
+        self.assertFalse(self.reader.has_dir('eth1'))
+
+    #--------------------------------------------------------------------------
+    def check_reread(self):
+
+        fd = self.reader.open_attr('eth0', 'carrier')
+        self.assertEqual(self.reader.attr_fds[fd],
+                os.path.join(self.base_dir, 'eth0', 'carrier'))
+        self.assertEqual(self.reader.open_attr('eth0', 'duplex'), None)
+
+        self.assertEqual(self.reader.reread(fd), '1')
+        self.assertEqual(self.reader.reread(fd), '1')
+        # rewritten in place like a sysfs attribute
+        self.write_attr('eth0/carrier', '0\n')
+        self.assertEqual(self.reader.reread(fd), '0')
+
+        self.reader.close()
+        self.assertEqual(self.reader.attr_fds, {})
+        self.assertRaises(OSError, os.fstat, fd)
+
+    #--------------------------------------------------------------------------
+    def test_reread(self):
+
+        self.check_reread()
+
+    #--------------------------------------------------------------------------
+    def test_reread_without_pread(self):
+
+        sysfs._openat = None
+        sysfs._pread = None
+        self.check_reread()
+
+    #--------------------------------------------------------------------------
+    def test_reread_einval(self):
+
+        if self.old_pread is None:
+            return
+
+        def pread(fd, buf, count, offset):
+            sysfs.ctypes.set_errno(errno.EINVAL)
+            return -1
+
+        fd = self.reader.open_attr('eth0', 'carrier')
+        sysfs._pread = pread
+        self.assertEqual(self.reader.reread(fd, 'n/a'), 'n/a')
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4
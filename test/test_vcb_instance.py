@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2013 by Frank Brehm, Berlin
+@summary: Tests of parsing the KEY=VALUE lines of a VCB status reply
+"""
+
+# Standard modules
+import os
+import sys
+import unittest
+
+# Mangeling import path
+libdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+        'lib', 'python2'))
+if libdir not in sys.path:
+    sys.path.insert(0, libdir)
+
+# Own modules
+
+from nagios_plugins.check_vcb_instance import CheckVcbInstancePlugin
+
+#---------------------------------------------
+# Some module variables
+
+VCB_INFO = ("VCB_VERSION=8.6.29\n" +
+        "  vcb_uptime = 4711 \n" +
+        "VCB_LOAD=12.50%\n" +
+        "VCB_PATH=/var/lib/vcb=old\n" +
+        "VCB_EMPTY=\n" +
+        "no key value line\n" +
+        "1ST_KEY=invalid\n" +
+        "END_OF_DATA=TRUE\n")
+
+#==============================================================================
+class TestParseValues(unittest.TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+
+        self.plugin = CheckVcbInstancePlugin()
+
+    #--------------------------------------------------------------------------
+    def test_parse_values(self):
+
+        self.assertEqual(self.plugin.parse_values(VCB_INFO), {
+            'VCB_VERSION': '8.6.29',
+            'VCB_UPTIME': '4711',
+            'VCB_LOAD': '12.50%',
+            'VCB_PATH': '/var/lib/vcb=old',
+            'VCB_EMPTY': '',
+            'END_OF_DATA': 'TRUE',
+        })
+        self.assertEqual(self.plugin.parse_for_version(VCB_INFO), '8.6.29')
+
+    #--------------------------------------------------------------------------
+    def test_parsed_once(self):
+
+        values = self.plugin.parse_values(VCB_INFO)
+        self.assertTrue(self.plugin.parse_values(VCB_INFO) is values)
+
+        # another message is parsed again
+        other = self.plugin.parse_values("VCB_VERSION=8.7.0\n")
+        self.assertEqual(other, {'VCB_VERSION': '8.7.0'})
+        self.assertEqual(self.plugin.parse_for_version(VCB_INFO), '8.6.29')
+
+    #--------------------------------------------------------------------------
+    def test_no_values(self):
+
+        self.assertEqual(self.plugin.parse_values(''), {})
+        self.assertEqual(self.plugin.parse_for_version("Processing\n"), None)
+
+#==============================================================================
+
+if __name__ == '__main__':
+
+    unittest.main()
+
+#==============================================================================
+
+# vim: fileencoding=utf-8 filetype=python ts=4 et sw=4